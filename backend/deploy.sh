@@ -7,18 +7,32 @@ REGION="us-central1"
 SERVICE_NAME="ecoflow-backend"
 DB_INSTANCE="ecoflow-db"
 CONNECTION_NAME="$PROJECT_ID:$REGION:$DB_INSTANCE"
+# DEPLOY_DETECT_POOL=True also deploys $SERVICE_NAME-detect, a service for camera
+# traffic only (SERVER_POOL=detect); point the cameras' /sensor/detect/ at its URL
+DEPLOY_DETECT_POOL="${DEPLOY_DETECT_POOL:-False}"
+# REDIS_URL (e.g. a Memorystore instance reachable through a VPC connector) switches the
+# cache to Redis, so idempotency keys and live occupancy are shared by every worker.
+# Without it the image uses its database cache table and keeps those per process.
+REDIS_URL="${REDIS_URL:-}"
+CACHE_ENV="CACHE_BACKEND=database"
+if [ -n "$REDIS_URL" ]; then
+    CACHE_ENV="CACHE_BACKEND=redis,REDIS_URL=$REDIS_URL"
+fi
 
 # Build and push image
 gcloud builds submit --tag gcr.io/$PROJECT_ID/$SERVICE_NAME
 
-# Deploy to Cloud Run with Cloud SQL connection
-gcloud run deploy $SERVICE_NAME \
+# Deploy to Cloud Run with Cloud SQL connection (service name, SERVER_POOL)
+deploy() {
+    gcloud run deploy $1 \
     --image gcr.io/$PROJECT_ID/$SERVICE_NAME \
     --platform managed \
     --region $REGION \
     --allow-unauthenticated \
     --add-cloudsql-instances $CONNECTION_NAME \
     --set-env-vars "USE_CLOUD_SQL=True" \
+    --set-env-vars "SERVER_POOL=$2" \
+    --set-env-vars "$CACHE_ENV" \
     --set-env-vars "DB_NAME=ecoflow_prod" \
     --set-env-vars "DB_USER=ecoflow_user" \
     --set-env-vars "DB_HOST=/cloudsql/$CONNECTION_NAME" \
@@ -28,6 +42,14 @@ gcloud run deploy $SERVICE_NAME \
     --set-secrets "GEMINI_API_KEY=gemini-api-key:latest" \
     --set-secrets "EMAIL_HOST_USER=email-user:latest" \
     --set-secrets "EMAIL_HOST_PASSWORD=email-password:latest"
+}
+
+if [ "$DEPLOY_DETECT_POOL" = "True" ]; then
+    deploy $SERVICE_NAME crud
+    deploy $SERVICE_NAME-detect detect
+else
+    deploy $SERVICE_NAME all
+fi
 
 echo "Deployment complete!"
 echo "Make sure you've created the secrets in Secret Manager first:"
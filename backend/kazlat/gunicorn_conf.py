@@ -0,0 +1,135 @@
+"""
+Gunicorn configuration for production:
+
+    gunicorn -c kazlat/gunicorn_conf.py kazlat.wsgi:application
+
+SERVER_POOL picks the traffic this deployment serves. Worker processes and
+threads are derived from the CPU count (SERVER_CPUS, else the CPUs this
+process may run on):
+
+- detect: /sensor/detect/ only (point cameras at this deployment). A
+  detection mostly waits on the crowd service and the counter backend, with
+  short CPU bursts (upload, PIL, JSON). So the profile is one process per
+  CPU with many threads.
+- crud: the dashboard API. Serializers and the ORM are CPU-bound Python
+  under the GIL, so the profile is more processes with few threads.
+- all (default): one deployment for both. Threads are sized for detections,
+  and DETECT_MAX_CONCURRENCY keeps two threads per process free for CRUD
+  requests (lims.serving).
+
+GUNICORN_WORKERS / GUNICORN_THREADS / GUNICORN_WORKER_CLASS (gthread or sync)
+/ GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT override the profile;
+`manage.py bench_server` compares the profiles under a mixed load.
+
+Every view is synchronous (DRF, psycopg, requests, the Gemini SDK), so the
+worker classes are thread based. An event loop (ASGI, gevent) would run the
+same views in a thread pool or need monkey-patched drivers.
+
+Shutdown: on SIGTERM a worker stops accepting, finishes in-flight requests
+within graceful_timeout, and drains buffered writes (lims.serving). The
+default graceful_timeout (8s) fits inside Cloud Run's 10s between SIGTERM
+and SIGKILL.
+"""
+import os
+
+# pool -> (workers per CPU, extra workers, threads per worker, timeout seconds)
+PROFILES = {
+    "detect": (1, 0, 16, 300),
+    "crud": (2, 1, 2, 120),
+    "all": (1, 1, 8, 300),
+}
+CRUD_RESERVED_THREADS = 2  # SERVER_POOL=all: threads per process detections may not take
+
+
+def available_cpus():
+    if os.getenv("SERVER_CPUS"):
+        return max(1, int(os.getenv("SERVER_CPUS")))
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:  # macOS, Windows
+        return os.cpu_count() or 1
+
+
+def server_profile(pool=None, cpus=None, env=os.environ):
+    """ {"pool", "worker_class", "workers", "threads", "timeout", "detect_max_concurrency"} """
+    pool = pool or env.get("SERVER_POOL", "all")
+    if pool not in PROFILES:
+        raise ValueError(f"SERVER_POOL must be one of {', '.join(PROFILES)}, not {pool!r}")
+    per_cpu, extra, threads, timeout = PROFILES[pool]
+    cpus = cpus or available_cpus()
+    worker_class = env.get("GUNICORN_WORKER_CLASS", "gthread")
+    threads = int(env.get("GUNICORN_THREADS", threads)) if worker_class == "gthread" else 1
+    detect_cap = threads - CRUD_RESERVED_THREADS if pool == "all" and threads > CRUD_RESERVED_THREADS else 0
+    return {
+        "pool": pool,
+        "worker_class": worker_class,
+        "workers": int(env.get("GUNICORN_WORKERS", per_cpu * cpus + extra)),
+        "threads": threads,
+        "timeout": int(env.get("GUNICORN_TIMEOUT", timeout)),
+        "detect_max_concurrency": int(env.get("DETECT_MAX_CONCURRENCY", detect_cap)),
+    }
+
+
+profile = server_profile()
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = profile["worker_class"]
+workers = profile["workers"]
+threads = profile["threads"]
+timeout = profile["timeout"]
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "8"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers now and then (slow leaks in native libraries); jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = max_requests // 10
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None  # Empty: no access log
+errorlog = "-"
+# gunicorn >= 25 opens a `gunicornc` control socket at a fixed per-user path; off unless asked for
+control_socket_disable = os.getenv("GUNICORN_CONTROL_SOCKET", "False") != "True"
+proc_name = f"ecoflow-{profile['pool']}"
+# No preload: heavy modules load lazily per worker anyway, and each worker needs its own
+# DB pool and background threads, which must not be created before the fork
+preload_app = False
+
+
+def post_fork(server, worker):
+    """ Runs before the worker loads Django, so these become its settings """
+    # Each thread may hold a pooled DB connection for a whole detection (DB_POOL=True)
+    os.environ.setdefault("DB_POOL_MAX_SIZE", str(threads))
+    os.environ.setdefault("DETECT_MAX_CONCURRENCY", str(profile["detect_max_concurrency"]))
+
+
+def post_worker_init(worker):
+    """ Chains a drain onto the worker's SIGTERM handler (which stops the accept loop) """
+    import signal
+
+    from lims.serving import begin_drain, per_process_state
+
+    local = per_process_state()
+    if workers > 1 and local and worker.age == 1:  # Once, from the first worker
+        worker.log.warning("%d workers, but state is kept per process (%s): set CACHE_BACKEND=redis "
+                           "to share it", workers, ", ".join(local))
+
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(sig, frame):
+        begin_drain()
+        stop(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    """ In-flight requests are done: write whatever they left in the buffers """
+    from django.apps import apps
+
+    if not apps.ready:  # The app failed to load; nothing was buffered
+        return
+    import time
+
+    from lims.serving import drain
+
+    started = time.perf_counter()
+    results = drain()
+    worker.log.info("Drained %s in %.0f ms", results, (time.perf_counter() - started) * 1000)
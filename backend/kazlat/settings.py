@@ -40,6 +40,175 @@ SECRET_KEY = get_env("DJANGO_SECRET_KEY")
 # settings.py
 GEMINI_API_KEY = get_env("GEMINI_API_KEY")
 
+# External counting services (override to point at local stubs, e.g. for benchmarks)
+CROWD_PREDICT_URL = os.getenv("CROWD_PREDICT_URL", "https://ecoflow-detector-490388308724.us-central1.run.app/predict")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))  # Keep-alive connections to the crowd service
+# First /api/ready/ call preloads the Gemini SDK and opens pooled connections
+# in the background; the instance reports ready once that has finished.
+WARMUP_ON_READY = os.getenv("WARMUP_ON_READY", "True") == "True"
+
+# Serving (lims.serving, kazlat/gunicorn_conf.py). Buffered writes (frame queue, points,
+# heartbeats) get DRAIN_TIMEOUT_SECONDS to reach the database when a worker stops.
+# DETECT_MAX_CONCURRENCY caps concurrent /sensor/detect/ requests per process so
+# detections can't hold every worker thread (0: no cap; set by SERVER_POOL=all).
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "5"))
+DETECT_MAX_CONCURRENCY = int(os.getenv("DETECT_MAX_CONCURRENCY", "0"))
+
+# Django cache behind the *_CACHE settings: "locmem" (per process), "database"
+# (table CACHE_TABLE, created by `manage.py createcachetable`; the Docker image's
+# default) or "redis" (REDIS_URL). "local" is always a per-process cache.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHE_TABLE = os.getenv("CACHE_TABLE", "ecoflow_cache")
+CACHES = {
+    "default": {
+        "locmem": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "database": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": CACHE_TABLE},
+        "redis": {"BACKEND": "django.core.cache.backends.redis.RedisCache",
+                  "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")},
+    }[CACHE_BACKEND],
+    "local": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "local"},
+}
+# Keys touched on every detection or live/geo read (idempotency claims, live counts,
+# the geo index version) only go to the shared cache when it is Redis. On the database
+# cache a get is a query and a set about five, so they stay per process there and
+# it only carries low-traffic keys (leaderboard, carbon stats, health probe).
+HOT_PATH_CACHE = CACHE_BACKEND == "redis"
+
+# Health probes run in a background thread; /api/health/ and /api/ready/ read the cached result
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "10"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+HEALTH_CRITICAL_PROBES = os.getenv("HEALTH_CRITICAL_PROBES", "database,cache").split(",")
+
+# Carbon ratio counter backend: "gemini", "sahi" or "local" (zones can override)
+CARBON_COUNTER_BACKEND = os.getenv("CARBON_COUNTER_BACKEND", "gemini")
+LOCAL_COUNTER_MODEL_PATH = os.getenv("LOCAL_COUNTER_MODEL_PATH", "")
+LOCAL_COUNTER_WORKERS = int(os.getenv("LOCAL_COUNTER_WORKERS", os.cpu_count() or 1))
+LOCAL_COUNTER_INPUT_SIZE = int(os.getenv("LOCAL_COUNTER_INPUT_SIZE", "300"))
+LOCAL_COUNTER_SCORE_THRESHOLD = float(os.getenv("LOCAL_COUNTER_SCORE_THRESHOLD", "0.5"))
+
+# Carbon formula (lims.carbon): version used for new carbon logs; `recompute_carbon`
+# re-derives stored rows in chunks of CARBON_BACKFILL_CHUNK ids across CARBON_BACKFILL_WORKERS processes
+CARBON_FORMULA_VERSION = int(os.getenv("CARBON_FORMULA_VERSION", "1"))
+CARBON_BACKFILL_CHUNK = int(os.getenv("CARBON_BACKFILL_CHUNK", "20000"))
+CARBON_BACKFILL_WORKERS = int(os.getenv("CARBON_BACKFILL_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Occupancy forecasting: raises a PREDICTED_OVERCROWDING alert when a zone is
+# forecast to reach 90% of capacity within FORECAST_HORIZON_MINUTES
+FORECAST_ENABLED = os.getenv("FORECAST_ENABLED", "True") == "True"
+FORECAST_HORIZON_MINUTES = float(os.getenv("FORECAST_HORIZON_MINUTES", "15"))
+FORECAST_MIN_OBSERVATIONS = int(os.getenv("FORECAST_MIN_OBSERVATIONS", "10"))  # Per zone, before it may alert
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.3"))   # Level smoothing, per minute
+FORECAST_BETA = float(os.getenv("FORECAST_BETA", "0.05"))    # Trend smoothing, per minute
+FORECAST_GAMMA = float(os.getenv("FORECAST_GAMMA", "0.02"))  # Weekly profile smoothing, per observation
+FORECAST_PHI = float(os.getenv("FORECAST_PHI", "0.98"))      # Trend damping, per minute
+FORECAST_WARMUP_HOURS = int(os.getenv("FORECAST_WARMUP_HOURS", "6"))
+FORECAST_PROFILE_DAYS = int(os.getenv("FORECAST_PROFILE_DAYS", "28"))
+
+# Live occupancy (latest count per camera): "memory" (per process) or "cache"
+# (shared through the LIVE_STATE_CACHE Django cache; the default with CACHE_BACKEND=redis)
+LIVE_STATE_BACKEND = os.getenv("LIVE_STATE_BACKEND", "cache" if HOT_PATH_CACHE else "memory")
+LIVE_STATE_CACHE = os.getenv("LIVE_STATE_CACHE", "default")
+LIVE_STALE_SECONDS = float(os.getenv("LIVE_STALE_SECONDS", "120"))  # Cameras silent this long drop out
+
+# Alert lifecycle (lims.lifecycle, run by `process_alerts`). Alerts are raised at
+# 90% of capacity and auto-closed once the camera stays below ALERT_RESOLVE_RATIO
+# for ALERT_RESOLVE_AFTER_MINUTES; open ones escalate every ALERT_ESCALATE_AFTER_MINUTES.
+ALERT_RESOLVE_RATIO = float(os.getenv("ALERT_RESOLVE_RATIO", "0.8"))
+ALERT_RESOLVE_AFTER_MINUTES = float(os.getenv("ALERT_RESOLVE_AFTER_MINUTES", "10"))
+ALERT_ESCALATE_AFTER_MINUTES = float(os.getenv("ALERT_ESCALATE_AFTER_MINUTES", "30"))
+ALERT_MAX_ESCALATION_LEVEL = int(os.getenv("ALERT_MAX_ESCALATION_LEVEL", "3"))
+ALERT_ESCALATION_BATCH = int(os.getenv("ALERT_ESCALATION_BATCH", "1000"))  # Alerts escalated per statement
+ALERT_LIFECYCLE_INTERVAL_SECONDS = float(os.getenv("ALERT_LIFECYCLE_INTERVAL_SECONDS", "30"))
+
+# Notification feed (lims.notifications)
+NOTIFICATION_PAGE_SIZE = int(os.getenv("NOTIFICATION_PAGE_SIZE", "20"))
+NOTIFICATION_MAX_PAGE_SIZE = int(os.getenv("NOTIFICATION_MAX_PAGE_SIZE", "100"))
+NOTIFICATION_UNREAD_CAP = int(os.getenv("NOTIFICATION_UNREAD_CAP", "1000"))  # Counted up to this ("999+")
+
+# Eco-points (lims.points): credits are batched in memory and flushed as one
+# F() update per user; the leaderboard lives in POINTS_CACHE (shared cache in production)
+POINTS_PER_DETECTION = int(os.getenv("POINTS_PER_DETECTION", "1"))
+POINTS_PER_CARBON_UNIT = float(os.getenv("POINTS_PER_CARBON_UNIT", "10"))  # x saved_amount of a carbon log
+POINTS_FLUSH_SECONDS = float(os.getenv("POINTS_FLUSH_SECONDS", "5"))
+POINTS_FLUSH_MAX_PENDING = int(os.getenv("POINTS_FLUSH_MAX_PENDING", "5000"))  # (user, reason) totals
+POINTS_CACHE = os.getenv("POINTS_CACHE", "default")
+POINTS_LEADERBOARD_SIZE = int(os.getenv("POINTS_LEADERBOARD_SIZE", "100"))
+POINTS_LEADERBOARD_MAX_AGE_SECONDS = float(os.getenv("POINTS_LEADERBOARD_MAX_AGE_SECONDS", "600"))
+
+# Camera liveness (lims.heartbeat): pings are kept in HEARTBEAT_BACKEND ("memory"
+# or "cache", shared through HEARTBEAT_CACHE) and written to Camera.last_seen_at
+# at most once per HEARTBEAT_FLUSH_SECONDS; `sweep_cameras` flags silent cameras.
+HEARTBEAT_BACKEND = os.getenv("HEARTBEAT_BACKEND", "memory")
+HEARTBEAT_CACHE = os.getenv("HEARTBEAT_CACHE", "default")
+HEARTBEAT_FLUSH_SECONDS = float(os.getenv("HEARTBEAT_FLUSH_SECONDS", "15"))
+HEARTBEAT_FLUSH_BATCH = int(os.getenv("HEARTBEAT_FLUSH_BATCH", "500"))  # cameras per UPDATE
+CAMERA_STALE_SECONDS = float(os.getenv("CAMERA_STALE_SECONDS", "300"))  # Silent this long: stale
+CAMERA_SWEEP_INTERVAL_SECONDS = float(os.getenv("CAMERA_SWEEP_INTERVAL_SECONDS", "60"))
+
+# Idempotent detections (lims.idempotency): retries with the same Idempotency-Key
+# (or camera_id + frame_timestamp) replay the stored response instead of re-running
+# the pipeline. "memory" (per process) or "cache" (shared through IDEMPOTENCY_CACHE;
+# the default with CACHE_BACKEND=redis).
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "cache" if HOT_PATH_CACHE else "memory")
+IDEMPOTENCY_CACHE = os.getenv("IDEMPOTENCY_CACHE", "default")
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))  # How long a response is replayed
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))  # memory backend bound
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))  # Retry waiting on the original
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "120"))  # cache claim outlives a dead worker
+
+# Response compression (lims.compression): best of COMPRESSION_ENCODINGS the client
+# accepts; br needs `brotli`, zstd needs `zstandard` (skipped when not installed)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True") == "True"
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "br,zstd,gzip")  # Server preference order
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# On-demand profiling (lims.profiling): ADMIN requests with X-Profile: 1 (or ?_profile=1),
+# plus 1 in PROFILE_SAMPLE_EVERY requests (0: off), are sampled into PROFILE_DIR.
+# With PROFILING_ENABLED off the middleware is not installed at all.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False") == "True"
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))  # Stack sampling period
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # Oldest deleted first
+
+# Tenant scoping (lims.tenancy): users see the organizations they are members of; ADMIN sees all.
+# Callers without a token see no organization. True is a temporary switch for clients that
+# read the API anonymously (as before tenancy): they then see every organization.
+TENANT_ANONYMOUS_ACCESS = os.getenv("TENANT_ANONYMOUS_ACCESS", "False") == "True"
+
+# Frame archive (lims.frames): detection uploads are downscaled and stored once per
+# content hash by a background writer. FRAME_STORAGE: "filesystem" (FRAME_DIR) or
+# "memory" (object-store stand-in, one process). Zone.frame_retention_days overrides the default.
+FRAME_ARCHIVE_ENABLED = os.getenv("FRAME_ARCHIVE_ENABLED", "False") == "True"
+FRAME_STORAGE = os.getenv("FRAME_STORAGE", "filesystem")
+FRAME_DIR = os.getenv("FRAME_DIR", str(BASE_DIR / "frames"))
+FRAME_MAX_SIZE = int(os.getenv("FRAME_MAX_SIZE", "1280"))  # Longest side in pixels
+FRAME_JPEG_QUALITY = int(os.getenv("FRAME_JPEG_QUALITY", "70"))
+FRAME_RETENTION_DAYS = float(os.getenv("FRAME_RETENTION_DAYS", "7"))
+FRAME_ALERT_RETENTION_DAYS = float(os.getenv("FRAME_ALERT_RETENTION_DAYS", "90"))  # Frames behind an alert
+FRAME_QUEUE_SIZE = int(os.getenv("FRAME_QUEUE_SIZE", "256"))  # Full queue: the frame is dropped, not waited for
+FRAME_WRITE_BATCH = int(os.getenv("FRAME_WRITE_BATCH", "50"))  # Frame rows per upsert
+FRAME_PRUNE_BATCH = int(os.getenv("FRAME_PRUNE_BATCH", "1000"))
+
+# Zone geo queries (lims.geo): in-process grid index, rebuilt when zones change.
+# With CACHE_BACKEND=redis the version stamp is shared, so every worker sees changes at once;
+# otherwise other workers pick them up within GEO_INDEX_MAX_AGE_SECONDS.
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.05"))  # Index cell size (~5.5 km of latitude)
+GEO_VERSION_CACHE = os.getenv("GEO_VERSION_CACHE", "default" if HOT_PATH_CACHE else "local")
+GEO_INDEX_MAX_AGE_SECONDS = float(os.getenv("GEO_INDEX_MAX_AGE_SECONDS", "300"))
+GEO_DEFAULT_RESULTS = int(os.getenv("GEO_DEFAULT_RESULTS", "500"))  # bbox limit
+GEO_MAX_RESULTS = int(os.getenv("GEO_MAX_RESULTS", "5000"))
+
+# Bulk import/export (lims.bulk)
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))  # Rows per import transaction
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", "1000"))  # Row errors listed in an import report
+BULK_EXPORT_CHUNK_SIZE = int(os.getenv("BULK_EXPORT_CHUNK_SIZE", "2000"))  # Rows per server-side cursor fetch
+EXPORT_PARQUET_ROW_GROUP = int(os.getenv("EXPORT_PARQUET_ROW_GROUP", "50000"))  # Rows buffered per Parquet row group
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv("DEBUG") == "True"
 
@@ -77,6 +246,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Lock down all views by default
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'lims.renderers.ORJSONRenderer',  # orjson (stdlib fallback); records render time in /api/metrics/
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'lims.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -116,14 +294,54 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'lims.middleware.ProfilingMiddleware',  # Removes itself unless PROFILING_ENABLED
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'lims.middleware.MetricsMiddleware',
+    'lims.middleware.CompressionMiddleware',  # Inside metrics, so compression time counts as a stage
+    'lims.middleware.QueryBudgetMiddleware',
+    'lims.middleware.ReplicaRoutingMiddleware',
 ]
 
+# Per-stage latency histograms served at /api/metrics/ (Prometheus text format)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+
+# Max queries per request, by URL name (an int, or a dict per HTTP method;
+# unlisted methods such as cascading DELETEs are not checked). Budgets include
+# one query for the JWT user lookup. Over budget logs a warning in production;
+# set QUERY_BUDGET_RAISE=True (CI) to turn it into an exception that fails the test.
+QUERY_BUDGETS = {
+    'organization-list-create': 4,  # orgs + prefetch zones + prefetch cameras
+    'organization-detail': {'GET': 4, 'PUT': 5},
+    'zone-list-create': 4,          # zones JOIN org + prefetch cameras (+ org lookup, membership check on POST)
+    'zone-detail': {'GET': 3, 'PUT': 9},  # moving a zone re-tags its cameras, alerts and carbon logs
+    'camera-list-create': {'GET': 4, 'POST': 5},  # cameras JOIN zone JOIN org (+ zone lookup, membership check)
+    'camera-detail': {'GET': 2, 'PUT': 7},
+    'camera-heartbeat': 3,          # membership check (+ camera lookup, first ping per process only)
+    'alert-list-create': {'GET': 2, 'POST': 4},  # POST: camera lookup + membership check + insert
+    'alert-detail': {'GET': 2, 'PUT': 3},
+    'frame-detail': 2,              # frame by pk; the image comes from the frame store
+    'notification-list-create': {'GET': 5, 'POST': 4},  # memberships + page + read cursor + unread count
+    'points-leaderboard': 3,        # cached board + co-members on it (+ a LIMIT query when it is rebuilt)
+    'notification-read': 5,         # newest id + cursor UPDATE (first time: INSERT + re-read)
+    'notification-detail': {'GET': 3, 'DELETE': 3},  # user + notification (+ memberships for an org: audience)
+    'sensor-detect': 7,             # zone with camera + membership + occupancy insert + carbon log + open-alert check + insert
+    'get-carbon-stats': 3,          # recent logs JOIN zone + aggregate
+    'occupancy-history': 3,         # one indexed range scan on rollups (+ zone check for members)
+    'organization-live': 2,         # org by pk; counts come from the live store
+    'zone-live': 2,
+    'zones-bbox': 3,                # the index answers (+ memberships); +1 to rebuild it after a zone change
+    'zones-nearest': 3,
+}
+QUERY_BUDGET_RAISE = os.getenv("QUERY_BUDGET_RAISE", "False") == "True"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Adds X-DB-Queries / X-DB-Time-Ms response headers (used by bench_endpoints)
+QUERY_COUNT_HEADERS = DEBUG or os.getenv("QUERY_COUNT_HEADERS") == "True"
+
 ROOT_URLCONF = 'kazlat.urls'
 
 TEMPLATES = [
@@ -168,7 +386,7 @@ if os.getenv('USE_CLOUD_SQL') == 'True':
             'PASSWORD': get_env('DB_PASSWORD'),
             'HOST': get_env('DB_HOST'),  # Use /cloudsql/CONNECTION_NAME for Cloud Run
             'PORT': os.getenv('DB_PORT', '5432'),
-            'CONN_MAX_AGE': 60,  # Persistent connections for 60 seconds
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),  # Persistent connections (seconds)
             'CONN_HEALTH_CHECKS': True,  # Check connection health
             'OPTIONS': {
                 'connect_timeout': 10,
@@ -176,16 +394,69 @@ if os.getenv('USE_CLOUD_SQL') == 'True':
             },
         }
     }
+
+    # Native psycopg 3 pool (Django 5.1+): one shared pool per process instead of
+    # one persistent connection per thread. Size it so that
+    # instances x DB_POOL_MAX_SIZE stays below Cloud SQL max_connections.
+    if os.getenv('DB_POOL', 'False') == 'True':
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # Pooling replaces persistent connections
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '8')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # Max wait for a free connection
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        }
 else:
-    # Local SQLite for development
+    # Local SQLite for development (and single-node edge deployments):
+    # WAL lets readers run alongside the writer, NORMAL sync is safe under WAL,
+    # IMMEDIATE transactions + busy timeout wait for the lock instead of failing.
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+            'OPTIONS': {
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '5')),  # Seconds
+                'transaction_mode': 'IMMEDIATE',
+            },
         }
     }
 
 
+# Read replicas: PostgreSQL hosts in DB_REPLICA_HOSTS, or SQLite files in
+# SQLITE_REPLICA_PATHS (local stand-in; migrate them with --database replica_N).
+# Only GETs to REPLICA_READ_ENDPOINTS read from them (see lims.routers).
+_replica_key, _replica_values = (
+    ('HOST', os.getenv('DB_REPLICA_HOSTS', '')) if os.getenv('USE_CLOUD_SQL') == 'True'
+    else ('NAME', os.getenv('SQLITE_REPLICA_PATHS', ''))
+)
+for _i, _value in enumerate(v.strip() for v in _replica_values.split(',') if v.strip()):
+    DATABASES[f'replica_{_i}'] = dict(
+        DATABASES['default'],
+        OPTIONS=dict(DATABASES['default']['OPTIONS']),
+        TEST={'MIRROR': 'default'},
+        **{_replica_key: _value if _replica_key == 'HOST' else BASE_DIR / _value},
+    )
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['lims.routers.ReplicaRouter']
+REPLICA_READ_ENDPOINTS = [
+    'organization-list-create',
+    'zone-list-create',
+    'camera-list-create',
+    'alert-list-create',
+    'notification-list-create',
+    'get-carbon-stats',
+    'occupancy-history',
+]
+REPLICA_PIN_COOKIE = 'db_pin'
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))  # Read-your-writes window after a write
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', '30'))  # How long a failed replica is skipped
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -27,6 +27,9 @@ from lims.views import user_views
 from lims.views import alert_views
 from lims.views import  notification_views
 from lims.views import sensor_views
+from lims.views import occupancy_views
+from lims.views import bulk_views
+from lims.views import geo_views
 
 urlpatterns = [
     # ... your existing job/client urls ...
@@ -38,26 +41,40 @@ urlpatterns = [
 
     # User Profile
     path('auth/me/', user_views.current_user, name='current_user'),
+    path('points/leaderboard/', user_views.points_leaderboard, name='points-leaderboard'),
     # Organization URLs
     path('organizations/', views.organization_list_create, name='organization-list-create'),
     path('organizations/<int:pk>/', views.organization_detail, name='organization-detail'),
+    path('organizations/<int:pk>/live/', occupancy_views.organization_live, name='organization-live'),
+    path('organizations/<int:pk>/members/', views.organization_members, name='organization-members'),
+    path('organizations/<int:pk>/members/<int:user_id>/', views.organization_member_delete,
+         name='organization-member-delete'),
 
     # Zone URLs
     path('zones/', views.zone_list_create, name='zone-list-create'),
+    path('zones/bbox/', geo_views.zones_in_bbox, name='zones-bbox'),
+    path('zones/nearest/', geo_views.zones_nearest, name='zones-nearest'),
     path('zones/<int:pk>/', views.zone_detail, name='zone-detail'),
+    path('zones/<int:pk>/live/', occupancy_views.zone_live, name='zone-live'),
 
     # Camera URLs
     path('cameras/', views.camera_list_create, name='camera-list-create'),
     path('cameras/<int:pk>/', views.camera_detail, name='camera-detail'),
+    path('cameras/<int:pk>/heartbeat/', views.camera_heartbeat, name='camera-heartbeat'),
 
     path('alerts/', alert_views.alert_list_create, name='alert-list-create'),
     path('alerts/<int:pk>/', alert_views.alert_detail, name='alert-detail'),
+    path('frames/<str:frame_id>/', alert_views.frame_detail, name='frame-detail'),
 
     path('notifications/', notification_views.notification_list_create, name='notification-list-create'),
+    path('notifications/read/', notification_views.notification_mark_read, name='notification-read'),
 
     # Get one (GET) or Delete (DELETE)
     path('notifications/<int:pk>/', notification_views.notification_detail, name='notification-detail'),
 
     path('sensor/detect/', sensor_views.sensor_detect, name='sensor-detect'),
     path('carbon/stats/', sensor_views.get_carbon_stats, name='get-carbon-stats'),
+    path('bulk/import/', bulk_views.bulk_import, name='bulk-import'),
+    path('bulk/export/', bulk_views.bulk_export, name='bulk-export'),
+    path('occupancy/history/', occupancy_views.occupancy_history, name='occupancy-history'),
 ]
\ No newline at end of file
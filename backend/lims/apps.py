@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class LimsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lims'
+
+    def ready(self):
+        # Connection accounting for /api/metrics/
+        from . import db  # noqa: F401
+
+        # Stale the zone geo index on any zone change (also cascaded deletes)
+        from django.db.models.signals import post_delete, post_save
+        from .geo import zones_changed
+        from .models import Zone
+        post_save.connect(zones_changed, sender=Zone, dispatch_uid='geo-zone-saved')
+        post_delete.connect(zones_changed, sender=Zone, dispatch_uid='geo-zone-deleted')
+
+        # Deleted or moved cameras stop answering heartbeats under their old organization
+        from .heartbeat import camera_changed
+        from .models import Camera
+        post_save.connect(camera_changed, sender=Camera, dispatch_uid='heartbeat-camera-saved')
+        post_delete.connect(camera_changed, sender=Camera, dispatch_uid='heartbeat-camera-deleted')
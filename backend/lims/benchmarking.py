@@ -0,0 +1,183 @@
+"""
+Shared pieces of the benchmark commands (seed_benchdata, bench_endpoints,
+bench_server): local stand-ins for the crowd service and Gemini, the seeded
+sample a load run needs, and latency statistics.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeService:
+    """
+    Threaded HTTP server that answers every POST after `latency` seconds
+    (+/- `jitter`). Subclasses build the JSON body.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                service.calls += 1
+
+                delay = service.latency + random.uniform(-service.jitter, service.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+
+                body = json.dumps(service.payload(self.path)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def payload(self, path):
+        raise NotImplementedError
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeCrowdService(FakeService):
+    """ Stands in for the SAHI crowd service (`/predict`) """
+
+    def __init__(self, max_count=40, **kwargs):
+        super().__init__(**kwargs)
+        self.max_count = max_count
+
+    @property
+    def url(self):
+        return f"{self.base_url}/predict"
+
+    def payload(self, path):
+        return {"sahi_count": random.randint(0, self.max_count)}
+
+
+class FakeGeminiService(FakeService):
+    """ Stands in for the Gemini REST API (`models/*:generateContent`) """
+
+    def __init__(self, max_count=40, **kwargs):
+        super().__init__(**kwargs)
+        self.max_count = max_count
+
+    def payload(self, path):
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": str(random.randint(1, self.max_count))}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }]
+        }
+
+
+def bench_context(base_url):
+    """
+    Sample ids from one organization of the seeded database, a token pair for
+    the bench user (a member of it) and a 1280x720 JPEG frame
+    """
+    import io
+
+    import PIL.Image
+    import requests
+    from django.core.management.base import CommandError
+    from django.urls import reverse
+
+    from .management.commands.seed_benchdata import BENCH_EMAIL, BENCH_PASSWORD
+    from .models import Alert, Camera, Membership, Notification, Zone
+
+    membership = Membership.objects.filter(user__email=BENCH_EMAIL).select_related('organization').first()
+    org = membership.organization if membership else None
+    zone = Zone.objects.filter(organization=org).order_by('id').first()
+    camera = Camera.objects.filter(zone=zone).order_by('id').first()
+    alert = Alert.objects.filter(organization_id=getattr(org, 'id', None)).order_by('id').first()
+    notification = Notification.objects.order_by('id').first()
+    if not all([org, zone, camera, alert, notification]):
+        raise CommandError("No benchmark data; run `manage.py seed_benchdata` first.")
+
+    resp = requests.post(f"{base_url}{reverse('login')}", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    if resp.status_code != 200:
+        raise CommandError(f"Cannot log in as {BENCH_EMAIL}: {resp.status_code} {resp.text[:200]}")
+    tokens = resp.json()
+
+    buf = io.BytesIO()
+    PIL.Image.new('RGB', (1280, 720), (90, 110, 130)).save(buf, format='JPEG', quality=85)
+
+    return {
+        "org": org.id, "zone": zone.id, "camera": camera.id,
+        "alert": alert.id, "notification": notification.id,
+        "access": tokens['access'], "refresh": tokens['refresh'],
+        "image": buf.getvalue(),
+    }
+
+
+def percentile(sorted_values, q):
+    """ Nearest-rank percentile of an already sorted list (q in 0..100) """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, wall_seconds, query_counts, errors):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_mean": round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+    }
+
+
+def find_regressions(baseline, current, threshold):
+    """
+    Compares two `results` dicts. Latency and throughput may drift by
+    `threshold` (a fraction). Query counts barely move between runs (cached
+    endpoints aside), so more than half a query per request is a regression.
+    Returns human-readable descriptions.
+    """
+    regressions = []
+    for key, base in baseline.items():
+        now = current.get(key)
+        if now is None:
+            continue
+        if now["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {base['p95_ms']} -> {now['p95_ms']} ms")
+        if now["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{key}: throughput {base['rps']} -> {now['rps']} req/s")
+        if base.get("queries_mean") is not None and now.get("queries_mean") is not None \
+                and now["queries_mean"] > base["queries_mean"] + 0.5:
+            regressions.append(f"{key}: queries {base['queries_mean']} -> {now['queries_mean']}")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{key}: errors {base['errors']} -> {now['errors']}")
+    return regressions
@@ -0,0 +1,285 @@
+"""
+Bulk import/export of the organization -> zone -> camera hierarchy.
+
+Import reads CSV or NDJSON row by row (never the whole file), one row per
+object with a `type` column (organization, zone or camera). Rows are handled
+in batches of BULK_BATCH_SIZE:
+
+- field validation is per row and in memory (Model.full_clean without the
+  unique/constraint checks that would query);
+- parent ids are checked with one `id__in` query per model per batch;
+- valid rows are inserted with bulk_create inside one transaction per batch.
+
+Parents created by the same import are referenced by `ref`: give an
+organization `ref=acme`, then its zones `organization_ref=acme`. Refs stay
+valid across batches. Bad rows are reported with their line number and
+skipped; the rest of the batch is still inserted.
+
+The hierarchy export streams rows from server-side cursors (QuerySet.iterator)
+in the import format, so an export can be re-imported into another
+deployment. History exports (carbon logs, alerts) live in lims.exports.
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .geo import zones_changed
+from .models import Camera, Organization, Zone
+from .tenancy import sync_organization
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+ORGANIZATION, ZONE, CAMERA = 'organization', 'zone', 'camera'
+# Parents before children, so a batch can reference rows created earlier in it
+KINDS = (ORGANIZATION, ZONE, CAMERA)
+
+FIELDS = {
+    ORGANIZATION: ['name', 'org_type', 'total_capacity', 'latitude', 'longitude'],
+    ZONE: ['name', 'zone_type', 'capacity', 'latitude', 'longitude', 'counter_backend'],
+    CAMERA: ['name', 'is_active'],
+}
+MODELS = {ORGANIZATION: Organization, ZONE: Zone, CAMERA: Camera}
+# kind -> (FK attribute, parent kind)
+PARENTS = {ZONE: ('organization_id', ORGANIZATION), CAMERA: ('zone_id', ZONE)}
+
+HIERARCHY_COLUMNS = ['type', 'ref', 'organization_ref', 'zone_ref', 'organization_id', 'zone_id',
+                     'name', 'org_type', 'zone_type', 'total_capacity', 'capacity',
+                     'latitude', 'longitude', 'counter_backend', 'is_active']
+
+
+# ==========================================
+# PARSING
+# ==========================================
+
+def guess_format(name='', content_type=''):
+    if content_type.startswith(('application/x-ndjson', 'application/jsonl', 'application/json')) \
+            or name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_rows(lines, fmt):
+    """
+    Yields (line_number, dict) from an iterable of byte or str lines.
+    Undecodable NDJSON lines yield (line_number, ValueError).
+    """
+    lines = _decoded(lines)
+
+    if fmt == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                yield number, ValueError(f"invalid JSON: {e}")
+                continue
+            yield number, row
+    else:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Header is line 1; line_num points at the last physical line of the record
+            yield reader.line_num, {k: v for k, v in row.items() if k is not None}
+
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
+
+
+def _decoded(lines):
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    if isinstance(first, bytes):
+        # Incremental decoder: a BOM is stripped once and multi-byte characters may span chunks
+        yield from codecs.iterdecode(_chain_first(first, lines), 'utf-8-sig')
+    else:
+        yield first.lstrip('\ufeff')
+        yield from lines
+
+
+# ==========================================
+# IMPORT
+# ==========================================
+
+def _clean_value(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return None if value == '' else value
+    return value
+
+
+def _int_or_none(value):
+    value = _clean_value(value)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"'{value}' is not an integer id")
+
+
+def _build(kind, row):
+    """ Unsaved model instance from a row, validated without touching the database """
+    model = MODELS[kind]
+    values = {}
+    for field in FIELDS[kind]:
+        value = _clean_value(row.get(field))
+        if value is None:
+            continue
+        if field == 'is_active' and isinstance(value, str):
+            value = value.lower() in ('1', 'true', 'yes', 'y')
+        values[field] = value
+    obj = model(**values)
+    # Also converts CSV strings ("12", "3.5") to field types
+    obj.full_clean(exclude=['organization', 'zone'], validate_unique=False, validate_constraints=False)
+    return obj
+
+
+class ImportReport:
+    def __init__(self, max_errors=None):
+        self.created = {kind: 0 for kind in KINDS}
+        self.refs = {kind: {} for kind in KINDS}  # ref -> id of rows created by this import
+        self.errors = []
+        self.error_count = 0
+        self.rows = 0
+        self.max_errors = settings.BULK_MAX_ERRORS if max_errors is None else max_errors
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": message})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+            "errors_truncated": self.error_count > len(self.errors),
+        }
+
+
+def _import_batch(batch, report, dry_run):
+    by_kind = {kind: [] for kind in KINDS}
+    for line, row in batch:
+        if isinstance(row, Exception):
+            report.error(line, str(row))
+            continue
+        kind = (_clean_value(row.get('type')) or '').lower()
+        if kind not in KINDS:
+            report.error(line, {"type": f"must be one of: {', '.join(KINDS)}"})
+            continue
+        by_kind[kind].append((line, row))
+
+    with transaction.atomic():
+        for kind in KINDS:
+            _import_kind(kind, by_kind[kind], report)
+        if dry_run:
+            transaction.set_rollback(True)
+
+
+def _import_kind(kind, rows, report):
+    if not rows:
+        return
+    model = MODELS[kind]
+    parent = PARENTS.get(kind)
+
+    built = []  # (line, ref, obj, parent_id, parent_ref)
+    for line, row in rows:
+        try:
+            obj = _build(kind, row)
+            parent_id = _int_or_none(row.get(parent[0])) if parent else None
+        except ValidationError as e:
+            report.error(line, getattr(e, 'message_dict', None) or {"__all__": e.messages})
+            continue
+        parent_ref = _clean_value(row.get(f"{parent[1]}_ref")) if parent else None
+        if parent and parent_id is None and parent_ref is None:
+            report.error(line, {parent[0]: f"{parent[0]} or {parent[1]}_ref is required"})
+            continue
+        built.append((line, _clean_value(row.get('ref')), obj, parent_id, parent_ref))
+
+    if parent:
+        attname, parent_kind = parent
+        # One set-based lookup for every existing parent referenced by this batch
+        wanted = {parent_id for _, _, _, parent_id, _ in built if parent_id is not None}
+        existing = set(MODELS[parent_kind].objects.filter(id__in=wanted).values_list('id', flat=True)) if wanted else set()
+        refs = report.refs[parent_kind]
+
+        valid = []
+        for line, ref, obj, parent_id, parent_ref in built:
+            if parent_id is not None:
+                if parent_id not in existing:
+                    report.error(line, {attname: f"{parent_kind} {parent_id} does not exist"})
+                    continue
+            else:
+                parent_id = refs.get(parent_ref)
+                if parent_id is None:
+                    report.error(line, {f"{parent_kind}_ref": f"unknown {parent_kind} ref '{parent_ref}'"})
+                    continue
+            setattr(obj, attname, parent_id)
+            valid.append((line, ref, obj))
+    else:
+        valid = [(line, ref, obj) for line, ref, obj, _, _ in built]
+
+    created = model.objects.bulk_create([obj for _, _, obj in valid])
+    report.created[kind] += len(created)
+    if kind == CAMERA and created:
+        # Denormalized tenant column (lims.tenancy), one UPDATE for the batch
+        sync_organization(Camera.objects.filter(pk__in=[obj.pk for obj in created]), 'zone')
+    for (_, ref, _), obj in zip(valid, created):
+        if ref is not None:
+            report.refs[kind][ref] = obj.pk
+
+
+def import_hierarchy(lines, fmt='csv', batch_size=None, dry_run=False, report=None):
+    """
+    Imports organizations/zones/cameras from an iterable of lines.
+    Returns an ImportReport; each batch is committed on its own.
+    """
+    batch_size = batch_size or settings.BULK_BATCH_SIZE
+    report = report or ImportReport()
+    rows = iter_rows(lines, fmt)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        report.rows += len(batch)
+        _import_batch(batch, report, dry_run)
+    if report.created[ZONE] and not dry_run:
+        # bulk_create sends no post_save
+        zones_changed()
+    return report
+
+
+# ==========================================
+# EXPORT
+# ==========================================
+
+def hierarchy_rows(organization_id=None):
+    """ Import-format dicts: organizations, then zones, then cameras (of one organization id or a list) """
+    orgs = Organization.objects.order_by('id')
+    zones = Zone.objects.order_by('id')
+    cameras = Camera.objects.order_by('id')
+    if organization_id is not None:
+        orgs = orgs.for_organization(organization_id)
+        zones = zones.for_organization(organization_id)
+        cameras = cameras.for_organization(organization_id)
+
+    chunk = settings.BULK_EXPORT_CHUNK_SIZE
+    for org in orgs.values('id', *FIELDS[ORGANIZATION]).iterator(chunk_size=chunk):
+        yield dict(org, type=ORGANIZATION, ref=f"org-{org.pop('id')}")
+    for zone in zones.values('id', 'organization_id', *FIELDS[ZONE]).iterator(chunk_size=chunk):
+        yield dict(zone, type=ZONE, ref=f"zone-{zone.pop('id')}", organization_ref=f"org-{zone.pop('organization_id')}")
+    for camera in cameras.values('id', 'zone_id', *FIELDS[CAMERA]).iterator(chunk_size=chunk):
+        yield dict(camera, type=CAMERA, ref=f"camera-{camera.pop('id')}", zone_ref=f"zone-{camera.pop('zone_id')}")
@@ -0,0 +1,236 @@
+"""
+Carbon formula registry and history re-computation.
+
+A CarbonLog keeps its inputs (sahi_count, gemini_count) and the version of
+the formula that turned them into saved_amount. Formulas are registered
+here by version number and written as NumPy functions over whole columns.
+`sensor_detect` runs the same function on a single row, so a log computed
+live and one re-derived later agree to the last bit.
+CARBON_FORMULA_VERSION picks the version for new logs.
+
+To change the formula, register a new version and point
+CARBON_FORMULA_VERSION at it. Then re-derive the history with
+`python manage.py recompute_carbon` (`backfill()` below):
+
+- The table is cut into primary-key ranges of CARBON_BACKFILL_CHUNK ids. A
+  range is one indexed scan, and ranges never overlap, so workers never
+  touch the same row.
+- Each range is read as columns and computed in one vectorized call. Only
+  the rows whose value or version changed are written, in one transaction
+  per range. The write is a parameterized primary-key UPDATE sent with
+  executemany, not bulk_update: bulk_update's CASE statement took 11 s per
+  20k rows on SQLite, executemany 0.06 s.
+- Ranges run across a pool of CARBON_BACKFILL_WORKERS processes. SQLite
+  has a single writer, so it always runs on one. The finished ranges are
+  recorded in a JSON checkpoint, so an interrupted run resumes where it
+  stopped.
+
+Rows logged before the inputs were stored have no counts and can't be
+re-derived. They keep their saved_amount and version and are reported as
+skipped.
+
+Model imports stay inside functions: pool workers import this module before
+Django is set up.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+class Formula:
+    """ A registered saved_amount formula: `compute` takes and returns NumPy columns """
+
+    def __init__(self, version, description, expression, fn):
+        self.version = version
+        self.description = description
+        self.expression = expression  # Shown in the detection response, e.g. "20 / 25 rounded"
+        self.fn = fn
+
+    def compute(self, sahi, gemini):
+        return self.fn(np.asarray(sahi, dtype=np.float64), np.asarray(gemini, dtype=np.float64))
+
+    def one(self, sahi, gemini):
+        return float(self.compute([sahi], [gemini])[0])
+
+    def describe(self, sahi, gemini):
+        return self.expression.format(sahi=sahi, gemini=gemini)
+
+
+FORMULAS = {}
+
+
+def register(version, description, expression):
+    def decorator(fn):
+        if version in FORMULAS:
+            raise ValueError(f"Carbon formula version {version} is already registered")
+        FORMULAS[version] = Formula(version, description, expression, fn)
+        return fn
+    return decorator
+
+
+def get_formula(version=None):
+    version = version or settings.CARBON_FORMULA_VERSION
+    if version not in FORMULAS:
+        raise ImproperlyConfigured(f"Unknown carbon formula version: {version!r}")
+    return FORMULAS[version]
+
+
+@register(1, "SAHI count over the reference counter's count, 4 decimals (0 without a reference count)",
+          "{sahi} / {gemini} rounded")
+def ratio(sahi, gemini):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(gemini == 0, 0.0, np.round(sahi / gemini, 4))
+
+
+# ==========================================
+# BACKFILL
+# ==========================================
+
+def _scoped(logs, zone_id=None, org_id=None):
+    if zone_id:
+        logs = logs.filter(zone_id=zone_id)
+    if org_id:
+        logs = logs.for_organization(org_id)
+    return logs
+
+
+def _update_sql():
+    from django.db import connection
+
+    from .models import CarbonLog
+
+    quote = connection.ops.quote_name
+    return (f"UPDATE {quote(CarbonLog._meta.db_table)} SET {quote('saved_amount')} = %s, "
+            f"{quote('formula_version')} = %s WHERE {quote('id')} = %s")
+
+
+def recompute_chunk(lo, hi, version, zone_id=None, org_id=None, only_stale=False, dry_run=False):
+    """
+    Re-derives saved_amount for ids in [lo, hi). Returns
+    {"rows", "updated", "skipped", "seconds"}; runs in a pool worker.
+    """
+    from django.db import connection, transaction
+
+    from .models import CarbonLog
+
+    started = time.perf_counter()
+    logs = _scoped(CarbonLog.objects.filter(id__gte=lo, id__lt=hi), zone_id, org_id)
+    if only_stale:
+        logs = logs.exclude(formula_version=version)
+    rows = list(logs.order_by().values_list('id', 'sahi_count', 'gemini_count', 'saved_amount', 'formula_version'))
+    result = {"rows": len(rows), "updated": 0, "skipped": 0, "seconds": 0.0}
+    if rows:
+        ids, sahi, gemini, saved, versions = (np.array(column, dtype=np.float64) for column in zip(*rows))
+        has_inputs = ~np.isnan(sahi) & ~np.isnan(gemini)
+        result["skipped"] = int((~has_inputs & (versions != version)).sum())
+
+        amounts = get_formula(version).compute(sahi[has_inputs], gemini[has_inputs])
+        changed = (amounts != saved[has_inputs]) | (versions[has_inputs] != version)
+        updates = [(float(amount), version, int(log_id))
+                   for log_id, amount in zip(ids[has_inputs][changed], amounts[changed])]
+        result["updated"] = len(updates)
+        if updates and not dry_run:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(_update_sql(), updates)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def _init_backfill_worker():
+    # Spawned workers (macOS, Windows) start without Django; forked ones already have it
+    import django
+
+    django.setup()
+
+
+class Checkpoint:
+    """ The finished ranges of one backfill, kept in a JSON file next to its parameters """
+
+    def __init__(self, path, params):
+        self.path = Path(path)
+        self.params = params
+        self.done = set()
+        if self.path.exists():
+            saved = json.loads(self.path.read_text())
+            if saved["params"] != params:
+                raise ValueError(f"{self.path} belongs to a backfill with other parameters: {saved['params']}")
+            self.done = set(saved["done"])
+
+    def mark(self, lo):
+        self.done.add(lo)
+        # Write then rename, so an interrupted write never loses the checkpoint
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"params": self.params, "done": sorted(self.done)}))
+        tmp.replace(self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+def plan_chunks(chunk_size, zone_id=None, org_id=None):
+    """ [lo, hi) id ranges covering the table (or the rows of one zone / organization) """
+    from django.db.models import Max, Min
+
+    from .models import CarbonLog
+
+    bounds = _scoped(CarbonLog.objects.all(), zone_id, org_id).aggregate(lo=Min('id'), hi=Max('id'))
+    if bounds['lo'] is None:
+        return []
+    return [(lo, min(lo + chunk_size, bounds['hi'] + 1)) for lo in range(bounds['lo'], bounds['hi'] + 1, chunk_size)]
+
+
+def backfill(version, chunk_size=None, workers=None, checkpoint=None, zone_id=None, org_id=None,
+             only_stale=False, dry_run=False, progress=None):
+    """
+    Re-derives saved_amount over the whole table with formula `version`.
+    `checkpoint` (a Checkpoint) skips the ranges an earlier run finished.
+    `progress(result, totals)` is called as each range completes. Returns the totals
+    (including the worker count actually used).
+    """
+    from django.db import connections
+
+    get_formula(version)  # Fails before any work on an unknown version
+    chunk_size = chunk_size or settings.CARBON_BACKFILL_CHUNK
+    workers = workers or settings.CARBON_BACKFILL_WORKERS
+    if connections['default'].vendor == 'sqlite':
+        # One writer at a time: parallel ranges would fail on the database lock
+        workers = 1
+    chunks = plan_chunks(chunk_size, zone_id, org_id)
+    todo = [(lo, hi) for lo, hi in chunks if checkpoint is None or lo not in checkpoint.done]
+    totals = {"workers": workers, "chunks": len(chunks), "resumed": len(chunks) - len(todo), "completed": 0,
+              "rows": 0, "updated": 0, "skipped": 0, "seconds": 0.0}
+    options = dict(version=version, zone_id=zone_id, org_id=org_id, only_stale=only_stale, dry_run=dry_run)
+    started = time.perf_counter()
+
+    def finished(lo, result):
+        if checkpoint is not None and not dry_run:
+            checkpoint.mark(lo)
+        totals["completed"] += 1
+        for key in ("rows", "updated", "skipped"):
+            totals[key] += result[key]
+        totals["seconds"] = time.perf_counter() - started
+        if progress:
+            progress(result, totals)
+
+    if workers == 1 or len(todo) <= 1:
+        for lo, hi in todo:
+            finished(lo, recompute_chunk(lo, hi, **options))
+        return totals
+
+    # Forked workers must not share the parent's database sockets
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker) as pool:
+        futures = {pool.submit(recompute_chunk, lo, hi, **options): lo for lo, hi in todo}
+        for future in as_completed(futures):
+            finished(futures[future], future.result())
+    return totals
+
+
+def default_checkpoint_path(version):
+    return Path(os.getcwd()) / f"recompute_carbon_v{version}.checkpoint.json"
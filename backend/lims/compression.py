@@ -0,0 +1,117 @@
+"""
+Content-negotiated response compression: brotli, zstd or gzip.
+
+CompressionMiddleware (lims.middleware) picks the client's best
+Accept-Encoding among COMPRESSION_ENCODINGS. It compresses JSON and text
+bodies of at least COMPRESSION_MIN_BYTES; smaller bodies aren't worth the
+CPU. gzip is always available. brotli ("br", `pip install brotli`) and zstd
+(`pip install zstandard`) are used when installed and skipped otherwise.
+The levels are tuned for dynamic responses: fast, at most a few percent
+larger than the maximum setting.
+
+Streaming responses (bulk exports) are left alone; they have ?compress=gzip.
+"""
+import importlib.util
+import threading
+import zlib
+
+from django.conf import settings
+
+from .metrics import register_collector
+
+# Encoding -> module it needs (None: stdlib)
+REQUIRES = {"br": "brotli", "zstd": "zstandard", "gzip": None}
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def _gzip(data):
+    return zlib.compress(data, settings.COMPRESSION_GZIP_LEVEL, wbits=31)  # wbits=31: gzip container
+
+
+def _brotli(data):
+    import brotli
+
+    return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def _zstd(data):
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(data)
+
+
+CODECS = {"br": _brotli, "zstd": _zstd, "gzip": _gzip}
+
+
+_available = None
+
+
+def available_encodings():
+    """ COMPRESSION_ENCODINGS that can run here, in server preference order """
+    global _available
+    if _available is None:
+        _available = [
+            name for name in (e.strip() for e in settings.COMPRESSION_ENCODINGS.split(','))
+            if name in CODECS and (REQUIRES[name] is None or importlib.util.find_spec(REQUIRES[name]))
+        ]
+    return _available
+
+
+def negotiate(accept_encoding, encodings=None):
+    """ Best encoding for an Accept-Encoding header, or None (identity) """
+    encodings = available_encodings() if encodings is None else encodings
+    weights = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    # Strictly greater: on equal weights the server's preference order wins
+    for name in encodings:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+_bytes_lock = threading.Lock()
+_bytes = {}  # encoding -> [bytes in, bytes out, responses]
+
+
+def compress(encoding, data):
+    body = CODECS[encoding](data)
+    with _bytes_lock:
+        totals = _bytes.setdefault(encoding, [0, 0, 0])
+        totals[0] += len(data)
+        totals[1] += len(body)
+        totals[2] += 1
+    return body
+
+
+@register_collector
+def collect():
+    with _bytes_lock:
+        totals = dict(_bytes)
+    if not totals:
+        return []
+    lines = ["# TYPE ecoflow_compression_bytes_in_total counter"]
+    lines += [f'ecoflow_compression_bytes_in_total{{encoding="{e}"}} {t[0]}' for e, t in totals.items()]
+    lines.append("# TYPE ecoflow_compression_bytes_out_total counter")
+    lines += [f'ecoflow_compression_bytes_out_total{{encoding="{e}"}} {t[1]}' for e, t in totals.items()]
+    lines.append("# TYPE ecoflow_compression_responses_total counter")
+    lines += [f'ecoflow_compression_responses_total{{encoding="{e}"}} {t[2]}' for e, t in totals.items()]
+    return lines
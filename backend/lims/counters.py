@@ -0,0 +1,366 @@
+"""
+Counter backends for the carbon ratio.
+
+The carbon formula is `sahi_count / reference_count`. The reference count used
+to always come from Gemini; it now comes from a pluggable backend so a zone (or
+the whole deployment) can swap the remote call for a local model.
+
+Backends:
+- "gemini": Google Gemini vision model (remote, default)
+- "sahi":   the remote SAHI crowd service
+- "local":  lightweight person detector run with ONNX Runtime in a process pool.
+            onnxruntime is optional (not in requirements.txt); without it the
+            backend raises CounterUnavailable and zones can't select it.
+"""
+import importlib.util
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .metrics import span
+
+# google.generativeai (~1s), PIL and requests are imported on first use, not at
+# module load: processes that only serve CRUD/auth traffic never pay for them.
+
+# One instance per backend per process (keeps model/pool warm)
+_counters = {}
+_counters_lock = threading.Lock()
+
+_genai = None
+_genai_options = {}
+_genai_lock = threading.Lock()
+
+
+def configure_gemini(api_key=None, api_endpoint=None):
+    """
+    Points the Gemini SDK at its API. A custom endpoint (GEMINI_API_ENDPOINT,
+    e.g. a local stub) switches to the REST transport. Applied on the next
+    get_genai() call, so calling this does not import the SDK.
+    """
+    global _genai
+    with _genai_lock:
+        _genai_options.update(api_key=api_key, api_endpoint=api_endpoint)
+        _genai = None
+
+    # Models bind to the client that was active when they were built
+    gemini = _counters.get('gemini')
+    if gemini is not None:
+        gemini._model = None
+
+
+def get_genai():
+    """ Imports and configures the Gemini SDK once per process """
+    global _genai
+    if _genai is not None:
+        return _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+
+            api_key = _genai_options.get('api_key') or settings.GEMINI_API_KEY
+            api_endpoint = _genai_options.get('api_endpoint') or settings.GEMINI_API_ENDPOINT
+            if api_endpoint:
+                genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': api_endpoint})
+            else:
+                genai.configure(api_key=api_key)
+            _genai = genai
+    return _genai
+
+
+class CounterServiceError(Exception):
+    """ Raised when a remote counting service answers with a non-200 status """
+    def __init__(self, message, details=""):
+        super().__init__(message)
+        self.details = details
+
+
+class CounterTimeout(Exception):
+    """ The counting service did not answer in time """
+
+
+class CounterUnavailable(Exception):
+    """ The counting service could not be reached """
+
+
+class BaseCounter:
+    """ Counts the people in a single frame """
+    name = None
+    requires = ()  # Optional packages the backend needs, with their pip names
+
+    @classmethod
+    def missing_requirement(cls):
+        """ Why the backend can't run in this environment, or None """
+        for module in cls.requires:
+            if importlib.util.find_spec(module) is None:
+                return f"The {cls.name} counter backend needs {module} (pip install {module})"
+        return None
+
+    def warm_up(self):
+        """ Loads whatever the first count() would otherwise load """
+
+    def count(self, image_data, filename="frame.jpg", content_type="image/jpeg", capacity=0):
+        raise NotImplementedError
+
+
+# ==========================================
+# REMOTE BACKENDS
+# ==========================================
+
+class SahiCounter(BaseCounter):
+    """ Uploads the frame to the SAHI crowd service """
+    name = "sahi"
+
+    def __init__(self, url=None, timeout=20):
+        self.url = url or settings.CROWD_PREDICT_URL
+        self.timeout = timeout
+        self._session = None
+
+    def get_session(self):
+        # Pooled keep-alive connections instead of a new TLS handshake per frame
+        if self._session is None:
+            import requests
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def warm_up(self):
+        """ Opens a pooled connection ahead of the first frame """
+        try:
+            self.get_session().head(self.url, timeout=self.timeout)
+        except Exception:
+            pass
+
+    def count(self, image_data, filename="frame.jpg", content_type="image/jpeg", capacity=0):
+        import requests
+
+        files = {'file': (filename, io.BytesIO(image_data), content_type)}
+        try:
+            crowd_resp = self.get_session().post(self.url, files=files, timeout=self.timeout)
+        except requests.Timeout as e:
+            raise CounterTimeout(str(e)) from e
+        except requests.ConnectionError as e:
+            raise CounterUnavailable(str(e)) from e
+
+        if crowd_resp.status_code != 200:
+            raise CounterServiceError("Crowd Service failed", crowd_resp.text)
+
+        return int(crowd_resp.json().get('sahi_count', 0))
+
+
+class GeminiCounter(BaseCounter):
+    """ Asks Gemini to count the people in the frame """
+    name = "gemini"
+    max_size = 1024
+    max_retries = 2
+
+    def __init__(self, model_name='gemini-1.5-flash'):
+        self.model_name = model_name
+        self._model = None
+
+    def get_model(self):
+        # Cache Gemini model initialization (expensive operation)
+        if self._model is None:
+            self._model = get_genai().GenerativeModel(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        import PIL.Image  # noqa: F401
+        self.get_model()
+
+    def count(self, image_data, filename="frame.jpg", content_type="image/jpeg", capacity=0):
+        import PIL.Image
+
+        genai = get_genai()
+        with span('gemini_resize'):
+            # Load image from memory buffer (faster than file pointer)
+            img = PIL.Image.open(io.BytesIO(image_data))
+
+            # Resize large images for faster processing
+            if img.width > self.max_size or img.height > self.max_size:
+                img.thumbnail((self.max_size, self.max_size), PIL.Image.Resampling.LANCZOS)
+
+        model = self.get_model()
+
+        # Simplified prompt for faster processing
+        prompt = f"Count people. Capacity: {capacity}. Return only the number."
+
+        for attempt in range(self.max_retries):
+            try:
+                # One span per attempt, so retries show up as extra observations
+                with span('gemini_generate'):
+                    gemini_response = model.generate_content(
+                        [prompt, img],
+                        generation_config=genai.types.GenerationConfig(
+                            temperature=0,  # Deterministic, faster
+                            max_output_tokens=10  # Limit output for speed
+                        )
+                    )
+                gemini_text = gemini_response.text.strip()
+                break
+            except Exception:
+                if attempt == self.max_retries - 1:
+                    raise
+                with span('gemini_retry_wait'):
+                    time.sleep(0.5)  # Reduced retry delay
+
+        # Parse Gemini Count (Handle cases where it might return "approx 5" etc)
+        try:
+            return int(''.join(filter(str.isdigit, gemini_text)))
+        except ValueError:
+            return 1  # Fallback to avoid division by zero
+
+
+# ==========================================
+# LOCAL BACKEND (ONNX Runtime, process pool)
+# ==========================================
+
+# Per-worker-process inference session, created by the pool initializer
+_session = None
+
+
+def _init_local_worker(model_path, intra_op_threads):
+    global _session
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = 1
+    _session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def _local_count(image_data, input_size, score_threshold, person_class):
+    """
+    Runs inside a pool worker. Expects an SSD-style detector (e.g. the ONNX
+    model zoo ssd_mobilenet_v1): uint8 NHWC input, outputs
+    (boxes, classes, scores, num_detections).
+    """
+    import numpy as np
+    import PIL.Image
+
+    img = PIL.Image.open(io.BytesIO(image_data)).convert('RGB')
+    img = img.resize((input_size, input_size), PIL.Image.Resampling.BILINEAR)
+    batch = np.asarray(img, dtype=np.uint8)[np.newaxis, ...]
+
+    input_name = _session.get_inputs()[0].name
+    results = _session.run(None, {input_name: batch})
+    named = dict(zip([o.name for o in _session.get_outputs()], results))
+
+    # Prefer named outputs, fall back to the standard positional order
+    classes = named.get('detection_classes', results[1])
+    scores = named.get('detection_scores', results[2])
+
+    hits = (classes[0].astype(np.int64) == person_class) & (scores[0] >= score_threshold)
+    return int(hits.sum())
+
+
+class LocalCounter(BaseCounter):
+    """ Counts people on local CPUs; no network round-trip or API quota """
+    name = "local"
+    requires = ("onnxruntime",)
+
+    def __init__(self, model_path=None, workers=None, input_size=None,
+                 score_threshold=None, person_class=1, timeout=10):
+        self.model_path = model_path or settings.LOCAL_COUNTER_MODEL_PATH
+        self.workers = workers or settings.LOCAL_COUNTER_WORKERS
+        self.input_size = input_size or settings.LOCAL_COUNTER_INPUT_SIZE
+        self.score_threshold = score_threshold if score_threshold is not None else settings.LOCAL_COUNTER_SCORE_THRESHOLD
+        self.person_class = person_class
+        self.timeout = timeout
+        self._pool = None
+
+    def get_pool(self):
+        if self._pool is None:
+            # Checked here: a pool whose initializer fails to import is broken for good
+            missing = self.missing_requirement()
+            if missing:
+                raise CounterUnavailable(missing)
+            if not self.model_path or not os.path.exists(self.model_path):
+                raise ImproperlyConfigured(
+                    f"LOCAL_COUNTER_MODEL_PATH does not point to an ONNX model: {self.model_path!r}"
+                )
+            # One inference thread per worker: the pool itself provides the parallelism
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_local_worker,
+                initargs=(str(self.model_path), 1),
+            )
+        return self._pool
+
+    def warm_up(self):
+        self.get_pool()
+
+    def count(self, image_data, filename="frame.jpg", content_type="image/jpeg", capacity=0):
+        future = self.get_pool().submit(
+            _local_count, image_data, self.input_size, self.score_threshold, self.person_class
+        )
+        return future.result(timeout=self.timeout)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+# ==========================================
+# REGISTRY
+# ==========================================
+
+COUNTER_BACKENDS = {
+    GeminiCounter.name: GeminiCounter,
+    SahiCounter.name: SahiCounter,
+    LocalCounter.name: LocalCounter,
+}
+
+
+
+def get_counter(name=None):
+    """ Returns the shared counter for `name`, falling back to CARBON_COUNTER_BACKEND """
+    name = name or settings.CARBON_COUNTER_BACKEND
+    if name not in COUNTER_BACKENDS:
+        raise ImproperlyConfigured(f"Unknown counter backend: {name!r}")
+    counter = _counters.get(name)
+    if counter is None:
+        with _counters_lock:
+            counter = _counters.get(name)
+            if counter is None:
+                counter = _counters[name] = COUNTER_BACKENDS[name]()
+    return counter
+
+
+def get_zone_counter(zone):
+    """ Zone setting wins; blank means use the deployment default """
+    return get_counter(zone.counter_backend or None)
+
+
+def warm_up():
+    """
+    Preloads the SDKs and opens pooled connections for the backends this
+    deployment uses (SAHI always; the default reference counter and any
+    configured by zones). Returns {backend: error or None}.
+    """
+    from .models import Zone
+
+    names = {'sahi', settings.CARBON_COUNTER_BACKEND}
+    try:
+        names.update(
+            Zone.objects.exclude(counter_backend='').values_list('counter_backend', flat=True).distinct()
+        )
+    except Exception:
+        pass
+
+    errors = {}
+    for name in sorted(names):
+        try:
+            get_counter(name).warm_up()
+            errors[name] = None
+        except Exception as e:
+            errors[name] = str(e)
+    return errors
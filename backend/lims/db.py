@@ -0,0 +1,77 @@
+"""
+Connection accounting for /api/metrics/.
+
+- ecoflow_db_connects_total: Django-level connects per alias (pool checkouts
+  when pooling is on, real connects otherwise).
+- ecoflow_db_pool_*: psycopg_pool statistics (pool size, waiting clients and
+  cumulative wait time) for aliases configured with OPTIONS["pool"].
+"""
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import register_collector
+
+_connects = Counter()
+_lock = threading.Lock()
+
+# psycopg_pool.ConnectionPool.get_stats() key -> (metric suffix, type)
+POOL_STATS = {
+    'pool_min': ('min_size', 'gauge'),
+    'pool_max': ('max_size', 'gauge'),
+    'pool_size': ('size', 'gauge'),
+    'pool_available': ('available', 'gauge'),
+    'requests_waiting': ('requests_waiting', 'gauge'),
+    'requests_num': ('requests_total', 'counter'),
+    'requests_queued': ('requests_queued_total', 'counter'),
+    'requests_wait_ms': ('requests_wait_ms_total', 'counter'),
+    'requests_errors': ('requests_errors_total', 'counter'),
+    'connections_num': ('connections_opened_total', 'counter'),
+    'connections_ms': ('connections_ms_total', 'counter'),
+    'connections_errors': ('connections_errors_total', 'counter'),
+    'connections_lost': ('connections_lost_total', 'counter'),
+    'usage_ms': ('usage_ms_total', 'counter'),
+}
+
+
+@receiver(connection_created)
+def count_connect(sender, connection, **kwargs):
+    with _lock:
+        _connects[connection.alias] += 1
+
+
+def connect_counts():
+    with _lock:
+        return dict(_connects)
+
+
+def pool_stats():
+    """ {alias: stats dict} for every alias whose pool has been created """
+    stats = {}
+    for conn in connections.all():
+        pool = getattr(conn, '_connection_pools', {}).get(conn.alias)
+        if pool is not None:
+            stats[conn.alias] = pool.get_stats()
+    return stats
+
+
+@register_collector
+def collect():
+    lines = [
+        "# HELP ecoflow_db_connects_total Django database connects (pool checkouts when pooled).",
+        "# TYPE ecoflow_db_connects_total counter",
+    ]
+    lines += [f'ecoflow_db_connects_total{{alias="{alias}"}} {n}' for alias, n in sorted(connect_counts().items())]
+
+    per_alias = pool_stats()
+    for key, (suffix, kind) in POOL_STATS.items():
+        name = f"ecoflow_db_pool_{suffix}"
+        samples = [(alias, stats[key]) for alias, stats in sorted(per_alias.items()) if key in stats]
+        if not samples:
+            continue
+        lines.append(f"# TYPE {name} {kind}")
+        lines += [f'{name}{{alias="{alias}"}} {value}' for alias, value in samples]
+    return lines
@@ -0,0 +1,215 @@
+"""
+Streaming exports of the CarbonLog and Alert history.
+
+Rows come from QuerySet.iterator(chunk_size=BULK_EXPORT_CHUNK_SIZE): a
+server-side cursor on PostgreSQL, chunked fetches elsewhere. Encoders turn
+them into CSV, NDJSON or Parquet chunks as they arrive, and gzip is applied
+on the fly, so memory depends on the chunk size, never on the table size.
+
+Parquet needs pyarrow (optional; not in requirements.txt). It is written one
+row group (EXPORT_PARQUET_ROW_GROUP rows) at a time and each finished group
+is sent immediately.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Alert, CarbonLog
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+
+
+class ExportError(ValueError):
+    """ Bad export parameters (unknown kind/format, missing pyarrow) """
+
+
+# ==========================================
+# ROW SOURCES
+# ==========================================
+
+CARBONLOG_COLUMNS = ['id', 'zone_id', 'organization_id', 'saved_amount', 'sahi_count', 'gemini_count',
+                     'formula_version', 'timestamp']
+ALERT_COLUMNS = ['id', 'camera_id', 'zone_id', 'organization_id', 'kind', 'status',
+                 'heading', 'sub_heading', 'created_at', 'updated_at']
+
+
+def carbonlog_rows(organization_id=None, zone_id=None, start=None, end=None):
+    # Primary-key order: the cursor walks the PK index, no sort of the whole table
+    logs = CarbonLog.objects.order_by('id')
+    if organization_id is not None:
+        logs = logs.for_organization(organization_id)
+    if zone_id:
+        logs = logs.filter(zone_id=zone_id)
+    if start:
+        logs = logs.filter(timestamp__gte=start)
+    if end:
+        logs = logs.filter(timestamp__lt=end)
+    rows = logs.values(*CARBONLOG_COLUMNS)
+    yield from rows.iterator(chunk_size=settings.BULK_EXPORT_CHUNK_SIZE)
+
+
+def alert_rows(organization_id=None, zone_id=None, start=None, end=None):
+    alerts = Alert.objects.order_by('id')
+    if organization_id is not None:
+        alerts = alerts.for_organization(organization_id)
+    if zone_id:
+        alerts = alerts.filter(camera__zone_id=zone_id)
+    if start:
+        alerts = alerts.filter(created_at__gte=start)
+    if end:
+        alerts = alerts.filter(created_at__lt=end)
+    rows = alerts.values('id', 'camera_id', 'kind', 'status', 'heading', 'sub_heading', 'created_at', 'updated_at',
+                         'organization_id', zone_id=F('camera__zone_id'))
+    yield from rows.iterator(chunk_size=settings.BULK_EXPORT_CHUNK_SIZE)
+
+
+def _parquet_schema(kind):
+    import pyarrow as pa
+
+    ts = pa.timestamp('us', tz='UTC')
+    if kind == 'carbonlogs':
+        return pa.schema([('id', pa.int64()), ('zone_id', pa.int64()), ('organization_id', pa.int64()),
+                          ('saved_amount', pa.float64()), ('sahi_count', pa.int64()), ('gemini_count', pa.int64()),
+                          ('formula_version', pa.int16()), ('timestamp', ts)])
+    return pa.schema([('id', pa.int64()), ('camera_id', pa.int64()), ('zone_id', pa.int64()),
+                      ('organization_id', pa.int64()), ('kind', pa.string()), ('status', pa.string()),
+                      ('heading', pa.string()), ('sub_heading', pa.string()),
+                      ('created_at', ts), ('updated_at', ts)])
+
+
+# kind -> (row source, columns)
+EXPORTS = {
+    'carbonlogs': (carbonlog_rows, CARBONLOG_COLUMNS),
+    'alerts': (alert_rows, ALERT_COLUMNS),
+}
+
+
+# ==========================================
+# ENCODERS
+# ==========================================
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def stream_rows(rows, fmt, columns, rows_per_chunk=500):
+    """ Encodes dicts as CSV or NDJSON text chunks of `rows_per_chunk` rows """
+    buf = io.StringIO()
+    if fmt == 'ndjson':
+        write = lambda row: buf.write(json.dumps(row, default=_json_default) + '\n')  # noqa: E731
+    else:
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+
+        def write(row):
+            # Missing keys are empty cells; ISO 8601 timestamps, like the NDJSON output and the API
+            writer.writerow([v.isoformat() if type(v) is datetime else v for v in map(row.get, columns)])
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    if buf.tell():
+        yield buf.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """ Write-only file that hands back what was written since the last drain() """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_parquet(rows, schema, compression='snappy', rows_per_group=None):
+    """ Encodes dicts as a Parquet file, yielding bytes after every row group """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows_per_group = rows_per_group or settings.EXPORT_PARQUET_ROW_GROUP
+    names = schema.names
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+
+    def flush(columns):
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        return sink.drain()
+
+    columns = {name: [] for name in names}
+    pending = 0
+    try:
+        for row in rows:
+            for name in names:
+                columns[name].append(row[name])
+            pending += 1
+            if pending >= rows_per_group:
+                yield flush(columns)
+                columns = {name: [] for name in names}
+                pending = 0
+        if pending:
+            yield flush(columns)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks, level=6):
+    """ Gzip-compresses a stream of str/bytes chunks on the fly """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(kind, fmt='csv', compress=None, **filters):
+    """
+    (chunks, content_type, filename) for a history export. `filters` are
+    organization_id (one id or a list), zone_id, start, end. Parquet compresses internally:
+    compress='gzip' selects gzip pages instead of snappy.
+    """
+    if kind not in EXPORTS:
+        raise ExportError(f"'kind' must be one of: {', '.join(EXPORTS)}")
+    if fmt not in FORMATS:
+        raise ExportError(f"'file_format' must be one of: {', '.join(FORMATS)}")
+    if compress not in (None, '', 'gzip'):
+        raise ExportError("'compress' must be 'gzip'")
+
+    row_source, columns = EXPORTS[kind]
+    rows = row_source(**filters)
+    filename = f"{kind}.{fmt}"
+
+    if fmt == 'parquet':
+        try:
+            schema = _parquet_schema(kind)
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+        return stream_parquet(rows, schema, compression='gzip' if compress else 'snappy'), CONTENT_TYPES[fmt], filename
+
+    chunks = stream_rows(rows, fmt, columns)
+    if compress:
+        return gzip_chunks(chunks), 'application/gzip', f"{filename}.gz"
+    return chunks, CONTENT_TYPES[fmt], filename
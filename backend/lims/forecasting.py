@@ -0,0 +1,288 @@
+"""
+Short-term occupancy forecasting for proactive overcrowding alerts.
+
+Each zone carries a damped-trend exponential smoothing state (level, trend)
+on top of a day-of-week x hour seasonal profile. All state lives in NumPy
+arrays indexed by a per-zone row, so:
+
+- a detection updates one row in O(1), no refit over history;
+- warm-starting from the rollups and forecasting every zone at once are
+  vectorized across zones (thousands of zones per core).
+
+Observations arrive at irregular intervals, so the smoothing factors are
+scaled by the time since the previous observation of the zone.
+
+State is per process. Each worker learns from the detections it serves and
+warm-starts from OccupancyRollup at readiness (see health.WarmUp).
+"""
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+SLOTS = 7 * 24  # day-of-week x hour
+# Past this gap the level is reset to the new observation and the trend dropped
+MAX_GAP_MINUTES = 120.0
+
+
+def to_minutes(when):
+    """ Epoch minutes (float) for an aware datetime """
+    return when.timestamp() / 60.0
+
+
+def season_slot(when):
+    local = timezone.localtime(when)
+    return local.weekday() * 24 + local.hour
+
+
+def _damped_sum(phi, steps):
+    """ phi + phi^2 + ... + phi^steps, for real-valued steps (vectorized) """
+    if phi >= 1.0:
+        return steps
+    return phi * (1.0 - np.power(phi, steps)) / (1.0 - phi)
+
+
+class OccupancyForecaster:
+    """ Holt damped-trend smoothing + additive weekly profile, one row per zone """
+
+    def __init__(self, alpha=None, beta=None, gamma=None, phi=None, initial_rows=256):
+        # Smoothing factors are per minute of elapsed time
+        self.alpha = settings.FORECAST_ALPHA if alpha is None else alpha
+        self.beta = settings.FORECAST_BETA if beta is None else beta
+        self.gamma = settings.FORECAST_GAMMA if gamma is None else gamma
+        self.phi = settings.FORECAST_PHI if phi is None else phi
+
+        self._rows = {}  # zone_id -> row
+        self._lock = threading.Lock()
+        self._allocate(initial_rows)
+
+    def _allocate(self, size):
+        old = getattr(self, 'level', None)
+        used = 0 if old is None else len(old)
+        level = np.zeros(size)
+        trend = np.zeros(size)
+        last_t = np.full(size, np.nan)
+        observations = np.zeros(size, dtype=np.int64)
+        season = np.zeros((size, SLOTS))
+        if used:
+            level[:used], trend[:used], last_t[:used] = self.level, self.trend, self.last_t
+            observations[:used], season[:used] = self.observations, self.season
+        self.level, self.trend, self.last_t = level, trend, last_t
+        self.observations, self.season = observations, season
+
+    def _row(self, zone_id):
+        row = self._rows.get(zone_id)
+        if row is None:
+            row = self._rows[zone_id] = len(self._rows)
+            if row >= len(self.level):
+                self._allocate(len(self.level) * 2)
+        return row
+
+    def rows(self, zone_ids):
+        return np.fromiter((self._row(z) for z in zone_ids), dtype=np.int64, count=len(zone_ids))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, zone_id):
+        return zone_id in self._rows
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _step(self, rows, counts, t, slots):
+        """ One observation for each of `rows` (no duplicates) """
+        last = self.last_t[rows]
+        fresh = np.isnan(last) | (t - last > MAX_GAP_MINUTES)
+        dt = np.where(fresh, 1.0, np.maximum(t - last, 0.0))
+
+        seasonal = self.season[rows, slots]
+        y = counts - seasonal
+        level, trend = self.level[rows], self.trend[rows]
+
+        a = 1.0 - np.power(1.0 - self.alpha, dt)
+        b = 1.0 - np.power(1.0 - self.beta, dt)
+        decay = np.power(self.phi, dt)
+        predicted = level + trend * _damped_sum(self.phi, dt)
+        new_level = predicted + a * (y - predicted)
+        # Slope per minute; a burst of same-second observations counts as one minute apart
+        slope = (new_level - level) / np.maximum(dt, 1.0)
+        new_trend = decay * trend + b * (slope - decay * trend)
+
+        new_level = np.where(fresh, y, new_level)
+        new_trend = np.where(fresh, 0.0, new_trend)
+
+        self.level[rows] = new_level
+        self.trend[rows] = new_trend
+        self.season[rows, slots] = seasonal + self.gamma * (counts - new_level - seasonal)
+        self.last_t[rows] = np.where(np.isnan(last), t, np.maximum(last, t))
+        self.observations[rows] += 1
+
+    def update(self, zone_id, count, when=None):
+        """ Folds one detection into the zone's state. O(1). """
+        when = when or timezone.now()
+        with self._lock:
+            row = self._row(zone_id)
+            self._step(np.array([row]), np.array([float(count)]),
+                       np.array([to_minutes(when)]), np.array([season_slot(when)]))
+
+    def update_many(self, zone_ids, counts, minutes, slots):
+        """
+        Folds a batch of observations (any order, any zones). Observations of
+        one zone are applied in time order; each pass is vectorized across zones.
+        """
+        if not len(zone_ids):
+            return
+        counts = np.asarray(counts, dtype=float)
+        minutes = np.asarray(minutes, dtype=float)
+        slots = np.asarray(slots, dtype=np.int64)
+        with self._lock:
+            unique_ids, inverse = np.unique(np.asarray(zone_ids), return_inverse=True)
+            rows = self.rows(unique_ids.tolist())[inverse]
+            order = np.lexsort((minutes, rows))
+            rows, counts, minutes, slots = rows[order], counts[order], minutes[order], slots[order]
+            # Rank of each observation within its zone: pass k applies every zone's k-th one
+            starts = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+            rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+            by_rank = np.argsort(rank, kind='stable')
+            bounds = np.searchsorted(rank[by_rank], np.arange(int(rank.max()) + 2))
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                pick = by_rank[lo:hi]
+                self._step(rows[pick], counts[pick], minutes[pick], slots[pick])
+
+    def set_profile(self, zone_ids, profiles):
+        """ Replaces the weekly profile of each zone (profiles: len(zone_ids) x SLOTS) """
+        with self._lock:
+            self.season[self.rows(list(zone_ids))] = profiles
+
+    # ------------------------------------------------------------------
+    # Forecasts
+    # ------------------------------------------------------------------
+
+    def forecast(self, zone_ids=None, horizon_minutes=None, now=None):
+        """
+        Predicted people count `horizon_minutes` from `now` for each zone
+        (all known zones by default). Returns (zone_ids, predictions, observations).
+        """
+        horizon = settings.FORECAST_HORIZON_MINUTES if horizon_minutes is None else horizon_minutes
+        now = now or timezone.now()
+        target = now + timedelta(minutes=horizon)
+        with self._lock:
+            if zone_ids is None:
+                zone_ids = list(self._rows)
+            known = [z for z in zone_ids if z in self._rows]
+            rows = np.fromiter((self._rows[z] for z in known), dtype=np.int64, count=len(known))
+            ahead = np.maximum(to_minutes(target) - self.last_t[rows], 0.0)
+            predicted = (self.level[rows] + self.trend[rows] * _damped_sum(self.phi, ahead)
+                         + self.season[rows, season_slot(target)])
+            observations = self.observations[rows].copy()
+        return known, np.maximum(predicted, 0.0), observations
+
+    def predict(self, zone_id, horizon_minutes=None, now=None):
+        """ (predicted count, observations) for one zone, or (None, 0) if unseen """
+        zone_ids, predicted, observations = self.forecast([zone_id], horizon_minutes, now)
+        if not zone_ids:
+            return None, 0
+        return float(predicted[0]), int(observations[0])
+
+
+# ==========================================
+# PROCESS-WIDE INSTANCE
+# ==========================================
+
+_forecaster = None
+_forecaster_lock = threading.Lock()
+
+
+def get_forecaster():
+    global _forecaster
+    if _forecaster is None:
+        with _forecaster_lock:
+            if _forecaster is None:
+                _forecaster = OccupancyForecaster()
+    return _forecaster
+
+
+def weekly_profiles(zone_ids, since):
+    """
+    Per-zone day-of-week x hour profile from hourly rollups: the mean of each
+    slot minus the zone's overall mean (additive seasonal component).
+    """
+    from .models import OccupancyRollup
+
+    rollups = (OccupancyRollup.objects
+               .filter(period_seconds=OccupancyRollup.HOUR, bucket_start__gte=since, zone_id__in=zone_ids)
+               .values_list('zone_id', 'bucket_start', 'avg_count'))
+    profiles = np.zeros((len(zone_ids), SLOTS))
+    rollups = list(rollups)
+    if not rollups:
+        return profiles
+    zone_col, bucket_col, avg_col = zip(*rollups)
+    index = {z: i for i, z in enumerate(zone_ids)}
+
+    # Few distinct hours, many zones: resolve each hour's slot once
+    slot_of = {b: season_slot(b) for b in set(bucket_col)}
+    rows = np.fromiter((index[z] for z in zone_col), dtype=np.int64, count=len(zone_col))
+    slots = np.fromiter((slot_of[b] for b in bucket_col), dtype=np.int64, count=len(bucket_col))
+    values = np.asarray(avg_col, dtype=float)
+
+    sums = np.zeros_like(profiles)
+    hits = np.zeros_like(profiles)
+    np.add.at(sums, (rows, slots), values)
+    np.add.at(hits, (rows, slots), 1.0)
+    means = np.divide(sums, hits, out=np.zeros_like(sums), where=hits > 0)
+    overall = np.divide(sums.sum(axis=1), hits.sum(axis=1), out=np.zeros(len(zone_ids)), where=hits.sum(axis=1) > 0)
+    return np.where(hits > 0, means - overall[:, None], 0.0)
+
+
+def warm_start(forecaster=None, now=None):
+    """
+    Seeds every zone from the rollups: weekly profile from the last
+    FORECAST_PROFILE_DAYS of hourly buckets, then level/trend from the last
+    FORECAST_WARMUP_HOURS of minute buckets. Returns the number of zones seeded.
+    """
+    from .models import OccupancyRollup
+
+    if forecaster is None:
+        forecaster = get_forecaster()
+    now = now or timezone.now()
+
+    zone_ids = list(OccupancyRollup.objects
+                    .filter(period_seconds=OccupancyRollup.HOUR,
+                            bucket_start__gte=now - timedelta(days=settings.FORECAST_PROFILE_DAYS))
+                    .values_list('zone_id', flat=True).distinct())
+    if zone_ids:
+        forecaster.set_profile(zone_ids, weekly_profiles(zone_ids, now - timedelta(days=settings.FORECAST_PROFILE_DAYS)))
+
+    minutes = (OccupancyRollup.objects
+               .filter(period_seconds=OccupancyRollup.MINUTE,
+                       bucket_start__gte=now - timedelta(hours=settings.FORECAST_WARMUP_HOURS))
+               .values_list('zone_id', 'bucket_start', 'avg_count'))
+    minutes = list(minutes)
+    zone_col, bucket_col, avg_col = zip(*minutes) if minutes else ((), (), ())
+    if zone_col:
+        slot_of = {b: season_slot(b) for b in set(bucket_col)}
+        forecaster.update_many(
+            zone_col, avg_col,
+            # Bucket midpoint
+            [to_minutes(b) + 0.5 for b in bucket_col],
+            [slot_of[b] for b in bucket_col],
+        )
+    return len(set(zone_ids) | set(zone_col))
+
+
+def check_zone(zone_id, count, when=None):
+    """
+    Feeds a detection to the forecaster and returns the predicted count
+    FORECAST_HORIZON_MINUTES ahead, or None until the zone has
+    FORECAST_MIN_OBSERVATIONS observations.
+    """
+    forecaster = get_forecaster()
+    forecaster.update(zone_id, count, when)
+    predicted, observations = forecaster.predict(zone_id, now=when)
+    if observations < settings.FORECAST_MIN_OBSERVATIONS:
+        return None
+    return predicted
@@ -0,0 +1,407 @@
+"""
+Frame archive: detection uploads kept for audits and re-counting.
+
+Off unless FRAME_ARCHIVE_ENABLED. When on, `sensor_detect` hashes the
+uploaded bytes (sha256, well under a millisecond for a camera frame) and hands
+the frame to a background writer. The request never waits on disk or the
+database: a full queue (FRAME_QUEUE_SIZE) drops the frame and counts it.
+Alerts raised by the detection point at the frame by its hash
+(Alert.frame_id), so they can link to it before it is written.
+
+Content-addressed: the hash is the key in the store and the Frame primary
+key. A repeated upload (a retry, a camera resending an unchanged scene) is
+stored once. Seeing it again only moves last_seen_at and expires_at forward.
+Frames are downscaled to FRAME_MAX_SIZE pixels and re-encoded as JPEG at
+FRAME_JPEG_QUALITY before they are stored.
+
+The writer takes up to FRAME_WRITE_BATCH frames at a time. Per batch it
+runs one lookup of the known hashes, one INSERT of the new rows and one
+CASE UPDATE of the expiry of the others.
+
+Stores (FRAME_STORAGE):
+- "filesystem": FRAME_DIR/ab/cd/<sha256>.jpg, written then renamed;
+- "memory":     a dict with the same interface as an object-store bucket
+  (put / get / exists / delete), for a single process, tests and benchmarks.
+
+Retention: Zone.frame_retention_days, else FRAME_RETENTION_DAYS (0 disables
+archiving for the zone). Frames behind an alert are kept at least
+FRAME_ALERT_RETENTION_DAYS. `prune()` (the `prune_frames` command) deletes
+expired rows, then their images. An alert keeps its frame_id after that,
+and /frames/<id>/ answers 404.
+
+`recount()` (the `reprocess_frames` command) runs archived frames through a
+counter backend in parallel.
+"""
+import hashlib
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .metrics import register_collector
+from .serving import on_drain
+from .models import Frame
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def retention_days(zone):
+    """ Days to keep `zone`'s frames (0: not archived) """
+    if zone.frame_retention_days is not None:
+        return zone.frame_retention_days
+    return settings.FRAME_RETENTION_DAYS
+
+
+def downscale(data, max_size=None, quality=None):
+    """ (JPEG bytes, width, height) no larger than max_size on either side """
+    import PIL.Image
+
+    max_size = max_size or settings.FRAME_MAX_SIZE
+    img = PIL.Image.open(io.BytesIO(data))
+    img.draft('RGB', (max_size, max_size))  # JPEG: decode at a reduced scale straight away
+    img = img.convert('RGB')
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), PIL.Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=quality or settings.FRAME_JPEG_QUALITY, optimize=True)
+    return buf.getvalue(), img.width, img.height
+
+
+# ==========================================
+# STORES
+# ==========================================
+
+class FilesystemFrameStore:
+    """ One file per frame under FRAME_DIR, fanned out by the first hash bytes """
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.FRAME_DIR)
+
+    def _path(self, key):
+        return self.root / key[:2] / key[2:4] / f"{key}.jpg"
+
+    def put(self, key, data):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a reader never sees half a file
+        tmp = path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+    def get(self, key):
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key):
+        return self._path(key).is_file()
+
+    def delete(self, key):
+        self._path(key).unlink(missing_ok=True)
+
+
+class MemoryFrameStore:
+    """ Object-store stand-in: same put/get/exists/delete, kept in this process """
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        with self._lock:
+            self._objects[key] = data
+
+    def get(self, key):
+        with self._lock:
+            return self._objects.get(key)
+
+    def exists(self, key):
+        with self._lock:
+            return key in self._objects
+
+    def delete(self, key):
+        with self._lock:
+            self._objects.pop(key, None)
+
+
+FRAME_STORES = {"filesystem": FilesystemFrameStore, "memory": MemoryFrameStore}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FRAME_STORES[settings.FRAME_STORAGE]()
+    return _store
+
+
+# ==========================================
+# BACKGROUND WRITER
+# ==========================================
+
+class FrameArchiver:
+    """ Bounded queue of frames, written by a daemon thread in batches """
+
+    def __init__(self, store=None, queue_size=None, batch_size=None):
+        self.store = store or get_store()
+        self.batch_size = batch_size or settings.FRAME_WRITE_BATCH
+        self._queue = queue.Queue(maxsize=queue_size or settings.FRAME_QUEUE_SIZE)
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0  # New frames stored
+        self.deduplicated = 0  # Frames already archived (or repeated within a batch)
+        self.dropped = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def submit(self, job):
+        """ Queues a frame; never blocks the request """
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.start()
+        return True
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def drain(self, deadline=None):
+        """
+        Writes everything queued now (shutdown drain, tests), stopping at
+        `deadline` (time.monotonic()); returns the number of frames taken
+        """
+        taken = 0
+        while deadline is None or time.monotonic() < deadline:
+            batch = self._take(block=False)
+            if not batch:
+                return taken
+            taken += len(batch)
+            self._write_quietly(batch)
+        return taken
+
+    def start(self):
+        """ Starts the writer once per process """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+            self._thread.start()
+            on_drain('frames', self.drain)
+
+    def _run(self):
+        while True:
+            batch = self._take(block=True)
+            if batch:
+                close_old_connections()
+                self._write_quietly(batch)
+
+    def _take(self, block):
+        """ Up to batch_size queued jobs (waits for the first one when `block`) """
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=1) if block else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write_quietly(self, batch):
+        try:
+            self.write(batch)
+        except Exception:
+            # Images already stored are kept; the rows are lost, like credits of a dead process
+            self.failures += 1
+
+    def write(self, batch):
+        """ Stores the new images and upserts the rows of a batch of jobs """
+        with self._write_lock:
+            merged = {}
+            for job in batch:
+                seen = merged.get(job['sha256'])
+                if seen is None:
+                    merged[job['sha256']] = dict(job)
+                    continue
+                self.deduplicated += 1
+                seen['seen_at'] = max(seen['seen_at'], job['seen_at'])
+                seen['expires_at'] = max(seen['expires_at'], job['expires_at'])
+
+            known = set(Frame.objects.filter(pk__in=list(merged)).values_list('pk', flat=True))
+            new_rows = []
+            for key, job in merged.items():
+                if key in known:
+                    self.deduplicated += 1
+                    continue
+                try:
+                    data, width, height = downscale(job['data'])
+                except Exception:
+                    self.failures += 1  # Not an image PIL can read; the rest of the batch goes on
+                    continue
+                self.store.put(key, data)
+                self.bytes_in += len(job['data'])
+                self.bytes_out += len(data)
+                new_rows.append(Frame(
+                    sha256=key, zone_id=job['zone_id'], camera_id=job['camera_id'],
+                    organization_id=job['organization_id'], width=width, height=height, size=len(data),
+                    people_count=min(job['people_count'], 32767), captured_at=job['seen_at'],
+                    last_seen_at=job['seen_at'], expires_at=job['expires_at'],
+                ))
+            if new_rows:
+                # Another worker may have inserted the same frame meanwhile: same content, keep theirs
+                Frame.objects.bulk_create(new_rows, ignore_conflicts=True)
+                self.written += len(new_rows)
+            if known:
+                extend_frames({key: merged[key] for key in known})
+
+
+def extend_frames(jobs):
+    """ One UPDATE: last_seen_at / expires_at of already archived frames, never moved backwards """
+    keys = sorted(jobs)  # Key order, so concurrent writers lock rows alike
+    seen = Case(*[When(pk=key, then=Value(jobs[key]['seen_at'])) for key in keys], output_field=DateTimeField())
+    expires = Case(*[When(pk=key, then=Value(jobs[key]['expires_at'])) for key in keys],
+                   output_field=DateTimeField())
+    Frame.objects.filter(pk__in=keys).update(
+        last_seen_at=Greatest(F('last_seen_at'), seen),
+        expires_at=Greatest(F('expires_at'), expires),
+    )
+
+
+_archiver = None
+_archiver_lock = threading.Lock()
+
+
+def get_archiver():
+    global _archiver
+    if _archiver is None:
+        with _archiver_lock:
+            if _archiver is None:
+                _archiver = FrameArchiver()
+    return _archiver
+
+
+def frame_key(zone, data):
+    """ The frame's id if `zone`'s frames are archived, else None (request path: hashing only) """
+    if not settings.FRAME_ARCHIVE_ENABLED or not retention_days(zone):
+        return None
+    return content_hash(data)
+
+
+def archive(key, data, zone, camera_id, people_count, alerted=False, now=None):
+    """ Queues the frame behind `key` (from frame_key) for the background writer """
+    now = now or timezone.now()
+    days = retention_days(zone)
+    if alerted:
+        days = max(days, settings.FRAME_ALERT_RETENTION_DAYS)
+    return get_archiver().submit({
+        "sha256": key, "data": data, "zone_id": zone.id, "camera_id": camera_id,
+        "organization_id": zone.organization_id, "people_count": people_count,
+        "seen_at": now, "expires_at": now + timedelta(days=days),
+    })
+
+
+@register_collector
+def collect():
+    if _archiver is None:
+        return []
+    a = _archiver
+    return [
+        "# TYPE ecoflow_frames_pending gauge",
+        f"ecoflow_frames_pending {a.pending()}",
+        "# TYPE ecoflow_frames_written_total counter",
+        f"ecoflow_frames_written_total {a.written}",
+        "# TYPE ecoflow_frames_deduplicated_total counter",
+        f"ecoflow_frames_deduplicated_total {a.deduplicated}",
+        "# TYPE ecoflow_frames_dropped_total counter",
+        f"ecoflow_frames_dropped_total {a.dropped}",
+        "# TYPE ecoflow_frames_write_failures_total counter",
+        f"ecoflow_frames_write_failures_total {a.failures}",
+        "# TYPE ecoflow_frames_bytes_in_total counter",
+        f"ecoflow_frames_bytes_in_total {a.bytes_in}",
+        "# TYPE ecoflow_frames_bytes_stored_total counter",
+        f"ecoflow_frames_bytes_stored_total {a.bytes_out}",
+    ]
+
+
+# ==========================================
+# RETENTION
+# ==========================================
+
+def prune(now=None, batch_size=None, store=None):
+    """ Deletes expired frames, oldest first; returns the number deleted """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.FRAME_PRUNE_BATCH
+    store = store or get_store()
+    deleted = 0
+    while True:
+        keys = list(Frame.objects.filter(expires_at__lt=now).order_by('expires_at')
+                    .values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        # Re-checks the expiry: the writer may have extended a frame since the read
+        Frame.objects.filter(pk__in=keys, expires_at__lt=now).delete()
+        kept = set(Frame.objects.filter(pk__in=keys).values_list('pk', flat=True))
+        for key in keys:
+            if key not in kept:
+                store.delete(key)
+                deleted += 1
+        if len(keys) < batch_size:
+            return deleted
+
+
+# ==========================================
+# RE-PROCESSING
+# ==========================================
+
+def recount(frames, counter, workers=4, store=None):
+    """
+    Counts each archived frame again with `counter`, `workers` at a time.
+    Yields (frame, count, error) in input order. Every frame of `frames` is
+    submitted at once, so pass a bounded chunk.
+    """
+    store = store or get_store()
+
+    def count(frame):
+        data = store.get(frame.sha256)
+        if data is None:
+            return frame, None, "image missing from the store"
+        try:
+            return frame, counter.count(data, filename=f"{frame.sha256}.jpg", content_type="image/jpeg"), None
+        except Exception as e:
+            return frame, None, str(e) or type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recount") as pool:
+        yield from pool.map(count, frames)
+
+
+def save_recounts(results, backend, now=None):
+    """ Writes (frame, count) pairs as one bulk UPDATE """
+    now = now or timezone.now()
+    frames = []
+    for frame, count in results:
+        frame.recount, frame.recount_backend, frame.recounted_at = min(count, 32767), backend, now
+        frames.append(frame)
+    Frame.objects.bulk_update(frames, ['recount', 'recount_backend', 'recounted_at'])
+    return len(frames)
@@ -0,0 +1,101 @@
+"""
+Bounding-box and nearest-zone queries on zone coordinates.
+
+The process keeps one spatial index (lims.spatial.ZoneIndex) of every zone
+with coordinates and rebuilds it, with one query, when zones change:
+
+- Zone saves and deletes (signals, connected in LimsConfig.ready) and bulk
+  imports bump a version stamp in the GEO_VERSION_CACHE Django cache. Each
+  query compares it with the version the index was built from; with a
+  shared cache (Redis) every worker sees the change.
+- The index is also rebuilt after GEO_INDEX_MAX_AGE_SECONDS, which covers
+  per-process caches and writes that bypass signals (raw UPDATEs).
+
+While one thread rebuilds, the others keep answering from the old index.
+NumPy (lims.spatial) is imported on the first query, not at startup.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = "geo:zones:version"
+
+
+def _version_cache():
+    return caches[settings.GEO_VERSION_CACHE]
+
+
+def zones_changed(**kwargs):
+    """ Marks every process's index stale (also a post_save/post_delete receiver) """
+    cache = _version_cache()
+    # add() is a no-op if the key exists; incr() is atomic on Redis/memcached
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # Evicted between add() and incr()
+        cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def current_version():
+    return _version_cache().get(VERSION_KEY, 0)
+
+
+class ZoneCatalog:
+    """ A ZoneIndex plus the per-zone fields returned by the endpoints """
+
+    def __init__(self, version):
+        from .models import Zone
+        from .spatial import ZoneIndex
+
+        rows = list(Zone.objects.filter(latitude__isnull=False, longitude__isnull=False)
+                    .values_list('id', 'organization_id', 'latitude', 'longitude', 'name', 'capacity'))
+        ids, org_ids, lats, lons, names, capacities = zip(*rows) if rows else ((),) * 6
+        self.index = ZoneIndex(ids, org_ids, [float(v) for v in lats], [float(v) for v in lons],
+                               cell_degrees=settings.GEO_CELL_DEGREES)
+        self.details = {zone_id: (name, capacity) for zone_id, name, capacity in zip(ids, names, capacities)}
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def zones(self, positions, distances=None):
+        """ Zone dicts for index positions (as returned by bbox/nearest) """
+        index = self.index
+        columns = zip(index.ids[positions].tolist(), index.organization_ids[positions].tolist(),
+                      index.lats[positions].tolist(), index.lons[positions].tolist())
+        result = []
+        for zone_id, org_id, lat, lon in columns:
+            name, capacity = self.details[zone_id]
+            result.append({"id": zone_id, "organization_id": org_id, "name": name, "capacity": capacity,
+                           "latitude": lat, "longitude": lon})
+        if distances is not None:
+            for zone, distance in zip(result, distances.tolist()):
+                zone["distance_km"] = round(distance, 3)
+        return result
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def _stale(catalog, version):
+    return catalog.version != version or time.monotonic() - catalog.built_at > settings.GEO_INDEX_MAX_AGE_SECONDS
+
+
+def get_zone_catalog():
+    """ The process-wide catalog, rebuilt if zones changed since it was built """
+    global _catalog
+    version = current_version()
+    catalog = _catalog
+    if catalog is not None and not _stale(catalog, version):
+        return catalog
+    # First build: everyone waits. Rebuild: one thread works, the rest use the old catalog.
+    if not _catalog_lock.acquire(blocking=catalog is None):
+        return catalog
+    try:
+        if _catalog is None or _stale(_catalog, version):
+            _catalog = ZoneCatalog(version)
+        return _catalog
+    finally:
+        _catalog_lock.release()
+
@@ -0,0 +1,216 @@
+"""
+Dependency health checks, run off the request path.
+
+A background thread probes the database, the crowd service, Gemini and the
+cache concurrently (each with its own timeout) every HEALTH_CHECK_INTERVAL
+seconds and keeps the last snapshot. Health endpoints only read that
+snapshot, so load balancer polling costs no DB queries or outbound calls.
+"""
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .routers import make_replica_probe
+
+OK = "OK"
+DOWN = "DOWN"
+
+GEMINI_DEFAULT_HOST = "generativelanguage.googleapis.com"
+
+
+# ==========================================
+# PROBES (return None when healthy, raise otherwise)
+# ==========================================
+
+def probe_database():
+    conn = connections['default']
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    finally:
+        # Probes run on pool threads; don't leave a connection parked on each one
+        conn.close()
+
+
+def probe_crowd_service():
+    import requests
+
+    # Any answer below 500 means the service is up (the probe does not send a frame)
+    resp = requests.get(settings.CROWD_PREDICT_URL, timeout=settings.HEALTH_PROBE_TIMEOUT)
+    if resp.status_code >= 500:
+        raise RuntimeError(f"HTTP {resp.status_code}")
+
+
+def probe_gemini():
+    # TCP reachability only: a real call would spend API quota every interval
+    if settings.GEMINI_API_ENDPOINT:
+        parts = urlsplit(settings.GEMINI_API_ENDPOINT if '//' in settings.GEMINI_API_ENDPOINT
+                         else f"//{settings.GEMINI_API_ENDPOINT}")
+        host, port = parts.hostname, parts.port or (80 if parts.scheme == 'http' else 443)
+    else:
+        host, port = GEMINI_DEFAULT_HOST, 443
+    socket.create_connection((host, port), timeout=settings.HEALTH_PROBE_TIMEOUT).close()
+
+
+def probe_cache():
+    key = "health_probe"
+    value = str(time.monotonic())
+    cache.set(key, value, 30)
+    if cache.get(key) != value:
+        raise RuntimeError("read-back mismatch")
+
+
+PROBES = {
+    "database": probe_database,
+    "crowd_service": probe_crowd_service,
+    "gemini": probe_gemini,
+    "cache": probe_cache,
+}
+# Replica probes also take failing/lagging replicas out of read rotation
+PROBES.update({alias: make_replica_probe(alias) for alias in settings.REPLICA_DATABASES})
+
+
+# ==========================================
+# MONITOR
+# ==========================================
+
+class HealthMonitor:
+    """ Runs PROBES periodically in a daemon thread and caches the result """
+
+    def __init__(self, probes=PROBES):
+        self.probes = probes
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._thread = None
+        # Probes block on I/O; one thread each keeps a slow probe from delaying the rest
+        self._executor = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix="health-probe")
+
+    def check_now(self):
+        """ Runs every probe concurrently and stores the snapshot """
+        timeout = settings.HEALTH_PROBE_TIMEOUT
+        started = time.perf_counter()
+        futures = {name: (time.perf_counter(), self._executor.submit(probe)) for name, probe in self.probes.items()}
+
+        checks = {}
+        for name, (start, future) in futures.items():
+            remaining = max(0.0, timeout - (time.perf_counter() - started))
+            try:
+                future.result(timeout=remaining)
+                checks[name] = {"status": OK}
+            except FutureTimeout:
+                checks[name] = {"status": DOWN, "error": f"timed out after {timeout}s"}
+            except Exception as e:
+                checks[name] = {"status": DOWN, "error": str(e)}
+            checks[name]["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        critical = settings.HEALTH_CRITICAL_PROBES
+        snapshot = {
+            "checked_at": time.time(),
+            "checks": checks,
+            "ready": all(checks[name]["status"] == OK for name in critical if name in checks),
+            "healthy": all(check["status"] == OK for check in checks.values()),
+        }
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def start(self):
+        """ Starts the refresher once per process (safe to call on every request) """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.check_now()
+            except Exception:
+                pass
+            time.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+    def snapshot(self):
+        """
+        Latest snapshot. The first call in a process probes synchronously;
+        a snapshot older than 3 intervals (refresher stuck) is reported as not ready.
+        """
+        self.start()
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.check_now()
+
+        age = time.time() - snapshot["checked_at"]
+        if age > settings.HEALTH_CHECK_INTERVAL * 3:
+            return dict(snapshot, ready=False, healthy=False, stale=True, age_seconds=round(age, 1))
+        return dict(snapshot, age_seconds=round(age, 1))
+
+
+class WarmUp:
+    """
+    One-shot background preload of the counter backends (see counters.warm_up),
+    the occupancy forecaster (see forecasting.warm_start) and the zone geo index
+    """
+
+    def __init__(self):
+        self.done = False
+        self.errors = {}
+        self.seconds = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        from .counters import warm_up
+
+        start = time.perf_counter()
+        try:
+            self.errors = warm_up()
+            if settings.FORECAST_ENABLED:
+                self.errors["forecast"] = self._warm_forecaster()
+            self.errors["geo"] = self._warm_zone_index()
+        except Exception as e:
+            self.errors = {"warm_up": str(e)}
+        finally:
+            connections.close_all()
+            self.seconds = round(time.perf_counter() - start, 3)
+            # Failures are reported but don't block readiness; requests fall back to lazy loading
+            self.done = True
+
+    def _warm_forecaster(self):
+        try:
+            from .forecasting import warm_start
+
+            warm_start()
+        except Exception as e:
+            return str(e)
+        return None
+
+    def _warm_zone_index(self):
+        try:
+            from .geo import get_zone_catalog
+
+            get_zone_catalog()
+        except Exception as e:
+            return str(e)
+        return None
+
+
+monitor = HealthMonitor()
+warmup = WarmUp()
@@ -0,0 +1,324 @@
+"""
+Camera liveness: last-seen times kept off the database on the hot path.
+
+Every `sensor_detect` call and every POST /cameras/<id>/heartbeat/ calls
+`beat()`. That records the time in a store (HEARTBEAT_BACKEND) and marks the
+camera dirty. A ping costs no query.
+
+Stores:
+- "memory": per process. Entries older than CAMERA_STALE_SECONDS are dropped,
+  because by then the database has them.
+- "cache":  shared through the HEARTBEAT_CACHE Django cache (e.g. Redis).
+  There is one key per camera, and a list read is one get_many.
+
+A daemon thread writes the dirty cameras every HEARTBEAT_FLUSH_SECONDS as
+one UPDATE per HEARTBEAT_FLUSH_BATCH cameras (a CASE over the ids), so a
+camera pinging every second is written at most once per interval. The
+UPDATE only moves `last_seen_at` forward, so workers flushing in any order
+agree.
+
+`sweep()` (the `sweep_cameras` command) compares `last_seen_at` with
+CAMERA_STALE_SECONDS. It sets `stale_since` on cameras that went quiet and
+clears it on cameras that came back. Each transition raises a Notification
+for the camera's organization. The database lags a ping by at most
+HEARTBEAT_FLUSH_SECONDS, well under the stale threshold.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .metrics import register_collector
+from .serving import on_drain
+from .models import Camera, Notification
+from .notifications import audience_key
+
+ONLINE = "online"
+STALE = "stale"
+NEVER_SEEN = "never_seen"
+INACTIVE = "inactive"
+
+
+def _as_datetime(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc) if ts is not None else None
+
+
+# ==========================================
+# STORES
+# ==========================================
+
+class MemoryHeartbeats:
+    """ Per-process last-seen times, oldest first """
+
+    def __init__(self, stale_seconds=None):
+        self.stale_seconds = settings.CAMERA_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self._seen = OrderedDict()  # camera_id -> timestamp
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        # Oldest first, so this stops at the first fresh camera (amortized O(1))
+        cutoff = now - self.stale_seconds
+        while self._seen and next(iter(self._seen.values())) < cutoff:
+            self._seen.popitem(last=False)
+
+    def beat(self, camera_id, now):
+        with self._lock:
+            self._seen.pop(camera_id, None)
+            self._seen[camera_id] = now
+            self._expire(now)
+
+    def last_seen_many(self, camera_ids):
+        with self._lock:
+            return {c: self._seen[c] for c in camera_ids if c in self._seen}
+
+
+class CacheHeartbeats:
+    """ Shared last-seen times on a Django cache; keys expire on their own """
+
+    def __init__(self, alias=None, stale_seconds=None):
+        self.cache = caches[alias or settings.HEARTBEAT_CACHE]
+        self.stale_seconds = settings.CAMERA_STALE_SECONDS if stale_seconds is None else stale_seconds
+
+    def _key(self, camera_id):
+        return f"hb:cam:{camera_id}"
+
+    def beat(self, camera_id, now):
+        self.cache.set(self._key(camera_id), now, timeout=self.stale_seconds)
+
+    def last_seen_many(self, camera_ids):
+        keys = {self._key(c): c for c in camera_ids}
+        return {keys[k]: ts for k, ts in self.cache.get_many(list(keys)).items()}
+
+
+HEARTBEAT_BACKENDS = {
+    "memory": MemoryHeartbeats,
+    "cache": CacheHeartbeats,
+}
+
+
+# ==========================================
+# COALESCED FLUSH
+# ==========================================
+
+class HeartbeatFlusher:
+    """ Latest ping per camera since the last flush, written by a daemon thread """
+
+    def __init__(self, store, flush_seconds=None, batch_size=None):
+        self.store = store
+        self.flush_seconds = settings.HEARTBEAT_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.batch_size = batch_size or settings.HEARTBEAT_FLUSH_BATCH
+        self._dirty = {}  # camera_id -> latest timestamp
+        self._known = {}  # camera_id -> (organization_id, monotonic time looked up), for the heartbeat endpoint
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_cameras = 0
+        self.failures = 0
+
+    def beat(self, camera_id, now=None):
+        now = time.time() if now is None else now
+        self.store.beat(camera_id, now)
+        with self._lock:
+            if now > self._dirty.get(camera_id, 0):
+                self._dirty[camera_id] = now
+        self.start()
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def organization_of(self, camera_id, now=None):
+        """
+        The camera's organization id (Camera.DoesNotExist if there is no such
+        camera). One query the first time per process; saves and deletes here
+        drop the entry (camera_changed), and it is looked up again after
+        CAMERA_STALE_SECONDS for changes made by other processes.
+        """
+        now = time.monotonic() if now is None else now
+        known = self._known.get(camera_id)
+        if known is not None and now - known[1] < settings.CAMERA_STALE_SECONDS:
+            return known[0]
+        organization_id = Camera.objects.values_list('organization_id', flat=True).get(pk=camera_id)
+        with self._lock:
+            self._known[camera_id] = (organization_id, now)
+        return organization_id
+
+    def forget(self, camera_id):
+        with self._lock:
+            self._known.pop(camera_id, None)
+
+    def flush(self):
+        """ Writes every dirty camera; returns how many """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, {}
+            if not batch:
+                return 0
+            try:
+                write_last_seen(batch, self.batch_size)
+            except Exception:
+                # Merge back (keeping the newer time) so the next flush retries
+                with self._lock:
+                    for camera_id, ts in batch.items():
+                        if ts > self._dirty.get(camera_id, 0):
+                            self._dirty[camera_id] = ts
+                self.failures += 1
+                raise
+            self.flushes += 1
+            self.flushed_cameras += len(batch)
+            return len(batch)
+
+    def start(self):
+        """ Starts the flusher once per process """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="heartbeat-flush", daemon=True)
+            self._thread.start()
+            on_drain('heartbeats', lambda deadline: self._flush_quietly())
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self._flush_quietly()
+
+    def _flush_quietly(self):
+        try:
+            close_old_connections()
+            return self.flush()
+        except Exception:
+            pass  # Retried on the next tick; counted in ecoflow_heartbeat_flush_failures_total
+
+
+def write_last_seen(batch, batch_size=None):
+    """ `batch` maps camera_id -> timestamp; one UPDATE per `batch_size` cameras """
+    batch_size = batch_size or settings.HEARTBEAT_FLUSH_BATCH
+    items = sorted(batch.items())  # id order, so concurrent flushes lock rows alike
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        seen = Case(*[When(pk=camera_id, then=Value(_as_datetime(ts))) for camera_id, ts in chunk],
+                    output_field=DateTimeField())
+        # Never moves backwards: another worker may already have written a later ping
+        Camera.objects.filter(pk__in=[camera_id for camera_id, _ in chunk]).update(
+            last_seen_at=Greatest(Coalesce(F('last_seen_at'), seen), seen),
+        )
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def get_heartbeats():
+    """ The process-wide flusher (and its store) for HEARTBEAT_BACKEND """
+    global _flusher
+    if _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = HeartbeatFlusher(HEARTBEAT_BACKENDS[settings.HEARTBEAT_BACKEND]())
+    return _flusher
+
+
+def beat(camera_id, now=None):
+    """ Records a ping; written to the database by the next flush """
+    get_heartbeats().beat(camera_id, now)
+
+
+def camera_changed(instance, **kwargs):
+    """ post_save/post_delete receiver: the camera's next heartbeat looks it up again """
+    if _flusher is not None:
+        _flusher.forget(instance.pk)
+
+
+@register_collector
+def collect():
+    if _flusher is None:
+        return []
+    return [
+        "# TYPE ecoflow_heartbeat_pending gauge",
+        f"ecoflow_heartbeat_pending {_flusher.pending()}",
+        "# TYPE ecoflow_heartbeat_flushes_total counter",
+        f"ecoflow_heartbeat_flushes_total {_flusher.flushes}",
+        "# TYPE ecoflow_heartbeat_flushed_cameras_total counter",
+        f"ecoflow_heartbeat_flushed_cameras_total {_flusher.flushed_cameras}",
+        "# TYPE ecoflow_heartbeat_flush_failures_total counter",
+        f"ecoflow_heartbeat_flush_failures_total {_flusher.failures}",
+    ]
+
+
+# ==========================================
+# LIVE STATUS
+# ==========================================
+
+def last_seen(cameras):
+    """ {camera_id: last-seen datetime} for `cameras`: the store, else the flushed column (no query) """
+    live = get_heartbeats().store.last_seen_many([camera.pk for camera in cameras])
+    result = {}
+    for camera in cameras:
+        ts = live.get(camera.pk)
+        stored = camera.last_seen_at
+        result[camera.pk] = max(filter(None, [_as_datetime(ts), stored]), default=None)
+    return result
+
+
+def camera_status(camera, seen_at, now=None):
+    """ "online", "stale", "never_seen" or "inactive" """
+    if not camera.is_active:
+        return INACTIVE
+    if seen_at is None:
+        return NEVER_SEEN
+    now = now or timezone.now()
+    if (now - seen_at).total_seconds() > settings.CAMERA_STALE_SECONDS:
+        return STALE
+    return ONLINE
+
+
+# ==========================================
+# SWEEPER
+# ==========================================
+
+def sweep(now=None):
+    """ Flags cameras that went quiet and clears those that came back: {"stale": n, "recovered": n} """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.CAMERA_STALE_SECONDS)
+    fields = ('id', 'name', 'last_seen_at', 'zone__organization_id')
+
+    with transaction.atomic():
+        # Locked rows are skipped, so two sweepers never notify the same transition twice
+        went_stale = list(Camera.objects
+                          .filter(is_active=True, stale_since__isnull=True, last_seen_at__lt=cutoff)
+                          .select_for_update(skip_locked=True, of=('self',)).values_list(*fields))
+        recovered = list(Camera.objects
+                         .filter(stale_since__isnull=False, last_seen_at__gte=cutoff)
+                         .select_for_update(skip_locked=True, of=('self',)).values_list(*fields))
+        if went_stale:
+            Camera.objects.filter(id__in=[c[0] for c in went_stale]).update(stale_since=now)
+        if recovered:
+            Camera.objects.filter(id__in=[c[0] for c in recovered]).update(stale_since=None)
+        notifications = [
+            Notification(
+                title=f"Camera offline: {name}",
+                message=f"Camera {camera_id} has not reported since {seen:%Y-%m-%d %H:%M} UTC.",
+                audience=audience_key(organization_id=organization_id),
+            )
+            for camera_id, name, seen, organization_id in went_stale
+        ] + [
+            Notification(
+                title=f"Camera back online: {name}",
+                message=f"Camera {camera_id} is reporting again.",
+                audience=audience_key(organization_id=organization_id),
+            )
+            for camera_id, name, _, organization_id in recovered
+        ]
+        if notifications:
+            Notification.objects.bulk_create(notifications)
+    return {"stale": len(went_stale), "recovered": len(recovered)}
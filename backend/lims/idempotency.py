@@ -0,0 +1,227 @@
+"""
+Request deduplication for retried uploads (Idempotency-Key).
+
+A camera on a flaky network retries `/sensor/detect/` when it misses the
+response. Without deduplication, every retry runs SAHI and the reference
+counter again and inserts another CarbonLog. `run_once(key, compute)`
+changes that:
+
+- the first request with a key claims it and runs `compute`. Its response
+  is stored for IDEMPOTENCY_TTL_SECONDS;
+- a retry that arrives after the original finished gets the stored response
+  back (replayed), with no external call;
+- a retry that arrives while the original is still running waits for that
+  result (single-flight) instead of starting the pipeline again. It gives up
+  after IDEMPOTENCY_WAIT_SECONDS (InFlight, answered with 409 + Retry-After).
+
+5xx responses are not stored: the key is released, so a retry once the
+crowd service is back runs the pipeline.
+
+Stores (IDEMPOTENCY_BACKEND):
+- "memory": per process, at most IDEMPOTENCY_MAX_KEYS results, oldest
+  evicted first. Waiters block on an Event.
+- "cache":  shared through the IDEMPOTENCY_CACHE Django cache (e.g. Redis).
+  The claim is an atomic cache.add(); waiters poll. A claim expires after
+  IDEMPOTENCY_LOCK_SECONDS, in case its worker dies mid-request.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import register_collector
+
+OWNER = "owner"
+DONE = "done"
+PENDING = "pending"
+
+_PENDING_MARKER = "__pending__"
+
+
+class InFlight(Exception):
+    """ The original request still holds the key after IDEMPOTENCY_WAIT_SECONDS """
+
+
+# ==========================================
+# STORES
+# ==========================================
+
+class MemoryIdempotencyStore:
+    """ Per-process results (bounded, TTL) plus an Event per in-flight key """
+
+    def __init__(self, ttl_seconds=None, max_keys=None):
+        self.ttl_seconds = settings.IDEMPOTENCY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_keys = settings.IDEMPOTENCY_MAX_KEYS if max_keys is None else max_keys
+        self._results = OrderedDict()  # key -> (expires_at, result); oldest first
+        self._inflight = {}  # key -> Event, set when the owner completes or releases
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._results and next(iter(self._results.values()))[0] < now:
+            self._results.popitem(last=False)
+
+    def claim(self, key):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self._results:
+                return DONE, self._results[key][1]
+            if key in self._inflight:
+                return PENDING, None
+            self._inflight[key] = threading.Event()
+            return OWNER, None
+
+    def wait(self, key, timeout):
+        """ Blocks until `key` is no longer in flight; False on timeout """
+        with self._lock:
+            event = self._inflight.get(key)
+        return event is None or event.wait(timeout)
+
+    def complete(self, key, result):
+        with self._lock:
+            self._results[key] = (time.time() + self.ttl_seconds, result)
+            while len(self._results) > self.max_keys:
+                self._results.popitem(last=False)
+            event = self._inflight.pop(key, None)
+        if event:
+            event.set()
+
+    def release(self, key):
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event:
+            event.set()
+
+
+class CacheIdempotencyStore:
+    """ Shared store on a Django cache; cache.add() makes the claim atomic """
+
+    poll_seconds = 0.05
+
+    def __init__(self, alias=None, ttl_seconds=None, lock_seconds=None):
+        self.cache = caches[alias or settings.IDEMPOTENCY_CACHE]
+        self.ttl_seconds = settings.IDEMPOTENCY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.lock_seconds = settings.IDEMPOTENCY_LOCK_SECONDS if lock_seconds is None else lock_seconds
+
+    def _key(self, key):
+        return f"idem:{key}"
+
+    def claim(self, key):
+        value = self.cache.get(self._key(key))
+        if value is None and self.cache.add(self._key(key), _PENDING_MARKER, timeout=self.lock_seconds):
+            return OWNER, None
+        if value is None:
+            value = self.cache.get(self._key(key))  # Lost the race: see what the winner left
+        if value is None or value == _PENDING_MARKER:
+            return PENDING, None
+        return DONE, value
+
+    def wait(self, key, timeout):
+        deadline = time.monotonic() + timeout
+        while self.cache.get(self._key(key)) == _PENDING_MARKER:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_seconds)
+        return True
+
+    def complete(self, key, result):
+        self.cache.set(self._key(key), result, timeout=self.ttl_seconds)
+
+    def release(self, key):
+        self.cache.delete(self._key(key))
+
+
+IDEMPOTENCY_BACKENDS = {
+    "memory": MemoryIdempotencyStore,
+    "cache": CacheIdempotencyStore,
+}
+
+
+# ==========================================
+# SINGLE-FLIGHT
+# ==========================================
+
+class Deduplicator:
+    """ run_once() over a store, with counters for /api/metrics/ """
+
+    def __init__(self, store, wait_seconds=None):
+        self.store = store
+        self.wait_seconds = settings.IDEMPOTENCY_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0  # Replays that had to wait for the original
+        self.saved_external_calls = 0
+        self.conflicts = 0
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def run_once(self, key, compute, external_calls=lambda result: 0):
+        """
+        (result, replayed). `compute()` returns a (status, data) pair.
+        `external_calls(result)` says how many outbound calls it cost, so
+        replays can report what they saved.
+        """
+        deadline = time.monotonic() + self.wait_seconds
+        waited = False
+        while True:
+            state, result = self.store.claim(key)
+            if state == DONE:
+                self._count(replayed=1, coalesced=int(waited), saved_external_calls=external_calls(result))
+                return result, True
+            if state == OWNER:
+                try:
+                    result = compute()
+                except BaseException:
+                    self.store.release(key)
+                    raise
+                # Server-side failures are not final: let the next retry run again
+                if result[0] >= 500:
+                    self.store.release(key)
+                else:
+                    self.store.complete(key, result)
+                self._count(executed=1)
+                return result, False
+            # In flight elsewhere: wait for it, then look again (released keys are claimed anew)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.store.wait(key, remaining):
+                self._count(conflicts=1)
+                raise InFlight(key)
+            waited = True
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_deduplicator():
+    """ The process-wide deduplicator for IDEMPOTENCY_BACKEND """
+    global _deduplicator
+    if _deduplicator is None:
+        with _deduplicator_lock:
+            if _deduplicator is None:
+                _deduplicator = Deduplicator(IDEMPOTENCY_BACKENDS[settings.IDEMPOTENCY_BACKEND]())
+    return _deduplicator
+
+
+@register_collector
+def collect():
+    if _deduplicator is None:
+        return []
+    return [
+        "# TYPE ecoflow_idempotency_executed_total counter",
+        f"ecoflow_idempotency_executed_total {_deduplicator.executed}",
+        "# TYPE ecoflow_idempotency_replayed_total counter",
+        f"ecoflow_idempotency_replayed_total {_deduplicator.replayed}",
+        "# TYPE ecoflow_idempotency_coalesced_total counter",
+        f"ecoflow_idempotency_coalesced_total {_deduplicator.coalesced}",
+        "# TYPE ecoflow_idempotency_saved_external_calls_total counter",
+        f"ecoflow_idempotency_saved_external_calls_total {_deduplicator.saved_external_calls}",
+        "# TYPE ecoflow_idempotency_conflicts_total counter",
+        f"ecoflow_idempotency_conflicts_total {_deduplicator.conflicts}",
+    ]
@@ -0,0 +1,92 @@
+"""
+Alert lifecycle: auto-resolution and escalation of open alerts.
+
+`process_alerts` runs tick() every ALERT_LIFECYCLE_INTERVAL_SECONDS. A tick
+is a fixed number of set-based statements, however many cameras there are:
+
+- resolve: one UPDATE closes every open alert whose camera reported during
+  the last ALERT_RESOLVE_AFTER_MINUTES and stayed below ALERT_RESOLVE_RATIO
+  of its zone's capacity the whole time. Alerts are raised at 90%, so a
+  count hovering around the threshold doesn't open and close alerts in a
+  loop (hysteresis). The evidence is read from OccupancySample through the
+  (zone, timestamp) index. A camera that stops reporting is not resolved;
+  it escalates instead.
+- escalate: alerts open for ALERT_ESCALATE_AFTER_MINUTES since they were
+  created (or last escalated) go up one level, up to
+  ALERT_MAX_ESCALATION_LEVEL, in one UPDATE. Each escalation also creates a
+  Notification for the alert's organization (one INSERT).
+
+Closed alerts no longer block new ones: the next overcrowded detection on
+that camera raises a fresh alert.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import Alert, Notification, OccupancySample, User
+from .notifications import audience_key
+
+
+def resolve(now=None):
+    """ Closes the open alerts whose camera stayed below the hysteresis threshold. Returns the count. """
+    now = now or timezone.now()
+    since = now - timedelta(minutes=settings.ALERT_RESOLVE_AFTER_MINUTES)
+
+    samples = OccupancySample.objects.filter(
+        zone_id=OuterRef('camera__zone_id'), camera_id=OuterRef('camera_id'), timestamp__gte=since,
+    )
+    quiet = (Alert.objects
+             .filter(status=Alert.Status.OPEN, camera__isnull=False, created_at__lte=since)
+             .filter(Exists(samples))
+             .exclude(Exists(samples.filter(capacity_ratio__gte=settings.ALERT_RESOLVE_RATIO))))
+    # update() skips auto_now, hence updated_at
+    return quiet.update(status=Alert.Status.CLOSED, resolved_at=now, updated_at=now)
+
+
+def escalate(now=None, batch_size=None):
+    """ Raises the level of alerts open too long and notifies. Returns the count. """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.ALERT_ESCALATION_BATCH
+    cutoff = now - timedelta(minutes=settings.ALERT_ESCALATE_AFTER_MINUTES)
+
+    due = (Alert.objects
+           .filter(status=Alert.Status.OPEN, escalation_level__lt=settings.ALERT_MAX_ESCALATION_LEVEL)
+           .filter(Q(escalated_at__isnull=True, created_at__lte=cutoff) | Q(escalated_at__lte=cutoff))
+           .order_by('id'))
+    with transaction.atomic():
+        # Locked rows are skipped, so two workers never escalate (and notify) the same alert twice
+        alerts = list(due.select_for_update(skip_locked=True, of=('self',))
+                      .values_list('id', 'heading', 'escalation_level', 'created_at', 'organization_id')[:batch_size])
+        if not alerts:
+            return 0
+        Alert.objects.filter(id__in=[alert_id for alert_id, *_ in alerts]).update(
+            escalation_level=F('escalation_level') + 1, escalated_at=now, updated_at=now,
+        )
+        Notification.objects.bulk_create([
+            Notification(
+                title=f"Escalated (level {level + 1}): {heading}",
+                message=f"Alert {alert_id} has been open for {int((now - created_at).total_seconds() // 60)} minutes.",
+                # The alert's own tenant column; one without an organization goes to admins, never to everyone
+                audience=(audience_key(organization_id=organization_id) if organization_id
+                          else audience_key(role=User.Role.ADMIN)),
+            )
+            for alert_id, heading, level, created_at, organization_id in alerts
+        ])
+    return len(alerts)
+
+
+def tick(now=None):
+    """ One lifecycle pass: {"resolved": n, "escalated": n} """
+    now = now or timezone.now()
+    # Resolve first, so an alert that has just calmed down is not escalated
+    resolved = resolve(now)
+    escalated = 0
+    while True:
+        count = escalate(now)
+        escalated += count
+        if count < settings.ALERT_ESCALATION_BATCH:
+            break
+    return {"resolved": resolved, "escalated": escalated}
@@ -0,0 +1,257 @@
+"""
+Live occupancy: the latest people count per camera, rolled up to zone and
+organization without touching the database.
+
+`sensor_detect` pushes every count here. A camera that has not reported for
+LIVE_STALE_SECONDS drops out of the totals.
+
+Backends (LIVE_STATE_BACKEND):
+- "memory": per-process. Zone and organization totals are kept up to date on
+  every update, so a read is O(1) (plus O(zones) for the per-zone breakdown).
+  Each worker only sees the detections it served, so it only suits a
+  single-process server.
+- "cache":  shared through the Django cache (LIVE_STATE_CACHE). The default
+  with CACHE_BACKEND=redis. Zone and organization totals are counters
+  changed with incr(), so a zone read is one get_many round trip and an
+  organization read one per level (totals, zone list, per-zone breakdown),
+  whatever the number of cameras. Totals are kept per time window, and
+  cameras drop out after 3/4 to all of LIVE_STALE_SECONDS.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+LIVE_WINDOWS = 4  # Cache backend: counter windows per LIVE_STALE_SECONDS
+
+
+def _camera_key(camera_id, zone_id):
+    # Detections without a camera count as one anonymous source per zone
+    return camera_id if camera_id is not None else f"zone-{zone_id}"
+
+
+def _zone_payload(zone, now):
+    return dict(
+        zone,
+        updated_at=datetime.fromtimestamp(zone["updated_at"], tz=dt_timezone.utc),
+        age_seconds=round(now - zone["updated_at"], 1),
+    )
+
+
+def _org_payload(organization_id, zones, now):
+    return {
+        "organization_id": organization_id,
+        "people": sum(z["people"] for z in zones.values()),
+        "cameras": sum(z["cameras"] for z in zones.values()),
+        "zones": {zone_id: _zone_payload(zone, now) for zone_id, zone in zones.items()},
+    }
+
+
+class MemoryLiveState:
+    """ Per-process store with running zone/org totals """
+
+    def __init__(self, stale_seconds=None):
+        self.stale_seconds = settings.LIVE_STALE_SECONDS if stale_seconds is None else stale_seconds
+        # camera -> (count, at, zone_id, organization_id, capacity); least recently updated first
+        self._cameras = OrderedDict()
+        self._zones = {}  # zone_id -> {"people", "cameras", "capacity", "updated_at"}
+        self._orgs = {}   # organization_id -> {"people", "cameras", "zones": set}
+        self._lock = threading.Lock()
+
+    def _remove(self, camera):
+        count, _, zone_id, org_id, _ = self._cameras.pop(camera)
+        zone = self._zones[zone_id]
+        zone["people"] -= count
+        zone["cameras"] -= 1
+        org = self._orgs[org_id]
+        org["people"] -= count
+        org["cameras"] -= 1
+        if not zone["cameras"]:
+            del self._zones[zone_id]
+            org["zones"].discard(zone_id)
+        if not org["cameras"]:
+            del self._orgs[org_id]
+
+    def _expire(self, now):
+        # Oldest first, so this stops at the first fresh camera (amortized O(1))
+        cutoff = now - self.stale_seconds
+        while self._cameras:
+            camera, reading = next(iter(self._cameras.items()))
+            if reading[1] >= cutoff:
+                break
+            self._remove(camera)
+
+    def update(self, camera_id, zone_id, organization_id, count, capacity=0, now=None):
+        now = time.time() if now is None else now
+        camera = _camera_key(camera_id, zone_id)
+        with self._lock:
+            if camera in self._cameras:
+                self._remove(camera)
+            self._cameras[camera] = (count, now, zone_id, organization_id, capacity)
+
+            zone = self._zones.setdefault(zone_id, {"people": 0, "cameras": 0, "capacity": capacity, "updated_at": now})
+            zone["people"] += count
+            zone["cameras"] += 1
+            zone["capacity"] = capacity
+            zone["updated_at"] = now
+            org = self._orgs.setdefault(organization_id, {"people": 0, "cameras": 0, "zones": set()})
+            org["people"] += count
+            org["cameras"] += 1
+            org["zones"].add(zone_id)
+            self._expire(now)
+
+    def organization(self, organization_id, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            org = self._orgs.get(organization_id)
+            if org is None:
+                return _org_payload(organization_id, {}, now)
+            return _org_payload(organization_id, {z: dict(self._zones[z]) for z in org["zones"]}, now)
+
+    def zone(self, zone_id, organization_id=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            zone = self._zones.get(zone_id)
+            return _zone_payload(zone, now) if zone else None
+
+
+class CacheLiveState:
+    """
+    Shared store on a Django cache, with running totals per zone and organization.
+
+    Time is cut into LIVE_WINDOWS windows per LIVE_STALE_SECONDS. A total is a
+    (people, cameras) counter pair per window, changed with incr() (atomic on
+    Redis): a reading is added to the current window, and the camera's previous
+    reading, if still in a live window, is taken out of its own. A read sums the
+    live windows, so silent cameras drop out without a sweep, and a total that a
+    crashed worker left half-updated expires with its window.
+    """
+
+    def __init__(self, alias=None, stale_seconds=None):
+        self.cache = caches[alias or settings.LIVE_STATE_CACHE]
+        self.stale_seconds = settings.LIVE_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self.window_seconds = self.stale_seconds / LIVE_WINDOWS
+        self.timeout = self.stale_seconds + self.window_seconds
+
+    def _window(self, now):
+        return int(now // self.window_seconds)
+
+    def _live_windows(self, now):
+        window = self._window(now)
+        return range(window - LIVE_WINDOWS + 1, window + 1)
+
+    def _total_keys(self, scope, window):
+        return f"live:{scope}:{window}:people", f"live:{scope}:{window}:cameras"
+
+    def _incr(self, key, delta, timeout=DEFAULT_TIMEOUT):
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:  # First change in this window
+            if self.cache.add(key, delta, timeout=self.timeout if timeout is DEFAULT_TIMEOUT else timeout):
+                return delta
+            return self.cache.incr(key, delta)
+
+    def _sum(self, found, scope, now):
+        """ (people, cameras) of a scope over the live windows """
+        people = cameras = 0
+        for window in self._live_windows(now):
+            people_key, cameras_key = self._total_keys(scope, window)
+            people += found.get(people_key, 0)
+            cameras += found.get(cameras_key, 0)
+        return max(people, 0), max(cameras, 0)
+
+    def _keys(self, scope, now):
+        return [key for window in self._live_windows(now) for key in self._total_keys(scope, window)]
+
+    def update(self, camera_id, zone_id, organization_id, count, capacity=0, now=None):
+        now = time.time() if now is None else now
+        camera = _camera_key(camera_id, zone_id)
+        window = self._window(now)
+        # Readings of one camera are applied one at a time; one that arrives while the
+        # previous is still being applied is dropped (the camera's next frame replaces it)
+        lock_key = f"live:camera:{camera}:lock"
+        if not self.cache.add(lock_key, 1, timeout=5):
+            return
+        try:
+            deltas = Counter()
+            previous = self.cache.get(f"live:camera:{camera}")
+            if previous is not None and previous[5] in self._live_windows(now):
+                previous_count, _, previous_zone, previous_org, _, previous_window = previous
+                for scope in (f"org:{previous_org}", f"org:{previous_org}:zone:{previous_zone}"):
+                    people_key, cameras_key = self._total_keys(scope, previous_window)
+                    deltas[people_key] -= previous_count
+                    deltas[cameras_key] -= 1
+            for scope in (f"org:{organization_id}", f"org:{organization_id}:zone:{zone_id}"):
+                people_key, cameras_key = self._total_keys(scope, window)
+                deltas[people_key] += count
+                deltas[cameras_key] += 1
+            for key, delta in deltas.items():
+                if delta:
+                    self._incr(key, delta)
+            self.cache.set_many({
+                f"live:camera:{camera}": (count, now, zone_id, organization_id, capacity, window),
+                f"live:org:{organization_id}:zone:{zone_id}:meta": (capacity, now),
+            }, timeout=self.timeout)
+            # Append-only list of the organization's zones: add() lets one worker list a zone once
+            if self.cache.add(f"live:org:{organization_id}:zone:{zone_id}:listed", 1, timeout=None):
+                slot = self._incr(f"live:org:{organization_id}:zones", 1, timeout=None)  # Lives as long as the list
+                self.cache.set(f"live:org:{organization_id}:zones:{slot}", zone_id, timeout=None)
+        finally:
+            self.cache.delete(lock_key)
+
+    def _zone(self, found, organization_id, zone_id, now):
+        people, cameras = self._sum(found, f"org:{organization_id}:zone:{zone_id}", now)
+        if not cameras:
+            return None
+        capacity, at = found.get(f"live:org:{organization_id}:zone:{zone_id}:meta", (0, now))
+        return {"people": people, "cameras": cameras, "capacity": capacity, "updated_at": at}
+
+    def organization(self, organization_id, now=None):
+        now = time.time() if now is None else now
+        scope = f"org:{organization_id}"
+        list_key = f"live:{scope}:zones"
+        found = self.cache.get_many(self._keys(scope, now) + [list_key])
+        people, cameras = self._sum(found, scope, now)
+        zones = {}
+        if cameras:
+            slots = self.cache.get_many([f"{list_key}:{slot}" for slot in range(1, found.get(list_key, 0) + 1)])
+            zone_ids = set(slots.values())  # May trail the counter while a slot is being written
+            found = zone_ids and self.cache.get_many([key for zone_id in zone_ids for key in (
+                self._keys(f"{scope}:zone:{zone_id}", now) + [f"live:{scope}:zone:{zone_id}:meta"])])
+            for zone_id in zone_ids:
+                zone = self._zone(found, organization_id, zone_id, now)
+                if zone:
+                    zones[zone_id] = zone
+        return dict(_org_payload(organization_id, zones, now), people=people, cameras=cameras)
+
+    def zone(self, zone_id, organization_id, now=None):
+        now = time.time() if now is None else now
+        scope = f"org:{organization_id}:zone:{zone_id}"
+        zone = self._zone(self.cache.get_many(self._keys(scope, now) + [f"live:{scope}:meta"]),
+                          organization_id, zone_id, now)
+        return _zone_payload(zone, now) if zone else None
+
+
+LIVE_STATE_BACKENDS = {
+    "memory": MemoryLiveState,
+    "cache": CacheLiveState,
+}
+
+_live_state = None
+_live_state_lock = threading.Lock()
+
+
+def get_live_state():
+    """ The process-wide store for LIVE_STATE_BACKEND """
+    global _live_state
+    if _live_state is None:
+        with _live_state_lock:
+            if _live_state is None:
+                _live_state = LIVE_STATE_BACKENDS[settings.LIVE_STATE_BACKEND]()
+    return _live_state
@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+from lims.db import connect_counts, pool_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts database connections opened per 1k requests with the current DATABASES "
+        "settings (persistent, pooled or neither). Requests go straight to the WSGI app from "
+        "a fixed set of threads, like gunicorn gthread workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8, help="Worker threads")
+        parser.add_argument('--paths', default="/organizations/,/zones/,/alerts/,/notifications/",
+                            help="Comma-separated GET paths, used round-robin")
+
+    def handle(self, *args, **options):
+        application = get_wsgi_application()
+        paths = [p for p in options['paths'].split(',') if p]
+        total = options['requests']
+        statuses = []
+        lock = threading.Lock()
+
+        def one(i):
+            environ = {'PATH_INFO': paths[i % len(paths)], 'REQUEST_METHOD': 'GET', 'HTTP_HOST': 'localhost'}
+            setup_testing_defaults(environ)
+            result = {}
+
+            def start_response(status, headers, exc_info=None):
+                result['status'] = status
+
+            response = application(environ, start_response)
+            try:
+                for _ in response:
+                    pass
+            finally:
+                # Fires request_finished, which applies CONN_MAX_AGE like a real server
+                response.close()
+            with lock:
+                statuses.append(result['status'])
+
+        connects_before = sum(connect_counts().values())
+        opened_before = sum(s.get('connections_num', 0) for s in pool_stats().values())
+        wait_before = sum(s.get('requests_wait_ms', 0) for s in pool_stats().values())
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+
+        connects = sum(connect_counts().values()) - connects_before
+        stats = pool_stats()
+        pooled = bool(stats)
+        opened = (sum(s.get('connections_num', 0) for s in stats.values()) - opened_before) if pooled else connects
+        wait_ms = sum(s.get('requests_wait_ms', 0) for s in stats.values()) - wait_before
+
+        db = connections['default'].settings_dict
+        errors = sum(1 for s in statuses if not s.startswith(('2', '3', '4')))
+        per_1k = 1000 / total
+
+        self.stdout.write(f"Database: {db['ENGINE']}  CONN_MAX_AGE={db.get('CONN_MAX_AGE')}  pool={db['OPTIONS'].get('pool', False)}")
+        self.stdout.write(f"Requests: {total} with {options['concurrency']} threads in {elapsed:.2f}s ({total / elapsed:.0f} req/s, {errors} errors)")
+        self.stdout.write(f"Django connects (pool checkouts when pooled): {connects} ({connects * per_1k:.1f} per 1k requests)")
+        self.stdout.write(f"Physical connections opened:                  {opened} ({opened * per_1k:.1f} per 1k requests)")
+        if pooled:
+            self.stdout.write(f"Pool wait: {wait_ms} ms total ({wait_ms / total:.2f} ms per request)")
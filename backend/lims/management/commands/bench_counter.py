@@ -0,0 +1,60 @@
+import io
+import time
+
+import PIL.Image
+from django.core.management.base import BaseCommand, CommandError
+
+from lims.counters import LocalCounter, _local_count
+
+
+def _timed_count(image_data, input_size, score_threshold, person_class):
+    """ Runs in a pool worker; returns inference latency in seconds """
+    start = time.perf_counter()
+    _local_count(image_data, input_size, score_threshold, person_class)
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = "CPU benchmark of the local counter backend: frames/sec per core for 1..N workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help="ONNX model path (defaults to LOCAL_COUNTER_MODEL_PATH)")
+        parser.add_argument('--image', help="Frame to count (defaults to a synthetic 1280x720 JPEG)")
+        parser.add_argument('--frames', type=int, default=200, help="Frames per run")
+        parser.add_argument('--max-workers', type=int, default=None, help="Largest pool size to try")
+
+    def handle(self, *args, **options):
+        if options['image']:
+            with open(options['image'], 'rb') as f:
+                image_data = f.read()
+        else:
+            buf = io.BytesIO()
+            PIL.Image.new('RGB', (1280, 720), (120, 120, 120)).save(buf, format='JPEG', quality=85)
+            image_data = buf.getvalue()
+
+        max_workers = options['max_workers'] or LocalCounter().workers
+        frames = options['frames']
+
+        self.stdout.write(f"{'workers':>8} {'frames/s':>10} {'frames/s/core':>14} {'p50 ms':>8}")
+        for workers in range(1, max_workers + 1):
+            counter = LocalCounter(model_path=options['model'], workers=workers)
+            try:
+                pool = counter.get_pool()
+            except Exception as e:
+                raise CommandError(str(e))
+
+            job = (counter.input_size, counter.score_threshold, counter.person_class)
+
+            # Warm every worker (session load is not part of the steady state)
+            for future in [pool.submit(_timed_count, image_data, *job) for _ in range(workers)]:
+                future.result()
+
+            start = time.perf_counter()
+            futures = [pool.submit(_timed_count, image_data, *job) for _ in range(frames)]
+            latencies = sorted(future.result() for future in futures)
+            elapsed = time.perf_counter() - start
+            counter.shutdown()
+
+            fps = frames / elapsed
+            p50 = latencies[len(latencies) // 2] * 1000
+            self.stdout.write(f"{workers:>8} {fps:>10.1f} {fps / workers:>14.1f} {p50:>8.1f}")
@@ -0,0 +1,246 @@
+import json
+import platform
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from lims import counters
+from lims.benchmarking import FakeCrowdService, FakeGeminiService, bench_context, find_regressions, summarize
+from lims.management.commands.seed_benchdata import BENCH_EMAIL, BENCH_PASSWORD
+
+
+class QuietHandler(WSGIRequestHandler):
+    # Headers and body go out in separate writes; Nagle would add ~40 ms per keep-alive request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _url_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every named URL at several concurrency levels with the crowd service and "
+        "Gemini replaced by local stubs. Records throughput, p50/p95/p99 and query counts, "
+        "and compares against a JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default="1,8,32", help="Comma-separated levels")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per URL per level")
+        parser.add_argument('--only', default="", help="Comma-separated URL names to run")
+        parser.add_argument('--base-url', help=(
+            "Benchmark an already running server instead of an in-process one. Start it with "
+            "CROWD_PREDICT_URL/GEMINI_API_ENDPOINT pointing at the printed stub URLs "
+            "and DEBUG=True (or QUERY_COUNT_HEADERS=True) for query counts."
+        ))
+        parser.add_argument('--crowd-latency', type=float, default=0.05, help="Seconds")
+        parser.add_argument('--gemini-latency', type=float, default=0.3, help="Seconds")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Seconds, applied to both stubs")
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'bench_baseline.json'))
+        parser.add_argument('--update-baseline', action='store_true', help="Write results as the new baseline")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Allowed latency/throughput drift (fraction)")
+        parser.add_argument('--output', help="Also write this run's results here")
+
+    def handle(self, *args, **options):
+        levels = [int(x) for x in options['concurrency'].split(',') if x]
+        only = {x for x in options['only'].split(',') if x}
+
+        crowd = FakeCrowdService(latency=options['crowd_latency'], jitter=options['jitter']).start()
+        gemini = FakeGeminiService(latency=options['gemini_latency'], jitter=options['jitter']).start()
+        self.stdout.write(f"Crowd stub:  {crowd.url}\nGemini stub: {gemini.base_url}")
+
+        server = None
+        if options['base_url']:
+            base_url = options['base_url'].rstrip('/')
+        else:
+            counters.get_counter('sahi').url = crowd.url
+            counters.configure_gemini(api_endpoint=gemini.base_url)
+            settings.QUERY_COUNT_HEADERS = True
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+            server.daemon_threads = True
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            context = bench_context(base_url)
+            scenarios = self._scenarios(context)
+
+            names = list(dict.fromkeys(_url_names(get_resolver().url_patterns)))
+            uncovered = [n for n in names if n not in scenarios]
+            if uncovered:
+                self.stderr.write(f"No scenario for: {', '.join(uncovered)}")
+
+            results = {}
+            self.stdout.write(f"{'endpoint':<32} {'conc':>5} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'err':>5}")
+            for name in names:
+                if name not in scenarios or (only and name not in only):
+                    continue
+                for level in levels:
+                    stats = self._run(base_url, scenarios[name], level, options['requests'])
+                    results[f"{name}@{level}"] = stats
+                    self.stdout.write(
+                        f"{name:<32} {level:>5} {stats['rps']:>9} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+                        f"{stats['p99_ms']:>8} {str(stats['queries_mean']):>8} {stats['errors']:>5}"
+                    )
+        finally:
+            if server is not None:
+                server.shutdown()
+            crowd.stop()
+            gemini.stop()
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "database": settings.DATABASES['default']['ENGINE'],
+                "requests_per_level": options['requests'],
+                "crowd_latency": options['crowd_latency'],
+                "gemini_latency": options['gemini_latency'],
+            },
+            "results": results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        if options['update_baseline']:
+            with open(options['baseline'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        try:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            self.stdout.write(f"No baseline at {options['baseline']}; run with --update-baseline to create one.")
+            return
+
+        regressions = find_regressions(baseline['results'], results, options['threshold'])
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
+
+    # ------------------------------------------------------------------
+
+    def _scenarios(self, ctx):
+        """ URL name -> callable returning the kwargs of one `requests` call """
+        auth = {"Authorization": f"Bearer {ctx['access']}"}
+
+        def get(name, params=None, signed_in=True, **kwargs):
+            # Tenant-scoped reads sign in as the bench user (a member of ctx['org'])
+            return lambda: {"method": "GET", "url": reverse(name, kwargs=kwargs or None), "params": params,
+                            "headers": auth if signed_in else None}
+
+        def detect():
+            return {
+                "method": "POST", "url": reverse('sensor-detect'), "headers": auth,
+                "data": {"zone_id": ctx['zone'], "camera_id": ctx['camera']},
+                "files": {"file": ("frame.jpg", ctx['image'], "image/jpeg")},
+            }
+
+        def register():
+            return {"method": "POST", "url": reverse('register'), "json": {
+                "email": f"bench-{uuid.uuid4().hex}@ecoflow.local", "password": BENCH_PASSWORD,
+            }}
+
+        return {
+            'system_status': get('system_status', signed_in=False),
+            'system_health': get('system_health', signed_in=False),
+            'system_metrics': get('system_metrics', signed_in=False),
+            'register': register,
+            'login': lambda: {"method": "POST", "url": reverse('login'),
+                              "json": {"email": BENCH_EMAIL, "password": BENCH_PASSWORD}},
+            # Rotation blacklists the old refresh token, so every call needs a fresh one
+            'token_refresh': None,
+            'current_user': lambda: {"method": "GET", "url": reverse('current_user'), "headers": auth},
+            'points-leaderboard': lambda: {"method": "GET", "url": reverse('points-leaderboard'), "headers": auth},
+            'organization-list-create': get('organization-list-create'),
+            'organization-detail': get('organization-detail', pk=ctx['org']),
+            'zone-list-create': get('zone-list-create', params={"org_id": ctx['org']}),
+            'zone-detail': get('zone-detail', pk=ctx['zone']),
+            'camera-list-create': get('camera-list-create', params={"zone_id": ctx['zone']}),
+            'camera-detail': get('camera-detail', pk=ctx['camera']),
+            'camera-heartbeat': lambda: {"method": "POST", "headers": auth,
+                                         "url": reverse('camera-heartbeat', kwargs={"pk": ctx['camera']})},
+            'alert-list-create': get('alert-list-create', params={"status": "OPEN"}),
+            'alert-detail': get('alert-detail', pk=ctx['alert']),
+            # Signed in: page + read cursor + unread count
+            'notification-list-create': lambda: {"method": "GET", "url": reverse('notification-list-create'),
+                                                 "headers": auth},
+            'notification-read': lambda: {"method": "POST", "url": reverse('notification-read'),
+                                          "headers": auth, "json": {}},
+            'notification-detail': get('notification-detail', pk=ctx['notification']),
+            'sensor-detect': detect,
+            'get-carbon-stats': get('get-carbon-stats', params={"zone_id": ctx['zone']}),
+            'organization-live': get('organization-live', pk=ctx['org']),
+            'zone-live': get('zone-live', pk=ctx['zone']),
+            'zones-bbox': get('zones-bbox', params={"min_lat": -90, "min_lon": -180, "max_lat": 90,
+                                                    "max_lon": 180, "live": 1}),
+            'zones-nearest': get('zones-nearest', params={"lat": 0, "lon": 0, "k": 10}),
+            'occupancy-history': get('occupancy-history', params={"zone_id": ctx['zone'], "resolution": "minute"}),
+        }
+
+    def _run(self, base_url, scenario, concurrency, total):
+        if scenario is None:
+            scenario = self._refresh_scenario(base_url)
+
+        local = threading.local()
+        latencies, query_counts = [], []
+        errors = 0
+        lock = threading.Lock()
+
+        def one(_):
+            nonlocal errors
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            kwargs = scenario()
+            kwargs['url'] = base_url + kwargs['url']
+
+            start = time.perf_counter()
+            try:
+                resp = session.request(timeout=60, **kwargs)
+                ok = resp.status_code < 500
+                queries = resp.headers.get('X-DB-Queries')
+            except requests.RequestException:
+                ok, queries = False, None
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                latencies.append(elapsed)
+                if queries is not None:
+                    query_counts.append(int(queries))
+                if not ok:
+                    errors += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        return summarize(latencies, time.perf_counter() - start, query_counts, errors)
+
+    def _refresh_scenario(self, base_url):
+        """ Each refresh consumes a token, so log in (untimed) before every call to mint one """
+        def scenario():
+            resp = requests.post(f"{base_url}{reverse('login')}", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+            return {"method": "POST", "url": reverse('token_refresh'), "json": {"refresh": resp.json()['refresh']}}
+
+        return scenario
@@ -0,0 +1,126 @@
+import os
+import resource
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from lims.exports import FORMATS, ExportError, export_stream
+from lims.models import CarbonLog, Zone
+
+
+class RssSampler:
+    """ Samples resident set size in a background thread (Linux /proc; ru_maxrss elsewhere) """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = self.start = self.current()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def _mb(n):
+    return n / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports every CarbonLog row through lims.exports (the /bulk/export/ code path) and "
+        "records throughput and peak RSS per format. --seed tops the table up to --rows first "
+        "with set-based INSERTs; use a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--formats', default='csv,ndjson,parquet', help="Comma-separated")
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--seed', action='store_true', help="Insert rows until the table holds --rows")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        formats = [f for f in options['formats'].split(',') if f]
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise CommandError(f"Unknown formats: {', '.join(sorted(unknown))}")
+
+        existing = CarbonLog.objects.count()
+        if existing < options['rows']:
+            if not options['seed']:
+                raise CommandError(f"CarbonLog has {existing} rows; pass --seed to add {options['rows'] - existing}.")
+            missing = options['rows'] - existing
+            if options['interactive'] and input(f"Insert {missing} carbon logs into the configured database? [y/N] ").lower() != 'y':
+                raise CommandError("Cancelled.")
+            started = time.perf_counter()
+            self._seed(missing)
+            self.stdout.write(f"Seeded {missing} rows in {time.perf_counter() - started:.1f}s")
+
+        total = CarbonLog.objects.count()
+        self.stdout.write(f"Exporting {total} carbon logs ({connection.vendor}), gzip={options['gzip']}")
+        self.stdout.write(f"{'format':<8} {'seconds':>8} {'rows/s':>10} {'MB out':>8} {'RSS MB':>8} {'peak MB':>8} {'growth':>8}")
+
+        for fmt in formats:
+            try:
+                chunks, _, _ = export_stream('carbonlogs', fmt, 'gzip' if options['gzip'] else None)
+            except ExportError as e:
+                self.stderr.write(f"{fmt}: {e}")
+                continue
+            written = 0
+            started = time.perf_counter()
+            with RssSampler() as rss:
+                for chunk in chunks:
+                    written += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            seconds = time.perf_counter() - started
+            self.stdout.write(
+                f"{fmt:<8} {seconds:>8.1f} {total / seconds:>10,.0f} {_mb(written):>8.1f} "
+                f"{_mb(rss.start):>8.1f} {_mb(rss.peak):>8.1f} {_mb(rss.peak - rss.start):>8.1f}"
+            )
+
+    def _seed(self, count):
+        zones = list(Zone.objects.order_by('id').values_list('id', 'organization_id')[:50])
+        if not zones:
+            raise CommandError("No zones; run `manage.py seed_benchdata` first.")
+        table = CarbonLog._meta.db_table
+        per_zone, extra = divmod(count, len(zones))
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for i, (zone_id, organization_id) in enumerate(zones):
+                n = per_zone + (1 if i < extra else 0)
+                if not n:
+                    continue
+                # Generated in the database: no Python objects, no round trip per row
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        f"INSERT INTO {table} (zone_id, organization_id, saved_amount, formula_version, timestamp) "
+                        f"SELECT %s, %s, round((random() * 2)::numeric, 4), 1, now() - n * interval '1 second' "
+                        f"FROM generate_series(1, %s) AS n",
+                        [zone_id, organization_id, n],
+                    )
+                else:
+                    cursor.execute(
+                        f"INSERT INTO {table} (zone_id, organization_id, saved_amount, formula_version, timestamp) "
+                        f"WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                        f"SELECT %s, %s, abs(random() % 20000) / 10000.0, 1, datetime('now', '-' || n || ' seconds') FROM seq",
+                        [n, zone_id, organization_id],
+                    )
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lims.benchmarking import percentile
+from lims.forecasting import OccupancyForecaster, season_slot, to_minutes
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the occupancy forecaster on synthetic zones (no database): per-detection "
+        "update latency, batched warm-start and a forecast of every zone, on one core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zones', type=int, default=5000)
+        parser.add_argument('--warmup-minutes', type=int, default=360, help="Minute buckets per zone for warm-start")
+        parser.add_argument('--updates', type=int, default=20000, help="Single detections to time")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        zones, minutes = options['zones'], options['warmup_minutes']
+        now = timezone.now().replace(second=0, microsecond=0)
+        forecaster = OccupancyForecaster(initial_rows=zones)
+
+        # Warm-start: every zone, one observation per minute, daily-ish wave + noise
+        start_minute = to_minutes(now) - minutes
+        grid = start_minute + np.arange(minutes)
+        base = rng.uniform(10, 200, zones)
+        counts = base[:, None] * (1 + 0.3 * np.sin(grid / 120.0))[None, :] + rng.normal(0, 3, (zones, minutes))
+        slot_of = {m: season_slot(now - timedelta(minutes=float(to_minutes(now) - m))) for m in grid}
+
+        started = time.perf_counter()
+        forecaster.update_many(
+            np.repeat(np.arange(zones), minutes), np.maximum(counts, 0).ravel(),
+            np.tile(grid, zones), np.tile([slot_of[m] for m in grid], zones),
+        )
+        warm_seconds = time.perf_counter() - started
+
+        # Per-detection path: what sensor_detect pays
+        picks = rng.integers(0, zones, options['updates'])
+        latencies = []
+        for i, zone in enumerate(picks):
+            when = now + timedelta(seconds=i * 0.05)
+            t0 = time.perf_counter()
+            forecaster.update(int(zone), float(base[zone]), when)
+            forecaster.predict(int(zone), now=when)
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+
+        started = time.perf_counter()
+        ids, predicted, _ = forecaster.forecast(now=now)
+        forecast_seconds = time.perf_counter() - started
+
+        observations = zones * minutes
+        self.stdout.write(f"Zones: {zones}  warm-start observations: {observations}")
+        self.stdout.write(f"Warm-start:   {warm_seconds * 1000:9.1f} ms ({observations / warm_seconds:,.0f} obs/s)")
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        self.stdout.write(f"Detection:    p50 {p50:.3f} ms  p95 {p95:.3f} ms  p99 {p99:.3f} ms"
+                          f"  (update + predict, {options['updates']} calls)")
+        self.stdout.write(f"Forecast all: {forecast_seconds * 1000:9.1f} ms for {len(ids)} zones")
@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lims.benchmarking import percentile
+from lims.spatial import ZoneIndex, haversine_km
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the zone geo index on synthetic zones (no database): build time, bounding-box "
+        "queries of several sizes and k-nearest queries, checked against a full scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zones', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=500, help="Queries per scenario")
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--cell-degrees', type=float, default=None, help="Default: GEO_CELL_DEGREES")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        zones, queries = options['zones'], options['queries']
+
+        # Clustered like real deployments: cities of a few km, spread over a continent
+        centers = np.column_stack([rng.uniform(-35, 60, 200), rng.uniform(-20, 50, 200)])
+        picks = rng.integers(0, len(centers), zones)
+        lats = np.clip(centers[picks, 0] + rng.normal(0, 0.05, zones), -90, 90)
+        lons = np.clip(centers[picks, 1] + rng.normal(0, 0.05, zones), -180, 180)
+        ids = np.arange(1, zones + 1)
+        orgs = rng.integers(1, 500, zones)
+
+        started = time.perf_counter()
+        index = ZoneIndex(ids, orgs, lats, lons, cell_degrees=options['cell_degrees'] or settings.GEO_CELL_DEGREES)
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Zones: {zones}  cell: {index.cell} deg  build: {build_ms:.1f} ms")
+        self.stdout.write(f"{'query':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'avg hits':>10}")
+
+        for label, size in (("bbox 0.05 deg (street)", 0.05), ("bbox 0.5 deg (city)", 0.5),
+                            ("bbox 5 deg (region)", 5.0), ("bbox 30 deg (continent)", 30.0)):
+            latencies, hits = [], 0
+            for i in range(queries):
+                lat, lon = centers[rng.integers(0, len(centers))]
+                box = (lat - size / 2, lon - size / 2, lat + size / 2, lon + size / 2)
+                t0 = time.perf_counter()
+                found = index.bbox(*box)
+                latencies.append(time.perf_counter() - t0)
+                hits += len(found)
+                if i < 20:
+                    expected = np.count_nonzero((lats >= box[0]) & (lats <= box[2]) & (lons >= box[1]) & (lons <= box[3]))
+                    if expected != len(found):
+                        raise AssertionError(f"{label}: {len(found)} hits, full scan found {expected}")
+            self._row(label, latencies, hits / queries)
+
+        k = options['k']
+        latencies = []
+        for i in range(queries):
+            lat, lon = centers[rng.integers(0, len(centers))] + rng.normal(0, 0.5, 2)
+            t0 = time.perf_counter()
+            found, distances = index.nearest(lat, lon, k=k)
+            latencies.append(time.perf_counter() - t0)
+            if i < 20:
+                expected = np.sort(haversine_km(lat, lon, lats, lons))[:k]
+                if not np.allclose(distances, expected):
+                    raise AssertionError(f"nearest: distances differ from a full scan at ({lat}, {lon})")
+        self._row(f"nearest k={k}", latencies, k)
+
+    def _row(self, label, latencies, hits):
+        latencies.sort()
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        self.stdout.write(f"{label:<22}{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}{hits:>10.0f}")
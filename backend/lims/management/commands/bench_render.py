@@ -0,0 +1,72 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims.benchmarking import percentile
+from lims.compression import CODECS, available_encodings, compress
+from lims.models import Alert, Notification, Organization
+from lims.renderers import ORJSONRenderer, TimedJSONRenderer, orjson
+from lims.serializers import AlertSerializer, NotificationSerializer, OrganizationSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the largest list payloads (/organizations/ tree, /alerts/, a notification page) "
+        "from the database with the stdlib and orjson renderers, then compresses them with each "
+        "available encoding: render time, bytes on the wire and compression time. "
+        "Run `manage.py seed_benchdata` first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alerts', type=int, default=10000, help="Alerts in the /alerts/ payload")
+        parser.add_argument('--notifications', type=int, default=100, help="Notifications in the page")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per measurement")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson is not installed (pip install orjson).")
+        payloads = {
+            "organizations": OrganizationSerializer(
+                Organization.objects.prefetch_related('zones__cameras').order_by('-created_at'), many=True).data,
+            "alerts": AlertSerializer(Alert.objects.order_by('-created_at')[:options['alerts']], many=True).data,
+            "notifications": NotificationSerializer(
+                Notification.objects.order_by('-id')[:options['notifications']], many=True).data,
+        }
+        if not any(payloads.values()):
+            raise CommandError("No benchmark data; run `manage.py seed_benchdata` first.")
+
+        repeat = options['repeat']
+        stdlib, fast = TimedJSONRenderer(), ORJSONRenderer()
+        encodings = available_encodings()
+        skipped = sorted(set(CODECS) - set(encodings))
+        if skipped:
+            self.stdout.write(f"Not installed, skipped: {', '.join(skipped)}")
+
+        self.stdout.write(f"{'payload':<15}{'items':>7}{'KB':>9}{'json ms':>9}{'orjson ms':>10}{'speedup':>8}")
+        bodies = {}
+        for name, data in payloads.items():
+            slow_ms, body = self._time(lambda: stdlib.render(data), repeat)
+            fast_ms, fast_body = self._time(lambda: fast.render(data), repeat)
+            if json.loads(body) != json.loads(fast_body):
+                raise CommandError(f"{name}: orjson output differs from the stdlib renderer")
+            bodies[name] = fast_body
+            self.stdout.write(f"{name:<15}{len(data):>7}{len(fast_body) / 1024:>9.1f}{slow_ms:>9.2f}"
+                              f"{fast_ms:>10.2f}{slow_ms / fast_ms if fast_ms else 0:>7.1f}x")
+
+        self.stdout.write(f"\n{'payload':<15}{'encoding':<10}{'KB':>9}{'ratio':>8}{'ms':>8}")
+        for name, body in bodies.items():
+            for encoding in encodings:
+                ms, out = self._time(lambda: compress(encoding, body), repeat)
+                self.stdout.write(f"{name:<15}{encoding:<10}{len(out) / 1024:>9.1f}"
+                                  f"{len(body) / len(out):>7.1f}x{ms:>8.2f}")
+
+    @staticmethod
+    def _time(fn, repeat):
+        """ (p50 ms, last result) """
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            latencies.append(time.perf_counter() - started)
+        return percentile(sorted(latencies), 50) * 1000, result
@@ -0,0 +1,269 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from kazlat.gunicorn_conf import available_cpus, server_profile
+from lims.benchmarking import FakeCrowdService, FakeGeminiService, bench_context, summarize
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def parse_config(spec):
+    """
+    Matrix entry -> [(role, env)]; role is "detect", "crud" or "both" (the
+    traffic sent to that server). sync[:W], gthread:WxT (no detection cap),
+    all / detect / crud (the SERVER_POOL profiles), split (detect + crud servers).
+    """
+    name, _, arg = spec.partition(':')
+    if name == 'sync':
+        env = {"GUNICORN_WORKER_CLASS": "sync"}
+        if arg:
+            env["GUNICORN_WORKERS"] = arg
+        return [("both", env)]
+    if name == 'gthread':
+        workers, _, threads = arg.partition('x')
+        if not workers.isdigit() or not threads.isdigit():
+            raise CommandError(f"{spec}: expected gthread:<workers>x<threads>")
+        return [("both", {"GUNICORN_WORKERS": workers, "GUNICORN_THREADS": threads, "DETECT_MAX_CONCURRENCY": "0"})]
+    if name in ('all', 'detect', 'crud'):
+        return [("both", {"SERVER_POOL": name})]
+    if name == 'split':
+        return [("detect", {"SERVER_POOL": "detect"}), ("crud", {"SERVER_POOL": "crud"})]
+    raise CommandError(f"Unknown configuration {spec!r}")
+
+
+class Server:
+    """ One gunicorn master started from kazlat/gunicorn_conf.py """
+
+    def __init__(self, env, log_dir):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(os.environ, GUNICORN_BIND=f"127.0.0.1:{self.port}", GUNICORN_ACCESS_LOG="", **env)
+        self.log_path = os.path.join(log_dir, f"gunicorn-{self.port}.log")
+        self.process = None
+
+    def start(self, timeout=60):
+        log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', str(settings.BASE_DIR / 'kazlat' / 'gunicorn_conf.py'),
+             'kazlat.wsgi:application'],
+            cwd=settings.BASE_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"gunicorn exited with {self.process.returncode}; see {self.log_path}")
+            try:
+                if requests.get(f"{self.url}{reverse('system_live')}", timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop(kill=True)
+        raise CommandError(f"gunicorn did not answer within {timeout}s; see {self.log_path}")
+
+    def stop(self, kill=False):
+        """ SIGTERM (graceful) and wait; returns seconds until the master exited """
+        started = time.perf_counter()
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGKILL if kill else signal.SIGTERM)
+            try:
+                self.process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        return time.perf_counter() - started
+
+    def drained(self):
+        """ The workers' drain log lines """
+        with open(self.log_path) as f:
+            return [line.split('] ', 2)[-1].strip() for line in f if 'Drained' in line]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark matrix of gunicorn worker configurations (kazlat/gunicorn_conf.py). Each one "
+        "is started in turn and serves a mixed load: detection clients, with the crowd service and "
+        "Gemini replaced by local stubs, next to CRUD clients. The matrix reports throughput and "
+        "latency per traffic class. It then stops the server with SIGTERM while detections are in "
+        "flight and checks that they all complete. Run `manage.py seed_benchdata` first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--configs', default="sync,gthread:2x4,all,split",
+                            help="Comma-separated: sync[:W], gthread:WxT, all, detect, crud, split")
+        parser.add_argument('--detect-clients', type=int, default=16, help="Concurrent detection clients")
+        parser.add_argument('--crud-clients', type=int, default=16, help="Concurrent CRUD clients")
+        parser.add_argument('--duration', type=float, default=15, help="Seconds of load per configuration")
+        parser.add_argument('--in-flight', type=int, default=8, help="Detections in flight at SIGTERM")
+        parser.add_argument('--crowd-latency', type=float, default=0.05, help="Seconds")
+        parser.add_argument('--gemini-latency', type=float, default=0.3, help="Seconds")
+        parser.add_argument('--output', help="Also write the results here (JSON)")
+
+    def handle(self, *args, **options):
+        specs = [s for s in options['configs'].split(',') if s]
+        matrix = {spec: parse_config(spec) for spec in specs}
+
+        crowd = FakeCrowdService(latency=options['crowd_latency']).start()
+        gemini = FakeGeminiService(latency=options['gemini_latency']).start()
+        stubs = {"CROWD_PREDICT_URL": crowd.url, "GEMINI_API_ENDPOINT": gemini.base_url}
+        log_dir = tempfile.mkdtemp(prefix="bench_server-")
+        self.stdout.write(f"{available_cpus()} CPUs; {options['detect_clients']} detection + "
+                          f"{options['crud_clients']} CRUD clients, {options['duration']:.0f}s per configuration; "
+                          f"gunicorn logs in {log_dir}\n")
+
+        header = (f"{'config':<14}{'processes':<18}{'req/s':>7}  {'detect/s':>8}{'p50':>7}{'p95':>7}"
+                  f"  {'crud/s':>7}{'p50':>7}{'p95':>7}{'p99':>7}  {'503':>5}{'err':>5}  {'SIGTERM drain'}")
+        self.stdout.write(header)
+        results = {}
+        try:
+            for spec, servers in matrix.items():
+                results[spec] = self._run_config(spec, servers, stubs, log_dir, options)
+                self.stdout.write(self._row(spec, results[spec]))
+        finally:
+            crowd.stop()
+            gemini.stop()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({"cpus": available_cpus(), "options": {k: options[k] for k in (
+                    'detect_clients', 'crud_clients', 'duration', 'crowd_latency', 'gemini_latency')},
+                    "results": results}, f, indent=2)
+
+    def _run_config(self, spec, servers, stubs, log_dir, options):
+        running = []
+        try:
+            for role, env in servers:
+                running.append((role, Server(dict(env, **stubs), log_dir).start()))
+            urls = {role: server.url for role, server in running}
+            detect_url = urls.get('detect', urls.get('both'))
+            crud_url = urls.get('crud', urls.get('both'))
+            context = bench_context(crud_url)
+
+            load = self._load(detect_url, crud_url, context, options)
+            drain = self._sigterm(detect_url, [server for _, server in running], context, options['in_flight'])
+        finally:
+            for _, server in running:
+                server.stop(kill=True)
+
+        processes = []
+        for role, env in servers:
+            profile = server_profile(env.get('SERVER_POOL', 'all'), env=env)
+            label = f"{profile['workers']}x{profile['threads']}" + (
+                f" cap{profile['detect_max_concurrency']}" if profile['detect_max_concurrency'] else "")
+            processes.append(f"{role[0]}:{label}" if role != 'both' else label)
+        return dict(load, processes=' + '.join(processes), drain=drain)
+
+    # ------------------------------------------------------------------
+
+    def _load(self, detect_url, crud_url, ctx, options):
+        """ Closed-loop clients for `duration` seconds; stats per traffic class """
+        auth = {"Authorization": f"Bearer {ctx['access']}"}
+        crud_calls = [
+            ("GET", reverse('organization-list-create'), {"headers": auth}),
+            ("GET", reverse('zone-list-create'), {"headers": auth, "params": {"org_id": ctx['org']}}),
+            ("GET", reverse('camera-list-create'), {"headers": auth, "params": {"zone_id": ctx['zone']}}),
+            ("GET", reverse('alert-list-create'), {"headers": auth, "params": {"status": "OPEN"}}),
+            ("GET", reverse('zone-detail', kwargs={"pk": ctx['zone']}), {"headers": auth}),
+            ("GET", reverse('get-carbon-stats'), {"headers": auth, "params": {"zone_id": ctx['zone']}}),
+            ("GET", reverse('notification-list-create'), {"headers": auth}),
+        ]
+        detect_path = reverse('sensor-detect')
+        stop_at = time.monotonic() + options['duration']
+        stats = {kind: {"latencies": [], "errors": 0, "rejected": 0} for kind in ('detect', 'crud')}
+        lock = threading.Lock()
+
+        def client(kind, index):
+            session = requests.Session()
+            i = index
+            while time.monotonic() < stop_at:
+                if kind == 'detect':
+                    kwargs = {"method": "POST", "url": detect_url + detect_path, "headers": auth,
+                              "data": {"zone_id": ctx['zone'], "camera_id": ctx['camera']},
+                              "files": {"file": ("frame.jpg", ctx['image'], "image/jpeg")}}
+                else:
+                    method, path, extra = crud_calls[i % len(crud_calls)]
+                    kwargs = dict(extra, method=method, url=crud_url + path)
+                i += 1
+                started = time.perf_counter()
+                retry_after = None
+                try:
+                    resp = session.request(timeout=60, **kwargs)
+                    status, retry_after = resp.status_code, resp.headers.get('Retry-After')
+                except requests.RequestException:
+                    status = None
+                elapsed = time.perf_counter() - started
+                with lock:
+                    entry = stats[kind]
+                    if status == 503:
+                        entry["rejected"] += 1  # Shed by the bulkhead: fast, and the client retries
+                    else:
+                        entry["latencies"].append(elapsed)
+                        if status is None or status >= 500:
+                            entry["errors"] += 1
+                if status == 503:
+                    time.sleep(float(retry_after or 1))  # As a camera would
+
+        started = time.perf_counter()
+        clients = [('detect', i) for i in range(options['detect_clients'])] + \
+                  [('crud', i) for i in range(options['crud_clients'])]
+        with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+            list(pool.map(lambda args: client(*args), clients))
+        wall = time.perf_counter() - started
+
+        result = {}
+        for kind, entry in stats.items():
+            result[kind] = dict(summarize(entry["latencies"], wall, [], entry["errors"]), rejected=entry["rejected"])
+            result[kind].pop("queries_mean")
+        return result
+
+    def _sigterm(self, detect_url, servers, ctx, count):
+        """ SIGTERM while `count` detections are in flight: how many completed, and shutdown time """
+        path = detect_url + reverse('sensor-detect')
+        auth = {"Authorization": f"Bearer {ctx['access']}"}
+
+        def detect(_):
+            try:
+                return requests.post(path, timeout=60, headers=auth,
+                                     data={"zone_id": ctx['zone'], "camera_id": ctx['camera']},
+                                     files={"file": ("frame.jpg", ctx['image'], "image/jpeg")}).status_code
+            except requests.RequestException:
+                return None
+
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            futures = [pool.submit(detect, i) for i in range(count)]
+            time.sleep(0.15)  # Past the crowd stub; waiting on the counter backend
+            stopped = [server.stop() for server in servers]
+            statuses = [f.result() for f in futures]
+        return {
+            "in_flight": count,
+            "completed": sum(1 for s in statuses if s == 200),
+            "shed": sum(1 for s in statuses if s == 503),
+            "stop_seconds": round(max(stopped), 2),
+            "drained": [line for server in servers for line in server.drained()],
+        }
+
+    def _row(self, spec, r):
+        d, c, drain = r['detect'], r['crud'], r['drain']
+        shed = f", {drain['shed']} shed" if drain['shed'] else ""
+        return (f"{spec:<14}{r['processes']:<18}{d['rps'] + c['rps']:>7.1f}  {d['rps']:>8.1f}{d['p50_ms']:>7.0f}"
+                f"{d['p95_ms']:>7.0f}  {c['rps']:>7.1f}{c['p50_ms']:>7.0f}{c['p95_ms']:>7.0f}{c['p99_ms']:>7.0f}  "
+                f"{d['rejected'] + c['rejected']:>5}{d['errors'] + c['errors']:>5}  "
+                f"{drain['completed']}/{drain['in_flight']} ok{shed}, {drain['stop_seconds']}s")
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lims.occupancy import prune_samples, rollup_hours, rollup_minutes
+
+
+class Command(BaseCommand):
+    help = (
+        "Folds raw occupancy samples into per-minute and per-hour rollups. Incremental: "
+        "starts from the newest existing bucket, so it is cheap to run every minute from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every rollup from the start")
+        parser.add_argument('--raw-retention-days', type=int, default=0,
+                            help="Delete raw samples older than this once rolled up (0 keeps them)")
+
+    def handle(self, *args, **options):
+        # A datetime before any data makes both rollups start from scratch
+        since = datetime(1970, 1, 1, tzinfo=dt_timezone.utc) if options['full'] else None
+
+        minutes = rollup_minutes(since)
+        hours = rollup_hours(since)
+        self.stdout.write(f"Upserted {minutes} minute and {hours} hour buckets.")
+
+        if options['raw_retention_days'] > 0:
+            cutoff = timezone.now() - timedelta(days=options['raw_retention_days'])
+            self.stdout.write(f"Deleted {prune_samples(cutoff)} raw samples older than {cutoff:%Y-%m-%d %H:%M}.")
@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims.bulk import HIERARCHY_COLUMNS, hierarchy_rows
+from lims.exports import FORMATS, ExportError, export_stream, stream_rows
+from lims.views.occupancy_views import parse_time
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams the organization hierarchy, the carbon log history or the alert history "
+        "as CSV, NDJSON or Parquet (constant memory)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['hierarchy', 'carbonlogs', 'alerts'])
+        parser.add_argument('--format', choices=FORMATS, default='csv', help="parquet needs pyarrow; not for hierarchy")
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output (Parquet: gzip pages)")
+        parser.add_argument('--output', '-o', default='-', help="Output file (default stdout)")
+        parser.add_argument('--org-id', type=int, help="Only this organization")
+        parser.add_argument('--zone-id', type=int, help="carbonlogs/alerts: only this zone")
+        parser.add_argument('--start', help="carbonlogs/alerts: ISO 8601, inclusive")
+        parser.add_argument('--end', help="carbonlogs/alerts: ISO 8601, exclusive")
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'hierarchy':
+            if options['format'] == 'parquet' or options['gzip']:
+                raise CommandError("The hierarchy export is plain CSV or NDJSON (the import format).")
+            chunks = stream_rows(hierarchy_rows(options['org_id']), options['format'], HIERARCHY_COLUMNS)
+        else:
+            try:
+                chunks, _, _ = export_stream(
+                    options['kind'], options['format'], 'gzip' if options['gzip'] else None,
+                    organization_id=options['org_id'], zone_id=options['zone_id'],
+                    start=parse_time(options['start']), end=parse_time(options['end']),
+                )
+            except ExportError as e:
+                raise CommandError(str(e))
+
+        out = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in chunks:
+                out.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
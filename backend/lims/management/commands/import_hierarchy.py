@@ -0,0 +1,39 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims.bulk import FORMATS, guess_format, import_hierarchy
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports organizations, zones and cameras from a CSV or NDJSON file (one `type` per row, "
+        "see lims.bulk). Streams the input; each batch is validated with set-based lookups and "
+        "inserted with bulk_create in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension (csv otherwise)")
+        parser.add_argument('--batch-size', type=int, help="Rows per transaction (default BULK_BATCH_SIZE)")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and roll back")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        try:
+            source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with source:
+            report = import_hierarchy(source, fmt, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... {report.error_count - len(report.errors)} more errors")
+        created = ', '.join(f"{n} {kind}s" for kind, n in report.created.items())
+        prefix = "Dry run, would have created" if options['dry_run'] else "Created"
+        self.stdout.write(f"{prefix} {created} from {report.rows} rows ({report.error_count} errors).")
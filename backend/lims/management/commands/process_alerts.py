@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from lims.lifecycle import tick
+
+
+class Command(BaseCommand):
+    help = (
+        "Alert lifecycle worker: auto-closes alerts whose camera stayed below ALERT_RESOLVE_RATIO "
+        "and escalates alerts open too long, every ALERT_LIFECYCLE_INTERVAL_SECONDS. "
+        "Use --once from cron or a scheduler instead of a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run one tick and exit")
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between ticks (default: ALERT_LIFECYCLE_INTERVAL_SECONDS)")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.ALERT_LIFECYCLE_INTERVAL_SECONDS
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            counts = tick()
+            elapsed = time.perf_counter() - started
+            if options['once'] or any(counts.values()):
+                self.stdout.write(f"Resolved {counts['resolved']}, escalated {counts['escalated']} "
+                                  f"alerts in {elapsed * 1000:.0f} ms.")
+            if options['once']:
+                return
+            try:
+                time.sleep(max(0.0, interval - elapsed))
+            except KeyboardInterrupt:
+                return
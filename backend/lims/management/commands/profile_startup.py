@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter under -X importtime. Phase timestamps go to
+# stdout as JSON; the import tree goes to stderr.
+CHILD = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t_setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+t_wsgi = time.perf_counter()
+from django.test import Client
+response = Client().get(sys.argv[1], HTTP_HOST="localhost")
+t_first = time.perf_counter()
+print(json.dumps({
+    "interpreter_to_main_ms": (t0 - START) * 1000,
+    "django_setup_ms": (t_setup - t0) * 1000,
+    "wsgi_application_ms": (t_wsgi - t_setup) * 1000,
+    "first_request_ms": (t_first - t_wsgi) * 1000,
+    "process_start_to_first_response_ms": (t_first - START) * 1000,
+    "status": response.status_code,
+    "heavy_modules_loaded": sorted(m for m in HEAVY if m in sys.modules),
+}))
+"""
+
+HEAVY = ["google.generativeai", "PIL.Image", "requests", "numpy", "onnxruntime"]
+
+
+def parse_importtime(stderr):
+    """ -X importtime lines -> list of (cumulative_us, self_us, module, depth) """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = (part for part in line.replace("import time:", "|", 1).split("|"))
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((int(cumulative_us), int(self_us), name.strip(), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Import-time profile of a cold process, from interpreter start to the first response (-X importtime)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/live/', help="URL of the first request")
+        parser.add_argument('--top', type=int, default=25, help="Slowest imports to list")
+        parser.add_argument('--json', dest='json_path', help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'kazlat.settings'))
+        # START is taken as early as the child can: the first statement it runs
+        code = f"import time; START = time.perf_counter(); HEAVY = {HEAVY!r}\n" + CHILD
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code, options['path']],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr[-2000:])
+
+        phases = json.loads(proc.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(proc.stderr)
+        top_level = [r for r in rows if r[3] == 0]
+        total_import_ms = sum(r[0] for r in top_level) / 1000
+
+        self.stdout.write(f"First request: GET {options['path']} -> {phases['status']}")
+        for key in ("django_setup_ms", "wsgi_application_ms", "first_request_ms", "process_start_to_first_response_ms"):
+            self.stdout.write(f"  {key:<38} {phases[key]:>9.1f}")
+        self.stdout.write(f"  {'imports (top-level cumulative)':<38} {total_import_ms:>9.1f} ms")
+        self.stdout.write(f"  heavy modules loaded: {', '.join(phases['heavy_modules_loaded']) or 'none'}")
+
+        self.stdout.write(f"\nSlowest imports (cumulative ms, self ms):")
+        for cumulative, self_us, name, depth in sorted(rows, reverse=True)[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:>9.1f} {self_us / 1000:>8.1f}  {'  ' * depth}{name}")
+
+        if options['json_path']:
+            report = dict(phases, total_import_ms=total_import_ms, imports=[
+                {"module": name, "cumulative_us": cumulative, "self_us": self_us, "depth": depth}
+                for cumulative, self_us, name, depth in rows
+            ])
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
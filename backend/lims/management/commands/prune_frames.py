@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from lims.frames import prune
+
+
+class Command(BaseCommand):
+    help = (
+        "Frame archive retention: deletes frames past their zone's retention (Zone.frame_retention_days, "
+        "else FRAME_RETENTION_DAYS; frames behind an alert FRAME_ALERT_RETENTION_DAYS), rows first, "
+        "then images. Use --once from cron or a scheduler instead of a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run one pass and exit")
+        parser.add_argument('--interval', type=float, default=3600, help="Seconds between passes (default: 3600)")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            deleted = prune()
+            elapsed = time.perf_counter() - started
+            if options['once'] or deleted:
+                self.stdout.write(f"{deleted} expired frames deleted in {elapsed * 1000:.0f} ms.")
+            if options['once']:
+                return
+            try:
+                time.sleep(max(0.0, options['interval'] - elapsed))
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from lims.carbon import FORMULAS, Checkpoint, backfill, default_checkpoint_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-derives CarbonLog.saved_amount from the stored counts with a carbon formula version "
+        "(default: CARBON_FORMULA_VERSION), in id ranges of --chunk rows across --workers processes. "
+        "Finished ranges go to a checkpoint file, so running the same command again resumes an "
+        "interrupted backfill. Rows logged before the counts were stored are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formula-version', type=int, help="Formula to apply (default: CARBON_FORMULA_VERSION)")
+        parser.add_argument('--zone-id', type=int, help="Only this zone")
+        parser.add_argument('--org-id', type=int, help="Only this organization")
+        parser.add_argument('--only-stale', action='store_true',
+                            help="Only rows computed with another version (skips re-checking current ones)")
+        parser.add_argument('--chunk', type=int, help="Ids per range (default: CARBON_BACKFILL_CHUNK)")
+        parser.add_argument('--workers', type=int,
+                            help="Processes (default: CARBON_BACKFILL_WORKERS; 1: no pool; always 1 on SQLite)")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: recompute_carbon_v<version>.checkpoint.json)")
+        parser.add_argument('--restart', action='store_true', help="Discard the checkpoint and start over")
+        parser.add_argument('--dry-run', action='store_true', help="Report only, store nothing (no checkpoint)")
+        parser.add_argument('--list', action='store_true', help="List the registered formulas and exit")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for version, formula in sorted(FORMULAS.items()):
+                current = " (current)" if version == settings.CARBON_FORMULA_VERSION else ""
+                self.stdout.write(f"v{version}{current}: {formula.description}")
+            return
+
+        version = options['formula_version'] or settings.CARBON_FORMULA_VERSION
+        if version not in FORMULAS:
+            raise CommandError(f"Unknown formula version {version}; registered: {sorted(FORMULAS)}")
+        chunk = options['chunk'] or settings.CARBON_BACKFILL_CHUNK
+        workers = options['workers'] or settings.CARBON_BACKFILL_WORKERS
+
+        # A checkpoint only resumes the run it was written by
+        params = {"version": version, "chunk": chunk, "zone_id": options['zone_id'],
+                  "org_id": options['org_id'], "only_stale": options['only_stale']}
+        checkpoint = None
+        if not options['dry_run']:
+            path = options['checkpoint'] or default_checkpoint_path(version)
+            if options['restart']:
+                # Whatever run wrote it: Checkpoint() would refuse one with other parameters
+                Path(path).unlink(missing_ok=True)
+            try:
+                checkpoint = Checkpoint(path, params)
+            except ValueError as e:
+                raise CommandError(f"{e}. Pass --restart to discard it.")
+
+        def progress(result, totals):
+            self.stdout.write(
+                f"range {totals['resumed'] + totals['completed']}/{totals['chunks']}: {result['rows']} rows, "
+                f"{result['updated']} updated in {result['seconds'] * 1000:.0f} ms "
+                f"(total {totals['rows'] / totals['seconds'] if totals['seconds'] else 0:,.0f} rows/s)"
+            )
+
+        try:
+            totals = backfill(version, chunk_size=chunk, workers=workers, checkpoint=checkpoint,
+                              zone_id=options['zone_id'], org_id=options['org_id'],
+                              only_stale=options['only_stale'], dry_run=options['dry_run'],
+                              progress=progress if options['verbosity'] > 1 else None)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        if not totals['chunks']:
+            self.stdout.write("No carbon logs match.")
+            return
+        seconds = totals['seconds']
+        self.stdout.write(
+            f"{totals['rows']} rows re-derived with formula v{version} in {seconds:.1f}s "
+            f"({totals['rows'] / seconds if seconds else 0:,.0f} rows/s, {totals['workers']} workers, "
+            f"{totals['completed']} ranges of {chunk} ids"
+            + (f", {totals['resumed']} already done" if totals['resumed'] else "") + "); "
+            f"{totals['updated']} updated, {totals['rows'] - totals['updated'] - totals['skipped']} unchanged, "
+            f"{totals['skipped']} skipped without stored counts."
+            + (" Dry run: nothing stored." if options['dry_run'] else "")
+        )
+        if checkpoint is not None and totals['resumed'] + totals['completed'] == totals['chunks']:
+            checkpoint.clear()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from lims.points import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Resets every eco-points balance that differs from the sum of its ledger entries "
+        "and rebuilds the leaderboard. Run it periodically from cron (e.g. hourly)."
+    )
+
+    def handle(self, *args, **options):
+        drifted = reconcile()
+        if drifted:
+            shown = ', '.join(str(user_id) for user_id in drifted[:20])
+            more = f" (+{len(drifted) - 20} more)" if len(drifted) > 20 else ""
+            self.stdout.write(f"Fixed {len(drifted)} balances: users {shown}{more}.")
+        self.stdout.write("Leaderboard rebuilt.")
@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lims.counters import COUNTER_BACKENDS, get_counter
+from lims.frames import recount, save_recounts
+from lims.models import Frame
+from lims.views.occupancy_views import parse_time
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts archived frames again with a counter backend (e.g. after a model update), "
+        "--workers at a time, and reports how far the new counts are from the ones recorded "
+        "at capture. Results are stored on the frames (recount, recount_backend) unless --dry-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', default='sahi', choices=sorted(COUNTER_BACKENDS),
+                            help="Counter to run (default: sahi, the capture-time counter)")
+        parser.add_argument('--zone-id', type=int, help="Only this zone")
+        parser.add_argument('--org-id', type=int, help="Only this organization")
+        parser.add_argument('--since', help="Captured at or after (ISO 8601)")
+        parser.add_argument('--until', help="Captured before (ISO 8601)")
+        parser.add_argument('--limit', type=int, help="At most this many frames, newest first")
+        parser.add_argument('--workers', type=int, default=4, help="Frames counted in parallel")
+        parser.add_argument('--chunk', type=int, default=200, help="Frames read and saved per batch")
+        parser.add_argument('--dry-run', action='store_true', help="Report only, store nothing")
+
+    def handle(self, *args, **options):
+        frames = Frame.objects.order_by('-captured_at')
+        if options['zone_id']:
+            frames = frames.filter(zone_id=options['zone_id'])
+        if options['org_id']:
+            frames = frames.for_organization(options['org_id'])
+        for name, lookup in (('since', 'captured_at__gte'), ('until', 'captured_at__lt')):
+            if options[name]:
+                value = parse_time(options[name])
+                if value is None:
+                    raise CommandError(f"--{name} must be an ISO 8601 datetime")
+                frames = frames.filter(**{lookup: value})
+        if options['limit']:
+            frames = frames[:options['limit']]
+
+        backend = options['backend']
+        counter = get_counter(backend)
+        counted = changed = errors = 0
+        abs_diff = 0
+        started = time.perf_counter()
+        chunk = []
+        for frame in frames.iterator(chunk_size=options['chunk']):
+            chunk.append(frame)
+            if len(chunk) == options['chunk']:
+                c, d, e, a = self._run(chunk, counter, backend, options)
+                counted, changed, errors, abs_diff = counted + c, changed + d, errors + e, abs_diff + a
+                chunk = []
+        if chunk:
+            c, d, e, a = self._run(chunk, counter, backend, options)
+            counted, changed, errors, abs_diff = counted + c, changed + d, errors + e, abs_diff + a
+
+        elapsed = time.perf_counter() - started
+        if not counted and not errors:
+            self.stdout.write("No archived frames match.")
+            return
+        self.stdout.write(
+            f"{counted} frames re-counted with {backend} in {elapsed:.1f}s "
+            f"({counted / elapsed if elapsed else 0:.1f}/s, {options['workers']} workers); "
+            f"{changed} changed, mean |new - captured| {abs_diff / counted if counted else 0:.2f}; "
+            f"{errors} errors." + (" Dry run: nothing stored." if options['dry_run'] else "")
+        )
+
+    def _run(self, chunk, counter, backend, options):
+        """ (counted, changed, errors, sum of |difference|) for one chunk """
+        results, errors = [], 0
+        for frame, count, error in recount(chunk, counter, workers=options['workers']):
+            if error:
+                errors += 1
+                self.stderr.write(f"{frame.sha256[:12]}: {error}")
+            else:
+                results.append((frame, count))
+        if results and not options['dry_run']:
+            save_recounts(results, backend)
+        changed = sum(1 for frame, count in results if count != frame.people_count)
+        return len(results), changed, errors, sum(abs(count - frame.people_count) for frame, count in results)
@@ -0,0 +1,129 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from lims.models import Organization, Zone, Camera, Alert, Notification, CarbonLog, Membership
+
+BENCH_EMAIL = "bench@ecoflow.local"
+BENCH_PASSWORD = "bench-password-123"
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """ Lets bulk_create keep the timestamps we set instead of auto_now_add """
+    saved = [(f, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, value in saved:
+            f.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = "Seeds realistic data volumes for bench_endpoints (orgs, zones, cameras, carbon logs, alerts)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orgs', type=int, default=50)
+        parser.add_argument('--zones', type=int, default=5000)
+        parser.add_argument('--cameras', type=int, default=10000)
+        parser.add_argument('--carbon-logs', type=int, default=2_000_000)
+        parser.add_argument('--alerts', type=int, default=200_000)
+        parser.add_argument('--notifications', type=int, default=1000)
+        parser.add_argument('--scale', type=float, default=1.0, help="Multiplies every volume (e.g. 0.01 for a quick run)")
+        parser.add_argument('--days', type=int, default=180, help="History window for timestamps")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        scale = options['scale']
+        counts = {k: max(1, int(options[k] * scale)) for k in
+                  ('orgs', 'zones', 'cameras', 'carbon_logs', 'alerts', 'notifications')}
+        batch = options['batch_size']
+
+        if options['interactive']:
+            answer = input(f"This adds {counts} to the configured database. Continue? [y/N] ")
+            if answer.lower() != 'y':
+                raise CommandError("Seeding cancelled.")
+
+        now = timezone.now()
+        window = options['days'] * 86400
+
+        def random_time():
+            return now - timedelta(seconds=random.randint(0, window))
+
+        start = time.perf_counter()
+
+        User = get_user_model()
+        bench_user = User.objects.filter(email=BENCH_EMAIL).first()
+        if bench_user is None:
+            bench_user = User.objects.create_user(username=BENCH_EMAIL, email=BENCH_EMAIL, password=BENCH_PASSWORD)
+
+        with transaction.atomic():
+            orgs = Organization.objects.bulk_create(
+                [Organization(name=f"Org {i}", org_type=random.choice(['Corporate', 'Warehouse', 'Campus']),
+                              total_capacity=random.randint(500, 20000),
+                              latitude=round(random.uniform(-60, 60), 6), longitude=round(random.uniform(-180, 180), 6))
+                 for i in range(counts['orgs'])],
+                batch_size=batch,
+            )
+            zones = Zone.objects.bulk_create(
+                [Zone(organization=orgs[i % len(orgs)], name=f"Zone {i}",
+                      zone_type=random.choice(['Room', 'Hall', 'Lobby']), capacity=random.randint(10, 500),
+                      latitude=round(random.uniform(-60, 60), 6), longitude=round(random.uniform(-180, 180), 6))
+                 for i in range(counts['zones'])],
+                batch_size=batch,
+            )
+            cameras = Camera.objects.bulk_create(
+                [Camera(zone=zones[i % len(zones)], organization_id=zones[i % len(zones)].organization_id,
+                        name=f"Cam {i}") for i in range(counts['cameras'])],
+                batch_size=batch,
+            )
+            # The benchmarks sign in as a member of the first organization (tenant-scoped reads)
+            Membership.objects.get_or_create(user=bench_user, organization=orgs[0])
+        self.stdout.write(f"Hierarchy: {len(orgs)} orgs, {len(zones)} zones, {len(cameras)} cameras")
+
+        # (id, organization_id): the tenant column is denormalized onto logs and alerts
+        zone_ids = [(z.id, z.organization_id) for z in zones]
+        camera_ids = [(c.id, c.organization_id) for c in cameras]
+
+        def random_carbon_log():
+            # Counts as the detection pipeline stores them; saved_amount as formula v1 gives it
+            gemini = random.randint(1, 400)
+            sahi = max(0, round(gemini * random.uniform(0.2, 2.0)))
+            return CarbonLog(**dict(zip(('zone_id', 'organization_id'), random.choice(zone_ids))),
+                             sahi_count=sahi, gemini_count=gemini, saved_amount=round(sahi / gemini, 4),
+                             timestamp=random_time())
+
+        with explicit_timestamps(CarbonLog._meta.get_field('timestamp'),
+                                 Alert._meta.get_field('created_at'),
+                                 Notification._meta.get_field('created_at')):
+            self._bulk(CarbonLog, counts['carbon_logs'], batch, random_carbon_log)
+            self._bulk(Alert, counts['alerts'], batch, lambda: Alert(
+                **dict(zip(('camera_id', 'organization_id'), random.choice(camera_ids))), heading="Overcrowding",
+                sub_heading="Seeded alert",
+                # Most alerts are history; a small share is still open
+                status=Alert.Status.OPEN if random.random() < 0.05 else Alert.Status.CLOSED,
+                created_at=random_time(),
+            ))
+            self._bulk(Notification, counts['notifications'], batch, lambda: Notification(
+                title="Seeded notification", message="Benchmark data", created_at=random_time(),
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - start:.1f}s"))
+
+    def _bulk(self, model, total, batch, make):
+        for offset in range(0, total, batch):
+            size = min(batch, total - offset)
+            with transaction.atomic():
+                model.objects.bulk_create([make() for _ in range(size)], batch_size=batch)
+        self.stdout.write(f"{model.__name__}: {total} rows")
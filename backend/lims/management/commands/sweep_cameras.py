@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from lims.heartbeat import sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Camera liveness sweeper: flags cameras silent for CAMERA_STALE_SECONDS (and clears the flag "
+        "when they report again), notifying their organization, every CAMERA_SWEEP_INTERVAL_SECONDS. "
+        "Use --once from cron or a scheduler instead of a long-running worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run one sweep and exit")
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between sweeps (default: CAMERA_SWEEP_INTERVAL_SECONDS)")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.CAMERA_SWEEP_INTERVAL_SECONDS
+        while True:
+            started = time.perf_counter()
+            close_old_connections()
+            counts = sweep()
+            elapsed = time.perf_counter() - started
+            if options['once'] or any(counts.values()):
+                self.stdout.write(f"{counts['stale']} cameras went stale, {counts['recovered']} recovered "
+                                  f"in {elapsed * 1000:.0f} ms.")
+            if options['once']:
+                return
+            try:
+                time.sleep(max(0.0, interval - elapsed))
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,121 @@
+"""
+In-process latency histograms, exported in Prometheus text format.
+
+Nothing is pushed anywhere: spans only bump counters in memory, and
+`/api/metrics/` renders them when a scraper asks. With no collector
+attached the cost is a perf_counter() pair and one bisect per span.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Seconds. Spans from sub-millisecond DB queries up to slow external calls.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# URL name of the request being served (set by MetricsMiddleware)
+current_endpoint = ContextVar('current_endpoint', default='none')
+
+
+class Histogram:
+    """ Cumulative-bucket histogram keyed by a tuple of label values """
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in sorted(self.collect().items()):
+            base = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labelvalues))
+            sep = ',' if base else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'ecoflow_request_seconds', 'Request latency by endpoint.', ['endpoint', 'method', 'status']
+)
+STAGE_SECONDS = Histogram(
+    'ecoflow_stage_seconds', 'Latency of a stage inside a request.', ['endpoint', 'stage']
+)
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS]
+
+# Callables returning ready-made exposition lines, evaluated at scrape time
+COLLECTORS = []
+
+
+def register(histogram):
+    """ Adds a histogram to the /api/metrics/ output and returns it """
+    REGISTRY.append(histogram)
+    return histogram
+
+
+def register_collector(collector):
+    """ Adds a callable returning a list of exposition lines; usable as a decorator """
+    COLLECTORS.append(collector)
+    return collector
+
+
+def observe_stage(stage, seconds, endpoint=None):
+    if settings.METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, endpoint or current_endpoint.get(), stage)
+
+
+@contextmanager
+def span(stage):
+    """ Times the enclosed block as `stage` of the current endpoint """
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, current_endpoint.get(), stage)
+
+
+def render_prometheus():
+    parts = [h.render() for h in REGISTRY]
+    for collector in COLLECTORS:
+        lines = collector()
+        if lines:
+            parts.append('\n'.join(lines))
+    return '\n'.join(parts) + '\n'
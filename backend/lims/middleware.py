@@ -0,0 +1,282 @@
+import itertools
+import logging
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.utils import InterfaceError, OperationalError
+from django.utils.cache import patch_vary_headers
+
+from . import routers
+from .compression import compress, is_compressible, negotiate
+from .metrics import REQUEST_SECONDS, current_endpoint, observe_stage, span
+from .profiling import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """
+    Records request latency per URL name, plus the time spent in DB queries
+    as the `db_query` stage of that endpoint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        token = current_endpoint.set('unmatched')
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(self._time_query))
+                response = self.get_response(request)
+
+            match = getattr(request, 'resolver_match', None)
+            endpoint = (match.url_name or match.view_name) if match else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method, str(response.status_code))
+            return response
+        finally:
+            current_endpoint.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        current_endpoint.set(match.url_name or match.view_name)
+
+    @staticmethod
+    def _time_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            observe_stage('db_query', time.perf_counter() - start)
+
+
+class QueryBudgetExceeded(Exception):
+    """ Raised (instead of logged) when QUERY_BUDGET_RAISE is on, e.g. in CI """
+
+
+class _QueryRecorder:
+    """ execute_wrapper that counts queries and logs slow ones with their stack """
+
+    def __init__(self, slow_ms):
+        self.slow_seconds = slow_ms / 1000
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if elapsed >= self.slow_seconds:
+                logger.warning(
+                    "Slow query (%.1f ms): %s\n%s", elapsed * 1000, sql, _project_stack()
+                )
+
+
+def _project_stack():
+    """ Stack frames from this project only (drops Django/DRF internals) """
+    root = str(settings.BASE_DIR)
+    frames = [
+        f for f in traceback.extract_stack()[:-2]
+        if f.filename.startswith(root) and 'site-packages' not in f.filename
+    ]
+    return ''.join(traceback.format_list(frames))
+
+
+def get_query_budget(url_name, method):
+    """ Budget for `url_name`/`method` from QUERY_BUDGETS, or None if unchecked """
+    budget = settings.QUERY_BUDGETS.get(url_name)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts queries and DB time per request and checks them against
+    QUERY_BUDGETS (URL name -> max queries). Over budget logs a warning,
+    or raises QueryBudgetExceeded when QUERY_BUDGET_RAISE is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = _QueryRecorder(settings.SLOW_QUERY_MS)
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        budget = get_query_budget(url_name, request.method)
+
+        if budget is not None and recorder.count > budget:
+            message = (
+                f"{request.method} {request.path} ({url_name}) ran {recorder.count} queries "
+                f"in {recorder.total * 1000:.1f} ms; budget is {budget}"
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        if settings.QUERY_COUNT_HEADERS:
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f"{recorder.total * 1000:.1f}"
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets GETs to REPLICA_READ_ENDPOINTS read from a replica (see lims.routers).
+
+    - Clients that wrote in the last REPLICA_PIN_SECONDS carry a pin cookie and
+      stay on the primary, so they read their own writes despite replica lag.
+    - A connection error on the replica marks it down and replays the
+      (idempotent) GET on the primary.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        replica_token = routers.use_replica.set(False)
+        alias_token = routers.current_replica.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.use_replica.reset(replica_token)
+            routers.current_replica.reset(alias_token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.url_name in settings.REPLICA_READ_ENDPOINTS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+        ):
+            routers.use_replica.set(True)
+            request._replica_view = (view_func, view_args, view_kwargs)
+
+    def process_exception(self, request, exception):
+        alias = routers.current_replica.get()
+        view = getattr(request, '_replica_view', None)
+        if alias is None or view is None or not isinstance(exception, (OperationalError, InterfaceError)):
+            return None
+
+        logger.warning("Replica %s failed (%s); retrying %s on the primary", alias, exception, request.path)
+        routers.mark_down(alias)
+        routers.use_replica.set(False)
+        routers.current_replica.set(None)
+        view_func, view_args, view_kwargs = view
+        return view_func(request, *view_args, **view_kwargs)
+
+
+class CompressionMiddleware:
+    """
+    Compresses JSON/text responses with the best encoding the client accepts
+    (see lims.compression). Bodies under COMPRESSION_MIN_BYTES, streaming
+    responses and already-encoded bodies pass through untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not settings.COMPRESSION_ENABLED
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not is_compressible(response.get('Content-Type', ''))
+            or len(response.content) < settings.COMPRESSION_MIN_BYTES
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        with span('compress'):
+            body = compress(encoding, response.content)
+        if len(body) >= len(response.content):
+            return response
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        # The bytes changed, so a strong ETag no longer holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Runs flagged requests from ADMIN users (X-Profile: 1 or ?_profile=1), and
+    1 in PROFILE_SAMPLE_EVERY requests, under the sampling profiler of
+    lims.profiling. Not installed at all unless PROFILING_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._requests = itertools.count(1)
+
+    def __call__(self, request):
+        reason = self._reason(request)
+        if reason is None:
+            return self.get_response(request)
+
+        with RequestProfile(reason) as profile:
+            response = self.get_response(request)
+        try:
+            response['X-Profile-Id'] = profile.save(request, response)
+        except OSError:
+            logger.exception("Could not store the profile of %s %s", request.method, request.path)
+        return response
+
+    def _reason(self, request):
+        if request.headers.get('X-Profile') == '1' or request.GET.get('_profile') == '1':
+            return "requested" if _is_admin(request) else None
+        every = settings.PROFILE_SAMPLE_EVERY
+        if every and next(self._requests) % every == 0:
+            return "sampled"
+        return None
+
+
+def _is_admin(request):
+    """ JWT check ahead of DRF (only for flagged requests; costs the user lookup) """
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    from .models import User
+
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    return authenticated is not None and authenticated[0].role == User.Role.ADMIN
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0004_alert_add_camera'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='counter_backend',
+            field=models.CharField(blank=True, choices=[('gemini', 'Gemini'), ('sahi', 'SAHI'), ('local', 'Local (ONNX)')], default='', max_length=20),
+        ),
+    ]
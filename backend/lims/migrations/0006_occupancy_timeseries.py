@@ -0,0 +1,61 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_brin_index(apps, schema_editor):
+    # BRIN keeps one summary per block range: tiny and cheap to maintain on an
+    # append-only, time-ordered table. PostgreSQL only.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS lims_occ_ts_brin ON lims_occupancysample USING brin (timestamp)"
+        )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS lims_occ_ts_brin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0005_zone_counter_backend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_seconds', models.PositiveIntegerField()),
+                ('bucket_start', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('avg_count', models.FloatField()),
+                ('peak_count', models.PositiveSmallIntegerField()),
+                ('peak_ratio', models.FloatField()),
+                ('zone', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_rollups', to='lims.zone')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period_seconds', 'bucket_start'], name='lims_occ_rollup_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('zone', 'period_seconds', 'bucket_start'), name='lims_occ_rollup_bucket_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OccupancySample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('people_count', models.PositiveSmallIntegerField()),
+                ('capacity_ratio', models.FloatField()),
+                ('camera', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='lims.camera')),
+                ('zone', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy_samples', to='lims.zone')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['zone', 'timestamp'], name='lims_occ_zone_ts_idx')],
+            },
+        ),
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0006_occupancy_timeseries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='kind',
+            field=models.CharField(choices=[('OVERCROWDING', 'Overcrowding'), ('PREDICTED_OVERCROWDING', 'Predicted overcrowding')], default='OVERCROWDING', max_length=30),
+        ),
+    ]
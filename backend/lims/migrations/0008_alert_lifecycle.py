@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0007_alert_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='escalated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='escalation_level',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('status', 'OPEN')), fields=['camera', 'kind'], name='lims_alert_open_idx'),
+        ),
+    ]
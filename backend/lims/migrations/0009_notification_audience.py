@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0008_alert_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCursor',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_cursor', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_seen_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience',
+            field=models.CharField(default='all', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['audience', 'id'], name='lims_notif_audience_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    # Existing balances become the first ledger rows, so reconciliation starts clean
+    User = apps.get_model('lims', 'User')
+    PointsEntry = apps.get_model('lims', 'PointsEntry')
+    users = User.objects.exclude(eco_points=0).values_list('id', 'eco_points').iterator(chunk_size=2000)
+    batch = []
+    for user_id, points in users:
+        batch.append(PointsEntry(user_id=user_id, reason='OPENING', amount=points, credits=1))
+        if len(batch) >= 2000:
+            PointsEntry.objects.bulk_create(batch)
+            batch = []
+    PointsEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0009_notification_audience'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('OPENING', 'Opening balance'), ('DETECTION', 'Detection'), ('CARBON_SAVED', 'Carbon saved'), ('ADJUSTMENT', 'Adjustment')], max_length=20)),
+                ('amount', models.IntegerField()),
+                ('credits', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='points_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='lims_points_user_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0010_points_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='stale_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
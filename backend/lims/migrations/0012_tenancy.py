@@ -0,0 +1,73 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_organizations(apps, schema_editor):
+    # One set-based UPDATE per table; cameras first, alerts copy from them
+    Zone = apps.get_model('lims', 'Zone')
+    Camera = apps.get_model('lims', 'Camera')
+    zone_org = Subquery(Zone.objects.filter(pk=OuterRef('zone_id')).values('organization_id')[:1])
+    Camera.objects.update(organization_id=zone_org)
+    apps.get_model('lims', 'CarbonLog').objects.update(organization_id=zone_org)
+    apps.get_model('lims', 'Alert').objects.filter(camera__isnull=False).update(
+        organization_id=Subquery(Camera.objects.filter(pk=OuterRef('camera_id')).values('organization_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0011_camera_liveness'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='organization',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lims.organization'),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='organization',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lims.organization'),
+        ),
+        migrations.AddField(
+            model_name='carbonlog',
+            name='organization',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='lims.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['organization', '-created_at'], name='lims_alert_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carbonlog',
+            index=models.Index(fields=['organization', '-timestamp'], name='lims_carbon_org_ts_idx'),
+        ),
+        migrations.AddField(
+            model_name='membership',
+            name='organization',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='lims.organization'),
+        ),
+        migrations.AddField(
+            model_name='membership',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='membership',
+            constraint=models.UniqueConstraint(fields=('user', 'organization'), name='lims_membership_unique'),
+        ),
+        migrations.RunPython(backfill_organizations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0012_tenancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='frame_retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Frame',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('width', models.PositiveSmallIntegerField()),
+                ('height', models.PositiveSmallIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('people_count', models.PositiveSmallIntegerField()),
+                ('recount', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('recount_backend', models.CharField(blank=True, default='', max_length=20)),
+                ('recounted_at', models.DateTimeField(blank=True, null=True)),
+                ('captured_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('camera', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='lims.camera')),
+                ('organization', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='lims.organization')),
+                ('zone', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='frames', to='lims.zone')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='frame',
+            field=models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='lims.frame'),
+        ),
+        migrations.AddIndex(
+            model_name='frame',
+            index=models.Index(fields=['zone', '-captured_at'], name='lims_frame_zone_captured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='frame',
+            index=models.Index(fields=['expires_at'], name='lims_frame_expires_idx'),
+        ),
+    ]
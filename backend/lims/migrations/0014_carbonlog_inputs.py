@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lims', '0013_frame_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carbonlog',
+            name='formula_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='carbonlog',
+            name='gemini_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='carbonlog',
+            name='sahi_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
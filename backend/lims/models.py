@@ -3,6 +3,9 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.db.models import Avg
 from django.conf import settings
+from django.utils import timezone
+
+from .tenancy import TenantManager
 
 class User(AbstractUser):
     # Define the 4 Roles
@@ -40,12 +43,35 @@ class Organization(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Tenant scoping (lims.tenancy): Model.objects.visible_to(user)
+    tenant_field = 'id'
+    objects = TenantManager()
+
     def __str__(self):
         return self.name
 
+class Membership(models.Model):
+    """ A user's access to an organization (tenant); ADMIN users see every organization """
+    # The unique (user, organization) index serves lookups by user
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='memberships',
+                             db_index=False)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='memberships')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'organization'], name='lims_membership_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.organization_id}"
+
 class Zone(models.Model):
     # Link to Parent Organization
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='zones')
+
+    tenant_field = 'organization_id'
+    objects = TenantManager()
     
     name = models.CharField(max_length=255)
     zone_type = models.CharField(max_length=100) # e.g., 'Room', 'Hall'
@@ -54,18 +80,37 @@ class Zone(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
 
+    # Reference counter for the carbon ratio (blank = deployment default)
+    class CounterBackend(models.TextChoices):
+        GEMINI = "gemini", "Gemini"
+        SAHI = "sahi", "SAHI"
+        LOCAL = "local", "Local (ONNX)"
+
+    counter_backend = models.CharField(max_length=20, choices=CounterBackend.choices, blank=True, default="")
+    # Frame archive (lims.frames): days to keep this zone's frames (blank = FRAME_RETENTION_DAYS, 0 = don't archive)
+    frame_retention_days = models.PositiveIntegerField(null=True, blank=True)
+
     def __str__(self):
         return f"{self.name} - {self.organization.name}"
 
 class Camera(models.Model):
     # Link to Parent Zone
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='cameras')
+    # Denormalized zone.organization (lims.tenancy): tenant filters skip the join
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+', null=True)
     
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
+
+    # Liveness (lims.heartbeat): last ping, written in coalesced batches; set by the sweeper
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    stale_since = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    tenant_field = 'organization_id'
+    objects = TenantManager()
+
     def __str__(self):
         return f"{self.name} ({self.zone.name})"
 
@@ -74,15 +119,43 @@ class Alert(models.Model):
         OPEN = 'OPEN', 'Open'
         CLOSED = 'CLOSED', 'Closed'
 
+    class Kind(models.TextChoices):
+        OVERCROWDING = 'OVERCROWDING', 'Overcrowding'
+        PREDICTED_OVERCROWDING = 'PREDICTED_OVERCROWDING', 'Predicted overcrowding'
+
     camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='alerts', null=True)
+    # The frame that raised it (lims.frames). Set before the background writer stores the frame,
+    # hence no constraint; left in place when the frame expires (no index needed to null it)
+    frame = models.ForeignKey('Frame', on_delete=models.DO_NOTHING, related_name='+', null=True, blank=True,
+                              db_constraint=False, db_index=False)
+    # Denormalized camera.organization (lims.tenancy); indexed below with created_at
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+', null=True,
+                                     db_index=False)
     heading = models.CharField(max_length=255)
     sub_heading = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.OPEN)
+    kind = models.CharField(max_length=30, choices=Kind.choices, default=Kind.OVERCROWDING)
+
+    # Lifecycle (lims.lifecycle): escalated while open too long, closed once occupancy stays low
+    escalation_level = models.PositiveSmallIntegerField(default=0)
+    escalated_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Only open alerts: the per-detection dedup and the lifecycle worker never read closed ones
+            models.Index(fields=['camera', 'kind'], condition=models.Q(status='OPEN'), name='lims_alert_open_idx'),
+            # One tenant's alerts, newest first
+            models.Index(fields=['organization', '-created_at'], name='lims_alert_org_created_idx'),
+        ]
+
+    tenant_field = 'organization_id'
+    objects = TenantManager()
+
     def __str__(self):
         return f"{self.heading} ({self.status})"
 class Notification(models.Model):
@@ -90,23 +163,173 @@ class Notification(models.Model):
     
     title = models.CharField(max_length=255)
     message = models.TextField()
+
+    # Who sees it: "all", "role:<ROLE>", "org:<id>" or "user:<id>" (see lims.notifications).
+    # One row per notification whatever the audience size; readers match their audiences.
+    audience = models.CharField(max_length=64, default="all")
     
     # Automatically set the time when created
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Feed pages and unread counts are id ranges within an audience
+            models.Index(fields=['audience', 'id'], name='lims_notif_audience_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} (ID: {self.id})"
 
+
+class PointsEntry(models.Model):
+    """
+    Append-only eco-points ledger; User.eco_points is the running sum.
+    Written by lims.points in batches: one row per user and reason per flush.
+    """
+    class Reason(models.TextChoices):
+        OPENING = 'OPENING', 'Opening balance'
+        DETECTION = 'DETECTION', 'Detection'
+        CARBON_SAVED = 'CARBON_SAVED', 'Carbon saved'
+        ADJUSTMENT = 'ADJUSTMENT', 'Adjustment'
+
+    # (user, id) index below covers user lookups
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points_entries',
+                             db_index=False)
+    reason = models.CharField(max_length=20, choices=Reason.choices)
+    amount = models.IntegerField()
+    credits = models.PositiveIntegerField(default=1)  # Credits folded into this row
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='lims_points_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.amount:+d} ({self.reason})"
+
+
+class NotificationCursor(models.Model):
+    """ Per-user read state: every notification with id <= last_seen_id is read """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='notification_cursor')
+    last_seen_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} read up to {self.last_seen_id}"
+
 class CarbonLog(models.Model):
     zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='carbon_logs')
+    # Denormalized zone.organization (lims.tenancy); indexed below with timestamp
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='+', null=True,
+                                     db_index=False)
     saved_amount = models.FloatField(help_text="Amount of Carbon saved (kg/g)")
+    # Inputs and formula of saved_amount (lims.carbon); the counts are null on rows logged before they were kept
+    sahi_count = models.PositiveIntegerField(null=True, blank=True)
+    gemini_count = models.PositiveIntegerField(null=True, blank=True)
+    formula_version = models.PositiveSmallIntegerField(default=1)
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)  # Add index for faster sorting
 
     class Meta:
         ordering = ['-timestamp']  # Default ordering for queries
         indexes = [
-            models.Index(fields=['-timestamp', 'zone']),  # Composite index for common queries
+            models.Index(fields=['-timestamp', 'zone'], name='lims_carbon_timesta_idx'),  # Composite index for common queries
+            models.Index(fields=['organization', '-timestamp'], name='lims_carbon_org_ts_idx'),
+        ]
+
+    tenant_field = 'organization_id'
+    objects = TenantManager()
+
+    def __str__(self):
+        return f"{self.zone.name} - {self.saved_amount} saved"
+
+class Frame(models.Model):
+    """
+    An archived detection frame (lims.frames), stored once per content hash:
+    the same upload seen again only moves last_seen_at / expires_at forward.
+    The image itself is in the frame store, keyed by sha256.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)  # Of the uploaded bytes
+    zone = models.ForeignKey(Zone, on_delete=models.SET_NULL, related_name='frames', null=True, db_index=False)
+    camera = models.ForeignKey(Camera, on_delete=models.DO_NOTHING, related_name='+',
+                               null=True, blank=True, db_constraint=False, db_index=False)
+    organization = models.ForeignKey(Organization, on_delete=models.DO_NOTHING, related_name='+',
+                                     null=True, db_constraint=False, db_index=False)
+    width = models.PositiveSmallIntegerField()  # Stored (downscaled) image
+    height = models.PositiveSmallIntegerField()
+    size = models.PositiveIntegerField()
+    people_count = models.PositiveSmallIntegerField()  # SAHI count at capture
+
+    # Latest re-count by `reprocess_frames`
+    recount = models.PositiveSmallIntegerField(null=True, blank=True)
+    recount_backend = models.CharField(max_length=20, blank=True, default="")
+    recounted_at = models.DateTimeField(null=True, blank=True)
+
+    captured_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['zone', '-captured_at'], name='lims_frame_zone_captured_idx'),
+            models.Index(fields=['expires_at'], name='lims_frame_expires_idx'),  # Retention sweep
+        ]
+
+    tenant_field = 'organization_id'
+    objects = TenantManager()
+
+    def __str__(self):
+        return f"{self.sha256[:12]} (zone {self.zone_id})"
+
+
+class OccupancySample(models.Model):
+    """
+    One row per detection (safe or overcrowded). Append-only and kept narrow:
+    no text columns, small integer count, loose camera reference.
+    Queried through OccupancyRollup for anything longer than a few hours.
+    """
+    # (zone, timestamp) index below covers zone lookups; no separate FK indexes to maintain
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='occupancy_samples', db_index=False)
+    # No FK constraint: appends stay cheap and history survives camera deletion
+    camera = models.ForeignKey(Camera, on_delete=models.DO_NOTHING, related_name='+',
+                               null=True, blank=True, db_constraint=False, db_index=False)
+    timestamp = models.DateTimeField(default=timezone.now)
+    people_count = models.PositiveSmallIntegerField()
+    capacity_ratio = models.FloatField()  # people_count / zone capacity
+
+    class Meta:
+        indexes = [
+            # Rows arrive in time order, so (zone, timestamp) is also time-clustered.
+            # PostgreSQL additionally gets a BRIN index on timestamp (migration 0006).
+            models.Index(fields=['zone', 'timestamp'], name='lims_occ_zone_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"Zone {self.zone_id} @ {self.timestamp}: {self.people_count}"
+
+
+class OccupancyRollup(models.Model):
+    """ Per-minute / per-hour aggregate of OccupancySample, built by `downsample_occupancy` """
+    MINUTE = 60
+    HOUR = 3600
+
+    zone = models.ForeignKey(Zone, on_delete=models.CASCADE, related_name='occupancy_rollups')
+    period_seconds = models.PositiveIntegerField()  # MINUTE or HOUR
+    bucket_start = models.DateTimeField()
+    samples = models.PositiveIntegerField()
+    avg_count = models.FloatField()
+    peak_count = models.PositiveSmallIntegerField()
+    peak_ratio = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zone', 'period_seconds', 'bucket_start'], name='lims_occ_rollup_bucket_uniq'),
+        ]
+        indexes = [
+            # Rollup watermark lookup (latest bucket per period)
+            models.Index(fields=['period_seconds', 'bucket_start'], name='lims_occ_rollup_period_idx'),
         ]
 
     def __str__(self):
-        return f"{self.zone.name} - {self.saved_amount} saved"
\ No newline at end of file
+        return f"Zone {self.zone_id} {self.period_seconds}s @ {self.bucket_start}: peak {self.peak_count}"
@@ -0,0 +1,122 @@
+"""
+Targeted notifications with a per-user read cursor (fan-out on read).
+
+A notification is stored once, with an `audience` key: "all", "role:<role>",
+"org:<id>" or "user:<id>". A reader's feed is every notification whose
+audience is one of theirs, so a broadcast to any number of users is a
+single INSERT.
+
+Read state is one NotificationCursor row per user (last_seen_id): every
+notification up to that id is read. Marking the feed read is one UPDATE,
+with no row per user per notification.
+
+Both reads are range scans on the (audience, id) index:
+- a feed page is keyset-paginated on id (?before=<id>), so any page costs
+  the same as the first;
+- the unread count is `audience IN (...) AND id > last_seen_id`, capped at
+  NOTIFICATION_UNREAD_CAP.
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+
+from .models import Membership, Notification, NotificationCursor
+from .tenancy import UNRESTRICTED, check_organization, member_organization_ids, organization_scope
+
+ALL = "all"
+
+
+def audience_key(user_id=None, role=None, organization_id=None):
+    """ Audience of a new notification: the most specific target given, else everyone """
+    if user_id:
+        return f"user:{user_id}"
+    if role:
+        return f"role:{role}"
+    if organization_id:
+        return f"org:{organization_id}"
+    return ALL
+
+
+def check_target(sender, user_id=None, role=None, organization_id=None):
+    """
+    Raises PermissionDenied unless `sender` may notify the target. ADMIN may
+    notify anyone; other users their organizations (check_organization) and
+    users who share one with them. Everyone and roles are ADMIN only.
+    """
+    scope = organization_scope(sender)
+    if scope is UNRESTRICTED:
+        return
+    if organization_id:
+        check_organization(sender, organization_id)
+    elif user_id:
+        # An unknown id answers like another tenant's user, so ids can't be probed
+        if user_id != sender.pk and not Membership.objects.filter(user_id=user_id, organization_id__in=scope).exists():
+            raise PermissionDenied("You can only notify members of your organizations.")
+    else:
+        raise PermissionDenied("Only admins can notify everyone or a role.")
+
+
+def audiences_for(user, organization_ids=()):
+    """
+    Every audience key a reader belongs to. Organization audiences are the
+    requested ids the reader may see (lims.tenancy); members who ask for none
+    get all of their organizations.
+    """
+    keys = [ALL]
+    if user is not None and user.is_authenticated:
+        keys += [f"role:{user.role}", f"user:{user.pk}"]
+    allowed = member_organization_ids(user)
+    if allowed is not UNRESTRICTED:
+        allowed = {str(org_id) for org_id in allowed}
+        organization_ids = [o for o in organization_ids if str(o) in allowed] if organization_ids else sorted(allowed)
+    keys += [f"org:{org_id}" for org_id in organization_ids]
+    return keys
+
+
+def can_read(user, notification):
+    """ Whether `notification` is in the reader's feed; only an "org:<id>" audience looks up tenancy """
+    kind, _, target = notification.audience.partition(':')
+    if kind == 'org':
+        return notification.audience in audiences_for(user, [target])
+    if notification.audience == ALL:
+        return True
+    signed_in = user is not None and user.is_authenticated
+    return signed_in and notification.audience in (f"role:{user.role}", f"user:{user.pk}")
+
+
+def feed(audiences, before=None, limit=None):
+    """ (newest-first page, `before` value of the next page or None) """
+    limit = limit or settings.NOTIFICATION_PAGE_SIZE
+    notifications = Notification.objects.filter(audience__in=audiences).order_by('-id')
+    if before:
+        notifications = notifications.filter(id__lt=before)
+    # One extra row tells whether there is a next page
+    page = list(notifications[:limit + 1])
+    return page[:limit], (page[limit - 1].id if len(page) > limit else None)
+
+
+def last_seen_id(user):
+    return NotificationCursor.objects.filter(user=user).values_list('last_seen_id', flat=True).first() or 0
+
+
+def unread_count(audiences, last_seen):
+    """ Unread notifications, counted up to NOTIFICATION_UNREAD_CAP """
+    unread = Notification.objects.filter(audience__in=audiences, id__gt=last_seen)
+    return unread[:settings.NOTIFICATION_UNREAD_CAP].count()
+
+
+def mark_read(user, up_to_id=None):
+    """
+    Moves the user's cursor forward to `up_to_id` (default: newest
+    notification), never back. Returns the cursor position.
+    """
+    if up_to_id is None:
+        up_to_id = Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    moved = (NotificationCursor.objects.filter(user=user, last_seen_id__lt=up_to_id)
+             .update(last_seen_id=up_to_id, updated_at=timezone.now()))
+    if moved:
+        return up_to_id
+    # No cursor yet (or already past up_to_id): insert unless it exists, without a savepoint
+    NotificationCursor.objects.bulk_create([NotificationCursor(user=user, last_seen_id=up_to_id)],
+                                           ignore_conflicts=True)
+    return last_seen_id(user)
@@ -0,0 +1,110 @@
+"""
+Occupancy time series: raw samples -> per-minute -> per-hour rollups.
+
+Every detection appends one OccupancySample. `downsample_occupancy` (cron)
+folds them into OccupancyRollup rows so history queries read at most one
+row per minute or hour instead of scanning raw samples. Rollups are
+upserts, so re-running over an already-processed window is harmless.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db.models import Avg, Count, F, FloatField, Max, Sum
+from django.db.models.functions import TruncHour, TruncMinute
+
+from .models import OccupancyRollup, OccupancySample
+
+UPSERT_BATCH_SIZE = 1000
+RESOLUTIONS = {'minute': OccupancyRollup.MINUTE, 'hour': OccupancyRollup.HOUR}
+
+
+def _watermark(period_seconds):
+    """ Start of the newest rollup bucket; it may have been partial, so it is rebuilt """
+    return (OccupancyRollup.objects
+            .filter(period_seconds=period_seconds)
+            .aggregate(latest=Max('bucket_start'))['latest'])
+
+
+def _upsert(rows):
+    OccupancyRollup.objects.bulk_create(
+        rows,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['zone', 'period_seconds', 'bucket_start'],
+        update_fields=['samples', 'avg_count', 'peak_count', 'peak_ratio'],
+    )
+    return len(rows)
+
+
+def rollup_minutes(since=None):
+    """ Aggregates raw samples into minute buckets from `since` (default: watermark) """
+    since = since or _watermark(OccupancyRollup.MINUTE)
+    samples = OccupancySample.objects.all()
+    if since is not None:
+        samples = samples.filter(timestamp__gte=since)
+
+    buckets = (samples
+               .annotate(bucket=TruncMinute('timestamp', tzinfo=dt_timezone.utc))
+               .values('zone_id', 'bucket')
+               .annotate(samples=Count('id'), avg_count=Avg('people_count'),
+                         peak_count=Max('people_count'), peak_ratio=Max('capacity_ratio'))
+               .order_by())
+    return _upsert([
+        OccupancyRollup(zone_id=b['zone_id'], period_seconds=OccupancyRollup.MINUTE, bucket_start=b['bucket'],
+                        samples=b['samples'], avg_count=b['avg_count'],
+                        peak_count=b['peak_count'], peak_ratio=b['peak_ratio'])
+        for b in buckets.iterator()
+    ])
+
+
+def rollup_hours(since=None):
+    """ Aggregates minute rollups into hour buckets (sample-weighted average) """
+    since = since or _watermark(OccupancyRollup.HOUR)
+    minutes = OccupancyRollup.objects.filter(period_seconds=OccupancyRollup.MINUTE)
+    if since is not None:
+        minutes = minutes.filter(bucket_start__gte=since)
+
+    buckets = (minutes
+               .annotate(bucket=TruncHour('bucket_start', tzinfo=dt_timezone.utc))
+               .values('zone_id', 'bucket')
+               .annotate(total=Sum('samples'),
+                         weighted=Sum(F('avg_count') * F('samples'), output_field=FloatField()),
+                         peak=Max('peak_count'), ratio=Max('peak_ratio'))
+               .order_by())
+    return _upsert([
+        OccupancyRollup(zone_id=b['zone_id'], period_seconds=OccupancyRollup.HOUR, bucket_start=b['bucket'],
+                        samples=b['total'], avg_count=b['weighted'] / b['total'] if b['total'] else 0.0,
+                        peak_count=b['peak'], peak_ratio=b['ratio'])
+        for b in buckets.iterator()
+    ])
+
+
+def prune_samples(older_than):
+    """
+    Deletes raw samples older than `older_than` that are already covered by
+    minute rollups. Returns the number of rows removed.
+    """
+    watermark = _watermark(OccupancyRollup.MINUTE)
+    if watermark is None:
+        return 0
+    cutoff = min(older_than, watermark)
+    # Nothing references samples, so this is a single DELETE (no per-row collection)
+    deleted, _ = OccupancySample.objects.filter(timestamp__lt=cutoff).delete()
+    return deleted
+
+
+def history(zone_id, resolution='hour', start=None, end=None):
+    """ Rollup rows of one zone, oldest first, as plain dicts """
+    period = RESOLUTIONS[resolution]
+    rows = OccupancyRollup.objects.filter(zone_id=zone_id, period_seconds=period)
+    if start is not None:
+        rows = rows.filter(bucket_start__gte=start)
+    if end is not None:
+        rows = rows.filter(bucket_start__lt=end)
+    return list(rows.order_by('bucket_start').values(
+        'bucket_start', 'samples', 'avg_count', 'peak_count', 'peak_ratio'
+    ))
+
+
+def default_window(resolution, end):
+    """ 24 hours of minutes or 7 days of hours """
+    return end - (timedelta(hours=24) if resolution == 'minute' else timedelta(days=7))
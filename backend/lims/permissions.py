@@ -1,26 +1,18 @@
-from rest_framework.permissions import BasePermission
+from rest_framework.permissions import SAFE_METHODS, BasePermission
 
+from .models import User
 
-class IsAdmin(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role in ['DIRECTOR', 'MANAGER']
-    
-class IsSubAdmin(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role in ['ANALYST', 'DIRECTOR', 'MANAGER']
 
-class IsDirector(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'DIRECTOR'
+# User.Role has ADMIN and USER. What a USER sees is decided by organization
+# membership (lims.tenancy), not by more roles.
 
-class IsManager(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'MANAGER'
-    
-class IsAnalyst(BasePermission):
+class IsAdmin(BasePermission):
+    """ ADMIN role: every organization, plus the operational endpoints """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'ANALYST'
+        return request.user.is_authenticated and request.user.role == User.Role.ADMIN
+
 
-class IsReceptionist(BasePermission):
+class IsAdminOrReadOnly(IsAdmin):
+    """ Anyone may read; writes need the ADMIN role """
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.role == 'RECEPTIONIST'
\ No newline at end of file
+        return request.method in SAFE_METHODS or super().has_permission(request, view)
@@ -0,0 +1,298 @@
+"""
+Eco-points: an append-only ledger, batched accrual and a precomputed leaderboard.
+
+PointsEntry is the source of truth; User.eco_points is the running balance.
+
+Accrual (`credit`) only adds to an in-memory total per (user, reason). A
+background thread flushes every POINTS_FLUSH_SECONDS, or sooner once
+POINTS_FLUSH_MAX_PENDING totals are waiting. A flush is one transaction:
+- one INSERT of ledger rows, one per (user, reason) with the number of
+  credits it folds;
+- one `eco_points = eco_points + n` UPDATE per user, in user id order so
+  concurrent flushes can't deadlock.
+A user credited 1000 times between flushes costs one row lock, not 1000
+contending UPDATEs. Credits still pending when a process dies are lost, so
+the loss is bounded by the flush interval.
+
+Leaderboard: the top POINTS_LEADERBOARD_SIZE users (plus a margin) are kept
+in the POINTS_CACHE Django cache. Each flush merges the new balances of the
+users it touched, and a read never sorts the users table. `reconcile` (the
+`reconcile_points` command) rebuilds it from scratch and also fixes any
+balance that drifted from its ledger. A snapshot older than
+POINTS_LEADERBOARD_MAX_AGE_SECONDS is rebuilt on read, for caches that are
+not shared between processes.
+
+The board is global, but `visible_to` only names the caller and users who
+share one of their organizations; other entries keep their rank and points
+and lose their id and name.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .metrics import register_collector
+from .serving import on_drain
+from .models import Membership, PointsEntry, User
+from .tenancy import UNRESTRICTED, organization_scope
+
+LEADERBOARD_KEY = "points:leaderboard"
+LEADERBOARD_LOCK_KEY = "points:leaderboard:lock"
+ANONYMOUS = "Anonymous"
+
+
+def _display_name(first_name, last_name, email):
+    name = f"{first_name} {last_name}".strip()
+    # Never publish full email addresses on a public board
+    return name or email.split('@')[0]
+
+
+# ==========================================
+# ACCRUAL
+# ==========================================
+
+class PointsAccrual:
+    """ Per-process buffer of credits, flushed in batches by a daemon thread """
+
+    def __init__(self, flush_seconds=None, max_pending=None):
+        self.flush_seconds = settings.POINTS_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.max_pending = settings.POINTS_FLUSH_MAX_PENDING if max_pending is None else max_pending
+        self._pending = defaultdict(lambda: [0, 0])  # (user_id, reason) -> [amount, credits]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, credits keep coming in meanwhile
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flushed_credits = 0
+        self.failures = 0
+
+    def credit(self, user_id, amount, reason):
+        if not amount:
+            return
+        with self._lock:
+            entry = self._pending[(user_id, reason)]
+            entry[0] += amount
+            entry[1] += 1
+            full = len(self._pending) >= self.max_pending
+        self.start()
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """ Writes every pending total; returns the number of credits flushed """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, defaultdict(lambda: [0, 0])
+            if not batch:
+                return 0
+            try:
+                totals = apply_credits(batch)
+            except Exception:
+                # Put the batch back so the next flush retries it
+                with self._lock:
+                    for key, (amount, credits) in batch.items():
+                        entry = self._pending[key]
+                        entry[0] += amount
+                        entry[1] += credits
+                self.failures += 1
+                raise
+            credits = sum(c for _, c in batch.values())
+            self.flushes += 1
+            self.flushed_credits += credits
+        merge_leaderboard(totals)
+        return credits
+
+    def start(self):
+        """ Starts the flusher once per process """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="points-flush", daemon=True)
+            self._thread.start()
+            on_drain('points', lambda deadline: self._flush_quietly())
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush_quietly()
+
+    def _flush_quietly(self):
+        try:
+            close_old_connections()
+            return self.flush()
+        except Exception:
+            pass  # Retried on the next tick; counted in ecoflow_points_flush_failures_total
+
+
+def apply_credits(batch):
+    """
+    Ledger INSERT + one F() UPDATE per user, in one transaction.
+    `batch` maps (user_id, reason) -> [amount, credits]. Returns {user_id: new balance}.
+    """
+    per_user = defaultdict(int)
+    for (user_id, _), (amount, _) in batch.items():
+        per_user[user_id] += amount
+
+    with transaction.atomic():
+        PointsEntry.objects.bulk_create([
+            PointsEntry(user_id=user_id, reason=reason, amount=amount, credits=credits)
+            for (user_id, reason), (amount, credits) in batch.items()
+        ])
+        for user_id in sorted(per_user):
+            User.objects.filter(pk=user_id).update(eco_points=F('eco_points') + per_user[user_id])
+        return dict(User.objects.filter(pk__in=per_user).values_list('id', 'eco_points'))
+
+
+_accrual = None
+_accrual_lock = threading.Lock()
+
+
+def get_accrual():
+    global _accrual
+    if _accrual is None:
+        with _accrual_lock:
+            if _accrual is None:
+                _accrual = PointsAccrual()
+    return _accrual
+
+
+def credit(user_id, amount, reason):
+    """ Queues `amount` points for the user; written by the next flush """
+    get_accrual().credit(user_id, amount, reason)
+
+
+@register_collector
+def collect():
+    if _accrual is None:
+        return []
+    return [
+        "# TYPE ecoflow_points_pending gauge",
+        f"ecoflow_points_pending {_accrual.pending()}",
+        "# TYPE ecoflow_points_flushes_total counter",
+        f"ecoflow_points_flushes_total {_accrual.flushes}",
+        "# TYPE ecoflow_points_flushed_credits_total counter",
+        f"ecoflow_points_flushed_credits_total {_accrual.flushed_credits}",
+        "# TYPE ecoflow_points_flush_failures_total counter",
+        f"ecoflow_points_flush_failures_total {_accrual.failures}",
+    ]
+
+
+# ==========================================
+# LEADERBOARD
+# ==========================================
+
+def _cache():
+    return caches[settings.POINTS_CACHE]
+
+
+def _kept():
+    # Margin below the visible board, so a few users losing points (reconcile) don't leave gaps
+    return settings.POINTS_LEADERBOARD_SIZE * 2
+
+
+def rebuild_leaderboard():
+    """ Top users straight from the table (a LIMIT scan, only here and in reconcile) """
+    rows = (User.objects.filter(eco_points__gt=0).order_by('-eco_points', 'id')
+            .values_list('id', 'eco_points', 'first_name', 'last_name', 'email')[:_kept()])
+    board = {
+        "built_at": time.time(),
+        "entries": [(user_id, points, _display_name(first, last, email))
+                    for user_id, points, first, last, email in rows],
+    }
+    _cache().set(LEADERBOARD_KEY, board, timeout=None)
+    return board
+
+
+def merge_leaderboard(balances):
+    """ Folds new balances ({user_id: points}) into the cached board """
+    if not balances:
+        return
+    cache = _cache()
+    # Short lock so two flushes don't overwrite each other's merge; give up rather than block
+    for _ in range(20):
+        if cache.add(LEADERBOARD_LOCK_KEY, 1, timeout=5):
+            break
+        time.sleep(0.01)
+    else:
+        return
+    try:
+        board = cache.get(LEADERBOARD_KEY)
+        if board is None:
+            return  # Built on the next read
+        entries = {user_id: (points, name) for user_id, points, name in board["entries"]}
+        lowest = min((points for points, _ in entries.values()), default=0)
+        full = len(entries) >= _kept()
+        newcomers = [u for u, points in balances.items()
+                     if u not in entries and points > 0 and (not full or points > lowest)]
+        names = {}
+        if newcomers:
+            names = {user_id: _display_name(first, last, email) for user_id, first, last, email in
+                     User.objects.filter(pk__in=newcomers).values_list('id', 'first_name', 'last_name', 'email')}
+        for user_id, points in balances.items():
+            if user_id in entries:
+                entries[user_id] = (points, entries[user_id][1])
+            elif user_id in names:
+                entries[user_id] = (points, names[user_id])
+        ranked = sorted(entries.items(), key=lambda item: (-item[1][0], item[0]))[:_kept()]
+        board["entries"] = [(user_id, points, name) for user_id, (points, name) in ranked]
+        cache.set(LEADERBOARD_KEY, board, timeout=None)
+    finally:
+        cache.delete(LEADERBOARD_LOCK_KEY)
+
+
+def leaderboard(limit=None):
+    """ [{"rank", "user_id", "name", "points"}] for the top `limit` users """
+    limit = limit or settings.POINTS_LEADERBOARD_SIZE
+    board = _cache().get(LEADERBOARD_KEY)
+    if board is None or time.time() - board["built_at"] > settings.POINTS_LEADERBOARD_MAX_AGE_SECONDS:
+        board = rebuild_leaderboard()
+    return [
+        {"rank": rank, "user_id": user_id, "name": name, "points": points}
+        for rank, (user_id, points, name) in enumerate(board["entries"][:limit], start=1)
+    ]
+
+
+def visible_to(board, user):
+    """ `board` with the entries of users outside `user`'s organizations made anonymous """
+    scope = organization_scope(user)
+    if scope is UNRESTRICTED or not board:
+        return board
+    known = {user.pk}
+    if not isinstance(scope, list):
+        known.update(Membership.objects.filter(organization_id__in=scope,
+                                               user_id__in=[entry["user_id"] for entry in board])
+                     .values_list('user_id', flat=True))
+    return [entry if entry["user_id"] in known else dict(entry, user_id=None, name=ANONYMOUS)
+            for entry in board]
+
+
+# ==========================================
+# RECONCILIATION
+# ==========================================
+
+def reconcile():
+    """
+    Sets every balance that differs from its ledger sum back to the ledger
+    (one UPDATE), then rebuilds the leaderboard. Returns the users fixed.
+    """
+    ledger = Subquery(PointsEntry.objects.filter(user_id=OuterRef('pk')).order_by()
+                      .values('user_id').annotate(total=Sum('amount')).values('total'))
+    expected = Coalesce(ledger, Value(0))
+    drifted = list(User.objects.annotate(expected=expected).exclude(eco_points=F('expected'))
+                   .values_list('id', flat=True))
+    if drifted:
+        User.objects.filter(pk__in=drifted).update(eco_points=expected)
+    rebuild_leaderboard()
+    return drifted
@@ -0,0 +1,200 @@
+"""
+On-demand request profiling (ProfilingMiddleware).
+
+Off by default: unless PROFILING_ENABLED is set, the middleware removes
+itself at startup (MiddlewareNotUsed) and costs nothing. When enabled, a
+request is profiled if:
+- it carries `X-Profile: 1` or `?_profile=1` and a JWT for an ADMIN user
+  (the token is only checked when the flag is present), or
+- it is picked by the global sampling mode, 1 in PROFILE_SAMPLE_EVERY
+  requests (0: off).
+
+A profiled request runs with a sampling thread that reads the request
+thread's stack every PROFILE_INTERVAL_MS. The request itself is not
+instrumented, so timings stay realistic. The stacks are kept in folded
+("collapsed") form: one `root;caller;callee count` line per distinct stack.
+That is the input format of flamegraph.pl, speedscope and most flame graph
+viewers. The ORM queries the request ran (SQL and time, without parameters)
+are recorded next to them.
+
+Each profile is a JSON file in PROFILE_DIR. Only the newest
+PROFILE_MAX_FILES are kept. Admins fetch profiles from /api/profiles/; the
+id comes back in the X-Profile-Id header of the profiled response.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+
+def _label(code):
+    """ Frame label: function (path relative to the project or site-packages:line) """
+    filename = code.co_filename
+    root = str(settings.BASE_DIR)
+    if filename.startswith(root):
+        filename = filename[len(root) + 1:]
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages', 1)[1].lstrip(os.sep)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """ Samples one thread's stack from a background thread until stopped """
+
+    def __init__(self, thread_id=None, interval_ms=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = (settings.PROFILE_INTERVAL_MS if interval_ms is None else interval_ms) / 1000
+        self.stacks = Counter()  # tuple of code objects, root first -> samples
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """ {"root;caller;callee": samples}, labels resolved once per code object """
+        labels = {}
+
+        def label(code):
+            if code not in labels:
+                labels[code] = _label(code)
+            return labels[code]
+
+        folded = Counter()
+        for stack, count in self.stacks.items():
+            folded[';'.join(label(c) for c in stack)] += count
+        return dict(folded.most_common())
+
+
+class QueryLog:
+    """ execute_wrapper recording each query's SQL and duration (parameters left out) """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "alias": context['connection'].alias,
+                "sql": sql,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+class RequestProfile:
+    """ Profiler + query log around one request """
+
+    def __init__(self, reason):
+        self.reason = reason  # "requested" or "sampled"
+        self.profiler = SamplingProfiler()
+        self.queries = QueryLog()
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        self.started_at = datetime.now(dt_timezone.utc)
+        self._start = time.perf_counter()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self.queries))
+        self._stack.enter_context(self.profiler)
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def save(self, request, response):
+        """ Writes the profile to PROFILE_DIR and returns its id """
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.url_name or match.view_name) if match else 'unmatched'
+        profile_id = f"{self.started_at:%Y%m%dT%H%M%S}-{endpoint}-{uuid.uuid4().hex[:8]}"
+        payload = {
+            "id": profile_id,
+            "reason": self.reason,
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 2),
+            "interval_ms": self.profiler.interval * 1000,
+            "samples": self.profiler.samples,
+            "query_count": len(self.queries.queries),
+            "query_ms": round(sum(q["ms"] for q in self.queries.queries), 3),
+            "queries": self.queries.queries,
+            "stacks": self.profiler.folded(),
+        }
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a reader never sees half a file
+        tmp = directory / f".{profile_id}.tmp"
+        tmp.write_text(json.dumps(payload))
+        tmp.rename(directory / f"{profile_id}.json")
+        rotate(directory)
+        return profile_id
+
+
+def rotate(directory=None, keep=None):
+    """ Deletes all but the newest `keep` profiles """
+    directory = Path(directory or settings.PROFILE_DIR)
+    keep = settings.PROFILE_MAX_FILES if keep is None else keep
+    files = sorted(directory.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in files[keep:]:
+        stale.unlink(missing_ok=True)
+
+
+def list_profiles():
+    """ Newest first: [{"id", "size", "modified"}] """
+    directory = Path(settings.PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    files = sorted(directory.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{
+        "id": f.stem,
+        "size": f.stat().st_size,
+        "modified": datetime.fromtimestamp(f.stat().st_mtime, tz=dt_timezone.utc).isoformat(),
+    } for f in files]
+
+
+def load_profile(profile_id):
+    """ The stored profile, or None (ids are file stems; anything else is rejected) """
+    if not profile_id or '/' in profile_id or '\\' in profile_id or profile_id.startswith('.'):
+        return None
+    path = Path(settings.PROFILE_DIR) / f"{profile_id}.json"
+    if not path.is_file():
+        return None
+    return json.loads(path.read_text())
+
+
+def folded_text(profile):
+    """ The stacks as flamegraph.pl / speedscope input """
+    return ''.join(f"{stack} {count}\n" for stack, count in profile["stacks"].items())
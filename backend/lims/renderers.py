@@ -0,0 +1,53 @@
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib renderer/parser are used instead
+    orjson = None
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import span
+
+# Types orjson doesn't take natively (Decimal, lazy strings, datetimes) go through
+# DRF's encoder, so the output matches JSONRenderer (e.g. "...T12:00:00.123Z")
+_fallback = JSONEncoder().default
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """ JSONRenderer that records its time as the `render` stage """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with span('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONRenderer(TimedJSONRenderer):
+    """
+    Same JSON as TimedJSONRenderer, written by orjson (several times faster on
+    long lists). Falls back to the stdlib when orjson is missing or an
+    indented response is asked for (orjson only has 2-space indents). NaN is
+    written as null, where the stdlib renderer would raise.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        with span('render'):
+            return orjson.dumps(data, default=_fallback, option=_ORJSON_OPTIONS)
+
+
+class ORJSONParser(JSONParser):
+    """ JSONParser on orjson (UTF-8 only, as JSON requires) """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,113 @@
+"""
+Read-replica routing.
+
+Reads go to a replica only inside requests that ReplicaRoutingMiddleware
+marks as replica-safe (GETs to REPLICA_READ_ENDPOINTS from clients that have
+not written recently). Everything else, and every write, uses `default`.
+Replicas that fail a health probe, lag too far behind or raise a connection
+error are skipped for REPLICA_RETRY_SECONDS.
+"""
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# True while the current request may read from a replica
+use_replica = ContextVar('use_replica', default=False)
+# Replica chosen for the current request (keeps one request on one snapshot)
+current_replica = ContextVar('current_replica', default=None)
+
+_down_until = {}
+_lock = threading.Lock()
+_round_robin = itertools.count()
+
+
+def mark_down(alias, seconds=None):
+    with _lock:
+        _down_until[alias] = time.monotonic() + (seconds or settings.REPLICA_RETRY_SECONDS)
+
+
+def mark_up(alias):
+    with _lock:
+        _down_until.pop(alias, None)
+
+
+def healthy_replicas():
+    now = time.monotonic()
+    return [alias for alias in settings.REPLICA_DATABASES if _down_until.get(alias, 0) <= now]
+
+
+def pick_replica():
+    replicas = healthy_replicas()
+    if not replicas:
+        return None
+    return replicas[next(_round_robin) % len(replicas)]
+
+
+class ReplicaRouter:
+    """ DATABASE_ROUTERS entry: replica reads when allowed, primary otherwise """
+
+    def db_for_read(self, model, **hints):
+        if not use_replica.get():
+            return 'default'
+        alias = current_replica.get()
+        if alias is None or alias not in healthy_replicas():
+            alias = pick_replica()
+            current_replica.set(alias)
+        return alias or 'default'
+
+    def db_for_write(self, model, **hints):
+        # Read-after-write inside the same request stays on the primary
+        use_replica.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # No opinion: `migrate` only touches a replica when asked with --database
+        return None
+
+
+def replica_lag_seconds(alias):
+    """ Replay lag for a PostgreSQL streaming replica; None when not applicable """
+    from django.db import connections
+
+    conn = connections[alias]
+    if conn.vendor != 'postgresql':
+        return None
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_is_in_recovery() "
+            "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )
+        row = cursor.fetchone()
+    return float(row[0]) if row and row[0] is not None else None
+
+
+def make_replica_probe(alias):
+    """ Health probe: SELECT 1 plus lag check; updates the routing state """
+    from django.db import connections
+
+    def probe():
+        conn = connections[alias]
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            lag = replica_lag_seconds(alias)
+        except Exception:
+            mark_down(alias)
+            raise
+        finally:
+            conn.close()
+
+        if lag is not None and lag > settings.REPLICA_MAX_LAG_SECONDS:
+            mark_down(alias)
+            raise RuntimeError(f"replication lag {lag:.1f}s > {settings.REPLICA_MAX_LAG_SECONDS}s")
+        mark_up(alias)
+
+    probe.__name__ = f"probe_{alias}"
+    return probe
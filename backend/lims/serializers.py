@@ -1,9 +1,13 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import Organization, Zone, Camera, Alert, Notification
+from .models import Organization, Zone, Camera, Alert, Notification, Membership, CarbonLog, Frame
+from .counters import COUNTER_BACKENDS
+from .heartbeat import camera_status, last_seen
+from .notifications import audience_key, check_target
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -13,15 +17,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['email', 'password', 'first_name', 'last_name', 'role']
+        read_only_fields = ['role']  # Always USER: ADMIN bypasses tenant scoping, so it is never self-assigned
 
     def create(self, validated_data):
         # We must use create_user to hash the password correctly
         user = User.objects.create_user(
+            username=validated_data['email'],  # AbstractUser still requires a unique username
             email=validated_data['email'],
             password=validated_data['password'],
             first_name=validated_data.get('first_name', ''),
             last_name=validated_data.get('last_name', ''),
-            role=validated_data.get('role', User.Role.USER)
+            role=User.Role.USER
         )
         return user
 
@@ -71,10 +77,41 @@ class CameraSerializer(serializers.ModelSerializer):
     zone_id = serializers.PrimaryKeyRelatedField(
         queryset=Zone.objects.all(), source='zone', write_only=True
     ) # For creating/updating
+    # Liveness from the heartbeat store; list views pass context['last_seen'] for all cameras at once
+    last_seen_at = serializers.SerializerMethodField()
+    live_status = serializers.SerializerMethodField()
 
     class Meta:
         model = Camera
-        fields = ['id', 'name', 'is_active', 'zone', 'zone_id', 'created_at']
+        fields = ['id', 'name', 'is_active', 'zone', 'zone_id', 'last_seen_at', 'live_status',
+                  'stale_since', 'created_at']
+        read_only_fields = ['stale_since']
+
+    def create(self, validated_data):
+        # Denormalized tenant column (lims.tenancy)
+        validated_data['organization_id'] = validated_data['zone'].organization_id
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        zone = validated_data.get('zone')
+        if zone is not None and zone.organization_id != instance.organization_id:
+            validated_data['organization_id'] = zone.organization_id
+            # The camera's alerts follow it to the other organization
+            Alert.objects.filter(camera=instance).update(organization_id=zone.organization_id)
+        return super().update(instance, validated_data)
+
+    def _seen_at(self, obj):
+        seen = self.context.get('last_seen')
+        if seen is None or obj.pk not in seen:
+            seen = last_seen([obj])
+        return seen[obj.pk]
+
+    def get_last_seen_at(self, obj):
+        seen_at = self._seen_at(obj)
+        return serializers.DateTimeField().to_representation(seen_at) if seen_at else None
+
+    def get_live_status(self, obj):
+        return camera_status(obj, self._seen_at(obj))
 
 
 class ZoneSerializer(serializers.ModelSerializer):
@@ -92,7 +129,22 @@ class ZoneSerializer(serializers.ModelSerializer):
     class Meta:
         model = Zone
         fields = ['id', 'name', 'zone_type', 'capacity', 'latitude', 'longitude', 
-                  'organization', 'organization_id', 'cameras']
+                  'counter_backend', 'frame_retention_days', 'organization', 'organization_id', 'cameras']
+
+    def validate_counter_backend(self, value):
+        missing = value and COUNTER_BACKENDS[value].missing_requirement()
+        if missing:
+            raise serializers.ValidationError(missing)
+        return value
+
+    def update(self, instance, validated_data):
+        organization = validated_data.get('organization')
+        if organization is not None and organization.pk != instance.organization_id:
+            # Moves the denormalized tenant column of everything under the zone (lims.tenancy)
+            Camera.objects.filter(zone=instance).update(organization_id=organization.pk)
+            Alert.objects.filter(camera__zone=instance).update(organization_id=organization.pk)
+            CarbonLog.objects.filter(zone=instance).update(organization_id=organization.pk)
+        return super().update(instance, validated_data)
 
 
 class OrganizationSerializer(serializers.ModelSerializer):
@@ -112,12 +164,80 @@ class OrganizationSerializer(serializers.ModelSerializer):
         model = Organization
         fields = ['id', 'name', 'org_type', 'total_capacity', 'latitude', 'longitude', 'zones']
 class AlertSerializer(serializers.ModelSerializer):
+    # The camera fixes the alert's organization (lims.tenancy)
+    camera_id = serializers.PrimaryKeyRelatedField(
+        queryset=Camera.objects.only('id', 'organization_id'), source='camera', write_only=True
+    )
+
     class Meta:
         model = Alert
-        fields = ['id', 'heading', 'sub_heading', 'status', 'created_at', 'updated_at']
+        fields = ['id', 'camera_id', 'heading', 'sub_heading', 'status', 'kind', 'escalation_level', 'escalated_at',
+                  'resolved_at', 'frame_id', 'created_at', 'updated_at']
+        read_only_fields = ['escalation_level', 'escalated_at', 'resolved_at', 'frame_id']
+
+    def create(self, validated_data):
+        # Denormalized tenant column (lims.tenancy)
+        validated_data['organization_id'] = validated_data['camera'].organization_id
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'camera' in validated_data:
+            validated_data['organization_id'] = validated_data['camera'].organization_id
+        # Closed by hand: same bookkeeping as the lifecycle worker
+        if validated_data.get('status') == Alert.Status.CLOSED and instance.status != Alert.Status.CLOSED:
+            validated_data['resolved_at'] = timezone.now()
+        return super().update(instance, validated_data)
+
+class FrameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Frame
+        fields = ['sha256', 'zone_id', 'camera_id', 'width', 'height', 'size', 'people_count',
+                  'recount', 'recount_backend', 'recounted_at', 'captured_at', 'last_seen_at', 'expires_at']
+        read_only_fields = fields
+
+class MembershipSerializer(serializers.ModelSerializer):
+    user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user')
+    email = serializers.EmailField(source='user.email', read_only=True)
+
+    class Meta:
+        model = Membership
+        fields = ['id', 'user_id', 'email', 'organization_id', 'created_at']
+        read_only_fields = ['organization_id', 'created_at']
+
+    def validate_user_id(self, user):
+        organization = self.context['organization']
+        if Membership.objects.filter(user=user, organization=organization).exists():
+            raise serializers.ValidationError("Already a member of this organization.")
+        return user
 
 class NotificationSerializer(serializers.ModelSerializer):
+    # Targeting on create (at most one; none = everyone), stored as `audience`
+    user_id = serializers.IntegerField(write_only=True, required=False)
+    role = serializers.ChoiceField(choices=User.Role.choices, write_only=True, required=False)
+    organization_id = serializers.IntegerField(write_only=True, required=False)
+
     class Meta:
         model = Notification
-        fields = ['id', 'title', 'message', 'created_at']
-        read_only_fields = ['created_at']
\ No newline at end of file
+        fields = ['id', 'title', 'message', 'audience', 'created_at', 'user_id', 'role', 'organization_id']
+        read_only_fields = ['audience', 'created_at']
+
+    def validate(self, data):
+        targets = [key for key in ('user_id', 'role', 'organization_id') if data.get(key)]
+        if len(targets) > 1:
+            raise serializers.ValidationError("Target one of 'user_id', 'role' or 'organization_id', not several.")
+        # Before the lookups, so a 400 never tells a non-admin which ids exist
+        if 'request' in self.context:
+            check_target(self.context['request'].user, data.get('user_id'), data.get('role'),
+                         data.get('organization_id'))
+        if data.get('user_id') and not User.objects.filter(pk=data['user_id']).exists():
+            raise serializers.ValidationError({"user_id": "User not found."})
+        if data.get('organization_id') and not Organization.objects.filter(pk=data['organization_id']).exists():
+            raise serializers.ValidationError({"organization_id": "Organization not found."})
+        return data
+
+    def create(self, validated_data):
+        validated_data['audience'] = audience_key(
+            validated_data.pop('user_id', None), validated_data.pop('role', None),
+            validated_data.pop('organization_id', None),
+        )
+        return super().create(validated_data)
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Production serving: graceful drain of buffered writes, and the detection
+bulkhead. kazlat/gunicorn_conf.py wires both into gunicorn.
+
+Some writes are held in memory for a few seconds before they reach the
+database: the frame archive queue (lims.frames), eco-point credits
+(lims.points) and camera heartbeats (lims.heartbeat). Each writer registers
+a hook with on_drain() when it starts. drain() runs the hooks in order
+within DRAIN_TIMEOUT_SECONDS.
+
+- Under gunicorn, SIGTERM calls begin_drain(). It marks the process as
+  draining, so /api/ready/ answers 503. It also writes what is buffered at
+  that moment on a background thread, while the worker finishes its
+  in-flight requests (up to graceful_timeout). The worker_exit hook then
+  calls drain() for what those requests added. If a hung request holds the
+  worker until the master's SIGKILL, the buffers from the moment of
+  SIGTERM are still saved.
+- Anywhere else (runserver, management commands), drain() runs at exit.
+
+Bulkhead: a gthread worker has a fixed number of threads. A detection
+holds one for the whole pipeline, and most of that time is spent waiting on
+the crowd service and the counter backend. With DETECT_MAX_CONCURRENCY set,
+a process runs at most that many detections at once and answers the rest
+with 503 + Retry-After. The remaining threads stay free for CRUD traffic.
+With SERVER_POOL=detect / crud the two kinds of traffic run in separate
+deployments and no cap is needed.
+"""
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import register_collector
+
+_hooks = {}  # name -> fn(deadline) returning the number of items written (or None), in registration order
+_hooks_lock = threading.Lock()
+draining = threading.Event()
+
+
+def on_drain(name, fn):
+    """ Registers `fn(deadline)` to run on drain(); registering a name again is a no-op """
+    with _hooks_lock:
+        if not _hooks:
+            atexit.register(drain)
+        _hooks.setdefault(name, fn)
+
+
+def drain(timeout=None):
+    """
+    Runs every drain hook; hooks that take batches stop at the deadline
+    (time.monotonic()). Returns {name: items written, or the error}.
+    """
+    draining.set()
+    deadline = time.monotonic() + (settings.DRAIN_TIMEOUT_SECONDS if timeout is None else timeout)
+    with _hooks_lock:
+        hooks = list(_hooks.items())
+    results = {}
+    try:
+        for name, fn in hooks:
+            try:
+                results[name] = fn(deadline)
+            except Exception as e:
+                results[name] = f"error: {e}"
+    finally:
+        connections.close_all()  # This thread's connections; the process is going away
+    return results
+
+
+def begin_drain():
+    """ Signal-handler safe: marks the process as draining and flushes in the background """
+    if draining.is_set():
+        return
+    draining.set()
+    threading.Thread(target=drain, name="drain", daemon=True).start()
+
+
+def per_process_state():
+    """
+    Settings whose state each worker process keeps to itself: a "memory"
+    backend, or a "cache" backend on a process-local cache. Fine with one
+    process; with several, gunicorn_conf.py warns at startup.
+    """
+    from django.core.cache import caches
+    from django.core.cache.backends.locmem import LocMemCache
+
+    stores = {
+        "IDEMPOTENCY_BACKEND": (settings.IDEMPOTENCY_BACKEND, settings.IDEMPOTENCY_CACHE),
+        "LIVE_STATE_BACKEND": (settings.LIVE_STATE_BACKEND, settings.LIVE_STATE_CACHE),
+    }
+    return [name for name, (backend, alias) in stores.items()
+            if backend == "memory" or isinstance(caches[alias], LocMemCache)]
+
+
+# ==========================================
+# DETECTION BULKHEAD
+# ==========================================
+
+class Bulkhead:
+    """ At most `limit` concurrent detections per process (0: no limit) """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        """ Yields False (and holds nothing) when every slot is taken """
+        with self._lock:
+            if self.limit and self.active >= self.limit:
+                self.rejected += 1
+                admitted = False
+            else:
+                self.active += 1
+                admitted = True
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                with self._lock:
+                    self.active -= 1
+
+
+_bulkhead = None
+_bulkhead_lock = threading.Lock()
+
+
+def get_bulkhead():
+    global _bulkhead
+    if _bulkhead is None:
+        with _bulkhead_lock:
+            if _bulkhead is None:
+                _bulkhead = Bulkhead(settings.DETECT_MAX_CONCURRENCY)
+    return _bulkhead
+
+
+@register_collector
+def collect():
+    if _bulkhead is None:
+        return []
+    return [
+        "# TYPE ecoflow_detect_in_flight gauge",
+        f"ecoflow_detect_in_flight {_bulkhead.active}",
+        "# TYPE ecoflow_detect_rejected_total counter",
+        f"ecoflow_detect_rejected_total {_bulkhead.rejected}",
+    ]
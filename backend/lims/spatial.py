@@ -0,0 +1,152 @@
+"""
+In-process spatial index over zone coordinates (no PostGIS).
+
+Points are bucketed into a geohash-style grid of `cell_degrees` cells and
+stored in NumPy arrays sorted by cell key (row-major: latitude band, then
+longitude). The cells of one latitude band inside a bounding box are then
+one contiguous slice of the arrays, so a bbox query is one vectorized
+searchsorted per band plus an exact filter on the candidates.
+
+Nearest-neighbour queries search a square of cells around the point and
+grow it until the k-th candidate is closer than anything outside the
+square can be (exact great-circle bound), falling back to a full scan.
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lon, lats, lons):
+    """ Great-circle distance from one point to arrays of points """
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ZoneIndex:
+    """ Grid-bucketed index of (zone id, organization id, latitude, longitude) """
+
+    def __init__(self, ids, organization_ids, lats, lons, cell_degrees=0.05):
+        self.cell = float(cell_degrees)
+        self.n_lat = int(math.ceil(180 / self.cell))
+        self.n_lon = int(math.ceil(360 / self.cell))
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        keys = self._band(lats) * self.n_lon + self._column(lons)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.organization_ids = np.asarray(organization_ids, dtype=np.int64)[order]
+        self.lats, self.lons = lats[order], lons[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _band(self, lats):
+        return np.clip(((np.asarray(lats) + 90) // self.cell).astype(np.int64), 0, self.n_lat - 1)
+
+    def _column(self, lons):
+        return np.clip(((np.asarray(lons) + 180) // self.cell).astype(np.int64), 0, self.n_lon - 1)
+
+    # ------------------------------------------------------------------
+    # Candidate selection
+    # ------------------------------------------------------------------
+
+    def _cells(self, band_lo, band_hi, col_lo, col_hi):
+        """ Positions of the points in a block of cells; columns wrap around the antimeridian """
+        band_lo, band_hi = max(band_lo, 0), min(band_hi, self.n_lat - 1)
+        if band_lo > band_hi or not len(self):
+            return np.empty(0, dtype=np.int64)
+        if col_hi - col_lo + 1 >= self.n_lon:
+            spans = [(0, self.n_lon - 1)]
+        elif col_lo < 0:
+            spans = [(col_lo + self.n_lon, self.n_lon - 1), (0, col_hi)]
+        elif col_hi >= self.n_lon:
+            spans = [(col_lo, self.n_lon - 1), (0, col_hi - self.n_lon)]
+        else:
+            spans = [(col_lo, col_hi)]
+
+        bands = np.arange(band_lo, band_hi + 1, dtype=np.int64) * self.n_lon
+        starts, ends = [], []
+        for lo, hi in spans:
+            starts.append(np.searchsorted(self.keys, bands + lo, side='left'))
+            ends.append(np.searchsorted(self.keys, bands + hi, side='right'))
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        if not len(starts):
+            return np.empty(0, dtype=np.int64)
+        # Concatenated aranges of every [start, end) slice
+        lengths = ends - starts
+        offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+        return np.arange(lengths.sum(), dtype=np.int64) + offsets
+
+    def _filter_org(self, positions, organization_id):
+        """ organization_id: one id, a collection of ids, or None (every organization) """
+        if organization_id is None:
+            return positions
+        if isinstance(organization_id, (list, tuple, set, frozenset)):
+            return positions[np.isin(self.organization_ids[positions], list(organization_id))]
+        return positions[self.organization_ids[positions] == organization_id]
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, organization_id=None):
+        """
+        Positions of the points inside the box, by zone id. min_lon > max_lon
+        means the box crosses the antimeridian.
+        """
+        band_lo, band_hi = (int(b) for b in self._band([min_lat, max_lat]))
+        col_lo, col_hi = (int(c) for c in self._column([min_lon, max_lon]))
+        if min_lon > max_lon:
+            col_hi += self.n_lon
+        positions = self._filter_org(self._cells(band_lo, band_hi, col_lo, col_hi), organization_id)
+
+        lats, lons = self.lats[positions], self.lons[positions]
+        inside = (lats >= min_lat) & (lats <= max_lat)
+        if min_lon <= max_lon:
+            inside &= (lons >= min_lon) & (lons <= max_lon)
+        else:
+            inside &= (lons >= min_lon) | (lons <= max_lon)
+        positions = positions[inside]
+        return positions[np.argsort(self.ids[positions], kind='stable')]
+
+    def nearest(self, lat, lon, k=10, max_km=None, organization_id=None):
+        """ (positions, distances in km) of the k nearest points, closest first """
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        band, col = int(self._band(lat)), int(self._column(lon))
+        cos_lat = math.cos(math.radians(lat))
+
+        radius = 1
+        while True:
+            reach = math.radians(radius * self.cell)  # distance to the square's edge, in angle
+            covers_all = reach >= math.pi / 2
+            if covers_all:
+                positions = self._filter_org(np.arange(len(self), dtype=np.int64), organization_id)
+            else:
+                positions = self._filter_org(
+                    self._cells(band - radius, band + radius, col - radius, col + radius), organization_id)
+            distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+            if max_km is not None:
+                within = distances <= max_km
+                positions, distances = positions[within], distances[within]
+
+            # Nothing outside the square is closer than this (to a parallel or to a meridian)
+            bound = EARTH_RADIUS_KM * min(reach, math.asin(min(1.0, math.sin(reach) * cos_lat)))
+            if covers_all or len(positions) >= k and np.partition(distances, k - 1)[k - 1] <= bound \
+                    or max_km is not None and bound >= max_km:
+                break
+            radius *= 2
+
+        if len(positions) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            positions, distances = positions[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return positions[order], distances[order]
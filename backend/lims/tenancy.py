@@ -0,0 +1,94 @@
+"""
+Tenant scoping: an organization is a tenant, and users see the organizations
+they are members of (Membership).
+
+Tenant-owned models (Organization, Zone, Camera, Alert, CarbonLog) use
+TenantManager. `Model.objects.visible_to(user)` adds one predicate on the
+model's `tenant_field`. Camera, Alert and CarbonLog carry a denormalized
+`organization_id`, so the predicate never joins up the zone -> organization
+chain. The membership list is inlined as a subquery
+(`organization_id IN (SELECT organization_id FROM lims_membership WHERE
+user_id = ...)`), so scoping adds no round trip.
+
+- ADMIN users see every organization.
+- Other signed-in users see their memberships only.
+- Anonymous callers see nothing. TENANT_ANONYMOUS_ACCESS=True (off by
+  default) lets them see everything, for clients written when the API was
+  public.
+
+Writes go through `check_organization`, which raises PermissionDenied (403)
+when the target organization is outside the caller's scope.
+"""
+from django.conf import settings
+from django.db import models
+from django.db.models import OuterRef, Subquery
+from rest_framework.exceptions import PermissionDenied
+
+UNRESTRICTED = None
+
+
+def organization_scope(user):
+    """ UNRESTRICTED, or a lazy subquery / list of the organization ids `user` may see """
+    from .models import Membership, User
+
+    if user is None or not user.is_authenticated:
+        return UNRESTRICTED if settings.TENANT_ANONYMOUS_ACCESS else []
+    if user.role == User.Role.ADMIN:
+        return UNRESTRICTED
+    return Membership.objects.filter(user_id=user.pk).values('organization_id')
+
+
+def member_organization_ids(user):
+    """ The ids themselves (one query), or UNRESTRICTED """
+    scope = organization_scope(user)
+    if scope is UNRESTRICTED or isinstance(scope, list):
+        return scope
+    return list(scope.values_list('organization_id', flat=True))
+
+
+def scope_key(user):
+    """ Cache key part: responses built from scoped querysets differ per member """
+    if organization_scope(user) is UNRESTRICTED:
+        return 'all'
+    return f"user{user.pk}" if user.is_authenticated else 'none'
+
+
+def check_organization(user, organization_id):
+    """ Raises PermissionDenied unless `user` may write to `organization_id` """
+    scope = organization_scope(user)
+    if scope is UNRESTRICTED:
+        return
+    if isinstance(scope, list) or not scope.filter(organization_id=organization_id).exists():
+        raise PermissionDenied("You are not a member of this organization.")
+
+
+class TenantQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """ Rows of the organizations `user` may see """
+        scope = organization_scope(user)
+        if scope is UNRESTRICTED:
+            return self
+        return self.filter(**{f"{self.model.tenant_field}__in": scope})
+
+    def for_organization(self, organization_id):
+        """ One organization, or any of a list of them """
+        if isinstance(organization_id, (list, tuple, set, frozenset)):
+            return self.filter(**{f"{self.model.tenant_field}__in": organization_id})
+        return self.filter(**{self.model.tenant_field: organization_id})
+
+
+TenantManager = models.Manager.from_queryset(TenantQuerySet)
+
+
+def sync_organization(queryset, source):
+    """
+    Sets the denormalized organization_id of every row in `queryset` from
+    `source` ('zone' or 'camera') in one UPDATE. Used by the migration, bulk
+    imports and seeding; request paths set it on the instance instead.
+    """
+    from .models import Camera, Zone
+
+    parent = {'zone': Zone, 'camera': Camera}[source]
+    return queryset.update(organization_id=Subquery(
+        parent.objects.filter(pk=OuterRef(f'{source}_id')).values('organization_id')[:1]
+    ))
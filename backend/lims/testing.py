@@ -0,0 +1,32 @@
+"""
+Test helpers.
+
+    class OrganizationTests(QueryBudgetTestMixin, TestCase):
+        def test_list(self):
+            with self.assertQueryBudget('organization-list-create'):
+                self.client.get('/organizations/')
+"""
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from .middleware import get_query_budget
+
+
+class QueryBudgetTestMixin:
+    """ Fails a test when a block runs more queries than QUERY_BUDGETS allows """
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, method='GET', budget=None, using='default'):
+        if budget is None:
+            budget = get_query_budget(url_name, method)
+        if budget is None:
+            self.fail(f"No query budget declared for {url_name} {method}")
+
+        with CaptureQueriesContext(connections[using]) as captured:
+            yield captured
+
+        if len(captured) > budget:
+            queries = '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(captured.captured_queries, 1))
+            self.fail(f"{url_name} {method} ran {len(captured)} queries, budget is {budget}:\n{queries}")
@@ -0,0 +1,80 @@
+"""
+Shared fixtures. The crowd service and the reference counter are replaced
+with stubs, so the suite runs without network access.
+"""
+import io
+from unittest import mock
+
+import PIL.Image
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..models import Alert, Camera, CarbonLog, Membership, Organization, User, Zone
+
+
+def jpeg_file():
+    buf = io.BytesIO()
+    PIL.Image.new('RGB', (64, 48), (90, 110, 130)).save(buf, format='JPEG')
+    buf.seek(0)
+    buf.name = "frame.jpg"
+    return buf
+
+
+class StubCounter:
+    """ Stands in for the crowd service and the reference counter """
+
+    def __init__(self, name, people):
+        self.name = name
+        self.people = people
+        self.calls = 0
+
+    def count(self, image_data, **kwargs):
+        self.calls += 1
+        return self.people
+
+
+class TenantTestCase(TestCase):
+    """ Two organizations with a zone, camera, alert and carbon log each; a member of the first """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org, cls.other_org = (
+            Organization.objects.create(name=name, org_type="Corporate", latitude=lat, longitude=10)
+            for name, lat in (("Mine", 10), ("Theirs", 20))
+        )
+        for org in (cls.org, cls.other_org):
+            org.zone = Zone.objects.create(organization=org, name=f"{org.name} hall", zone_type="Hall",
+                                           capacity=100, latitude=org.latitude, longitude=org.longitude)
+            org.camera = Camera.objects.create(zone=org.zone, organization=org, name=f"{org.name} cam")
+            org.alert = Alert.objects.create(camera=org.camera, organization=org, heading="Overcrowding")
+            CarbonLog.objects.create(zone=org.zone, organization=org, saved_amount=0.5, sahi_count=1,
+                                     gemini_count=2, formula_version=1)
+        cls.zone, cls.camera, cls.alert = cls.org.zone, cls.org.camera, cls.org.alert
+
+        cls.member = User.objects.create_user(username="member@test", email="member@test", password="pw")
+        Membership.objects.create(user=cls.member, organization=cls.org)
+        cls.admin = User.objects.create_user(username="admin@test", email="admin@test", password="pw",
+                                             role=User.Role.ADMIN)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def sign_in(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
+    def detect(self, zone=None, camera=None, people=10, reference=20, **headers):
+        """
+        POST /sensor/detect/ with stub counters (camera: the zone's first by
+        default); returns (response, reference counter)
+        """
+        zone = zone or self.zone
+        camera = camera or Camera.objects.filter(zone=zone).order_by('id').first()
+        crowd, counter = StubCounter('sahi', people), StubCounter('stub', reference)
+        with mock.patch('lims.views.sensor_views.get_counter', return_value=crowd), \
+                mock.patch('lims.views.sensor_views.get_zone_counter', return_value=counter):
+            response = self.client.post(reverse('sensor-detect'), {
+                "zone_id": zone.pk, "camera_id": camera.pk, "file": jpeg_file(),
+            }, format='multipart', headers=headers)
+        return response, counter
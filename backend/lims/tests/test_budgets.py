@@ -0,0 +1,84 @@
+""" Per-endpoint query budgets (QUERY_BUDGETS) """
+from django.urls import reverse
+
+from ..models import Notification
+from ..testing import QueryBudgetTestMixin
+from .base import TenantTestCase
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TenantTestCase):
+    """ Signed-in member reads stay within QUERY_BUDGETS """
+
+    def requests(self):
+        """ URL name -> (method, path, params) """
+        notification = Notification.objects.create(title="Hello", message="Everyone")
+        return {
+            'organization-list-create': ('GET', reverse('organization-list-create'), None),
+            'organization-detail': ('GET', reverse('organization-detail', args=[self.org.pk]), None),
+            'zone-list-create': ('GET', reverse('zone-list-create'), {"org_id": self.org.pk}),
+            'zone-detail': ('GET', reverse('zone-detail', args=[self.zone.pk]), None),
+            'camera-list-create': ('GET', reverse('camera-list-create'), {"zone_id": self.zone.pk}),
+            'camera-detail': ('GET', reverse('camera-detail', args=[self.camera.pk]), None),
+            'alert-list-create': ('GET', reverse('alert-list-create'), {"status": "OPEN"}),
+            'alert-detail': ('GET', reverse('alert-detail', args=[self.alert.pk]), None),
+            'notification-list-create': ('GET', reverse('notification-list-create'), None),
+            'notification-detail': ('GET', reverse('notification-detail', args=[notification.pk]), None),
+            'get-carbon-stats': ('GET', reverse('get-carbon-stats'), {"zone_id": self.zone.pk}),
+            'occupancy-history': ('GET', reverse('occupancy-history'),
+                                  {"zone_id": self.zone.pk, "resolution": "minute"}),
+            'organization-live': ('GET', reverse('organization-live', args=[self.org.pk]), None),
+            'zone-live': ('GET', reverse('zone-live', args=[self.zone.pk]), None),
+            'zones-bbox': ('GET', reverse('zones-bbox'),
+                           {"min_lat": -90, "min_lon": -180, "max_lat": 90, "max_lon": 180}),
+            'zones-nearest': ('GET', reverse('zones-nearest'), {"lat": 0, "lon": 0, "k": 10}),
+            'points-leaderboard': ('GET', reverse('points-leaderboard'), None),
+        }
+
+    def writes(self):
+        """ URL name -> (method, path, JSON body, expected status) """
+        return {
+            'organization-detail': ('PUT', reverse('organization-detail', args=[self.org.pk]),
+                                    {"name": "Renamed"}, 200),
+            'zone-detail': ('PUT', reverse('zone-detail', args=[self.zone.pk]), {"capacity": 120}, 200),
+            'camera-list-create': ('POST', reverse('camera-list-create'),
+                                   {"name": "New cam", "zone_id": self.zone.pk}, 201),
+            'camera-detail': ('PUT', reverse('camera-detail', args=[self.camera.pk]), {"name": "Renamed cam"}, 200),
+            'alert-list-create': ('POST', reverse('alert-list-create'),
+                                  {"heading": "Smoke", "camera_id": self.camera.pk}, 201),
+            'alert-detail': ('PUT', reverse('alert-detail', args=[self.alert.pk]), {"status": "CLOSED"}, 200),
+            'notification-list-create': ('POST', reverse('notification-list-create'),
+                                         {"title": "Drill", "message": "At noon", "organization_id": self.org.pk}, 201),
+            'notification-read': ('POST', reverse('notification-read'), {}, 200),
+        }
+
+    def test_reads_within_budget(self):
+        self.sign_in(self.member)
+        for name, (method, path, params) in self.requests().items():
+            with self.subTest(name):
+                self.client.get(path, params)  # Warms per-process caches (geo index, heartbeats)
+                with self.assertQueryBudget(name, method):
+                    response = self.client.get(path, params)
+                self.assertEqual(response.status_code, 200, response.content[:200])
+
+    def test_writes_within_budget(self):
+        self.sign_in(self.member)
+        for name, (method, path, body, expected) in self.writes().items():
+            with self.subTest(name):
+                with self.assertQueryBudget(name, method):
+                    response = getattr(self.client, method.lower())(path, body, format='json')
+                self.assertEqual(response.status_code, expected, response.content[:200])
+
+    def test_detect_within_budget(self):
+        self.sign_in(self.member)
+        self.detect()  # First detection of the zone loads its forecast state
+        with self.assertQueryBudget('sensor-detect', 'POST'):
+            response, _ = self.detect()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("carbon_data", response.data)
+
+    def test_heartbeat_within_budget(self):
+        self.sign_in(self.member)
+        path = reverse('camera-heartbeat', args=[self.camera.pk])
+        with self.assertQueryBudget('camera-heartbeat', 'POST'):
+            response = self.client.post(path)
+        self.assertEqual(response.status_code, 204)
@@ -0,0 +1,106 @@
+""" Bulk import/export of the organization -> zone -> camera hierarchy (lims.bulk) """
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..bulk import HIERARCHY_COLUMNS, hierarchy_rows, import_hierarchy, iter_rows
+from ..exports import stream_rows
+from ..models import Camera, Organization, Zone
+from .base import TenantTestCase
+
+CSV = """type,ref,organization_ref,zone_ref,organization_id,zone_id,name,org_type,zone_type,capacity,latitude,longitude
+organization,acme,,,,,Acme,Corporate,,,40.1,-3.2
+zone,lobby,acme,,,,Lobby,,Hall,80,40.1,-3.2
+camera,,,lobby,,,Door,,,,,
+zone,,,,{zone_org},,Annex,,Hall,not-a-number,0,0
+camera,,,,,999999,Ghost,,,,,
+camera,,,nowhere,,,Lost,,,,,
+robot,,,,,,R2,,,,,
+"""
+
+
+class ImportTests(TenantTestCase):
+
+    def csv(self):
+        return CSV.format(zone_org=self.org.pk).splitlines(keepends=True)
+
+    def test_refs_resolve_across_batches_and_bad_rows_are_reported(self):
+        report = import_hierarchy(self.csv(), 'csv', batch_size=2).as_dict()
+        self.assertEqual(report["rows"], 7)
+        self.assertEqual(report["created"], {"organization": 1, "zone": 1, "camera": 1})
+        self.assertEqual([e["line"] for e in report["errors"]], [5, 6, 7, 8])
+        self.assertIn("capacity", report["errors"][0]["errors"])
+        self.assertIn("999999 does not exist", report["errors"][1]["errors"]["zone_id"])
+        self.assertIn("unknown zone ref 'nowhere'", report["errors"][2]["errors"]["zone_ref"])
+
+        camera = Camera.objects.get(name="Door")
+        self.assertEqual(camera.zone.name, "Lobby")
+        self.assertEqual(camera.organization_id, camera.zone.organization_id)  # Denormalized tenant column
+
+    def test_dry_run_rolls_back(self):
+        report = import_hierarchy(self.csv(), 'csv', dry_run=True)
+        self.assertEqual(report.created["organization"], 1)
+        self.assertFalse(Organization.objects.filter(name="Acme").exists())
+
+    def test_ndjson_bytes_with_a_bom(self):
+        lines = [
+            '\ufeff{"type": "organization", "ref": "o", "name": "Json org", "org_type": "NGO"}\n'.encode(),
+            b'{not json\n',
+            b'\n',
+            json.dumps({"type": "zone", "organization_ref": "o", "name": "Café", "zone_type": "Hall",
+                        "capacity": 5}).encode() + b'\n',
+        ]
+        report = import_hierarchy(lines, 'ndjson')
+        self.assertEqual(report.created, {"organization": 1, "zone": 1, "camera": 0})
+        self.assertEqual([e["line"] for e in report.errors], [2])
+        self.assertTrue(Zone.objects.filter(name="Café", organization__name="Json org").exists())
+
+    def test_queries_per_batch_do_not_grow_with_rows(self):
+        def queries(zones):
+            lines = ["type,organization_id,name,zone_type,capacity\n"] + [
+                f"zone,{self.org.pk},Zone {i},Hall,10\n" for i in range(zones)]
+            with CaptureQueriesContext(connection) as ctx:
+                import_hierarchy(lines, 'csv', batch_size=1000)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries(3), queries(60))
+
+    def test_export_round_trips(self):
+        rows = list(hierarchy_rows(self.org.pk))
+        self.assertEqual([row["type"] for row in rows], ["organization", "zone", "camera"])
+        exported = ''.join(stream_rows(rows, 'csv', HIERARCHY_COLUMNS)).splitlines(keepends=True)
+        self.assertEqual(len(list(iter_rows(exported, 'csv'))), 3)
+
+        report = import_hierarchy(exported, 'csv')
+        self.assertEqual((report.error_count, report.created), (0, {"organization": 1, "zone": 1, "camera": 1}))
+        copy = Camera.objects.exclude(pk=self.camera.pk).get(name=self.camera.name)
+        self.assertNotEqual(copy.organization_id, self.org.pk)
+        self.assertEqual(copy.zone.organization.name, self.org.name)
+
+
+class BulkEndpointTests(TenantTestCase):
+
+    def test_only_admins_import(self):
+        body = f"type,organization_id,name,zone_type,capacity\nzone,{self.org.pk},Upload,Hall,10\n"
+        self.sign_in(self.member)
+        response = self.client.post(reverse('bulk-import'), body, content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
+
+        self.sign_in(self.admin)
+        response = self.client.post(reverse('bulk-import') + '?dry_run=1', body, content_type='text/csv')
+        self.assertEqual((response.data["created"]["zone"], response.data["dry_run"]), (1, True))
+        response = self.client.post(reverse('bulk-import'), body, content_type='text/csv')
+        self.assertEqual(response.data["created"]["zone"], 1)
+        self.assertTrue(Zone.objects.filter(name="Upload").exists())
+
+    def test_members_export_their_own_hierarchy(self):
+        self.sign_in(self.member)
+        response = self.client.get(reverse('bulk-export'), {"file_format": "ndjson"})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual({row["name"] for row in rows}, {"Mine", "Mine hall", "Mine cam"})
+
+        response = self.client.get(reverse('bulk-export'), {"org_id": self.other_org.pk})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), [','.join(HIERARCHY_COLUMNS)])
+        self.assertEqual(self.client.get(reverse('bulk-export'), {"file_format": "xml"}).status_code, 400)
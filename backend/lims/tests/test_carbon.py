@@ -0,0 +1,131 @@
+""" Carbon formula registry and the checkpointed backfill (lims.carbon, recompute_carbon) """
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+
+from .. import carbon
+from ..carbon import FORMULAS, Checkpoint, backfill, get_formula, register
+from ..models import CarbonLog
+from .base import TenantTestCase
+
+
+class CarbonTestCase(TenantTestCase):
+    """ A test formula (v99: twice the count), legacy rows without counts, a checkpoint file """
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(FORMULAS.pop, 99, None)
+        register(99, "Twice the SAHI count", "2 x {sahi}")(lambda sahi, gemini: sahi * 2)
+
+        for sahi in (3, 4, 5):
+            CarbonLog.objects.create(zone=self.zone, organization=self.org, saved_amount=0.1, sahi_count=sahi,
+                                     gemini_count=10, formula_version=1)
+        self.legacy = CarbonLog.objects.create(zone=self.zone, organization=self.org, saved_amount=0.7)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint_path = os.path.join(directory.name, "backfill.json")
+
+    def amounts(self):
+        return dict(CarbonLog.objects.values_list('sahi_count', 'saved_amount'))
+
+
+class FormulaTests(CarbonTestCase):
+
+    def test_registry(self):
+        self.assertEqual(get_formula().version, 1)
+        with self.assertRaises(ImproperlyConfigured):
+            get_formula(42)
+        with self.assertRaises(ValueError):
+            register(99, "Again", "")(lambda sahi, gemini: sahi)
+
+    def test_ratio_over_columns_matches_one_row(self):
+        formula = get_formula(1)
+        np.testing.assert_array_equal(formula.compute([1, 2, 5], [3, 0, 5]), [0.3333, 0.0, 1.0])
+        self.assertEqual(formula.one(1, 3), 0.3333)
+        self.assertEqual(formula.describe(1, 3), "1 / 3 rounded")
+
+    def test_detection_logs_its_inputs_and_version(self):
+        self.sign_in(self.member)
+        self.detect(people=10, reference=40)
+        log = CarbonLog.objects.order_by('-id').first()
+        self.assertEqual((log.sahi_count, log.gemini_count, log.saved_amount, log.formula_version),
+                         (10, 40, 0.25, 1))
+
+
+class BackfillTests(CarbonTestCase):
+
+    def test_rederives_in_ranges_and_skips_legacy_rows(self):
+        totals = backfill(99, chunk_size=2, workers=1)
+        self.assertEqual({key: totals[key] for key in ("chunks", "rows", "updated", "skipped")},
+                         {"chunks": 3, "rows": 6, "updated": 5, "skipped": 1})
+        self.assertEqual(self.amounts(), {1: 2.0, 3: 6.0, 4: 8.0, 5: 10.0, None: 0.7})
+        self.legacy.refresh_from_db()
+        self.assertEqual(self.legacy.formula_version, 1)
+
+        # Current rows: nothing left to write
+        self.assertEqual(backfill(99, chunk_size=2, only_stale=True)["rows"], 1)  # The legacy row
+        self.assertEqual(backfill(99, chunk_size=2)["updated"], 0)
+
+    def test_scope_and_dry_run(self):
+        totals = backfill(99, chunk_size=100, org_id=self.other_org.pk, dry_run=True)
+        self.assertEqual((totals["rows"], totals["updated"]), (1, 1))
+        self.assertFalse(CarbonLog.objects.filter(formula_version=99).exists())
+        backfill(99, chunk_size=100, zone_id=self.other_org.zone.pk)
+        self.assertEqual(list(CarbonLog.objects.filter(formula_version=99).values_list('zone_id', flat=True)),
+                         [self.other_org.zone.pk])
+
+    def test_interrupted_run_resumes_from_its_checkpoint(self):
+        params = {"version": 99}
+        checkpoint = Checkpoint(self.checkpoint_path, params)
+        calls = []
+        original = carbon.recompute_chunk
+
+        def fail_on_the_second(lo, hi, **options):
+            calls.append(lo)
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            return original(lo, hi, **options)
+
+        with mock.patch.object(carbon, 'recompute_chunk', side_effect=fail_on_the_second), \
+                self.assertRaises(RuntimeError):
+            backfill(99, chunk_size=2, checkpoint=checkpoint)
+
+        resumed = Checkpoint(self.checkpoint_path, params)
+        self.assertEqual(resumed.done, {calls[0]})
+        totals = backfill(99, chunk_size=2, checkpoint=resumed)
+        self.assertEqual((totals["resumed"], totals["completed"]), (1, 2))
+        self.assertEqual(self.amounts(), {1: 2.0, 3: 6.0, 4: 8.0, 5: 10.0, None: 0.7})
+
+        with self.assertRaisesMessage(ValueError, "other parameters"):
+            Checkpoint(self.checkpoint_path, {"version": 1})
+
+
+class RecomputeCarbonCommandTests(CarbonTestCase):
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('recompute_carbon', '--checkpoint', self.checkpoint_path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_backfill_clears_its_checkpoint_when_done(self):
+        out = self.call('--formula-version', '99', '--chunk', '2')
+        self.assertIn("6 rows re-derived with formula v99", out)
+        self.assertIn("5 updated, 0 unchanged, 1 skipped without stored counts.", out)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_checkpoint_of_another_run(self):
+        Checkpoint(self.checkpoint_path, {"version": 1}).mark(1)
+        with self.assertRaisesMessage(CommandError, "Pass --restart"):
+            self.call('--formula-version', '99')
+        self.assertIn("6 rows re-derived", self.call('--formula-version', '99', '--restart'))
+
+    def test_list_and_unknown_version(self):
+        self.assertIn("v1 (current): SAHI count over", self.call('--list'))
+        with self.assertRaisesMessage(CommandError, "Unknown formula version 42"):
+            self.call('--formula-version', '42')
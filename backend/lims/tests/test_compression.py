@@ -0,0 +1,113 @@
+""" Response compression and the orjson renderer/parser (lims.compression, lims.renderers) """
+import gzip
+import io
+import unittest
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from .. import compression
+from ..compression import negotiate
+from ..middleware import CompressionMiddleware
+from ..renderers import ORJSONParser, ORJSONRenderer, orjson
+
+
+class NegotiateTests(SimpleTestCase):
+
+    def test_best_accepted_encoding(self):
+        encodings = ['br', 'zstd', 'gzip']
+        for header, expected in (
+            ('', None),
+            ('gzip', 'gzip'),
+            ('gzip, deflate, br', 'br'),  # Equal weights: server preference
+            ('br;q=0.5, gzip', 'gzip'),
+            ('br;q=0, zstd;q=0', None),
+            ('*', 'br'),
+            ('*;q=0.1, gzip;q=0.5', 'gzip'),
+            ('GZIP;q=0.8, identity', 'gzip'),
+            ('br;q=oops, gzip;q=0.1', 'gzip'),  # Unparsable weight: refused
+            ('deflate', None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(negotiate(header, encodings), expected)
+
+    def test_missing_codecs_are_skipped(self):
+        with override_settings(COMPRESSION_ENCODINGS='br,zstd,gzip'), \
+                mock.patch.object(compression, '_available', None), \
+                mock.patch('importlib.util.find_spec', return_value=None):
+            self.assertEqual(compression.available_encodings(), ['gzip'])
+
+
+@override_settings(COMPRESSION_ENABLED=True, COMPRESSION_MIN_BYTES=100, COMPRESSION_ENCODINGS='gzip')
+@mock.patch.object(compression, '_available', None)
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def respond(self, response, accept='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_large_json_is_compressed(self):
+        body = {"zones": [{"id": i, "name": f"Zone {i}"} for i in range(50)]}
+        plain = JsonResponse(body).content
+        response = self.respond(JsonResponse(body, headers={"ETag": '"abc"'}))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    def test_left_alone(self):
+        big = {"data": "x" * 500}
+        for response, accept in (
+            (JsonResponse({"ok": True}), 'gzip'),  # Under COMPRESSION_MIN_BYTES
+            (JsonResponse(big), ''),  # Client accepts nothing we have
+            (HttpResponse(b"\x89PNG" * 100, content_type='image/png'), 'gzip'),
+            (HttpResponse(b"x" * 500, content_type='text/plain', headers={"Content-Encoding": "br"}), 'gzip'),
+        ):
+            with self.subTest(content_type=response['Content-Type'], accept=accept):
+                content = response.content
+                response = self.respond(response, accept)
+                self.assertEqual(response.content, content)
+                self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+
+
+@unittest.skipIf(orjson is None, "orjson is optional")
+class ORJSONTests(SimpleTestCase):
+    """ Same bytes as DRF's JSONRenderer """
+
+    def assertSameJSON(self, data):
+        stdlib, fast = JSONRenderer().render(data), ORJSONRenderer().render(data)
+        self.assertEqual(fast, stdlib)
+
+    def test_matches_the_stdlib_renderer(self):
+        for data in (
+            {"id": 1, "name": "Zoné", "ratio": 0.25, "flags": [True, False, None]},
+            [{"nested": {"deep": [1, 2, {"x": "y"}]}}],
+            {"at": datetime(2025, 3, 1, 12, 0, 0, 123456, tzinfo=dt_timezone.utc), "day": date(2025, 3, 1)},
+            {"at": datetime(2025, 3, 1, 12, 0, 0, 123000, tzinfo=dt_timezone.utc)},
+            {"price": Decimal("12.50"), "uuid": uuid.UUID(int=7), "label": gettext_lazy("Open")},
+            {"emoji": "\U0001F600", "quote": "a\"b\\c</script>"},
+            [],
+        ):
+            with self.subTest(data=data):
+                self.assertSameJSON(data)
+
+    def test_differences_are_deliberate(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(ORJSONRenderer().render({1: "a"}), b'{"1":"a"}')  # Non-string keys
+        # Indented output falls back to the stdlib renderer
+        indented = ORJSONRenderer().render({"a": 1}, 'application/json; indent=4')
+        self.assertEqual(indented, JSONRenderer().render({"a": 1}, 'application/json; indent=4'))
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO('{"name": "Zoné", "n": [1, 2.5]}'.encode())),
+                         {"name": "Zoné", "n": [1, 2.5]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"name": '))
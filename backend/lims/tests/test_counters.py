@@ -0,0 +1,83 @@
+""" Counter backends for the carbon ratio (lims.counters) """
+import threading
+import time
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .. import counters
+from ..counters import COUNTER_BACKENDS, BaseCounter, get_counter, get_zone_counter
+from ..models import CarbonLog, Zone
+from .base import StubCounter, TenantTestCase, jpeg_file
+
+
+class SlowCounter(BaseCounter):
+    name = "slow"
+    built = 0
+
+    def __init__(self):
+        time.sleep(0.05)  # Widens the window two threads could both build in
+        SlowCounter.built += 1
+
+
+@mock.patch.dict(counters._counters, clear=True)
+class RegistryTests(SimpleTestCase):
+
+    @override_settings(CARBON_COUNTER_BACKEND='sahi')
+    def test_zone_setting_wins_over_the_default(self):
+        self.assertEqual(get_zone_counter(Zone(counter_backend='')).name, 'sahi')
+        self.assertEqual(get_zone_counter(Zone(counter_backend='gemini')).name, 'gemini')
+        self.assertIs(get_counter('gemini'), get_counter('gemini'))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_counter('bogus')
+
+    @mock.patch.dict(COUNTER_BACKENDS, {'slow': SlowCounter})
+    def test_one_instance_per_process_under_concurrency(self):
+        SlowCounter.built = 0
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(get_counter('slow'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(SlowCounter.built, 1)
+        self.assertEqual(len({id(counter) for counter in seen}), 1)
+
+    def test_missing_requirement(self):
+        class Needy(BaseCounter):
+            name = "needy"
+            requires = ("no_such_module_here",)
+
+        self.assertIn("pip install no_such_module_here", Needy.missing_requirement())
+        self.assertIsNone(BaseCounter.missing_requirement())
+
+
+class DetectCounterTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sign_in(self.member)
+
+    def test_misconfigured_backend_is_reported(self):
+        Zone.objects.filter(pk=self.zone.pk).update(counter_backend='bogus')
+        logs = CarbonLog.objects.count()
+        with mock.patch('lims.views.sensor_views.get_counter', return_value=StubCounter('sahi', 10)):
+            response = self.client.post(reverse('sensor-detect'), {
+                "zone_id": self.zone.pk, "camera_id": self.camera.pk, "file": jpeg_file(),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("bogus", response.data["carbon_error"])
+        self.assertNotIn("carbon_data", response.data)
+        self.assertEqual(CarbonLog.objects.count(), logs)
+
+    def test_reference_count_feeds_the_carbon_log(self):
+        response, counter = self.detect(people=10, reference=20)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(counter.calls, 1)
+        self.assertEqual(response.data["carbon_data"]["backend"], 'stub')
+        self.assertEqual(response.data["carbon_data"]["gemini_count"], 20)
+        self.assertTrue(CarbonLog.objects.filter(zone=self.zone, sahi_count=10, gemini_count=20).exists())
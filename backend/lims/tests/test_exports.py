@@ -0,0 +1,89 @@
+""" Streaming carbon log / alert history exports (lims.exports) """
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.urls import reverse
+from django.utils import timezone
+
+from ..exports import CARBONLOG_COLUMNS, ExportError, export_stream, stream_rows
+from ..models import Alert, CarbonLog
+from .base import TenantTestCase
+
+
+def body(chunks):
+    return b''.join(chunk.encode() if isinstance(chunk, str) else chunk for chunk in chunks)
+
+
+class ExportStreamTests(TenantTestCase):
+
+    def test_csv_has_a_header_and_iso_timestamps(self):
+        chunks, content_type, filename = export_stream('carbonlogs', 'csv', organization_id=self.org.pk)
+        rows = list(csv.DictReader(io.StringIO(body(chunks).decode())))
+        self.assertEqual((content_type, filename), ('text/csv', 'carbonlogs.csv'))
+        self.assertEqual(list(rows[0]), CARBONLOG_COLUMNS)
+        self.assertEqual([row["zone_id"] for row in rows], [str(self.zone.pk)])
+        log = CarbonLog.objects.get(zone=self.zone)
+        self.assertEqual(rows[0]["timestamp"], log.timestamp.isoformat())
+
+    def test_ndjson_alerts_filtered_by_zone_and_time(self):
+        old = Alert.objects.create(camera=self.camera, organization=self.org, heading="Old")
+        Alert.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=3))
+        chunks, _, _ = export_stream('alerts', 'ndjson', zone_id=self.zone.pk,
+                                     start=timezone.now() - timedelta(days=1))
+        rows = [json.loads(line) for line in body(chunks).splitlines()]
+        self.assertEqual([(row["id"], row["zone_id"]) for row in rows], [(self.alert.pk, self.zone.pk)])
+
+    def test_gzip_matches_the_plain_stream(self):
+        plain, _, _ = export_stream('alerts', 'csv')
+        zipped, content_type, filename = export_stream('alerts', 'csv', compress='gzip')
+        self.assertEqual((content_type, filename), ('application/gzip', 'alerts.csv.gz'))
+        self.assertEqual(gzip.decompress(body(zipped)), body(plain))
+
+    def test_rows_are_sent_in_chunks(self):
+        chunks = list(stream_rows(({"a": i} for i in range(5)), 'csv', ['a'], rows_per_chunk=2))
+        self.assertEqual(chunks, ["a\r\n0\r\n1\r\n", "2\r\n3\r\n", "4\r\n"])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is optional")
+    def test_parquet_one_row_group_at_a_time(self):
+        import pyarrow.parquet as pq
+
+        for _ in range(4):
+            CarbonLog.objects.create(zone=self.zone, organization=self.org, saved_amount=0.25, sahi_count=1,
+                                     gemini_count=4, formula_version=1)
+        with self.settings(EXPORT_PARQUET_ROW_GROUP=2):
+            chunks, content_type, _ = export_stream('carbonlogs', 'parquet', organization_id=[self.org.pk])
+            table = pq.ParquetFile(io.BytesIO(body(chunks)))
+        self.assertEqual(content_type, 'application/vnd.apache.parquet')
+        self.assertEqual((table.metadata.num_rows, table.metadata.num_row_groups), (5, 3))
+        self.assertEqual(table.read().column('saved_amount').to_pylist()[1:], [0.25] * 4)
+
+    def test_parquet_without_pyarrow(self):
+        with mock.patch.dict('sys.modules', {'pyarrow': None}):
+            with self.assertRaisesMessage(ExportError, "pip install pyarrow"):
+                export_stream('carbonlogs', 'parquet')
+
+    def test_bad_parameters(self):
+        for kind, fmt, compress in (('frames', 'csv', None), ('alerts', 'xlsx', None), ('alerts', 'csv', 'zip')):
+            with self.subTest(kind=kind, fmt=fmt, compress=compress), self.assertRaises(ExportError):
+                export_stream(kind, fmt, compress)
+
+
+class ExportEndpointTests(TenantTestCase):
+
+    def test_members_export_their_own_history(self):
+        self.sign_in(self.member)
+        response = self.client.get(reverse('bulk-export'), {"kind": "carbonlogs", "file_format": "ndjson"})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="carbonlogs.ndjson"')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual({row["organization_id"] for row in rows}, {self.org.pk})
+
+        response = self.client.get(reverse('bulk-export'), {"kind": "alerts", "org_id": self.other_org.pk})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 1)  # Header only
+        self.assertEqual(self.client.get(reverse('bulk-export'), {"kind": "alerts", "start": "soon"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('bulk-export'), {"kind": "frames"}).status_code, 400)
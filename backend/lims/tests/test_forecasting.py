@@ -0,0 +1,117 @@
+""" Occupancy forecasting and predicted-overcrowding alerts (lims.forecasting) """
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from ..forecasting import SLOTS, OccupancyForecaster, check_zone, season_slot, to_minutes, warm_start, weekly_profiles
+from ..models import Alert, OccupancyRollup
+from .base import TenantTestCase
+
+T0 = datetime(2025, 3, 3, 9, 0, tzinfo=dt_timezone.utc)  # A Monday
+
+
+def forecaster():
+    return OccupancyForecaster(alpha=0.3, beta=0.05, gamma=0.0, phi=0.98, initial_rows=2)
+
+
+class ForecasterTests(SimpleTestCase):
+
+    def test_steady_zone_forecasts_its_level(self):
+        f = forecaster()
+        for minute in range(30):
+            f.update(1, 40, T0 + timedelta(minutes=minute))
+        predicted, observations = f.predict(1, horizon_minutes=15, now=T0 + timedelta(minutes=29))
+        self.assertAlmostEqual(predicted, 40, places=3)
+        self.assertEqual(observations, 30)
+        self.assertEqual(f.predict(2), (None, 0))
+
+    def test_rising_zone_forecasts_above_its_last_count(self):
+        f = forecaster()
+        for minute in range(30):
+            f.update(1, 10 + 2 * minute, T0 + timedelta(minutes=minute))
+        predicted, _ = f.predict(1, horizon_minutes=15, now=T0 + timedelta(minutes=29))
+        self.assertGreater(predicted, 68)
+
+    def test_long_gap_restarts_from_the_new_count(self):
+        f = forecaster()
+        for minute in range(10):
+            f.update(1, 10 + 5 * minute, T0 + timedelta(minutes=minute))
+        later = T0 + timedelta(hours=5)
+        f.update(1, 20, later)
+        self.assertAlmostEqual(f.predict(1, horizon_minutes=15, now=later)[0], 20)
+
+    def test_batch_matches_one_at_a_time(self):
+        rng = np.random.default_rng(7)
+        zone_ids = rng.integers(1, 6, size=200)
+        counts = rng.integers(0, 100, size=200)
+        times = [T0 + timedelta(minutes=float(m)) for m in rng.uniform(0, 180, size=200)]
+
+        one = forecaster()
+        for i in sorted(range(200), key=lambda i: times[i]):
+            one.update(int(zone_ids[i]), int(counts[i]), times[i])
+        batch = forecaster()  # Grows past initial_rows
+        batch.update_many(zone_ids, counts, [to_minutes(t) for t in times], [season_slot(t) for t in times])
+
+        now = max(times)
+        ids, expected, _ = one.forecast(now=now)
+        self.assertEqual(len(batch), 5)
+        got = dict(zip(*batch.forecast(ids, now=now)[:2]))
+        np.testing.assert_allclose([got[z] for z in ids], expected)
+
+
+@override_settings(FORECAST_PROFILE_DAYS=28, FORECAST_WARMUP_HOURS=6)
+class WarmStartTests(TenantTestCase):
+
+    def test_profile_is_the_slot_mean_minus_the_zone_mean(self):
+        for day in range(2):
+            for hour, avg in ((9, 30.0), (10, 10.0)):
+                OccupancyRollup.objects.create(
+                    zone=self.zone, period_seconds=OccupancyRollup.HOUR, samples=1, avg_count=avg,
+                    peak_count=int(avg), peak_ratio=avg / 100,
+                    bucket_start=T0.replace(hour=hour) - timedelta(days=7 * day))
+        profile = weekly_profiles([self.zone.pk], T0 - timedelta(days=28))[0]
+        self.assertEqual(profile.shape, (SLOTS,))
+        self.assertEqual((profile[season_slot(T0)], profile[season_slot(T0.replace(hour=10))]), (10.0, -10.0))
+        self.assertEqual(np.count_nonzero(profile), 2)
+
+    def test_warm_start_seeds_level_from_minute_rollups(self):
+        for minute in range(20):
+            OccupancyRollup.objects.create(
+                zone=self.zone, period_seconds=OccupancyRollup.MINUTE, samples=1, avg_count=25.0,
+                peak_count=25, peak_ratio=0.25, bucket_start=T0 + timedelta(minutes=minute))
+        f = forecaster()
+        self.assertEqual(warm_start(f, now=T0 + timedelta(minutes=20)), 1)
+        predicted, observations = f.predict(self.zone.pk, horizon_minutes=15, now=T0 + timedelta(minutes=20))
+        self.assertEqual(observations, 20)
+        self.assertAlmostEqual(predicted, 25.0, places=3)
+
+
+@override_settings(FORECAST_ENABLED=True, FORECAST_MIN_OBSERVATIONS=3)
+class PredictedAlertTests(TenantTestCase):
+
+    def test_check_zone_waits_for_enough_observations(self):
+        with mock.patch('lims.forecasting._forecaster', forecaster()):
+            self.assertIsNone(check_zone(99, 10, T0))
+            self.assertIsNone(check_zone(99, 10, T0 + timedelta(minutes=1)))
+            self.assertAlmostEqual(check_zone(99, 10, T0 + timedelta(minutes=2)), 10.0)
+
+    def test_forecast_over_threshold_opens_one_alert(self):
+        self.sign_in(self.member)
+        with mock.patch('lims.forecasting.check_zone', return_value=95.0):
+            response, _ = self.detect(people=50)
+            again, _ = self.detect(people=50)
+        self.assertEqual(response.data["status"], "PREDICTED_DANGER")
+        self.assertEqual(response.data["forecast"]["predicted_people"], 95.0)
+        self.assertTrue(response.data["alert_created"])
+        alert = Alert.objects.get(kind=Alert.Kind.PREDICTED_OVERCROWDING)
+        self.assertEqual((alert.camera_id, alert.organization_id), (self.camera.pk, self.org.pk))
+        self.assertEqual(again.data["alert_id"], alert.pk)
+
+    def test_forecast_under_threshold(self):
+        self.sign_in(self.member)
+        with mock.patch('lims.forecasting.check_zone', return_value=60.0):
+            response, _ = self.detect(people=50)
+        self.assertEqual(response.data["status"], "NORMAL")
+        self.assertFalse(Alert.objects.filter(kind=Alert.Kind.PREDICTED_OVERCROWDING).exists())
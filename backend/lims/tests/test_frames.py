@@ -0,0 +1,175 @@
+""" Frame archive: content-addressed dedup, retention and re-counting (lims.frames) """
+import io
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import PIL.Image
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import frames
+from ..frames import FrameArchiver, MemoryFrameStore, archive, content_hash, prune
+from ..models import Frame
+from .base import StubCounter, TenantTestCase, jpeg_file
+
+
+def image(width=64, height=48, color=(90, 110, 130)):
+    buf = io.BytesIO()
+    PIL.Image.new('RGB', (width, height), color).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+@override_settings(FRAME_ARCHIVE_ENABLED=True, FRAME_RETENTION_DAYS=7, FRAME_ALERT_RETENTION_DAYS=90,
+                   FRAME_MAX_SIZE=32)
+class FrameTestCase(TenantTestCase):
+    """ A memory store and an archiver whose writer thread never starts: drain() writes """
+
+    def setUp(self):
+        super().setUp()
+        self.store = MemoryFrameStore()
+        self.archiver = FrameArchiver(store=self.store, queue_size=8, batch_size=10)
+        self.now = timezone.now()
+        for patch in (mock.patch.object(frames, '_store', self.store),
+                      mock.patch.object(frames, '_archiver', self.archiver),
+                      mock.patch.object(FrameArchiver, 'start')):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def archived(self, data, zone=None, people=3, at=None, alerted=False):
+        key = content_hash(data)
+        archive(key, data, zone or self.zone, self.camera.pk, people, alerted=alerted, now=at or self.now)
+        return key
+
+
+class ArchiverTests(FrameTestCase):
+
+    def test_repeated_uploads_are_stored_once(self):
+        data = image()
+        key = self.archived(data)
+        first_seen = self.now + timedelta(minutes=1)
+        self.archived(data, at=first_seen)  # Same batch: merged before it is written
+        self.archiver.drain()
+        later = self.now + timedelta(days=2)
+        self.archived(data, at=later)  # Already archived
+        self.archiver.drain()
+
+        frame = Frame.objects.get()
+        self.assertEqual((frame.pk, frame.organization_id, frame.people_count), (key, self.org.pk, 3))
+        self.assertEqual((frame.captured_at, frame.last_seen_at), (first_seen, later))
+        self.assertEqual(frame.expires_at, later + timedelta(days=7))
+        self.assertEqual((self.archiver.written, self.archiver.deduplicated), (1, 2))
+
+    def test_expiry_never_moves_backwards(self):
+        data = image()
+        self.archived(data, alerted=True)
+        self.archiver.drain()
+        self.archived(data, at=self.now + timedelta(days=1))
+        self.archiver.drain()
+        self.assertEqual(Frame.objects.get().expires_at, self.now + timedelta(days=90))
+
+    def test_frames_are_downscaled(self):
+        key = self.archived(image(320, 160))
+        self.archiver.drain()
+        frame = Frame.objects.get()
+        self.assertEqual((frame.width, frame.height), (32, 16))
+        stored = PIL.Image.open(io.BytesIO(self.store.get(key)))
+        self.assertEqual((stored.format, stored.size), ('JPEG', (32, 16)))
+        self.assertEqual(frame.size, self.archiver.bytes_out)
+
+    def test_unreadable_image_does_not_stop_the_batch(self):
+        self.archived(b"not an image")
+        good = self.archived(image())
+        self.assertEqual(self.archiver.drain(), 2)
+        self.assertEqual(list(Frame.objects.values_list('pk', flat=True)), [good])
+        self.assertEqual(self.archiver.failures, 1)
+
+    def test_full_queue_drops_the_frame(self):
+        archiver = FrameArchiver(store=self.store, queue_size=1)
+        self.assertTrue(archiver.submit({"sha256": "a"}))
+        self.assertFalse(archiver.submit({"sha256": "b"}))
+        self.assertEqual((archiver.pending(), archiver.dropped), (1, 1))
+
+
+class PruneTests(FrameTestCase):
+
+    def test_deletes_expired_rows_then_their_images(self):
+        old = [self.archived(image(color=(80 * i, 0, 0)), at=self.now - timedelta(days=10 + i)) for i in range(3)]
+        fresh = self.archived(image(color=(0, 200, 0)), at=self.now - timedelta(days=1))
+        self.archiver.drain()
+
+        self.assertEqual(prune(self.now, batch_size=2), 3)
+        self.assertEqual(list(Frame.objects.values_list('pk', flat=True)), [fresh])
+        self.assertFalse(any(self.store.exists(key) for key in old))
+        self.assertTrue(self.store.exists(fresh))
+
+        out = StringIO()
+        call_command('prune_frames', '--once', stdout=out)
+        self.assertIn("0 expired frames deleted", out.getvalue())
+
+
+class FrameEndpointTests(FrameTestCase):
+
+    def test_detection_archives_its_frame(self):
+        self.sign_in(self.member)
+        response, _ = self.detect()
+        key = content_hash(jpeg_file().read())
+        self.assertEqual(response.json()["frame_id"], key)
+        self.assertFalse(Frame.objects.exists())  # Written in the background
+        self.archiver.drain()
+
+        response = self.client.get(reverse('frame-detail', args=[key]))
+        self.assertEqual((response['Content-Type'], response['ETag']), ('image/jpeg', f'"{key}"'))
+        self.assertEqual(response.content, self.store.get(key))
+        data = self.client.get(reverse('frame-detail', args=[key]), {"file_format": "json"}).json()
+        self.assertEqual(data["people_count"], 10)
+
+        self.store.delete(key)
+        self.assertEqual(self.client.get(reverse('frame-detail', args=[key])).status_code, 404)
+
+    def test_other_organizations_frames_are_hidden(self):
+        self.sign_in(self.member)
+        key = self.archived(image(), zone=self.other_org.zone)
+        self.archiver.drain()
+        self.assertEqual(self.client.get(reverse('frame-detail', args=[key])).status_code, 404)
+
+    def test_zones_without_retention_are_not_archived(self):
+        self.zone.frame_retention_days = 0
+        self.zone.save(update_fields=['frame_retention_days'])
+        self.sign_in(self.member)
+        response, _ = self.detect()
+        self.assertNotIn("frame_id", response.json())
+        self.assertEqual(self.archiver.pending(), 0)
+
+
+class ReprocessFramesTests(FrameTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.keys = [self.archived(image(color=(80 * i, 0, 0)), people=4) for i in range(3)]
+        self.archiver.drain()
+
+    def reprocess(self, *args, people=5):
+        out, err = StringIO(), StringIO()
+        with mock.patch('lims.management.commands.reprocess_frames.get_counter',
+                        return_value=StubCounter('sahi', people)):
+            call_command('reprocess_frames', '--workers', '2', '--chunk', '2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_recounts_are_stored(self):
+        self.store.delete(self.keys[0])
+        out, err = self.reprocess()
+        self.assertIn("2 frames re-counted with sahi", out)
+        self.assertIn("2 changed, mean |new - captured| 1.00; 1 errors.", out)
+        self.assertIn("image missing from the store", err)
+        recounts = dict(Frame.objects.values_list('pk', 'recount'))
+        self.assertEqual([recounts[key] for key in self.keys], [None, 5, 5])
+
+    def test_dry_run_stores_nothing(self):
+        out, _ = self.reprocess('--dry-run', '--org-id', str(self.org.pk))
+        self.assertIn("Dry run: nothing stored.", out)
+        self.assertFalse(Frame.objects.filter(recount__isnull=False).exists())
+        out, _ = self.reprocess('--zone-id', str(self.other_org.zone.pk))
+        self.assertEqual(out.strip(), "No archived frames match.")
@@ -0,0 +1,100 @@
+""" Bounding-box and nearest-zone queries (lims.spatial, lims.geo) """
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from .. import geo
+from ..models import Zone
+from ..spatial import ZoneIndex, haversine_km
+from .base import TenantTestCase
+
+
+class ZoneIndexTests(SimpleTestCase):
+    """ The grid index against a brute-force scan of the same points """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(3)
+        n = 2000
+        cls.lats = np.concatenate([rng.uniform(-80, 80, n), rng.normal(51.5, 0.05, 200)])
+        cls.lons = np.concatenate([rng.uniform(-180, 180, n), rng.normal(-0.1, 0.05, 200)])
+        cls.ids = np.arange(1, len(cls.lats) + 1)
+        cls.orgs = cls.ids % 3
+        cls.index = ZoneIndex(cls.ids, cls.orgs, cls.lats, cls.lons, cell_degrees=0.5)
+
+    def ids_of(self, positions):
+        return self.index.ids[positions].tolist()
+
+    def test_bbox(self):
+        for box in ((51.4, -0.2, 51.6, 0.0), (-10, -30, 10, 30), (-60, 170, 60, -170)):  # Last one crosses 180
+            with self.subTest(box=box):
+                min_lat, min_lon, max_lat, max_lon = box
+                inside = (self.lats >= min_lat) & (self.lats <= max_lat)
+                inside &= ((self.lons >= min_lon) & (self.lons <= max_lon) if min_lon <= max_lon
+                           else (self.lons >= min_lon) | (self.lons <= max_lon))
+                self.assertEqual(self.ids_of(self.index.bbox(*box)), self.ids[inside].tolist())
+        org = self.index.bbox(-90, -180, 90, 180, organization_id=[1, 2])
+        self.assertEqual(self.ids_of(org), self.ids[self.orgs != 0].tolist())
+
+    def test_nearest(self):
+        for lat, lon, k, max_km in ((51.5, -0.1, 10, None), (0, 179.9, 5, None), (-89, 0, 3, None),
+                                    (51.5, -0.1, 500, 5.0)):
+            with self.subTest(lat=lat, lon=lon, k=k, max_km=max_km):
+                distances = haversine_km(lat, lon, self.lats, self.lons)
+                order = np.argsort(distances, kind='stable')
+                if max_km is not None:
+                    order = order[distances[order] <= max_km]
+                positions, got = self.index.nearest(lat, lon, k=k, max_km=max_km)
+                np.testing.assert_allclose(got, distances[order[:k]])
+        positions, _ = self.index.nearest(0, 0, k=4, organization_id=2)
+        self.assertEqual(set(self.index.organization_ids[positions].tolist()), {2})
+
+    def test_empty_index(self):
+        index = ZoneIndex([], [], [], [])
+        self.assertEqual(len(index.bbox(-90, -180, 90, 180)), 0)
+        self.assertEqual(len(index.nearest(0, 0)[0]), 0)
+
+
+@mock.patch.object(geo, '_catalog', None)
+class GeoEndpointTests(TenantTestCase):
+
+    def test_catalog_follows_zone_changes(self):
+        catalog = geo.get_zone_catalog()
+        self.assertIs(geo.get_zone_catalog(), catalog)
+        zone = Zone.objects.create(organization=self.org, name="Roof", zone_type="Open", capacity=5,
+                                   latitude=10.5, longitude=10.5)
+        rebuilt = geo.get_zone_catalog()
+        self.assertIsNot(rebuilt, catalog)
+        self.assertIn(zone.pk, rebuilt.details)
+
+    def test_members_see_their_own_zones(self):
+        whole_world = {"min_lat": -90, "min_lon": -180, "max_lat": 90, "max_lon": 180}
+        self.sign_in(self.member)
+        data = self.client.get(reverse('zones-bbox'), whole_world).json()
+        self.assertEqual([zone["id"] for zone in data["zones"]], [self.zone.pk])
+        data = self.client.get(reverse('zones-bbox'), dict(whole_world, org_id=self.other_org.pk)).json()
+        self.assertEqual(data["count"], 0)
+
+        data = self.client.get(reverse('zones-nearest'), {"lat": 20, "lon": 10, "live": 1}).json()
+        self.assertEqual([zone["id"] for zone in data["zones"]], [self.zone.pk])
+        self.assertAlmostEqual(data["zones"][0]["distance_km"], 1111.95, places=1)
+        self.assertIn("occupancy_percentage", data["zones"][0])  # live=1
+
+        self.sign_in(self.admin)
+        data = self.client.get(reverse('zones-nearest'), {"lat": 20, "lon": 10, "k": 1}).json()
+        self.assertEqual([zone["id"] for zone in data["zones"]], [self.other_org.zone.pk])
+
+    def test_parameter_errors(self):
+        self.sign_in(self.member)
+        for url, params in (
+            ('zones-bbox', {"min_lat": 10, "min_lon": 0, "max_lat": 0, "max_lon": 1}),
+            ('zones-bbox', {"min_lat": -91, "min_lon": 0, "max_lat": 0, "max_lon": 1}),
+            ('zones-nearest', {"lat": 0}),
+            ('zones-nearest', {"lat": 0, "lon": 0, "k": 0}),
+            ('zones-nearest', {"lat": 0, "lon": 0, "max_km": "far"}),
+        ):
+            with self.subTest(url=url, params=params):
+                self.assertEqual(self.client.get(reverse(url), params).status_code, 400)
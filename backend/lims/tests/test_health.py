@@ -0,0 +1,83 @@
+""" Background health probes and the endpoints that read their snapshot (lims.health) """
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .. import health
+from ..health import DOWN, OK, HealthMonitor
+
+
+def healthy():
+    return None
+
+
+def failing():
+    raise RuntimeError("refused")
+
+
+def hanging():
+    time.sleep(0.5)
+
+
+@override_settings(HEALTH_PROBE_TIMEOUT=0.2, HEALTH_CHECK_INTERVAL=10, HEALTH_CRITICAL_PROBES=['database'])
+@mock.patch.object(HealthMonitor, 'start')  # Probed by hand, not by the daemon thread
+class HealthMonitorTests(SimpleTestCase):
+
+    def test_probes_report_their_own_status(self, start):
+        snapshot = HealthMonitor({"database": healthy, "crowd_service": failing, "gemini": hanging}).check_now()
+        checks = snapshot["checks"]
+        self.assertEqual(checks["database"]["status"], OK)
+        self.assertEqual(checks["crowd_service"], dict(checks["crowd_service"], status=DOWN, error="refused"))
+        self.assertIn("timed out", checks["gemini"]["error"])
+        # Only critical probes gate readiness
+        self.assertTrue(snapshot["ready"])
+        self.assertFalse(snapshot["healthy"])
+
+    def test_probes_run_concurrently(self, start):
+        monitor = HealthMonitor({f"slow{i}": lambda: time.sleep(0.1) for i in range(4)})
+        started = time.perf_counter()
+        monitor.check_now()
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+    def test_snapshot_is_reused_until_stale(self, start):
+        probe = mock.Mock(return_value=None)
+        monitor = HealthMonitor({"database": probe})
+        monitor.snapshot()
+        monitor.snapshot()
+        self.assertEqual(probe.call_count, 1)  # First read probes; later reads are served from memory
+        monitor._snapshot["checked_at"] -= 31
+        snapshot = monitor.snapshot()
+        self.assertEqual((snapshot["ready"], snapshot["healthy"], snapshot["stale"]), (False, False, True))
+
+
+@override_settings(HEALTH_PROBE_TIMEOUT=0.2, HEALTH_CRITICAL_PROBES=['database'], WARMUP_ON_READY=False)
+@mock.patch.object(HealthMonitor, 'start')
+class HealthEndpointTests(SimpleTestCase):
+
+    def use(self, probes):
+        monitor = HealthMonitor(probes)
+        monitor.check_now()
+        return mock.patch.object(health, 'monitor', monitor)
+
+    def test_health_reads_the_snapshot(self, start):
+        with self.use({"database": healthy, "crowd_service": healthy}):
+            response = self.client.get(reverse('system_health'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["overall_status"], "OK")
+
+        with self.use({"database": healthy, "crowd_service": failing}):
+            response = self.client.get(reverse('system_health'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual((response.json()["database"], response.json()["external_service"]), (OK, DOWN))
+
+    def test_ready_follows_critical_probes_and_drain(self, start):
+        with self.use({"database": healthy, "crowd_service": failing}):
+            self.assertEqual(self.client.get(reverse('system_ready')).status_code, 200)
+            with mock.patch('lims.serving.draining') as draining:
+                draining.is_set.return_value = True
+                self.assertEqual(self.client.get(reverse('system_ready')).json(), {"ready": False, "draining": True})
+        with self.use({"database": failing}):
+            self.assertEqual(self.client.get(reverse('system_ready')).status_code, 503)
+        self.assertEqual(self.client.get(reverse('system_live')).status_code, 200)
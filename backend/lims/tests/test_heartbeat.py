@@ -0,0 +1,98 @@
+""" Camera liveness (lims.heartbeat) """
+from datetime import timedelta
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..heartbeat import HeartbeatFlusher, MemoryHeartbeats, get_heartbeats, sweep
+from ..models import Camera, Notification
+from .base import TenantTestCase
+
+T0 = 1_700_000_000.0
+
+
+class HeartbeatEndpointTests(TenantTestCase):
+
+    def ping(self, camera_id):
+        return self.client.post(reverse('camera-heartbeat', args=[camera_id])).status_code
+
+    def test_members_ping_their_own_cameras(self):
+        self.assertEqual(self.ping(self.camera.pk), 403)
+        self.sign_in(self.member)
+        self.assertEqual(self.ping(self.other_org.camera.pk), 403)
+        self.assertEqual(self.ping(10 ** 6), 404)
+        self.assertEqual(self.ping(self.camera.pk), 204)
+        self.assertIn(self.camera.pk, get_heartbeats().store.last_seen_many([self.camera.pk]))
+
+    def test_deleted_camera_is_forgotten(self):
+        self.sign_in(self.member)
+        camera = Camera.objects.create(zone=self.zone, organization=self.org, name="Short-lived")
+        self.assertEqual(self.ping(camera.pk), 204)
+        camera_id = camera.pk
+        camera.delete()
+        self.assertEqual(self.ping(camera_id), 404)
+
+    def test_moved_camera_answers_to_its_new_organization(self):
+        self.sign_in(self.member)
+        self.assertEqual(self.ping(self.camera.pk), 204)
+        self.camera.zone, self.camera.organization = self.other_org.zone, self.other_org
+        self.camera.save()
+        self.assertEqual(self.ping(self.camera.pk), 403)
+
+
+@mock.patch.object(HeartbeatFlusher, 'start')  # Flushed by hand, not by the daemon thread
+class FlushTests(TenantTestCase):
+
+    def flusher(self):
+        return HeartbeatFlusher(MemoryHeartbeats(stale_seconds=300), flush_seconds=3600, batch_size=1)
+
+    def test_pings_coalesce_into_one_write_per_camera(self, start):
+        flusher = self.flusher()
+        for i in range(50):
+            flusher.beat(self.camera.pk, now=T0 + i)
+        flusher.beat(self.other_org.camera.pk, now=T0)
+        self.assertEqual(flusher.pending(), 2)
+        with self.assertNumQueries(2):  # batch_size=1: one UPDATE per camera
+            self.assertEqual(flusher.flush(), 2)
+        self.camera.refresh_from_db()
+        self.assertEqual(self.camera.last_seen_at.timestamp(), T0 + 49)
+        with self.assertNumQueries(0):
+            self.assertEqual(flusher.flush(), 0)
+
+    def test_last_seen_never_moves_back(self, start):
+        flusher = self.flusher()
+        flusher.beat(self.camera.pk, now=T0 + 10)
+        flusher.flush()
+        flusher.beat(self.camera.pk, now=T0)  # Another worker's older ping
+        flusher.flush()
+        self.camera.refresh_from_db()
+        self.assertEqual(self.camera.last_seen_at.timestamp(), T0 + 10)
+
+    def test_failed_flush_is_retried(self, start):
+        flusher = self.flusher()
+        flusher.beat(self.camera.pk, now=T0)
+        with mock.patch('lims.heartbeat.write_last_seen', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flusher.flush()
+        self.assertEqual((flusher.pending(), flusher.failures), (1, 1))
+        self.assertEqual(flusher.flush(), 1)
+
+
+@override_settings(CAMERA_STALE_SECONDS=300)
+class SweepTests(TenantTestCase):
+
+    def test_stale_and_recovered_cameras_notify_their_organization(self):
+        now = timezone.now()
+        Camera.objects.filter(pk=self.camera.pk).update(last_seen_at=now - timedelta(minutes=10))
+        Camera.objects.filter(pk=self.other_org.camera.pk).update(last_seen_at=now)
+        self.assertEqual(sweep(now), {"stale": 1, "recovered": 0})
+        self.assertEqual(sweep(now), {"stale": 0, "recovered": 0})  # Notified once
+        self.assertEqual(list(Notification.objects.values_list('audience', flat=True)), [f"org:{self.org.pk}"])
+
+        Camera.objects.filter(pk=self.camera.pk).update(last_seen_at=now)
+        self.assertEqual(sweep(now), {"stale": 0, "recovered": 1})
+        self.camera.refresh_from_db()
+        self.assertIsNone(self.camera.stale_since)
+        self.assertEqual(Notification.objects.count(), 2)
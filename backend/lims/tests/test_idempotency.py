@@ -0,0 +1,34 @@
+""" Idempotent detections (lims.idempotency) """
+import uuid
+
+from ..models import CarbonLog
+from .base import TenantTestCase
+
+
+class IdempotentDetectionTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sign_in(self.member)
+
+    def test_retry_replays_without_recounting(self):
+        key = str(uuid.uuid4())
+        first, counter = self.detect(**{"Idempotency-Key": key})
+        retry, retry_counter = self.detect(**{"Idempotency-Key": key})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual((counter.calls, retry_counter.calls), (1, 0))
+        self.assertEqual(CarbonLog.objects.filter(zone=self.zone).count(), 2)  # Fixture + one
+
+    def test_key_is_scoped_to_zone_and_caller(self):
+        key = str(uuid.uuid4())
+        self.sign_in(self.admin)  # May write to both organizations
+        self.detect(**{"Idempotency-Key": key})
+        other_zone, counter = self.detect(zone=self.other_org.zone, **{"Idempotency-Key": key})
+        self.assertNotIn('Idempotent-Replayed', other_zone)
+        self.assertEqual(counter.calls, 1)
+        self.sign_in(self.member)
+        other_caller, counter = self.detect(**{"Idempotency-Key": key})
+        self.assertNotIn('Idempotent-Replayed', other_caller)
+        self.assertEqual(counter.calls, 1)
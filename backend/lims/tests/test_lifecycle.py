@@ -0,0 +1,70 @@
+""" Alert auto-resolution and escalation (lims.lifecycle) """
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from ..lifecycle import escalate, resolve, tick
+from ..models import Alert, Notification, OccupancySample, User
+from .base import TenantTestCase
+
+
+@override_settings(ALERT_RESOLVE_RATIO=0.8, ALERT_RESOLVE_AFTER_MINUTES=10, ALERT_ESCALATE_AFTER_MINUTES=30,
+                   ALERT_MAX_ESCALATION_LEVEL=2, ALERT_ESCALATION_BATCH=2)
+class LifecycleTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        # The fixture alerts are an hour old
+        Alert.objects.update(created_at=self.now - timedelta(hours=1))
+
+    def samples(self, camera, *ratios, minutes_ago=5):
+        for ratio in ratios:
+            OccupancySample.objects.create(zone_id=camera.zone_id, camera=camera, people_count=int(ratio * 100),
+                                           capacity_ratio=ratio, timestamp=self.now - timedelta(minutes=minutes_ago))
+
+    def test_resolves_only_cameras_that_stayed_below_the_ratio(self):
+        calm, busy = self.camera, self.other_org.camera
+        self.samples(calm, 0.5, 0.7)
+        self.samples(busy, 0.5, 0.85)  # Between the resolve ratio and the 90% alert threshold
+        self.assertEqual(resolve(self.now), 1)
+        self.alert.refresh_from_db()
+        self.assertEqual((self.alert.status, self.alert.resolved_at), (Alert.Status.CLOSED, self.now))
+        self.assertEqual(Alert.objects.get(camera=busy).status, Alert.Status.OPEN)
+
+    def test_silent_and_fresh_alerts_stay_open(self):
+        self.samples(self.camera, 0.2, minutes_ago=30)  # Before the window: the camera went quiet
+        Alert.objects.filter(camera=self.other_org.camera).update(created_at=self.now - timedelta(minutes=2))
+        self.samples(self.other_org.camera, 0.2)
+        self.assertEqual(resolve(self.now), 0)
+
+    def test_escalation_steps_up_to_the_max_level_and_notifies_the_organization(self):
+        self.assertEqual(escalate(self.now), 2)
+        self.assertEqual(escalate(self.now), 0)  # Not due again for 30 minutes
+        later = self.now + timedelta(minutes=31)
+        self.assertEqual(escalate(later), 2)
+        self.assertEqual(escalate(later + timedelta(hours=1)), 0)  # ALERT_MAX_ESCALATION_LEVEL
+        self.alert.refresh_from_db()
+        self.assertEqual((self.alert.escalation_level, self.alert.escalated_at), (2, later))
+        self.assertEqual(Notification.objects.filter(audience=f"org:{self.org.pk}").count(), 2)
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_alert_without_organization_notifies_admins(self):
+        Alert.objects.filter(pk=self.alert.pk).update(organization=None)
+        escalate(self.now)
+        self.assertTrue(Notification.objects.filter(audience=f"role:{User.Role.ADMIN}",
+                                                    message__startswith=f"Alert {self.alert.pk} ").exists())
+
+    def test_tick_resolves_before_escalating_in_batches(self):
+        for i in range(3):
+            Alert.objects.create(camera=self.other_org.camera, organization=self.other_org, heading=f"Extra {i}")
+        Alert.objects.update(created_at=self.now - timedelta(hours=1))
+        self.samples(self.camera, 0.1)
+        self.assertEqual(tick(self.now), {"resolved": 1, "escalated": 4})  # Batches of 2
+
+        out = StringIO()
+        call_command('process_alerts', '--once', stdout=out)
+        self.assertIn("Resolved 0, escalated 0 alerts", out.getvalue())
@@ -0,0 +1,98 @@
+""" Live occupancy (lims.live) """
+import random
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from ..live import CacheLiveState, MemoryLiveState
+from .base import TenantTestCase
+
+T0 = 1_000_000.0
+
+
+class LiveStateTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['local'].clear()
+        self.stores = {
+            "memory": MemoryLiveState(stale_seconds=120),
+            "cache": CacheLiveState(alias='local', stale_seconds=120),
+        }
+
+    def test_latest_count_per_camera(self):
+        for name, store in self.stores.items():
+            with self.subTest(name):
+                store.update(1, zone_id=10, organization_id=1, count=5, capacity=50, now=T0)
+                store.update(2, zone_id=10, organization_id=1, count=3, capacity=50, now=T0 + 1)
+                store.update(1, zone_id=10, organization_id=1, count=7, capacity=50, now=T0 + 2)
+                store.update(3, zone_id=11, organization_id=1, count=4, capacity=20, now=T0 + 3)
+                org = store.organization(1, now=T0 + 4)
+                self.assertEqual((org["people"], org["cameras"]), (14, 3))
+                self.assertEqual({z: v["people"] for z, v in org["zones"].items()}, {10: 10, 11: 4})
+                zone = store.zone(10, 1, now=T0 + 4)
+                self.assertEqual((zone["people"], zone["cameras"], zone["capacity"]), (10, 2, 50))
+
+    def test_camera_moving_zones(self):
+        for name, store in self.stores.items():
+            with self.subTest(name):
+                store.update(1, zone_id=10, organization_id=1, count=5, now=T0)
+                store.update(1, zone_id=20, organization_id=2, count=6, now=T0 + 1)
+                self.assertEqual(store.organization(1, now=T0 + 2)["people"], 0)
+                self.assertIsNone(store.zone(10, 1, now=T0 + 2))
+                self.assertEqual(store.zone(20, 2, now=T0 + 2)["people"], 6)
+
+    def test_silent_cameras_drop_out(self):
+        for name, store in self.stores.items():
+            with self.subTest(name):
+                store.update(1, zone_id=10, organization_id=1, count=5, now=T0)
+                store.update(2, zone_id=10, organization_id=1, count=3, now=T0 + 60)
+                self.assertEqual(store.organization(1, now=T0 + 80)["people"], 8)
+                self.assertEqual(store.organization(1, now=T0 + 125)["people"], 3)  # Camera 1 is stale
+                self.assertIsNone(store.zone(10, 1, now=T0 + 400))
+
+    def test_cache_totals_match_memory(self):
+        memory, cache = self.stores["memory"], self.stores["cache"]
+        rng = random.Random(7)
+        now = T0
+        for _ in range(500):
+            now += rng.random() * 2
+            camera = rng.randint(1, 20)
+            zone = camera % 4
+            args = (camera, zone, zone % 2, rng.randint(0, 30), 100)
+            memory.update(*args, now=now)
+            cache.update(*args, now=now)
+        for org_id in (0, 1):
+            expected, actual = memory.organization(org_id, now=now), cache.organization(org_id, now=now)
+            self.assertEqual((actual["people"], actual["cameras"]), (expected["people"], expected["cameras"]))
+            self.assertEqual({z: v["people"] for z, v in actual["zones"].items()},
+                             {z: v["people"] for z, v in expected["zones"].items()})
+
+    def test_zone_list_outlives_the_windows(self):
+        cache = CacheLiveState(alias='local', stale_seconds=0.4)  # Counters expire after 0.5 s
+        cache.update(1, zone_id=10, organization_id=1, count=5)
+        time.sleep(0.6)
+        cache.update(1, zone_id=10, organization_id=1, count=6)
+        self.assertEqual(cache.organization(1)["zones"][10]["people"], 6)
+
+    def test_cache_reads_do_not_scan_cameras(self):
+        cache = self.stores["cache"]
+        for camera in range(200):
+            cache.update(camera, zone_id=10, organization_id=1, count=1, now=T0)
+        read_keys = []
+        get_many = cache.cache.get_many
+        cache.cache.get_many = lambda keys: read_keys.extend(keys) or get_many(keys)
+        self.assertEqual(cache.organization(1, now=T0 + 1)["people"], 200)
+        self.assertLess(len(read_keys), 30)
+
+
+class LiveEndpointTests(TenantTestCase):
+
+    def test_detection_updates_live_counts(self):
+        self.sign_in(self.member)
+        self.detect(people=12)
+        org = self.client.get(reverse('organization-live', args=[self.org.pk])).json()
+        self.assertEqual(org["people"], 12)
+        zone = self.client.get(reverse('zone-live', args=[self.zone.pk])).json()
+        self.assertEqual((zone["people"], zone["cameras"]), (12, 1))
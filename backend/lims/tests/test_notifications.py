@@ -0,0 +1,78 @@
+""" Notification feed (lims.notifications) """
+from django.urls import reverse
+
+from ..models import Membership, Notification, User
+from .base import TenantTestCase
+
+
+class NotificationFeedTests(TenantTestCase):
+
+    def test_keyset_pages(self):
+        ids = [Notification.objects.create(title=f"n{i}", message="m").pk for i in range(5)]
+        self.sign_in(self.member)
+        page = self.client.get(reverse('notification-list-create'), {"limit": 2}).json()
+        self.assertEqual([n['id'] for n in page['results']], ids[:-3:-1])
+        seen = [n['id'] for n in page['results']]
+        while page['next_before']:
+            page = self.client.get(reverse('notification-list-create'),
+                                   {"limit": 2, "before": page['next_before']}).json()
+            seen += [n['id'] for n in page['results']]
+        self.assertEqual(seen, ids[::-1])
+
+    def test_private_audiences(self):
+        mine = Notification.objects.create(title="Mine", message="m", audience=f"org:{self.org.pk}")
+        theirs = Notification.objects.create(title="Theirs", message="m", audience=f"org:{self.other_org.pk}")
+        direct = Notification.objects.create(title="Direct", message="m", audience=f"user:{self.admin.pk}")
+        self.sign_in(self.member)
+        feed = {n['id'] for n in self.client.get(reverse('notification-list-create')).json()['results']}
+        self.assertIn(mine.pk, feed)
+        self.assertFalse(feed & {theirs.pk, direct.pk})
+        for notification, expected in ((mine, 200), (theirs, 404), (direct, 404)):
+            with self.subTest(notification.title):
+                response = self.client.get(reverse('notification-detail', args=[notification.pk]))
+                self.assertEqual(response.status_code, expected)
+        self.assertEqual(self.client.delete(reverse('notification-detail', args=[mine.pk])).status_code, 403)
+
+
+class SendNotificationTests(TenantTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.colleague = User.objects.create_user(username="colleague@test", email="colleague@test", password="pw")
+        Membership.objects.create(user=cls.colleague, organization=cls.org)
+        cls.stranger = User.objects.create_user(username="stranger@test", email="stranger@test", password="pw")
+        Membership.objects.create(user=cls.stranger, organization=cls.other_org)
+
+    def send(self, **target):
+        return self.client.post(reverse('notification-list-create'),
+                                dict(title="Hello", message="m", **target), format='json')
+
+    def test_anonymous_cannot_send(self):
+        self.assertEqual(self.send().status_code, 401)
+        self.assertEqual(self.send(organization_id=self.org.pk).status_code, 401)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_member_targets(self):
+        self.sign_in(self.member)
+        for target, expected in (
+            ({}, 403),
+            ({"role": User.Role.ADMIN}, 403),
+            ({"organization_id": self.other_org.pk}, 403),
+            ({"user_id": self.stranger.pk}, 403),
+            ({"user_id": 10 ** 6}, 403),  # Unknown ids answer like other tenants' users
+            ({"organization_id": self.org.pk}, 201),
+            ({"user_id": self.colleague.pk}, 201),
+        ):
+            with self.subTest(target):
+                self.assertEqual(self.send(**target).status_code, expected)
+        self.assertEqual(set(Notification.objects.values_list('audience', flat=True)),
+                         {f"org:{self.org.pk}", f"user:{self.colleague.pk}"})
+
+    def test_admin_targets_anyone(self):
+        self.sign_in(self.admin)
+        for target in ({}, {"role": User.Role.USER}, {"user_id": self.stranger.pk},
+                       {"organization_id": self.other_org.pk}):
+            with self.subTest(target):
+                self.assertEqual(self.send(**target).status_code, 201)
+        self.assertEqual(self.send(user_id=10 ** 6).status_code, 400)
@@ -0,0 +1,89 @@
+""" Occupancy samples and their minute/hour rollups (lims.occupancy) """
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from ..models import OccupancyRollup, OccupancySample
+from ..occupancy import prune_samples, rollup_hours, rollup_minutes
+from .base import TenantTestCase
+
+T0 = datetime(2025, 3, 1, 9, 0, tzinfo=dt_timezone.utc)
+
+
+class RollupTests(TenantTestCase):
+
+    def sample(self, at, people, zone=None):
+        return OccupancySample.objects.create(zone=zone or self.zone, timestamp=at, people_count=people,
+                                              capacity_ratio=people / 100)
+
+    def rollups(self, period):
+        return list(OccupancyRollup.objects.filter(zone=self.zone, period_seconds=period).order_by('bucket_start')
+                    .values_list('bucket_start', 'samples', 'avg_count', 'peak_count'))
+
+    def test_minutes_then_hours(self):
+        for second, people in ((0, 10), (20, 30), (59, 20)):  # 9:00
+            self.sample(T0 + timedelta(seconds=second), people)
+        self.sample(T0 + timedelta(minutes=1, seconds=5), 50)  # 9:01
+        self.sample(T0 + timedelta(hours=1), 7)  # 10:00
+
+        self.assertEqual(rollup_minutes(), 3)
+        self.assertEqual(self.rollups(OccupancyRollup.MINUTE), [
+            (T0, 3, 20.0, 30),
+            (T0 + timedelta(minutes=1), 1, 50.0, 50),
+            (T0 + timedelta(hours=1), 1, 7.0, 7),
+        ])
+        self.assertEqual(rollup_hours(), 2)
+        # Hourly average is weighted by samples, not by minutes
+        self.assertEqual(self.rollups(OccupancyRollup.HOUR), [(T0, 4, 27.5, 50), (T0 + timedelta(hours=1), 1, 7.0, 7)])
+
+    def test_reruns_rebuild_only_the_newest_bucket(self):
+        self.sample(T0, 10)
+        self.sample(T0 + timedelta(minutes=5), 20)
+        rollup_minutes()
+        self.sample(T0 + timedelta(minutes=5, seconds=30), 40)  # Lands in the newest, partial bucket
+        self.assertEqual(rollup_minutes(), 1)
+        self.assertEqual(self.rollups(OccupancyRollup.MINUTE)[-1], (T0 + timedelta(minutes=5), 2, 30.0, 40))
+        self.assertEqual(OccupancyRollup.objects.filter(period_seconds=OccupancyRollup.MINUTE).count(), 2)
+
+    def test_prune_keeps_samples_not_rolled_up(self):
+        self.assertEqual(prune_samples(T0 + timedelta(days=1)), 0)  # Nothing rolled up yet
+        for minute in range(3):
+            self.sample(T0 + timedelta(minutes=minute), 10)
+        rollup_minutes()
+        self.sample(T0 + timedelta(minutes=3), 10)
+        # The watermark (9:02) caps the cutoff, so 9:02 and 9:03 survive
+        self.assertEqual(prune_samples(T0 + timedelta(days=1)), 2)
+        self.assertEqual(OccupancySample.objects.count(), 2)
+
+    def test_command(self):
+        self.sample(T0, 10)
+        out = StringIO()
+        call_command('downsample_occupancy', '--full', '--raw-retention-days=1', stdout=out)
+        self.assertIn("Upserted 1 minute and 1 hour buckets.", out.getvalue())
+        self.assertIn("Deleted 0 raw samples", out.getvalue())  # T0 is the watermark itself
+
+
+class HistoryEndpointTests(TenantTestCase):
+
+    def test_detection_appends_a_sample(self):
+        self.sign_in(self.member)
+        self.detect(people=12)
+        sample = OccupancySample.objects.get(zone=self.zone)
+        self.assertEqual((sample.camera_id, sample.people_count, sample.capacity_ratio), (self.camera.pk, 12, 0.12))
+
+    def test_history_reads_rollups_of_visible_zones(self):
+        for zone in (self.zone, self.other_org.zone):
+            OccupancyRollup.objects.create(zone=zone, period_seconds=OccupancyRollup.HOUR, bucket_start=T0,
+                                           samples=4, avg_count=27.5, peak_count=50, peak_ratio=0.5)
+        params = {"zone_id": self.zone.pk, "start": "2025-03-01T00:00:00Z", "end": "2025-03-02T00:00:00Z"}
+        url = reverse('occupancy-history')
+
+        self.sign_in(self.member)
+        data = self.client.get(url, params).json()
+        self.assertEqual([(b["samples"], b["peak_count"]) for b in data["buckets"]], [(4, 50)])
+        self.assertEqual(self.client.get(url, dict(params, resolution="minute")).json()["buckets"], [])
+        self.assertEqual(self.client.get(url, dict(params, zone_id=self.other_org.zone.pk)).status_code, 404)
+        self.assertEqual(self.client.get(url, dict(params, resolution="day")).status_code, 400)
+        self.assertEqual(self.client.get(url, dict(params, start="yesterday")).status_code, 400)
@@ -0,0 +1,108 @@
+""" Eco-points ledger, batched accrual and leaderboard (lims.points) """
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+
+from ..models import Membership, PointsEntry, User
+from ..points import ANONYMOUS, PointsAccrual, leaderboard, reconcile, rebuild_leaderboard
+from .base import TenantTestCase
+
+DETECTION = PointsEntry.Reason.DETECTION
+
+
+@override_settings(POINTS_CACHE='local', POINTS_LEADERBOARD_SIZE=2)
+@mock.patch.object(PointsAccrual, 'start')  # Flushed by hand, not by the daemon thread
+class PointsTests(TenantTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.outsider = User.objects.create_user(username="outsider@test", email="outsider@test", password="pw",
+                                                first_name="Out", last_name="Sider")
+        Membership.objects.create(user=cls.outsider, organization=cls.other_org)
+
+    def setUp(self):
+        super().setUp()
+        caches['local'].clear()
+
+    def test_credits_fold_into_one_ledger_row_per_user_and_reason(self, start):
+        accrual = PointsAccrual(flush_seconds=3600)
+        for _ in range(30):
+            accrual.credit(self.member.pk, 2, DETECTION)
+        accrual.credit(self.member.pk, 5, PointsEntry.Reason.CARBON_SAVED)
+        accrual.credit(self.outsider.pk, 0, DETECTION)  # Nothing to write
+        self.assertEqual(accrual.pending(), 2)
+        self.assertEqual(accrual.flush(), 31)
+        self.assertEqual(accrual.pending(), 0)
+        self.assertEqual(sorted(PointsEntry.objects.values_list('reason', 'amount', 'credits')),
+                         [('CARBON_SAVED', 5, 1), ('DETECTION', 60, 30)])
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.eco_points, 65)
+
+    def test_failed_flush_keeps_the_batch(self, start):
+        accrual = PointsAccrual(flush_seconds=3600)
+        accrual.credit(self.member.pk, 3, DETECTION)
+        with mock.patch('lims.points.apply_credits', side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                accrual.flush()
+        self.assertEqual((accrual.pending(), accrual.failures), (1, 1))
+        accrual.credit(self.member.pk, 4, DETECTION)
+        self.assertEqual(accrual.flush(), 2)
+        self.assertEqual(PointsEntry.objects.get().amount, 7)
+
+    def test_flush_merges_new_balances_into_the_board(self, start):
+        rebuild_leaderboard()
+        self.assertEqual(leaderboard(), [])
+        accrual = PointsAccrual(flush_seconds=3600)
+        accrual.credit(self.member.pk, 5, DETECTION)
+        accrual.credit(self.outsider.pk, 9, DETECTION)
+        accrual.flush()
+        board = leaderboard()
+        self.assertEqual([(e["rank"], e["user_id"], e["points"]) for e in board],
+                         [(1, self.outsider.pk, 9), (2, self.member.pk, 5)])
+        self.assertEqual(board[0]["name"], "Out Sider")
+        self.assertEqual(board[1]["name"], "member")  # Email local part, never the address
+
+        accrual.credit(self.member.pk, 10, DETECTION)
+        # Savepoint + ledger insert + balance update + re-read + release; no name lookup for known users
+        with self.assertNumQueries(5):
+            accrual.flush()
+        self.assertEqual([e["user_id"] for e in leaderboard()], [self.member.pk, self.outsider.pk])
+
+    def test_reconcile_resets_drifted_balances_to_the_ledger(self, start):
+        PointsEntry.objects.create(user=self.member, reason=DETECTION, amount=8, credits=8)
+        User.objects.filter(pk=self.member.pk).update(eco_points=50)  # Drifted
+        User.objects.filter(pk=self.outsider.pk).update(eco_points=3)  # No ledger at all
+        self.assertEqual(sorted(reconcile()), sorted([self.member.pk, self.outsider.pk]))
+        self.assertEqual(dict(User.objects.filter(pk__in=[self.member.pk, self.outsider.pk])
+                              .values_list('id', 'eco_points')),
+                         {self.member.pk: 8, self.outsider.pk: 0})
+        self.assertEqual(reconcile(), [])
+        self.assertEqual([e["user_id"] for e in leaderboard()], [self.member.pk])
+
+    def test_endpoint_names_only_co_members(self, start):
+        self.assertEqual(self.client.get(reverse('points-leaderboard')).status_code, 401)
+        User.objects.filter(pk=self.outsider.pk).update(eco_points=9)
+        User.objects.filter(pk=self.member.pk).update(eco_points=5)
+        rebuild_leaderboard()
+
+        self.sign_in(self.member)
+        data = self.client.get(reverse('points-leaderboard')).json()
+        self.assertEqual(data["leaderboard"], [
+            {"rank": 1, "user_id": None, "name": ANONYMOUS, "points": 9},
+            {"rank": 2, "user_id": self.member.pk, "name": "member", "points": 5},
+        ])
+        self.assertEqual(data["me"], {"points": 5, "rank": 2})
+
+        Membership.objects.create(user=self.member, organization=self.other_org)
+        data = self.client.get(reverse('points-leaderboard')).json()
+        self.assertEqual(data["leaderboard"][0]["user_id"], self.outsider.pk)
+
+        self.sign_in(self.admin)
+        data = self.client.get(reverse('points-leaderboard'), {"limit": 1}).json()
+        self.assertEqual(data["leaderboard"], [{"rank": 1, "user_id": self.outsider.pk,
+                                                "name": "Out Sider", "points": 9}])
+        self.assertEqual(data["me"], {"points": 0, "rank": None})
+        self.assertEqual(self.client.get(reverse('points-leaderboard'), {"limit": 3}).status_code, 400)
@@ -0,0 +1,108 @@
+""" On-demand request profiling (lims.profiling, ProfilingMiddleware) """
+import json
+import os
+import tempfile
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ..middleware import ProfilingMiddleware
+from ..models import Zone
+from ..profiling import SamplingProfiler, folded_text, list_profiles, load_profile, rotate
+from .base import TenantTestCase
+
+
+def busy_for(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def slow_view(request):
+    list(Zone.objects.values_list('id', flat=True))
+    busy_for(0.05)
+    return HttpResponse("done")
+
+
+class ProfilingTestCase(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        overrides = override_settings(PROFILE_DIR=self.directory, PROFILE_INTERVAL_MS=1, PROFILE_MAX_FILES=3)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class ProfilerTests(ProfilingTestCase):
+
+    def test_samples_the_request_thread(self):
+        with SamplingProfiler(interval_ms=1) as profiler:
+            busy_for(0.05)
+        self.assertGreater(profiler.samples, 5)
+        hottest = next(iter(profiler.folded()))
+        self.assertTrue(hottest.rsplit(';', 1)[-1].startswith("busy_for (lims/tests/test_profiling.py:"), hottest)
+        self.assertIn("test_samples_the_request_thread", hottest)
+
+    def test_rotation_and_lookup(self):
+        for i in range(5):
+            path = os.path.join(self.directory, f"p{i}.json")
+            with open(path, 'w') as f:
+                json.dump({"stacks": {"root;leaf": i}}, f)
+            os.utime(path, (1_700_000_000 + i,) * 2)
+        rotate()
+        self.assertEqual([p["id"] for p in list_profiles()], ["p4", "p3", "p2"])
+        self.assertEqual(folded_text(load_profile("p4")), "root;leaf 4\n")
+        for bad in ("p0", "../p4", ".p4", ""):
+            self.assertIsNone(load_profile(bad))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILE_SAMPLE_EVERY=0)
+class ProfilingMiddlewareTests(ProfilingTestCase):
+
+    def call(self, middleware, user=None, flagged=True):
+        headers = {"HTTP_X_PROFILE": "1"} if flagged else {}
+        if user:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {RefreshToken.for_user(user).access_token}"
+        request = RequestFactory().get(reverse('zone-list-create'), **headers)
+        request.resolver_match = resolve(request.path)
+        return middleware(request)
+
+    def test_off_unless_enabled(self):
+        with override_settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(slow_view)
+
+    def test_admin_requests_are_profiled_with_their_queries(self):
+        response = self.call(ProfilingMiddleware(slow_view), self.admin)
+        profile = load_profile(response['X-Profile-Id'])
+        self.assertEqual((profile["reason"], profile["endpoint"], profile["status"]),
+                         ("requested", "zone-list-create", 200))
+        self.assertEqual(profile["query_count"], 1)
+        self.assertIn('"lims_zone"', profile["queries"][0]["sql"])
+        self.assertTrue(any("slow_view" in stack for stack in profile["stacks"]))
+
+        self.sign_in(self.admin)
+        listed = self.client.get(reverse('profile-list')).json()["profiles"]
+        self.assertEqual([p["id"] for p in listed], [profile["id"]])
+        folded = self.client.get(reverse('profile-detail', args=[profile["id"]]), {"file_format": "folded"})
+        self.assertIn(b"slow_view", folded.content)
+
+    def test_flag_from_non_admins_is_ignored(self):
+        middleware = ProfilingMiddleware(slow_view)
+        self.assertNotIn('X-Profile-Id', self.call(middleware, self.member))
+        self.assertNotIn('X-Profile-Id', self.call(middleware))
+        self.sign_in(self.member)
+        self.assertEqual(self.client.get(reverse('profile-list')).status_code, 403)
+
+    @override_settings(PROFILE_SAMPLE_EVERY=2)
+    def test_sampling_mode(self):
+        middleware = ProfilingMiddleware(slow_view)
+        profiled = ['X-Profile-Id' in self.call(middleware, flagged=False) for _ in range(4)]
+        self.assertEqual(profiled, [False, True, False, True])
+        self.assertEqual({load_profile(p["id"])["reason"] for p in list_profiles()}, {"sampled"})
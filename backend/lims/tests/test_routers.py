@@ -0,0 +1,101 @@
+""" Read-replica routing and the read-your-writes pin (lims.routers, ReplicaRoutingMiddleware) """
+from unittest import mock
+
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve, reverse
+
+from .. import routers
+from ..middleware import ReplicaRoutingMiddleware
+from ..routers import ReplicaRouter
+
+REPLICAS = ['replica_0', 'replica_1']
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS, REPLICA_RETRY_SECONDS=30)
+@mock.patch.dict(routers._down_until, clear=True)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        tokens = routers.use_replica.set(True), routers.current_replica.set(None)
+        self.addCleanup(routers.use_replica.reset, tokens[0])
+        self.addCleanup(routers.current_replica.reset, tokens[1])
+
+    def test_reads_stay_on_the_primary_unless_allowed(self):
+        routers.use_replica.set(False)
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    def test_one_replica_per_request(self):
+        alias = self.router.db_for_read(None)
+        self.assertIn(alias, REPLICAS)
+        self.assertEqual({self.router.db_for_read(None) for _ in range(5)}, {alias})
+
+    def test_down_replicas_are_skipped(self):
+        routers.mark_down('replica_0')
+        self.assertEqual(routers.healthy_replicas(), ['replica_1'])
+        self.assertEqual(self.router.db_for_read(None), 'replica_1')
+        routers.mark_down('replica_1')
+        self.assertEqual(self.router.db_for_read(None), 'default')
+        routers.mark_up('replica_0')
+        self.assertEqual(self.router.db_for_read(None), 'replica_0')
+
+    def test_a_write_moves_the_rest_of_the_request_to_the_primary(self):
+        self.assertIn(self.router.db_for_read(None), REPLICAS)
+        self.assertEqual(self.router.db_for_write(None), 'default')
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS, REPLICA_READ_ENDPOINTS=['organization-list-create'],
+                   REPLICA_PIN_COOKIE='db_pin', REPLICA_PIN_SECONDS=5)
+@mock.patch.dict(routers._down_until, clear=True)
+class ReplicaMiddlewareTests(SimpleTestCase):
+    """ Runs the middleware around a view that only records where its reads would go """
+
+    def call(self, method, url_name, cookies=None, fail_on=None):
+        request = getattr(RequestFactory(), method)(reverse(url_name))
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(request.path)
+        seen = []
+
+        def view(request):
+            alias = ReplicaRouter().db_for_read(None)
+            seen.append(alias)
+            if alias == fail_on:
+                raise OperationalError("replica went away")
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(None)
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            try:
+                return view(request)
+            except OperationalError as e:
+                return middleware.process_exception(request, e)
+
+        middleware.get_response = get_response
+        return middleware(request), seen
+
+    def test_listed_gets_read_from_a_replica(self):
+        _, seen = self.call('get', 'organization-list-create')
+        self.assertIn(seen[0], REPLICAS)
+        _, seen = self.call('get', 'zone-list-create')
+        self.assertEqual(seen, ['default'])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response, _ = self.call('post', 'organization-list-create')
+        self.assertEqual(response.cookies['db_pin']['max-age'], 5)
+        _, seen = self.call('get', 'organization-list-create', cookies={'db_pin': '1'})
+        self.assertEqual(seen, ['default'])
+
+    def test_failed_replica_is_marked_down_and_the_read_replayed(self):
+        routers.mark_down('replica_1')
+        with self.assertLogs('lims.middleware', 'WARNING'):
+            response, seen = self.call('get', 'organization-list-create', fail_on='replica_0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(seen, ['replica_0', 'default'])
+        self.assertEqual(routers.healthy_replicas(), [])
+        # Context is reset between requests
+        self.assertFalse(routers.use_replica.get())
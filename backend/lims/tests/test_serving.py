@@ -0,0 +1,134 @@
+""" Graceful drain, the detection bulkhead and the gunicorn profiles (lims.serving, kazlat/gunicorn_conf.py) """
+import signal
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from kazlat import gunicorn_conf
+
+from .. import serving
+from ..serving import Bulkhead, begin_drain, drain, on_drain
+from .base import TenantTestCase
+
+
+@mock.patch('lims.serving.connections')
+@mock.patch('atexit.register')
+class DrainTests(SimpleTestCase):
+
+    def setUp(self):
+        hooks = mock.patch.dict(serving._hooks, clear=True)
+        hooks.start()
+        self.addCleanup(hooks.stop)
+        self.addCleanup(serving.draining.clear)
+
+    def test_hooks_run_in_order_until_the_deadline(self, register, connections):
+        deadlines = []
+
+        def frames(deadline):
+            deadlines.append(deadline)
+            return 3
+
+        def points(deadline):
+            raise RuntimeError("database is gone")
+
+        on_drain('frames', frames)
+        on_drain('points', points)
+        on_drain('frames', lambda deadline: 0)  # Registered once
+        register.assert_called_once_with(drain)
+
+        before = time.monotonic()
+        self.assertEqual(drain(timeout=2), {"frames": 3, "points": "error: database is gone"})
+        self.assertTrue(before + 2 <= deadlines[0] <= time.monotonic() + 2)
+        self.assertTrue(serving.draining.is_set())
+        connections.close_all.assert_called_once_with()
+
+    def test_sigterm_drains_in_the_background_once(self, register, connections):
+        done = threading.Event()
+        calls = []
+
+        def hook(deadline):
+            calls.append(threading.current_thread().name)
+            done.set()
+
+        on_drain('heartbeats', hook)
+        begin_drain()
+        begin_drain()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, ["drain"])
+
+
+class BulkheadTests(SimpleTestCase):
+
+    def test_at_most_limit_slots(self):
+        bulkhead = Bulkhead(2)
+        with bulkhead.slot() as first, bulkhead.slot() as second:
+            with bulkhead.slot() as third:
+                self.assertEqual((first, second, third), (True, True, False))
+                self.assertEqual(bulkhead.active, 2)
+        self.assertEqual((bulkhead.active, bulkhead.rejected), (0, 1))
+        with bulkhead.slot() as again:
+            self.assertTrue(again)
+
+    def test_zero_is_unlimited(self):
+        bulkhead = Bulkhead(0)
+        with bulkhead.slot() as first, bulkhead.slot() as second:
+            self.assertTrue(first and second)
+        self.assertEqual(bulkhead.rejected, 0)
+
+
+class DetectBulkheadTests(TenantTestCase):
+
+    def test_detections_beyond_the_cap_are_shed(self):
+        bulkhead = Bulkhead(1)
+        self.sign_in(self.member)
+        with mock.patch.object(serving, '_bulkhead', bulkhead):
+            with bulkhead.slot():
+                response, counter = self.detect()
+                self.assertEqual((response.status_code, response['Retry-After']), (503, "1"))
+                self.assertEqual(counter.calls, 0)
+            self.assertEqual(self.detect()[0].status_code, 200)
+        self.assertEqual((bulkhead.active, bulkhead.rejected), (0, 1))
+
+
+class GunicornProfileTests(SimpleTestCase):
+
+    def test_profiles(self):
+        for pool, expected in (
+            ("detect", {"workers": 4, "threads": 16, "timeout": 300, "detect_max_concurrency": 0}),
+            ("crud", {"workers": 9, "threads": 2, "timeout": 120, "detect_max_concurrency": 0}),
+            ("all", {"workers": 5, "threads": 8, "timeout": 300, "detect_max_concurrency": 6}),
+        ):
+            with self.subTest(pool=pool):
+                profile = gunicorn_conf.server_profile(pool, cpus=4, env={})
+                self.assertEqual({key: profile[key] for key in expected}, expected)
+
+    def test_environment_overrides(self):
+        profile = gunicorn_conf.server_profile(cpus=2, env={"SERVER_POOL": "all", "GUNICORN_WORKER_CLASS": "sync",
+                                                            "GUNICORN_WORKERS": "3"})
+        self.assertEqual((profile["worker_class"], profile["workers"], profile["threads"]), ("sync", 3, 1))
+        self.assertEqual(profile["detect_max_concurrency"], 0)  # One thread: nothing to reserve
+        profile = gunicorn_conf.server_profile("all", cpus=2, env={"DETECT_MAX_CONCURRENCY": "3"})
+        self.assertEqual(profile["detect_max_concurrency"], 3)
+        with self.assertRaisesMessage(ValueError, "SERVER_POOL must be one of"):
+            gunicorn_conf.server_profile("batch", cpus=2, env={})
+
+    def test_sigterm_is_chained_to_begin_drain(self):
+        worker = mock.Mock(age=2)
+        stop = mock.Mock()
+        with mock.patch('signal.getsignal', return_value=stop), mock.patch('signal.signal') as install, \
+                mock.patch('lims.serving.begin_drain') as begin:
+            gunicorn_conf.post_worker_init(worker)
+            sig, handler = install.call_args.args
+            handler(signal.SIGTERM, None)
+        self.assertEqual(sig, signal.SIGTERM)
+        begin.assert_called_once_with()
+        stop.assert_called_once_with(signal.SIGTERM, None)
+
+    def test_worker_exit_drains(self):
+        worker = mock.Mock()
+        with mock.patch('lims.serving.drain', return_value={"frames": 2}) as drained:
+            gunicorn_conf.worker_exit(None, worker)
+        drained.assert_called_once_with()
+        self.assertEqual(worker.log.info.call_args.args[1], {"frames": 2})
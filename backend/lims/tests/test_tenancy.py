@@ -0,0 +1,88 @@
+""" Tenant scoping (lims.tenancy) """
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+
+from ..lifecycle import escalate
+from ..models import Alert, Notification, OccupancySample, User
+from .base import TenantTestCase
+
+
+class TenantScopingTests(TenantTestCase):
+
+    def organization_ids(self):
+        return {org['id'] for org in self.client.get(reverse('organization-list-create')).json()}
+
+    def test_member_sees_own_organization_only(self):
+        self.sign_in(self.member)
+        self.assertEqual(self.organization_ids(), {self.org.pk})
+        alerts = self.client.get(reverse('alert-list-create')).json()
+        alert_ids = {a['id'] for a in (alerts['results'] if isinstance(alerts, dict) else alerts)}
+        self.assertEqual(alert_ids, {self.alert.pk})
+        self.assertEqual(self.client.get(reverse('zone-detail', args=[self.other_org.zone.pk])).status_code, 404)
+
+    def test_member_cannot_write_to_other_organization(self):
+        self.sign_in(self.member)
+        response = self.client.post(reverse('zone-list-create'), {
+            "name": "Intruder", "zone_type": "Hall", "capacity": 10, "organization_id": self.other_org.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_admin_sees_every_organization(self):
+        self.sign_in(self.admin)
+        self.assertEqual(self.organization_ids(), {self.org.pk, self.other_org.pk})
+
+    def test_anonymous_sees_nothing_by_default(self):
+        self.assertEqual(self.organization_ids(), set())
+        with self.settings(TENANT_ANONYMOUS_ACCESS=True):
+            self.assertEqual(self.organization_ids(), {self.org.pk, self.other_org.pk})
+
+    def test_registration_cannot_pick_a_role(self):
+        response = self.client.post(reverse('register'), {
+            "email": "new@example.com", "password": "a-long-password", "role": "ADMIN",
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.objects.get(email="new@example.com").role, User.Role.USER)
+
+    def test_escalation_notifies_the_alerts_organization(self):
+        Alert.objects.update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(escalate(), 2)
+        self.assertEqual(set(Notification.objects.values_list('audience', flat=True)),
+                         {f"org:{self.org.pk}", f"org:{self.other_org.pk}"})
+
+
+class TenantWriteTests(TenantTestCase):
+    """ Detections and alerts only land in the caller's organizations """
+
+    def test_detect_needs_a_member(self):
+        response, counter = self.detect()
+        self.assertEqual(response.status_code, 403)
+        self.sign_in(self.member)
+        response, counter = self.detect(zone=self.other_org.zone)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(counter.calls, 0)
+        self.assertFalse(OccupancySample.objects.exists())
+        self.assertEqual(self.detect()[0].status_code, 200)
+
+    def test_detect_camera_must_belong_to_the_zone(self):
+        self.sign_in(self.admin)
+        response, _ = self.detect(camera=self.other_org.camera, people=95)  # Would raise an alert
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OccupancySample.objects.exists())
+        self.assertEqual(Alert.objects.count(), 2)  # Fixtures only
+        response, _ = self.detect(people=95)
+        self.assertEqual(response.status_code, 200)
+        alert = Alert.objects.get(pk=response.data["alert_id"])
+        self.assertEqual((alert.camera_id, alert.organization_id), (self.camera.pk, self.org.pk))
+
+    def test_alert_takes_its_cameras_organization(self):
+        self.sign_in(self.member)
+        path = reverse('alert-list-create')
+        body = {"heading": "Smoke", "camera_id": self.other_org.camera.pk}
+        self.assertEqual(self.client.post(path, body, format='json').status_code, 403)
+        self.assertEqual(self.client.post(path, {"heading": "Smoke"}, format='json').status_code, 400)
+        response = self.client.post(path, dict(body, camera_id=self.camera.pk), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Alert.objects.get(pk=response.data["id"]).organization_id, self.org.pk)
+        self.assertIn(response.data["id"], {a['id'] for a in self.client.get(path).json()})
@@ -1,7 +1,13 @@
 from django.urls import path
-from ..views.system_views import system_status, system_health
+from ..views.system_views import system_status, system_health, system_live, system_ready, system_metrics
+from ..views.system_views import profile_detail, profile_list
 
 urlpatterns = [
     path("status/", system_status, name="system_status"),
     path("health/", system_health, name="system_health"),
+    path("live/", system_live, name="system_live"),
+    path("ready/", system_ready, name="system_ready"),
+    path("metrics/", system_metrics, name="system_metrics"),
+    path("profiles/", profile_list, name="profile-list"),
+    path("profiles/<str:profile_id>/", profile_detail, name="profile-detail"),
 ]
\ No newline at end of file
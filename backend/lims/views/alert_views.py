@@ -2,9 +2,13 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from ..models import Alert, Camera
-from ..serializers import AlertSerializer
+from ..frames import get_store
+from ..models import Alert, Frame
+from ..metrics import span
+from ..serializers import AlertSerializer, FrameSerializer
+from ..tenancy import check_organization
 
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])  # Or AllowAny, depending on your needs
@@ -12,7 +16,7 @@ def alert_list_create(request):
     
 # --- GET: List all alerts ---
     if request.method == 'GET':
-        alerts = Alert.objects.all().order_by('-created_at')
+        alerts = Alert.objects.visible_to(request.user).order_by('-created_at')
 
         # 1. Apply Status Filter if present
         status_param = request.query_params.get('status')
@@ -22,16 +26,19 @@ def alert_list_create(request):
         # 2. Apply Organization Filter if present
         org_param = request.query_params.get('org_id')
         if org_param:
-            # Get IDs of cameras belonging to this org
-            camera_ids = Camera.objects.filter(organization_id=org_param).values_list('id', flat=True)
-            alerts = alerts.filter(camera_id__in=camera_ids)
+            # Alerts carry their camera's organization (lims.tenancy)
+            alerts = alerts.filter(organization_id=org_param)
             
         serializer = AlertSerializer(alerts, many=True)
-        return Response(serializer.data)
-    # --- POST: Create a new alert ---
+        # Evaluates the queryset and builds the payload
+        with span('serialize'):
+            data = serializer.data
+        return Response(data)
+    # --- POST: Create a new alert on one of the caller's cameras ---
     elif request.method == 'POST':
         serializer = AlertSerializer(data=request.data)
         if serializer.is_valid():
+            check_organization(request.user, serializer.validated_data['camera'].organization_id)
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -40,7 +47,7 @@ def alert_list_create(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
 def alert_detail(request, pk):
-    alert = get_object_or_404(Alert, pk=pk)
+    alert = get_object_or_404(Alert.objects.visible_to(request.user), pk=pk)
 
     # --- GET: Retrieve single alert ---
     if request.method == 'GET':
@@ -51,6 +58,8 @@ def alert_detail(request, pk):
     elif request.method == 'PUT':
         serializer = AlertSerializer(alert, data=request.data, partial=True)
         if serializer.is_valid():
+            if 'camera' in serializer.validated_data:
+                check_organization(request.user, serializer.validated_data['camera'].organization_id)
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -58,4 +67,21 @@ def alert_detail(request, pk):
     # --- DELETE: Remove alert ---
     elif request.method == 'DELETE':
         alert.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def frame_detail(request, frame_id):
+    """ An archived frame (e.g. an alert's frame_id) as JPEG, or its metadata with ?file_format=json """
+    frame = get_object_or_404(Frame.objects.visible_to(request.user), pk=frame_id)
+    if request.query_params.get('file_format') == 'json':
+        return Response(FrameSerializer(frame).data)
+    data = get_store().get(frame.sha256)
+    if data is None:
+        return Response({"error": "Frame image not found"}, status=status.HTTP_404_NOT_FOUND)
+    response = HttpResponse(data, content_type="image/jpeg")
+    # Content-addressed: the bytes behind an id never change
+    response['Cache-Control'] = "private, max-age=86400, immutable"
+    response['ETag'] = f'"{frame.sha256}"'
+    return response
@@ -0,0 +1,87 @@
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+
+from ..bulk import FORMATS, HIERARCHY_COLUMNS, guess_format, hierarchy_rows, import_hierarchy
+from ..exports import CONTENT_TYPES, ExportError, export_stream, stream_rows
+from ..metrics import span
+from ..permissions import IsAdmin
+from ..tenancy import UNRESTRICTED, member_organization_ids
+from .occupancy_views import parse_time
+
+
+@api_view(['POST'])
+@permission_classes([IsAdmin])  # Creates rows in any organization
+def bulk_import(request):
+    """
+    Creates organizations, zones and cameras from a CSV or NDJSON upload
+    (multipart `file`, or the raw request body with a text/csv or
+    application/x-ndjson Content-Type). Query params: file_format, batch_size, dry_run.
+    """
+    if request.content_type.startswith('multipart/'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Missing 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+        lines, name, content_type = upload, upload.name, upload.content_type or ''
+    else:
+        # Read the body line by line instead of through request.data (no full copy in memory)
+        lines, name, content_type = request._request, '', request.content_type
+
+    fmt = request.query_params.get('file_format') or guess_format(name, content_type)
+    if fmt not in FORMATS:
+        return Response({"error": f"'file_format' must be one of: {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        batch_size = int(request.query_params.get('batch_size', 0)) or None
+    except ValueError:
+        return Response({"error": "'batch_size' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    dry_run = request.query_params.get('dry_run') in ('1', 'true', 'True')
+
+    with span('bulk_import'):
+        report = import_hierarchy(lines, fmt, batch_size=batch_size, dry_run=dry_run)
+    return Response(dict(report.as_dict(), dry_run=dry_run), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bulk_export(request):
+    """
+    Streams the hierarchy (?kind=hierarchy, optional org_id) in the import
+    format, or the carbon log / alert history (?kind=carbonlogs|alerts,
+    optional org_id, zone_id, start, end) as CSV, NDJSON or Parquet.
+    ?compress=gzip compresses on the fly. (?file_format=; DRF reserves ?format=.)
+    """
+    params = request.query_params
+    kind = params.get('kind', 'hierarchy')
+    fmt = params.get('file_format', 'csv')
+    org_id = params.get('org_id') or None
+    if org_id is not None and not org_id.isdigit():
+        return Response({"error": "Invalid 'org_id'"}, status=status.HTTP_400_BAD_REQUEST)
+    # Members export their own organizations only (lims.tenancy)
+    allowed = member_organization_ids(request.user)
+    if allowed is not UNRESTRICTED:
+        org_id = allowed if org_id is None else ([int(org_id)] if int(org_id) in allowed else [])
+
+    if kind == 'hierarchy':
+        if fmt not in FORMATS:
+            return Response({"error": f"'file_format' must be one of: {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        chunks, content_type, filename = (
+            stream_rows(hierarchy_rows(org_id), fmt, HIERARCHY_COLUMNS), CONTENT_TYPES[fmt], f"hierarchy.{fmt}"
+        )
+    else:
+        start, end = parse_time(params.get('start')), parse_time(params.get('end'))
+        if (params.get('start') and start is None) or (params.get('end') and end is None):
+            return Response({"error": "'start' and 'end' must be ISO 8601 datetimes"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            chunks, content_type, filename = export_stream(
+                kind, fmt, params.get('compress'),
+                organization_id=org_id, zone_id=params.get('zone_id'), start=start, end=end,
+            )
+        except ExportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Rows are fetched while the body is sent, not before
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,114 @@
+from django.conf import settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from ..geo import get_zone_catalog
+from ..live import get_live_state
+from ..metrics import span
+from ..tenancy import UNRESTRICTED, member_organization_ids
+from .occupancy_views import _percentage
+
+
+def _float_params(params, names, bounds):
+    """ {name: float} or an error message; `bounds` is (low, high) per name """
+    values = {}
+    for name, (low, high) in zip(names, bounds):
+        try:
+            value = float(params[name])
+        except (KeyError, TypeError, ValueError):
+            return None, f"Missing or invalid '{name}'"
+        if not low <= value <= high:
+            return None, f"'{name}' must be between {low} and {high}"
+        values[name] = value
+    return values, None
+
+
+def _common_params(params, default_limit):
+    """ (organization_id, limit, live) shared by the geo endpoints, or an error message """
+    org_id = params.get('org_id')
+    if org_id and not org_id.isdigit():
+        return None, "Invalid 'org_id'"
+    limit = params.get('limit') or params.get('k') or str(default_limit)
+    if not limit.isdigit() or not 0 < int(limit) <= settings.GEO_MAX_RESULTS:
+        return None, f"'limit' (or 'k') must be between 1 and {settings.GEO_MAX_RESULTS}"
+    live = params.get('live') in ('1', 'true', 'True')
+    return (int(org_id) if org_id else None, int(limit), live), None
+
+
+def _organization_filter(user, org_id):
+    """ The index's organization filter: ?org_id, narrowed to the caller's organizations (lims.tenancy) """
+    allowed = member_organization_ids(user)
+    if allowed is UNRESTRICTED:
+        return org_id
+    if org_id is None:
+        return allowed
+    return org_id if org_id in allowed else []
+
+
+def _with_live(zones):
+    """ Adds the live people count, one live-store read per organization """
+    state = get_live_state()
+    orgs = {}
+    for zone in zones:
+        org_id = zone["organization_id"]
+        if org_id not in orgs:
+            orgs[org_id] = state.organization(org_id)["zones"]
+        live = orgs[org_id].get(zone["id"])
+        zone["people"] = live["people"] if live else 0
+        zone["updated_at"] = live["updated_at"] if live else None
+        zone["occupancy_percentage"] = _percentage(zone["people"], zone["capacity"])
+    return zones
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def zones_in_bbox(request):
+    """
+    Zones inside a bounding box (?min_lat, min_lon, max_lat, max_lon; min_lon >
+    max_lon crosses the antimeridian), ordered by id. Optional org_id, limit, live=1.
+    """
+    box, error = _float_params(request.query_params, ('min_lat', 'min_lon', 'max_lat', 'max_lon'),
+                               ((-90, 90), (-180, 180), (-90, 90), (-180, 180)))
+    common, error = (None, error) if error else _common_params(request.query_params, settings.GEO_DEFAULT_RESULTS)
+    if error:
+        return Response({"error": error}, status=400)
+    if box['min_lat'] > box['max_lat']:
+        return Response({"error": "'min_lat' must not be greater than 'max_lat'"}, status=400)
+    org_id, limit, live = common
+    org_id = _organization_filter(request.user, org_id)
+
+    with span('geo_query'):
+        catalog = get_zone_catalog()
+        positions = catalog.index.bbox(box['min_lat'], box['min_lon'], box['max_lat'], box['max_lon'],
+                                       organization_id=org_id)
+        zones = catalog.zones(positions[:limit])
+    if live:
+        zones = _with_live(zones)
+    return Response({"count": len(positions), "truncated": len(positions) > limit, "zones": zones})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def zones_nearest(request):
+    """ The k zones closest to ?lat&lon (great-circle), closest first. Optional max_km, org_id, live=1. """
+    point, error = _float_params(request.query_params, ('lat', 'lon'), ((-90, 90), (-180, 180)))
+    common, error = (None, error) if error else _common_params(request.query_params, 10)
+    if error:
+        return Response({"error": error}, status=400)
+    max_km = request.query_params.get('max_km')
+    try:
+        max_km = float(max_km) if max_km else None
+    except ValueError:
+        return Response({"error": "Invalid 'max_km'"}, status=400)
+    org_id, k, live = common
+    org_id = _organization_filter(request.user, org_id)
+
+    with span('geo_query'):
+        catalog = get_zone_catalog()
+        positions, distances = catalog.index.nearest(point['lat'], point['lon'], k=k, max_km=max_km,
+                                                     organization_id=org_id)
+        zones = catalog.zones(positions, distances)
+    if live:
+        zones = _with_live(zones)
+    return Response({"count": len(zones), "zones": zones})
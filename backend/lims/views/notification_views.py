@@ -1,42 +1,81 @@
+from django.conf import settings
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from ..models import Notification
+from ..metrics import span
+from ..notifications import audiences_for, can_read, feed, last_seen_id, mark_read, unread_count
+from ..permissions import IsAdminOrReadOnly
 from ..serializers import NotificationSerializer
 
 @api_view(['GET', 'POST'])
-@permission_classes([AllowAny])
+@permission_classes([IsAuthenticatedOrReadOnly])
 def notification_list_create(request):
-    
-    # --- GET: List ALL Notifications (Everyone sees everything) ---
+
+    # --- GET: The caller's feed, newest first, one keyset page at a time ---
     if request.method == 'GET':
-        # Get all notifications, newest first
-        notifications = Notification.objects.all().order_by('-created_at')
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+        params = request.query_params
+        org_ids = [o for o in params.get('org_id', '').split(',') if o]
+        before, limit = params.get('before'), params.get('limit', str(settings.NOTIFICATION_PAGE_SIZE))
+        if not all(o.isdigit() for o in org_ids) or (before and not before.isdigit()):
+            return Response({"error": "'org_id' and 'before' must be ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if not limit.isdigit() or not 0 < int(limit) <= settings.NOTIFICATION_MAX_PAGE_SIZE:
+            return Response({"error": f"'limit' must be between 1 and {settings.NOTIFICATION_MAX_PAGE_SIZE}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Broadcasts, plus the caller's role/user audiences when signed in, plus ?org_id= audiences
+        audiences = audiences_for(request.user, org_ids)
+        page, next_before = feed(audiences, before=before, limit=int(limit))
+        serializer = NotificationSerializer(page, many=True)
+        # Evaluates the queryset and builds the payload
+        with span('serialize'):
+            data = serializer.data
 
-    # --- POST: Broadcast a new message to ALL users ---
+        seen = unread = None
+        if request.user.is_authenticated:
+            seen = last_seen_id(request.user)
+            unread = unread_count(audiences, seen)
+            for item in data:
+                item["read"] = item["id"] <= seen
+        return Response({"results": data, "next_before": next_before, "unread_count": unread, "last_seen_id": seen})
+
+    # --- POST: Send a message to everyone, a role, an organization or one user ---
+    # (lims.notifications.check_target: admins anyone, members their organizations)
     elif request.method == 'POST':
-        serializer = NotificationSerializer(data=request.data)
+        serializer = NotificationSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save() # No sender to attach anymore
+            serializer.save() # One row, whatever the audience size
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def notification_mark_read(request):
+    """ Marks the caller's feed read up to `up_to_id` (default: everything) """
+    up_to_id = request.data.get('up_to_id')
+    if up_to_id is not None and not str(up_to_id).isdigit():
+        return Response({"error": "'up_to_id' must be an id"}, status=status.HTTP_400_BAD_REQUEST)
+    seen = mark_read(request.user, int(up_to_id) if up_to_id is not None else None)
+    return Response({"last_seen_id": seen})
+
+
 @api_view(['GET', 'DELETE'])
-@permission_classes([AllowAny])
+@permission_classes([IsAdminOrReadOnly])
 def notification_detail(request, pk):
-    """ Retrieve or Delete a specific notification by ID """
+    """ Retrieve (if it is in the caller's feed) or Delete (admin only) a notification by ID """
     notification = get_object_or_404(Notification, pk=pk)
+    # Another user's or organization's message answers like a missing one
+    if not can_read(request.user, notification):
+        raise Http404
 
     if request.method == 'GET':
         serializer = NotificationSerializer(notification)
         return Response(serializer.data)
 
     elif request.method == 'DELETE':
-        # Simple delete, no sender checks
         notification.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
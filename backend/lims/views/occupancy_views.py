@@ -0,0 +1,96 @@
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from ..live import get_live_state
+from ..metrics import span
+from ..models import Organization, Zone
+from ..occupancy import RESOLUTIONS, default_window, history
+from ..tenancy import UNRESTRICTED, organization_scope
+
+
+def parse_time(value):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def occupancy_history(request):
+    """
+    Occupancy of one zone over time, read from the minute/hour rollups.
+    Defaults: hourly buckets for the last 7 days (minute: last 24 hours).
+    """
+    zone_id = request.query_params.get('zone_id')
+    resolution = request.query_params.get('resolution', 'hour')
+    if not zone_id or not zone_id.isdigit():
+        return Response({"error": "Missing or invalid 'zone_id'"}, status=400)
+    if resolution not in RESOLUTIONS:
+        return Response({"error": f"'resolution' must be one of: {', '.join(RESOLUTIONS)}"}, status=400)
+    # Rollups carry no tenant column; members only read zones they can see
+    if organization_scope(request.user) is not UNRESTRICTED \
+            and not Zone.objects.visible_to(request.user).filter(pk=zone_id).exists():
+        return Response({"error": "Zone not found"}, status=404)
+
+    start, end = (parse_time(request.query_params.get(k)) for k in ('start', 'end'))
+    if (request.query_params.get('start') and start is None) or (request.query_params.get('end') and end is None):
+        return Response({"error": "'start' and 'end' must be ISO 8601 datetimes"}, status=400)
+    end = end or timezone.now()
+    start = start or default_window(resolution, end)
+
+    with span('occupancy_query'):
+        buckets = history(zone_id, resolution, start, end)
+
+    return Response({
+        "zone_id": int(zone_id),
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "buckets": buckets,
+    })
+
+
+def _percentage(people, capacity):
+    return f"{round(people / capacity * 100, 1)}%" if capacity else None
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def organization_live(request, pk):
+    """ Current people count of an organization and its zones (cameras seen in the last LIVE_STALE_SECONDS) """
+    org = get_object_or_404(Organization.objects.visible_to(request.user).only('id', 'name', 'total_capacity'), pk=pk)
+    live = get_live_state().organization(org.id)
+    for zone in live["zones"].values():
+        zone["occupancy_percentage"] = _percentage(zone["people"], zone["capacity"])
+    return Response(dict(
+        live,
+        name=org.name,
+        capacity=org.total_capacity,
+        occupancy_percentage=_percentage(live["people"], org.total_capacity),
+    ))
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def zone_live(request, pk):
+    """ Current people count of one zone """
+    zone = get_object_or_404(Zone.objects.visible_to(request.user).only('id', 'name', 'capacity', 'organization_id'),
+                             pk=pk)
+    live = get_live_state().zone(zone.id, zone.organization_id) or {"people": 0, "cameras": 0, "updated_at": None}
+    return Response({
+        "zone_id": zone.id,
+        "name": zone.name,
+        "capacity": zone.capacity,
+        "people": live["people"],
+        "cameras": live["cameras"],
+        "occupancy_percentage": _percentage(live["people"], zone.capacity),
+        "updated_at": live["updated_at"],
+        "age_seconds": live.get("age_seconds"),
+    })
@@ -1,6 +1,6 @@
+import hashlib
+
 from django.views.decorators.csrf import csrf_exempt
-import requests
-import google.generativeai as genai
 from django.conf import settings
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
@@ -8,35 +8,93 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from django.db.models import Avg, Sum
-from ..models import Zone, Alert, CarbonLog, Camera
-import PIL.Image
-import io
-
-# Endpoint for the initial Crowd Prediction
-CROWD_PREDICT_URL = "https://ecoflow-detector-490388308724.us-central1.run.app/predict"
-
-# Configure Gemini (once at module load)
-genai.configure(api_key=settings.GEMINI_API_KEY)
-
-# Cache Gemini model initialization (expensive operation)
-_gemini_model = None
-def get_gemini_model():
-    global _gemini_model
-    if _gemini_model is None:
-        _gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-    return _gemini_model
+from ..models import Zone, Alert, CarbonLog, Camera, OccupancySample, PointsEntry
+from ..frames import archive, frame_key
+from ..counters import CounterServiceError, CounterTimeout, CounterUnavailable, get_counter, get_zone_counter
+from ..heartbeat import beat
+from ..idempotency import InFlight, get_deduplicator
+from ..live import get_live_state
+from ..metrics import span
+from ..points import credit
+from ..serving import get_bulkhead
+from ..tenancy import check_organization, scope_key
 
 from django.core.cache import cache
-import time
 
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def sensor_detect(request):
+    """
+    Runs the detection pipeline once per upload. A retry carrying the same
+    `Idempotency-Key` header (or the same camera_id + frame_timestamp) gets
+    the original response back, or waits for it while it is still running,
+    instead of calling the counting services again. With DETECT_MAX_CONCURRENCY
+    set, detections beyond the cap get 503 + Retry-After (lims.serving).
+    The caller must be able to write to the zone's organization (lims.tenancy),
+    and camera_id must be one of the zone's cameras.
+    """
+    with get_bulkhead().slot() as admitted:
+        if not admitted:
+            return Response({"error": "Too many detections in progress on this worker. Please retry."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+        return _deduplicated_detect(request)
+
+
+def _deduplicated_detect(request):
+    key = _idempotency_key(request)
+    if key is None:
+        return _detect(request)
+
+    def compute():
+        response = _detect(request)
+        return response.status_code, response.data
+
+    try:
+        (status_code, data), replayed = get_deduplicator().run_once(key, compute, _external_calls)
+    except InFlight:
+        return Response({"error": "The original request with this key is still running. Retry shortly."},
+                        status=status.HTTP_409_CONFLICT, headers={"Retry-After": "1"})
+    response = Response(data, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _idempotency_key(request):
+    """
+    Dedup key from the Idempotency-Key header, else camera_id + frame_timestamp,
+    else None. Scoped to the caller (user, else camera) and the zone, which
+    fixes the organization: one client's key never replays another's response.
+    """
+    raw = request.headers.get('Idempotency-Key')
+    camera_id = request.data.get('camera_id')
+    if raw:
+        raw = f"key:{raw}"
+    elif camera_id and request.data.get('frame_timestamp'):
+        raw = f"frame:{request.data['frame_timestamp']}"
+    else:
+        return None
+    caller = f"user:{request.user.pk}" if request.user.is_authenticated else f"camera:{camera_id or ''}"
+    raw = f"{caller}|zone:{request.data.get('zone_id')}|{raw}"
+    # Fixed length and cache-safe, whatever the client sent
+    return "detect:" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _external_calls(result):
+    """ Outbound calls behind a stored response: SAHI, plus the reference counter when it ran """
+    status_code, data = result
+    if status_code != status.HTTP_200_OK:
+        return 0
+    return 1 + int("carbon_data" in data or "carbon_error" in data)
+
+
+def _detect(request):
     """
     1. Uploads image to Crowd API -> Gets 'sahi_count'.
     2. Checks Overcrowding.
-    3. If Safe -> Sends image DIRECTLY to Google Gemini API to get 'gemini_count'.
+    3. If Safe -> Counts again with the zone's counter backend to get 'gemini_count'
+       (Gemini by default, or the SAHI service / a local ONNX model).
     4. Calculates Carbon Saved = sahi_count / gemini_count.
     
     Optimized with:
@@ -52,9 +110,25 @@ def sensor_detect(request):
 
     if not zone_id or not image_file:
         return Response({"error": "Missing 'zone_id' or 'file'"}, status=400)
+    if not str(zone_id).isdigit() or (camera_id and not str(camera_id).isdigit()):
+        return Response({"error": "'zone_id' and 'camera_id' must be ids"}, status=400)
 
-    # Use only() to fetch only needed fields (faster query)
-    zone = Zone.objects.only('id', 'name', 'capacity').get(pk=zone_id)
+    # Use only() to fetch only needed fields (faster query); the camera, when given,
+    # is looked up together with its zone, so it can't belong to another zone (or tenant)
+    with span('zone_query'):
+        zone_fields = ('id', 'name', 'capacity', 'counter_backend', 'organization_id')
+        if camera_id:
+            camera = (Camera.objects.select_related('zone').only('id', *(f'zone__{f}' for f in zone_fields))
+                      .filter(pk=camera_id, zone_id=zone_id).first())
+            if camera is None:
+                return Response({"error": f"Camera {camera_id} is not in zone {zone_id}"}, status=400)
+            zone = camera.zone
+        else:
+            zone = Zone.objects.only(*zone_fields).filter(pk=zone_id).first()
+            if zone is None:
+                return Response({"error": "Zone not found"}, status=404)
+    # Before any work: only members (or admins) write samples, logs and alerts into a tenant
+    check_organization(request.user, zone.organization_id)
     capacity = zone.capacity
 
     # ---------------------------------------------------------
@@ -62,26 +136,44 @@ def sensor_detect(request):
     # ---------------------------------------------------------
     try:
         # Read image into memory once (avoid multiple file reads)
-        image_data = image_file.read()
-        image_file.seek(0)  # Reset for potential reuse
+        with span('upload'):
+            image_data = image_file.read()
+            image_file.seek(0)  # Reset for potential reuse
         
         # Send file to your external Sahi service with reduced timeout
-        files = {'file': (image_file.name, io.BytesIO(image_data), image_file.content_type)}
-        crowd_resp = requests.post(CROWD_PREDICT_URL, files=files, timeout=20)
-        
-        if crowd_resp.status_code != 200:
-            return Response({"error": "Crowd Service failed", "details": crowd_resp.text}, status=502)
-        
-        crowd_data = crowd_resp.json()
-        sahi_count = int(crowd_data.get('sahi_count', 0))
+        with span('sahi'):
+            sahi_count = get_counter('sahi').count(
+                image_data, filename=image_file.name, content_type=image_file.content_type
+            )
 
-    except requests.Timeout:
+    except CounterServiceError as e:
+        return Response({"error": str(e), "details": e.details}, status=502)
+    except CounterTimeout:
         return Response({"error": "Crowd API timeout. Please try again."}, status=504)
-    except requests.ConnectionError:
+    except CounterUnavailable:
         return Response({"error": "Cannot connect to Crowd API. Service may be down."}, status=503)
     except Exception as e:
         return Response({"error": "Unexpected error calling Crowd API", "details": str(e)}, status=503)
 
+    # Every detection goes into the occupancy time series (safe or not)
+    camera_pk = int(camera_id) if camera_id else None
+    # Archived frame id, known now so alerts can link to it; stored after the response is built
+    frame_id = frame_key(zone, image_data)
+    with span('occupancy_insert'):
+        OccupancySample.objects.create(
+            zone_id=zone.id,
+            camera_id=camera_pk,
+            people_count=min(sahi_count, 32767),
+            capacity_ratio=round(sahi_count / capacity, 4) if capacity else 0.0,
+        )
+    with span('live_update'):
+        get_live_state().update(camera_pk, zone.id, zone.organization_id, sahi_count, capacity)
+    if camera_pk is not None:
+        beat(camera_pk)  # Every detection doubles as a heartbeat (no query)
+    # Eco-points for the reporting user: queued in memory, written by the next batched flush
+    if request.user.is_authenticated:
+        credit(request.user.pk, settings.POINTS_PER_DETECTION, PointsEntry.Reason.DETECTION)
+
     # ---------------------------------------------------------
     # STEP 2: Check Capacity
     # ---------------------------------------------------------
@@ -96,12 +188,22 @@ def sensor_detect(request):
         "status": "NORMAL"
     }
 
+    # Every detection also updates the zone's forecast (NumPy loads on first use)
+    predicted = None
+    if settings.FORECAST_ENABLED:
+        from ..forecasting import check_zone
+
+        with span('forecast'):
+            predicted = check_zone(zone.id, sahi_count)
+
     if is_danger:
         # Check for existing open alert for this camera
-        existing_alert = Alert.objects.filter(
-            camera_id=camera_id,
-            status=Alert.Status.OPEN
-        ).first()
+        with span('alert_query'):
+            existing_alert = Alert.objects.filter(
+                camera_id=camera_pk,
+                kind=Alert.Kind.OVERCROWDING,
+                status=Alert.Status.OPEN
+            ).first()
         
         if existing_alert:
             # Keep existing alert, just update the response
@@ -111,12 +213,15 @@ def sensor_detect(request):
             response_data["alert_message"] = "Existing alert still active"
         else:
             # Create new alert linked to camera
-            new_alert = Alert.objects.create(
-                camera_id=camera_id,
-                heading=f"Overcrowding in {zone.name}",
-                sub_heading=f"Detected {sahi_count}/{capacity} people. (Cam: {camera_id})",
-                status=Alert.Status.OPEN
-            )
+            with span('alert_insert'):
+                new_alert = Alert.objects.create(
+                    camera_id=camera_pk,
+                    organization_id=zone.organization_id,
+                    frame_id=frame_id,
+                    heading=f"Overcrowding in {zone.name}",
+                    sub_heading=f"Detected {sahi_count}/{capacity} people. (Cam: {camera_id})",
+                    status=Alert.Status.OPEN
+                )
             response_data["status"] = "DANGER"
             response_data["alert_created"] = True
             response_data["alert_id"] = new_alert.id
@@ -125,61 +230,36 @@ def sensor_detect(request):
         
     else:
         # ---------------------------------------------------------
-        # STEP 3: Call Google Gemini API Directly
+        # STEP 3: Reference count from the zone's counter backend
         # ---------------------------------------------------------
+        backend = zone.counter_backend or settings.CARBON_COUNTER_BACKEND
         try:
-            # Load image from memory buffer (faster than file pointer)
-            img = PIL.Image.open(io.BytesIO(image_data))
-            
-            # Resize large images for faster processing (max 1024px)
-            max_size = 1024
-            if img.width > max_size or img.height > max_size:
-                img.thumbnail((max_size, max_size), PIL.Image.Resampling.LANCZOS)
-
-            # Use cached model (avoid re-initialization)
-            model = get_gemini_model()
-
-            # Simplified prompt for faster processing
-            prompt = f"Count people. Capacity: {capacity}. Return only the number."
-
-            # Call Gemini with faster retry logic
-            max_retries = 2
-            for attempt in range(max_retries):
-                try:
-                    # Add generation config for faster responses
-                    gemini_response = model.generate_content(
-                        [prompt, img],
-                        generation_config=genai.types.GenerationConfig(
-                            temperature=0,  # Deterministic, faster
-                            max_output_tokens=10  # Limit output for speed
-                        )
-                    )
-                    gemini_text = gemini_response.text.strip()
-                    break
-                except Exception as retry_error:
-                    if attempt == max_retries - 1:
-                        raise
-                    time.sleep(0.5)  # Reduced retry delay
-            
-            # Parse Gemini Count (Handle cases where it might return "approx 5" etc)
-            try:
-                gemini_count = int(''.join(filter(str.isdigit, gemini_text)))
-            except ValueError:
-                gemini_count = 1 # Fallback to avoid division by zero
+            counter = get_zone_counter(zone)  # A misconfigured backend is reported, not a 500
+            with span(f'count_{counter.name}'):
+                gemini_count = counter.count(
+                    image_data, filename=image_file.name,
+                    content_type=image_file.content_type, capacity=capacity
+                )
 
             # ---------------------------------------------------------
             # STEP 4: Calculate "Carbon Saved" Formula
-            # Formula: sahi_count / gemini_count (Rounded)
+            # Versioned in lims.carbon (CARBON_FORMULA_VERSION); the inputs are
+            # stored so `recompute_carbon` can re-derive the log later
             # ---------------------------------------------------------
-            if gemini_count == 0:
-                final_ratio = 0.0
-            else:
-                final_ratio = round(sahi_count / gemini_count, 4)
+            from ..carbon import get_formula
 
-            formula_str = f"{sahi_count} / {gemini_count} rounded"
+            formula = get_formula()
+            final_ratio = formula.one(sahi_count, gemini_count)
+            formula_str = formula.describe(sahi_count, gemini_count)
 
             # Save to Database (async in production, but Django ORM is fast for single insert)
-            CarbonLog.objects.create(zone_id=zone_id, saved_amount=final_ratio)
+            with span('carbonlog_insert'):
+                CarbonLog.objects.create(zone_id=zone_id, organization_id=zone.organization_id,
+                                         saved_amount=final_ratio, sahi_count=sahi_count,
+                                         gemini_count=gemini_count, formula_version=formula.version)
+            if request.user.is_authenticated:
+                credit(request.user.pk, round(final_ratio * settings.POINTS_PER_CARBON_UNIT),
+                       PointsEntry.Reason.CARBON_SAVED)
 
             # Update Response
             response_data["carbon_data"] = {
@@ -188,12 +268,52 @@ def sensor_detect(request):
                 "gemini_count": gemini_count,
                 "calculation_result": final_ratio,
                 "formula": formula_str,
-                "message": "Prediction successful via Gemini API"
+                "formula_version": formula.version,
+                "backend": counter.name,
+                "message": f"Prediction successful via {counter.name} backend"
             }
             response_data["alert_created"] = False
 
         except Exception as e:
-            response_data["carbon_error"] = f"Error calling Gemini API: {str(e)}"
+            response_data["carbon_error"] = f"Error calling {backend} backend: {str(e)}"
+
+        # ---------------------------------------------------------
+        # STEP 5: Proactive alert if the forecast crosses the threshold
+        # ---------------------------------------------------------
+        if predicted is not None and predicted >= threshold:
+            response_data["status"] = "PREDICTED_DANGER"
+            response_data["forecast"] = {
+                "horizon_minutes": settings.FORECAST_HORIZON_MINUTES,
+                "predicted_people": round(predicted, 1),
+            }
+            with span('alert_query'):
+                existing_alert = Alert.objects.filter(
+                    camera_id=camera_pk,
+                    kind=Alert.Kind.PREDICTED_OVERCROWDING,
+                    status=Alert.Status.OPEN
+                ).first()
+            if existing_alert:
+                response_data["alert_id"] = existing_alert.id
+            else:
+                with span('alert_insert'):
+                    new_alert = Alert.objects.create(
+                        camera_id=camera_pk,
+                        organization_id=zone.organization_id,
+                        frame_id=frame_id,
+                        kind=Alert.Kind.PREDICTED_OVERCROWDING,
+                        heading=f"Predicted overcrowding in {zone.name}",
+                        sub_heading=(f"Forecast {round(predicted)}/{capacity} people within "
+                                     f"{settings.FORECAST_HORIZON_MINUTES:g} min, now {sahi_count}. (Cam: {camera_id})"),
+                        status=Alert.Status.OPEN
+                    )
+                response_data["alert_created"] = True
+                response_data["alert_id"] = new_alert.id
+
+    if frame_id:
+        # Queued for the background writer; frames behind a new alert are kept longer
+        with span('frame_archive'):
+            archive(frame_id, image_data, zone, camera_pk, sahi_count, alerted=response_data.get("alert_created", False))
+        response_data["frame_id"] = frame_id
 
     return Response(response_data, status=status.HTTP_200_OK)
 
@@ -204,25 +324,21 @@ def get_carbon_stats(request):
     """ Retrieves Carbon Saving statistics with caching """
     zone_id = request.query_params.get('zone_id')
     
-    # Cache key for stats (cache for 30 seconds)
-    cache_key = f"carbon_stats_{zone_id or 'all'}"
+    # Cache key for stats (cache for 30 seconds), one entry per tenant scope
+    cache_key = f"carbon_stats_{zone_id or 'all'}_{scope_key(request.user)}"
     cached_response = cache.get(cache_key)
     if cached_response:
         return Response(cached_response)
 
     # Optimize query: use select_related for zone, limit logs to 10
+    carbon_logs = CarbonLog.objects.visible_to(request.user)
     if zone_id:
-        logs = CarbonLog.objects.filter(zone_id=zone_id).select_related('zone').order_by('-timestamp')[:10]
-        stats = CarbonLog.objects.filter(zone_id=zone_id).aggregate(
-            total_saved=Sum('saved_amount'),
-            avg_saved=Avg('saved_amount')
-        )
-    else:
-        logs = CarbonLog.objects.select_related('zone').order_by('-timestamp')[:10]
-        stats = CarbonLog.objects.aggregate(
-            total_saved=Sum('saved_amount'),
-            avg_saved=Avg('saved_amount')
-        )
+        carbon_logs = carbon_logs.filter(zone_id=zone_id)
+    logs = carbon_logs.select_related('zone').order_by('-timestamp')[:10]
+    stats = carbon_logs.aggregate(
+        total_saved=Sum('saved_amount'),
+        avg_saved=Avg('saved_amount')
+    )
 
     recent_logs = [
         {
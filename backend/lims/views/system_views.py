@@ -2,9 +2,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import connection
-from django.db.utils import OperationalError
-from ..permissions import IsAdmin, IsAnalyst, IsDirector, IsManager
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from ..permissions import IsAdmin
+from ..metrics import render_prometheus
+from ..profiling import folded_text, list_profiles, load_profile
+from .. import health, serving
 
 
 @api_view(['GET'])
@@ -18,21 +21,14 @@ def system_status(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def system_health(request):
-    """ A more detailed health check endpoint """
-    
-    try:
-        connection.ensure_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        db_status = "OK"
-    except OperationalError:
-        db_status = "DOWN"
-    except Exception as e:
-        db_status = f"ERROR: {str(e)}"
-
-    external_service_status = "OK" 
-
-    if db_status == "OK" and external_service_status == "OK":
+    """ A more detailed health check endpoint (served from the cached probe snapshot) """
+    snapshot = health.monitor.snapshot()
+    checks = snapshot["checks"]
+
+    external = [checks[name]["status"] for name in ("crowd_service", "gemini") if name in checks]
+    external_service_status = "OK" if all(s == health.OK for s in external) else "DOWN"
+
+    if snapshot["healthy"]:
         overall_status = "OK"
         http_status = status.HTTP_200_OK
     else:
@@ -41,6 +37,62 @@ def system_health(request):
 
     return Response({
         "overall_status": overall_status,
-        "database": db_status,
-        "external_service": external_service_status
-    }, status=http_status)
\ No newline at end of file
+        "database": checks.get("database", {}).get("status", "UNKNOWN"),
+        "external_service": external_service_status,
+        "checks": checks,
+        "age_seconds": snapshot["age_seconds"],
+    }, status=http_status)
+
+
+# Liveness/readiness skip DRF (negotiation, auth) and never touch the DB:
+# they are polled every few seconds by every load balancer node.
+
+def system_live(request):
+    """ Liveness: the process can serve requests """
+    return JsonResponse({"status": "OK"})
+
+
+def system_ready(request):
+    """
+    Readiness: critical dependencies (HEALTH_CRITICAL_PROBES) passed their last
+    probe and, with WARMUP_ON_READY, the counter backends have been preloaded.
+    A process that is shutting down (SIGTERM) is never ready.
+    """
+    if serving.draining.is_set():
+        return JsonResponse({"ready": False, "draining": True}, status=503)
+    snapshot = health.monitor.snapshot()
+    ready = snapshot["ready"]
+    body = {"ready": ready, "age_seconds": snapshot["age_seconds"]}
+
+    if settings.WARMUP_ON_READY:
+        health.warmup.start()
+        ready = ready and health.warmup.done
+        body.update(ready=ready, warmed_up=health.warmup.done, warm_up_errors=health.warmup.errors)
+
+    return JsonResponse(body, status=200 if ready else 503)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def system_metrics(request):
+    """ Latency histograms in Prometheus text exposition format """
+    return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_list(request):
+    """ Stored request profiles, newest first """
+    return Response({"profiling_enabled": settings.PROFILING_ENABLED, "profiles": list_profiles()})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_detail(request, profile_id):
+    """ One profile as JSON, or its folded stacks with ?file_format=folded (flame graph input) """
+    profile = load_profile(profile_id)
+    if profile is None:
+        return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+    if request.query_params.get('file_format') == 'folded':
+        return HttpResponse(folded_text(profile), content_type="text/plain; charset=utf-8")
+    return Response(profile)
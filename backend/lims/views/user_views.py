@@ -3,6 +3,8 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.views import TokenObtainPairView
+from django.conf import settings
+from ..points import leaderboard, visible_to
 from ..serializers import (
     UserRegistrationSerializer, 
     UserSerializer, 
@@ -47,4 +49,23 @@ def current_user(request):
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# --- 4. ECO-POINTS LEADERBOARD ---
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def points_leaderboard(request):
+    """
+    Top users by eco-points, from the precomputed board (no sort over the users table).
+    Users outside the caller's organizations are listed without id or name.
+    """
+    limit = request.query_params.get('limit', str(settings.POINTS_LEADERBOARD_SIZE))
+    if not limit.isdigit() or not 0 < int(limit) <= settings.POINTS_LEADERBOARD_SIZE:
+        return Response({"error": f"'limit' must be between 1 and {settings.POINTS_LEADERBOARD_SIZE}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    board = leaderboard(int(limit))
+
+    # Balance as of the last flush; rank only if on the board
+    rank = next((entry["rank"] for entry in board if entry["user_id"] == request.user.pk), None)
+    me = {"points": request.user.eco_points, "rank": rank}
+    return Response({"leaderboard": visible_to(board, request.user), "me": me})
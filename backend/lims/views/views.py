@@ -3,8 +3,12 @@ from rest_framework.permissions import AllowAny, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from ..models import Organization, Zone, Camera
-from ..serializers import OrganizationSerializer, ZoneSerializer, CameraSerializer
+from ..models import Organization, Zone, Camera, Membership, User
+from ..heartbeat import get_heartbeats, last_seen
+from ..metrics import span
+from ..permissions import IsAdmin
+from ..serializers import OrganizationSerializer, ZoneSerializer, CameraSerializer, MembershipSerializer
+from ..tenancy import check_organization
 
 # ==========================================
 # ORGANIZATION VIEWS
@@ -16,21 +20,27 @@ def organization_list_create(request):
     
     if request.method == 'GET':
         # Prefetch related zones and cameras for performance
-        orgs = Organization.objects.all().prefetch_related('zones__cameras').order_by('-created_at')
+        orgs = Organization.objects.visible_to(request.user).prefetch_related('zones__cameras').order_by('-created_at')
         serializer = OrganizationSerializer(orgs, many=True)
-        return Response(serializer.data)
+        # Evaluates the queryset and builds the payload
+        with span('serialize'):
+            data = serializer.data
+        return Response(data)
 
     elif request.method == 'POST':
         serializer = OrganizationSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            org = serializer.save()
+            # The creator joins it, so a non-admin can see what they created
+            if request.user.is_authenticated and request.user.role != User.Role.ADMIN:
+                Membership.objects.create(user=request.user, organization=org)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
 def organization_detail(request, pk):
-    org = get_object_or_404(Organization, pk=pk)
+    org = get_object_or_404(Organization.objects.visible_to(request.user).prefetch_related('zones__cameras'), pk=pk)
 
     if request.method == 'GET':
         serializer = OrganizationSerializer(org)
@@ -47,6 +57,31 @@ def organization_detail(request, pk):
         org.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdmin])
+def organization_members(request, pk):
+    """ Members of an organization (admin only); POST {"user_id"} adds one """
+    org = get_object_or_404(Organization.objects.only('id'), pk=pk)
+
+    if request.method == 'GET':
+        members = Membership.objects.filter(organization=org).select_related('user').order_by('created_at')
+        return Response(MembershipSerializer(members, many=True).data)
+
+    elif request.method == 'POST':
+        serializer = MembershipSerializer(data=request.data, context={'organization': org})
+        if serializer.is_valid():
+            serializer.save(organization=org)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['DELETE'])
+@permission_classes([IsAdmin])
+def organization_member_delete(request, pk, user_id):
+    deleted, _ = Membership.objects.filter(organization_id=pk, user_id=user_id).delete()
+    if not deleted:
+        return Response({"error": "Membership not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 # ==========================================
 # ZONE VIEWS
@@ -59,17 +94,20 @@ def zone_list_create(request):
     if request.method == 'GET':
         # Filter by Organization ID if provided in URL (e.g. ?org_id=1)
         org_id = request.query_params.get('org_id')
+        zones = Zone.objects.visible_to(request.user).select_related('organization').prefetch_related('cameras')
         if org_id:
-            zones = Zone.objects.filter(organization_id=org_id).select_related('organization').prefetch_related('cameras')
-        else:
-            zones = Zone.objects.all().select_related('organization').prefetch_related('cameras')
+            zones = zones.filter(organization_id=org_id)
             
         serializer = ZoneSerializer(zones, many=True)
-        return Response(serializer.data)
+        # Evaluates the queryset and builds the payload
+        with span('serialize'):
+            data = serializer.data
+        return Response(data)
 
     elif request.method == 'POST':
         serializer = ZoneSerializer(data=request.data)
         if serializer.is_valid():
+            check_organization(request.user, serializer.validated_data['organization'].pk)
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -77,7 +115,9 @@ def zone_list_create(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
 def zone_detail(request, pk):
-    zone = get_object_or_404(Zone, pk=pk)
+    zone = get_object_or_404(
+        Zone.objects.visible_to(request.user).select_related('organization').prefetch_related('cameras'), pk=pk
+    )
 
     if request.method == 'GET':
         serializer = ZoneSerializer(zone)
@@ -86,6 +126,9 @@ def zone_detail(request, pk):
     elif request.method == 'PUT':
         serializer = ZoneSerializer(zone, data=request.data, partial=True)
         if serializer.is_valid():
+            # Moving the zone to another organization needs membership there too
+            if 'organization' in serializer.validated_data:
+                check_organization(request.user, serializer.validated_data['organization'].pk)
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -106,17 +149,21 @@ def camera_list_create(request):
     if request.method == 'GET':
         # Filter by Zone ID if needed (e.g. ?zone_id=5)
         zone_id = request.query_params.get('zone_id')
+        cameras = Camera.objects.visible_to(request.user).select_related('zone__organization')
         if zone_id:
-            cameras = Camera.objects.filter(zone_id=zone_id).select_related('zone__organization')
-        else:
-            cameras = Camera.objects.all().select_related('zone__organization')
+            cameras = cameras.filter(zone_id=zone_id)
 
-        serializer = CameraSerializer(cameras, many=True)
-        return Response(serializer.data)
+        # Evaluates the queryset, reads every camera's heartbeat at once and builds the payload
+        with span('serialize'):
+            cameras = list(cameras)
+            serializer = CameraSerializer(cameras, many=True, context={'last_seen': last_seen(cameras)})
+            data = serializer.data
+        return Response(data)
 
     elif request.method == 'POST':
         serializer = CameraSerializer(data=request.data)
         if serializer.is_valid():
+            check_organization(request.user, serializer.validated_data['zone'].organization_id)
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -124,7 +171,7 @@ def camera_list_create(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
 def camera_detail(request, pk):
-    camera = get_object_or_404(Camera, pk=pk)
+    camera = get_object_or_404(Camera.objects.visible_to(request.user).select_related('zone__organization'), pk=pk)
 
     if request.method == 'GET':
         serializer = CameraSerializer(camera)
@@ -133,10 +180,26 @@ def camera_detail(request, pk):
     elif request.method == 'PUT':
         serializer = CameraSerializer(camera, data=request.data, partial=True)
         if serializer.is_valid():
+            if 'zone' in serializer.validated_data:
+                check_organization(request.user, serializer.validated_data['zone'].organization_id)
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
         camera.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def camera_heartbeat(request, pk):
+    """ Liveness ping from a member of the camera's organization: recorded in memory, flushed in batches """
+    heartbeats = get_heartbeats()
+    try:
+        organization_id = heartbeats.organization_of(pk)
+    except Camera.DoesNotExist:
+        return Response({"error": "Camera not found"}, status=status.HTTP_404_NOT_FOUND)
+    # Otherwise anyone could keep any camera "online" and silence the sweeper
+    check_organization(request.user, organization_id)
+    heartbeats.beat(pk)
+    return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file